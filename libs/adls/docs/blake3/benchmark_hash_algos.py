@@ -11,6 +11,8 @@ import timeit
 
 from blake3 import blake3  # type: ignore
 
+from thds.core import hashing
+
 
 @contextlib.contextmanager
 def createdummyfiles():
@@ -69,6 +71,40 @@ def xxhash_mmap(filepath):
     memmap_hasher(filepath, xxhash.xxh3_64())
 
 
+def xxhash_serial(filepath):
+    import xxhash
+
+    hashing.hash_using(filepath, xxhash.xxh3_128()).digest()
+
+
+def xxhash_parallel(filepath, readers):
+    import xxhash
+
+    hashing.hash_file_parallel(filepath, xxhash.xxh3_128(), readers=readers).digest()
+
+
+def compare_serial_and_parallel(fullfilename, filesize, num_iter):
+    """thds.core.hashing.hash_file_parallel produces the same digest as serial hashing, but
+    keeps several segment reads in flight while the hasher consumes them in order."""
+    serial_time = timeit.timeit(
+        f"xxhash_serial('{fullfilename}')", setup="from __main__ import xxhash_serial", number=num_iter
+    )
+    print(f"+++ xxh3_128 serial: {filesize * num_iter / serial_time / 2**20:_.1f} MB/s")
+    results = [serial_time]
+    for readers in (2, 4, 8, 16):
+        parallel_time = timeit.timeit(
+            f"xxhash_parallel('{fullfilename}', {readers})",
+            setup="from __main__ import xxhash_parallel",
+            number=num_iter,
+        )
+        print(
+            f"+++ xxh3_128 parallel ({readers} readers): {filesize * num_iter / parallel_time / 2**20:_.1f} MB/s"
+            f" - speedup {serial_time / parallel_time:.02f}x"
+        )
+        results.append(parallel_time)
+    return results
+
+
 if __name__ == "__main__":
     result_list = []  # list (of lists) to record file stats
 
@@ -133,6 +169,8 @@ if __name__ == "__main__":
             )
             print(f"+++ Ratio best chunked time/avg full: {least_time / timetaken_complete:.03}")
             result.append(timetaken_complete)
+
+            result.extend(compare_serial_and_parallel(fullfilename, filesize, num_iter))
             print("====================================================================")
             result_list.append(result)
 
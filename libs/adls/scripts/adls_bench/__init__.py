@@ -0,0 +1,22 @@
+"""Throughput benchmarks for thds.adls, against Azurite.
+
+    cd libs/adls/scripts
+    python -m adls_bench run [--scale quick|full] [--only download,ro_cache.hit] --out results.json
+    python -m adls_bench compare before.json after.json
+
+Azurite (`npm install -g azurite`) is started on a scratch directory unless something is
+already listening on its blob port. Every operation goes through the library's own global
+clients, which are pointed at the emulator by `target.redirect`; pass `--connection-string`
+to use a real account instead, and `--hns` if it has a hierarchical namespace, which the
+operations built on the Data Lake (dfs) API need. Azurite has none, so those are reported
+as skipped.
+
+The datasets (`datasets.DATASETS`) are deterministic: the same scale always produces the
+same bytes, under the same prefix, so they are generated and seeded once per work dir and
+container, and reused.
+
+Each operation runs in a fresh process, so its peak RSS is its own, and nothing it does is
+already warm in memory. Its untimed preparation (e.g. filling the cache that `ro_cache.hit`
+then hits) runs in another process beforehand. The results, along with the commit and
+environment they came from, are written as JSON.
+"""
@@ -0,0 +1,155 @@
+import argparse
+import contextlib
+import datetime
+import json
+import platform
+import sys
+import tempfile
+import typing as ty
+from pathlib import Path
+
+from thds.core import git, log, meta
+
+from . import __doc__ as _doc
+from . import datasets, measure, ops, target
+
+logger = log.getLogger(__name__)
+
+
+def _environment() -> ty.Dict[str, ty.Any]:
+    env: ty.Dict[str, ty.Any] = dict(
+        thds_adls=meta.get_version("thds.adls"),
+        python=platform.python_version(),
+        platform=platform.platform(),
+        machine=platform.machine(),
+        timestamp=datetime.datetime.now(datetime.timezone.utc).isoformat(),
+    )
+    try:
+        env.update(commit=git.get_commit_hash(), clean=git.is_clean())
+    except Exception as exc:  # not run from a checkout, perhaps.
+        logger.warning(f"Unable to determine the commit: {exc}")
+    return env
+
+
+def _selected(only: str) -> ty.List[ops.Op]:
+    if not only:
+        return ops.OPS
+    wanted = set(only.split(","))
+    selected = [op for op in ops.OPS if op.name in wanted or op.key in wanted]
+    unknown = wanted - {op.name for op in selected} - {op.key for op in selected}
+    if unknown:
+        raise SystemExit(
+            f"Unknown operations: {sorted(unknown)}; choose from {[op.key for op in ops.OPS]}"
+        )
+    return selected
+
+
+def _run(args: argparse.Namespace) -> None:
+    workdir = args.workdir or Path(tempfile.gettempdir()) / "adls-bench"
+    tgt = target.Target(args.connection_string, args.container, args.hns)
+    ctx = ops.Context(tgt, workdir, datasets.DATASETS[args.scale], args.concurrency, args.repeat)
+    selected = _selected(args.only)
+
+    results: ty.List[ty.Dict[str, ty.Any]] = list()
+    with target.azurite(workdir / "azurite") if tgt.is_azurite else contextlib.nullcontext():
+        target.redirect(tgt)
+        target.ensure_container(tgt)
+        for name in sorted({op.dataset for op in selected}):
+            datasets.seed(tgt, workdir, ctx.datasets[name], args.concurrency)
+
+        for op in selected:
+            result: ty.Dict[str, ty.Any] = dict(op=op.name, dataset=op.dataset)
+            if op.needs_hns and not tgt.hns:
+                result["skipped"] = "needs the Data Lake (dfs) API, which the target lacks (see --hns)"
+            else:
+                logger.info(f"Running {op.key}")
+                ops.clean(ctx, op.key)
+                try:
+                    measure.in_fresh_process(ops.prepare, ctx, op.key)
+                    result.update(measure.in_fresh_process(ops.run, ctx, op.key))
+                    _print(result)
+                except Exception as exc:
+                    logger.exception(f"{op.key} failed")
+                    result["error"] = repr(exc)
+                finally:
+                    ops.clean(ctx, op.key)
+            results.append(result)
+
+    report = dict(
+        environment=_environment(),
+        target=dict(azurite=tgt.is_azurite, hns=tgt.hns, container=tgt.container),
+        scale=args.scale,
+        results=results,
+    )
+    if args.out:
+        args.out.write_text(json.dumps(report, indent=2) + "\n")
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+
+def _print(result: ty.Dict[str, ty.Any]) -> None:
+    mbps = (result["bytes_per_second"] or 0) / 2**20
+    lat = result["latency_s"]
+    print(
+        f"{result['op'] + ':' + result['dataset']:<40} {result['files_per_second']:10.1f} files/s"
+        f" {mbps:9.1f} MiB/s  p50 {lat['p50']:.4f}s  p99 {lat['p99']:.4f}s"
+        f"  peak RSS {result['peak_rss_bytes'] / 2**20:.0f} MiB",
+        file=sys.stderr,
+    )
+
+
+def _compare(args: argparse.Namespace) -> None:
+    """Prints the new results relative to the old ones, per operation."""
+
+    def _by_key(path: Path) -> ty.Dict[str, ty.Dict[str, ty.Any]]:
+        report = json.loads(path.read_text())
+        return {f"{r['op']}:{r['dataset']}": r for r in report["results"] if "files" in r}
+
+    def _ratio(new: ty.Optional[float], old: ty.Optional[float]) -> str:
+        return f"{new / old:6.2f}x" if new and old else "     -"
+
+    old, new = _by_key(args.old), _by_key(args.new)
+    print(f"{'':<40} {'files/s':>8} {'bytes/s':>8} {'p50':>8} {'p99':>8} {'peak RSS':>8}")
+    for key in [k for k in new if k in old]:
+        o, n = old[key], new[key]
+        print(
+            f"{key:<40} {_ratio(n['files_per_second'], o['files_per_second']):>8}"
+            f" {_ratio(n['bytes_per_second'], o['bytes_per_second']):>8}"
+            f" {_ratio(n['latency_s']['p50'], o['latency_s']['p50']):>8}"
+            f" {_ratio(n['latency_s']['p99'], o['latency_s']['p99']):>8}"
+            f" {_ratio(n['peak_rss_bytes'], o['peak_rss_bytes']):>8}"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        prog="adls_bench", description=_doc, formatter_class=argparse.RawTextHelpFormatter
+    )
+    sub = parser.add_subparsers(required=True)
+
+    run = sub.add_parser("run", help="Run the benchmarks and write their results as JSON.")
+    run.add_argument("--scale", choices=sorted(datasets.DATASETS), default="quick")
+    run.add_argument(
+        "--only", default="", help="Comma-separated operations (e.g. download) or op:dataset keys."
+    )
+    run.add_argument("--out", type=Path, help="Defaults to stdout.")
+    run.add_argument("--workdir", type=Path, help="Where datasets and Azurite's data are kept.")
+    run.add_argument("--connection-string", default=target.AZURITE)
+    run.add_argument("--container", default="adls-bench")
+    run.add_argument("--hns", action="store_true", help="The account has a hierarchical namespace.")
+    run.add_argument("--concurrency", type=int, default=16)
+    run.add_argument("--repeat", type=int, default=5)
+    run.set_defaults(func=_run)
+
+    compare = sub.add_parser("compare", help="Compare two sets of results.")
+    compare.add_argument("old", type=Path)
+    compare.add_argument("new", type=Path)
+    compare.set_defaults(func=_compare)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""Deterministic datasets: generated locally once, and seeded into the container once."""
+
+import concurrent.futures
+import hashlib
+import json
+import random
+import typing as ty
+from pathlib import Path
+
+from azure.storage.blob import BlobServiceClient
+
+from thds.adls import upload
+from thds.core import log, parallel
+from thds.core.thunks import thunking
+
+from .target import Target
+
+_CHUNK = 4 * 2**20
+_SEEDED_MARKER = "_seeded"  # beside the datasets, so as not to be listed with them.
+logger = log.getLogger(__name__)
+
+
+class File(ty.NamedTuple):
+    path: str  # relative to the dataset's root
+    size: int
+
+
+class Dataset(ty.NamedTuple):
+    name: str
+    files: ty.Tuple[File, ...]
+
+    @property
+    def n_bytes(self) -> int:
+        return sum(f.size for f in self.files)
+
+    @property
+    def fingerprint(self) -> str:
+        return hashlib.sha256(json.dumps(self, sort_keys=True).encode()).hexdigest()[:12]
+
+    @property
+    def prefix(self) -> str:
+        """Where it's seeded in the container. Changes whenever the dataset does."""
+        return f"bench/{self.name}-{self.fingerprint}"
+
+
+def _small_files(n: int, size: int) -> Dataset:
+    return Dataset("small_files", tuple(File(f"part-{i:05}.bin", size) for i in range(n)))
+
+
+def _huge_files(n: int, size: int) -> Dataset:
+    return Dataset("huge_files", tuple(File(f"huge-{i}.bin", size) for i in range(n)))
+
+
+def _deep_tree(depth: int, fanout: int, files_per_dir: int, size: int) -> Dataset:
+    dirs = [""]
+    for _ in range(depth):
+        dirs = [f"{d}d{i}/" for d in dirs for i in range(fanout)]
+    return Dataset(
+        "deep_tree", tuple(File(f"{d}f{j}.bin", size) for d in dirs for j in range(files_per_dir))
+    )
+
+
+DATASETS: ty.Dict[str, ty.Dict[str, Dataset]] = {
+    "quick": {
+        ds.name: ds
+        for ds in (_small_files(200, 16 * 2**10), _huge_files(2, 64 * 2**20), _deep_tree(4, 3, 2, 2**10))
+    },
+    "full": {
+        ds.name: ds
+        # huge enough for ranged downloads, and for staged uploads.
+        for ds in (_small_files(2000, 16 * 2**10), _huge_files(3, 2**30), _deep_tree(6, 3, 2, 2**10))
+    },
+}
+
+
+def _write(path: Path, seed: str, size: int) -> None:
+    rng = random.Random(seed)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "wb") as f:
+        for start in range(0, size, _CHUNK):
+            f.write(rng.randbytes(min(_CHUNK, size - start)))
+
+
+def local_root(workdir: Path, dataset: Dataset) -> Path:
+    return workdir / "datasets" / f"{dataset.name}-{dataset.fingerprint}"
+
+
+def materialize(workdir: Path, dataset: Dataset) -> Path:
+    """Writes the dataset's files, unless they are already there."""
+    root = local_root(workdir, dataset)
+    for file in dataset.files:
+        path = root / file.path
+        if not path.exists() or path.stat().st_size != file.size:
+            _write(path, f"{dataset.name}/{file.path}", file.size)
+    return root
+
+
+def seed(target: Target, workdir: Path, dataset: Dataset, concurrency: int) -> None:
+    """Uploads the dataset with thds.adls, so that it has the hash metadata our uploads
+    always have. Skipped if it was already completely seeded."""
+    container = BlobServiceClient.from_connection_string(target.connection_string).get_container_client(
+        target.container
+    )
+    marker = container.get_blob_client(f"bench/{_SEEDED_MARKER}/{dataset.name}-{dataset.fingerprint}")
+    if marker.exists():
+        return
+
+    root = materialize(workdir, dataset)
+    logger.info(f"Seeding {dataset.name}: {len(dataset.files)} files, {dataset.n_bytes:,} bytes")
+    for _ in parallel.failfast(
+        parallel.yield_all(
+            (
+                (
+                    file.path,
+                    thunking(upload)(target.fqn(f"{dataset.prefix}/{file.path}"), root / file.path),
+                )
+                for file in dataset.files
+            ),
+            executor_cm=concurrent.futures.ThreadPoolExecutor(max_workers=concurrency),
+        )
+    ):
+        pass
+    marker.upload_blob(b"", overwrite=True)
@@ -0,0 +1,78 @@
+"""Timing, latency percentiles, and peak RSS."""
+
+import concurrent.futures
+import math
+import multiprocessing
+import resource
+import sys
+import time
+import typing as ty
+
+T = ty.TypeVar("T")
+
+
+class Timings(ty.NamedTuple):
+    """What an operation reports about a run of itself."""
+
+    seconds: float  # wall clock, for the whole run
+    latencies: ty.List[float]  # of each unit of work - a file, or a whole listing
+    files: int
+    bytes: int
+    params: ty.Dict[str, ty.Any] = dict()
+
+
+def percentile(values: ty.Sequence[float], q: float) -> float:
+    """Nearest-rank, so it's always one of the values."""
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(q * len(ordered)) - 1)]
+
+
+def peak_rss_bytes() -> int:
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return maxrss if sys.platform == "darwin" else maxrss * 1024  # Linux reports KiB
+
+
+def timed_each(
+    items: ty.Sequence[T], fn: ty.Callable[[T], ty.Any], concurrency: int
+) -> ty.Tuple[float, ty.List[float]]:
+    """Calls fn on every item, `concurrency` at a time, and returns the wall clock time for
+    all of them, and the latency of each."""
+
+    def _timed(item: T) -> float:
+        start = time.perf_counter()
+        fn(item)
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=concurrency) as pool:
+        latencies = list(pool.map(_timed, items))
+    return time.perf_counter() - start, latencies
+
+
+def summarize(timings: Timings, baseline_rss: int, peak_rss: int) -> ty.Dict[str, ty.Any]:
+    lat = timings.latencies
+    return dict(
+        files=timings.files,
+        bytes=timings.bytes,
+        seconds=timings.seconds,
+        files_per_second=timings.files / timings.seconds if timings.seconds else None,
+        bytes_per_second=timings.bytes / timings.seconds if timings.seconds and timings.bytes else None,
+        latency_s=dict(
+            n=len(lat),
+            p50=percentile(lat, 0.5) if lat else None,
+            p99=percentile(lat, 0.99) if lat else None,
+            mean=sum(lat) / len(lat) if lat else None,
+            max=max(lat) if lat else None,
+        ),
+        peak_rss_bytes=peak_rss,
+        baseline_rss_bytes=baseline_rss,  # after imports and setup, before the operation
+        params=timings.params,
+    )
+
+
+def in_fresh_process(fn: ty.Callable[..., T], *args: ty.Any) -> T:
+    """Spawned, rather than forked, so that it starts with nothing of ours in memory."""
+    with concurrent.futures.ProcessPoolExecutor(
+        max_workers=1, mp_context=multiprocessing.get_context("spawn")
+    ) as pool:
+        return pool.submit(fn, *args).result()
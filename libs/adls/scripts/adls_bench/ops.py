@@ -0,0 +1,190 @@
+"""The operations we benchmark. Each runs in its own process (see `run`)."""
+
+import shutil
+import time
+import typing as ty
+import uuid
+from pathlib import Path
+
+from azure.storage.blob import BlobServiceClient
+
+from thds.adls import download, global_client, hashes, impl, list_fast, ro_cache, upload
+from thds.core import hash_cache
+
+from . import measure, target
+from .datasets import Dataset, File, local_root, materialize
+
+
+class Context(ty.NamedTuple):
+    target: target.Target
+    workdir: Path
+    datasets: ty.Dict[str, Dataset]
+    concurrency: int  # files at a time
+    repeat: int  # for the operations on a whole dataset at once
+
+
+class Op(ty.NamedTuple):
+    name: str
+    dataset: str
+    run: ty.Callable[[Context, Dataset, Path], measure.Timings]
+    prepare: ty.Optional[ty.Callable[[Context, Dataset, Path], None]] = None
+    needs_hns: bool = False
+
+    @property
+    def key(self) -> str:
+        return f"{self.name}:{self.dataset}"
+
+
+def _download_all(
+    ctx: Context,
+    dataset: Dataset,
+    dest: Path,
+    cache: ty.Optional[ro_cache.Cache] = None,
+    **kwargs: ty.Any,
+) -> measure.Timings:
+    fs_client = global_client.get_global_fs_client(ctx.target.account_name, ctx.target.container)
+    expected: ty.Dict[str, ty.Any] = dict()
+    if kwargs.pop("expected_hashes", False):
+        root = local_root(ctx.workdir, dataset)
+        expected = {
+            f.path: hash_cache.filehash(hashes.default_hasher().name.lower(), root / f.path)
+            for f in dataset.files
+        }
+
+    def _one(file: File) -> None:
+        download.download_or_use_verified(
+            fs_client,
+            f"{dataset.prefix}/{file.path}",
+            dest / file.path,
+            expected_hash=expected.get(file.path),
+            cache=cache,
+        )
+
+    seconds, latencies = measure.timed_each(dataset.files, _one, ctx.concurrency)
+    return measure.Timings(
+        seconds,
+        latencies,
+        len(dataset.files),
+        dataset.n_bytes,
+        dict(concurrency=ctx.concurrency, **kwargs),
+    )
+
+
+def _download(ctx: Context, dataset: Dataset, op_dir: Path) -> measure.Timings:
+    return _download_all(ctx, dataset, op_dir / "out")
+
+
+def _cache(op_dir: Path) -> ro_cache.Cache:
+    return ro_cache.Cache(op_dir / "ro-cache", ("ref", "hard"))
+
+
+def _fill_cache(ctx: Context, dataset: Dataset, op_dir: Path) -> None:
+    _download_all(ctx, dataset, op_dir / "warm", cache=_cache(op_dir))
+
+
+def _cache_hit(ctx: Context, dataset: Dataset, op_dir: Path) -> measure.Timings:
+    """With the expected hash in hand, as from a SourceTree; no requests at all."""
+    materialize(ctx.workdir, dataset)
+    return _download_all(ctx, dataset, op_dir / "out", cache=_cache(op_dir), expected_hashes=True)
+
+
+def _cache_hit_remote_hash(ctx: Context, dataset: Dataset, op_dir: Path) -> measure.Timings:
+    """Learning the expected hash from the remote properties, which takes a request."""
+    return _download_all(ctx, dataset, op_dir / "out", cache=_cache(op_dir))
+
+
+def _upload(ctx: Context, dataset: Dataset, op_dir: Path) -> measure.Timings:
+    root = materialize(ctx.workdir, dataset)
+    prefix = f"bench-uploads/{uuid.uuid4().hex}"
+
+    def _one(file: File) -> None:
+        upload(ctx.target.fqn(f"{prefix}/{file.path}"), root / file.path)
+
+    try:
+        seconds, latencies = measure.timed_each(dataset.files, _one, ctx.concurrency)
+    finally:
+        container = BlobServiceClient.from_connection_string(
+            ctx.target.connection_string
+        ).get_container_client(ctx.target.container)
+        for blob in container.list_blobs(name_starts_with=prefix + "/"):
+            container.delete_blob(blob.name)
+    return measure.Timings(
+        seconds, latencies, len(dataset.files), dataset.n_bytes, dict(concurrency=ctx.concurrency)
+    )
+
+
+def _repeated(ctx: Context, fn: ty.Callable[[int], int]) -> ty.Tuple[float, ty.List[float], int]:
+    """Calls fn(i) ctx.repeat times, one after another; fn returns a number of files."""
+    latencies = list()
+    n_files = 0
+    start = time.perf_counter()
+    for i in range(ctx.repeat):
+        one_start = time.perf_counter()
+        n_files += fn(i)
+        latencies.append(time.perf_counter() - one_start)
+    return time.perf_counter() - start, latencies, n_files
+
+
+def _list_fast(ctx: Context, dataset: Dataset, op_dir: Path) -> measure.Timings:
+    # the parallel listing of subdirectories needs the dfs API to find them.
+    layers = 1 if ctx.target.hns else 0
+    fqn = ctx.target.fqn(dataset.prefix)
+    seconds, latencies, n_files = _repeated(
+        ctx, lambda _: sum(1 for _ in list_fast.multilayer_yield_blob_properties(fqn, layers=layers))
+    )
+    return measure.Timings(seconds, latencies, n_files, 0, dict(layers=layers, repeat=ctx.repeat))
+
+
+def _fetch_directory(ctx: Context, dataset: Dataset, op_dir: Path) -> measure.Timings:
+    fs = impl.ADLSFileSystem(ctx.target.account_name, ctx.target.container)
+    seconds, latencies, n_files = _repeated(
+        ctx, lambda i: len(fs.fetch_directory(dataset.prefix, op_dir / "out" / str(i)))
+    )
+    return measure.Timings(
+        seconds, latencies, n_files, dataset.n_bytes * ctx.repeat, dict(repeat=ctx.repeat)
+    )
+
+
+OPS = [
+    Op("download", "small_files", _download),
+    Op("download", "huge_files", _download),
+    Op("ro_cache.hit", "small_files", _cache_hit, prepare=_fill_cache),
+    Op("ro_cache.hit_remote_hash", "small_files", _cache_hit_remote_hash, prepare=_fill_cache),
+    Op("upload", "small_files", _upload),
+    Op("upload", "huge_files", _upload),
+    Op("list_fast", "deep_tree", _list_fast),
+    Op("fetch_directory", "deep_tree", _fetch_directory, needs_hns=True),
+]
+_BY_KEY = {op.key: op for op in OPS}
+
+
+def _op_dir(ctx: Context, op: Op) -> Path:
+    return ctx.workdir / "ops" / op.key.replace(":", "-")
+
+
+def _setup(ctx: Context, op: Op) -> Path:
+    target.redirect(ctx.target)
+    op_dir = _op_dir(ctx, op)
+    # shared by the op's preparation and its run, but not with any other op.
+    hash_cache.CACHE_HASH_DIR.set_global(op_dir / "hash-cache")
+    ro_cache.GLOBAL_CACHE_PATH.set_global(op_dir / "global-ro-cache")
+    return op_dir
+
+
+def prepare(ctx: Context, key: str) -> None:
+    op = _BY_KEY[key]
+    op_dir = _setup(ctx, op)
+    if op.prepare:
+        op.prepare(ctx, ctx.datasets[op.dataset], op_dir)
+
+
+def run(ctx: Context, key: str) -> ty.Dict[str, ty.Any]:
+    op = _BY_KEY[key]
+    op_dir = _setup(ctx, op)
+    baseline_rss = measure.peak_rss_bytes()
+    timings = op.run(ctx, ctx.datasets[op.dataset], op_dir)
+    return measure.summarize(timings, baseline_rss, measure.peak_rss_bytes())
+
+
+def clean(ctx: Context, key: str) -> None:
+    shutil.rmtree(_op_dir(ctx, _BY_KEY[key]), ignore_errors=True)
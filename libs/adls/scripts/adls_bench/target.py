@@ -0,0 +1,109 @@
+"""Where the benchmarks run, and pointing thds.adls at it."""
+
+import contextlib
+import shutil
+import socket
+import subprocess
+import time
+import typing as ty
+from pathlib import Path
+from urllib.parse import urlparse
+
+from azure.storage.blob import BlobServiceClient
+from azure.storage.filedatalake import DataLakeServiceClient
+from azure.storage.filedatalake.aio import DataLakeServiceClient as AioDataLakeServiceClient
+
+from thds.adls import AdlsFqn, azcopy, global_client, impl
+
+AZURITE = "UseDevelopmentStorage=true"
+
+
+class Target(ty.NamedTuple):
+    connection_string: str
+    container: str
+    hns: bool  # whether the Data Lake (dfs) API is available
+
+    @property
+    def is_azurite(self) -> bool:
+        return self.connection_string == AZURITE
+
+    @property
+    def account_name(self) -> str:
+        return BlobServiceClient.from_connection_string(self.connection_string).account_name
+
+    def fqn(self, path: str) -> AdlsFqn:
+        return AdlsFqn(self.account_name, self.container, path)
+
+
+class _NoCredential:
+    """Stands in for impl's DefaultAzureCredential; the connection string has the key."""
+
+    async def __aenter__(self) -> None:
+        return None
+
+    async def __aexit__(self, *_exc: ty.Any) -> None:
+        return None
+
+
+def redirect(target: Target) -> None:
+    """Makes the library's clients talk to the target, authenticating with its connection
+    string. Must be called before any client has been created (and cached).
+    """
+
+    def _from_connection_string(cls: ty.Any) -> ty.Callable[..., ty.Any]:
+        def make(account_url: str = "", credential: ty.Any = None, **kwargs: ty.Any) -> ty.Any:
+            return cls.from_connection_string(target.connection_string, **kwargs)
+
+        return make
+
+    global_client.BlobServiceClient = _from_connection_string(BlobServiceClient)  # type: ignore
+    global_client.DataLakeServiceClient = _from_connection_string(DataLakeServiceClient)  # type: ignore
+    impl.DataLakeServiceClient = _from_connection_string(AioDataLakeServiceClient)  # type: ignore
+    impl.DefaultAzureCredential = lambda **_kw: _NoCredential()  # type: ignore
+    if target.is_azurite:
+        # azcopy would authenticate with our Azure login, which Azurite knows nothing of.
+        azcopy.download.DONT_USE_AZCOPY.set_global(True)
+        azcopy.upload.DONT_USE_AZCOPY.set_global(True)
+
+
+def ensure_container(target: Target) -> None:
+    container = BlobServiceClient.from_connection_string(target.connection_string).get_container_client(
+        target.container
+    )
+    if not container.exists():
+        container.create_container()
+
+
+def _listening(host: str, port: int) -> bool:
+    with contextlib.suppress(OSError), socket.create_connection((host, port), timeout=0.5):
+        return True
+    return False
+
+
+@contextlib.contextmanager
+def azurite(location: Path) -> ty.Iterator[None]:
+    """Runs Azurite's blob service for the duration, unless something is already listening
+    on its port, in which case that is presumed to be Azurite."""
+    url = urlparse(BlobServiceClient.from_connection_string(AZURITE).url)
+    host, port = url.hostname or "127.0.0.1", url.port or 10000
+    if _listening(host, port):
+        yield
+        return
+
+    exe = shutil.which("azurite-blob")
+    if not exe:
+        raise RuntimeError("Nothing is listening on Azurite's port, and azurite-blob is not installed")
+    location.mkdir(parents=True, exist_ok=True)
+    proc = subprocess.Popen(
+        [exe, "--silent", "--skipApiVersionCheck", "--location", str(location), "--blobPort", str(port)]
+    )
+    try:
+        deadline = time.monotonic() + 30
+        while not _listening(host, port):
+            if proc.poll() is not None or time.monotonic() > deadline:
+                raise RuntimeError(f"Azurite did not start (exit code {proc.poll()})")
+            time.sleep(0.1)
+        yield
+    finally:
+        proc.terminate()
+        proc.wait(timeout=30)
@@ -0,0 +1,109 @@
+#!/usr/bin/env python
+"""Benchmarks the persistent listing cache against a flat listing, on a synthetic tree of
+blobs in an Azurite container.
+
+    azurite-blob --silent --location /tmp/azurite &
+    python scripts/bench_list_cache.py [--n-blobs 1000000] [--fanout 1000]
+
+The tree is `bench/dNNNN/dNN/fNNNNNNN`. Azurite has no hierarchical namespace, so we write
+the directory blobs (with `hdi_isfolder` metadata) ourselves, and re-write a directory's
+blob whenever we add a child to it, which is what an HNS account does for us.
+
+Populating a million blobs takes a while; it only happens if the container is empty.
+"""
+
+import argparse
+import asyncio
+import tempfile
+import time
+import typing as ty
+from pathlib import Path
+
+from azure.storage.blob.aio import BlobServiceClient, ContainerClient
+
+from thds.adls import list_cache
+
+_AZURITE = "UseDevelopmentStorage=true"
+_DIR_METADATA = {"hdi_isfolder": "true"}
+
+
+def _blob_name(i: int, fanout: int) -> str:
+    return f"bench/d{i // (fanout * 100):04}/d{i // fanout % 100:02}/f{i:07}"
+
+
+def _dirs_of(name: str) -> ty.List[str]:
+    parts = name.split("/")[:-1]
+    return ["/".join(parts[: i + 1]) for i in range(len(parts))]
+
+
+async def _populate(container: ContainerClient, n_blobs: int, fanout: int, concurrency: int) -> None:
+    sem = asyncio.Semaphore(concurrency)
+
+    async def _put(name: str, metadata: ty.Optional[ty.Dict[str, str]] = None) -> None:
+        async with sem:
+            await container.upload_blob(name, b"x" * 16, metadata=metadata, overwrite=True)
+
+    names = [_blob_name(i, fanout) for i in range(n_blobs)]
+    dirs = sorted({d for name in names for d in _dirs_of(name)})
+    start = time.monotonic()
+    for i in range(0, len(names), 10_000):
+        await asyncio.gather(*(_put(name) for name in names[i : i + 10_000]))
+        print(f"  {min(i + 10_000, n_blobs):,} blobs after {time.monotonic() - start:.0f}s", flush=True)
+    # after the files, so that they're newer than their children, as they would be with HNS.
+    await asyncio.gather(*(_put(d, _DIR_METADATA) for d in dirs))
+
+
+async def _flat_listing(container: ContainerClient) -> int:
+    return len([b async for b in container.list_blobs(name_starts_with="bench/", include=["metadata"])])
+
+
+async def _timed(label: str, coro: ty.Awaitable[ty.Any]) -> ty.Any:
+    start = time.monotonic()
+    result = await coro
+    print(f"{label:<40} {time.monotonic() - start:8.2f}s   {result}")
+    return result
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument("--connection-string", default=_AZURITE)
+    parser.add_argument("--container", default="list-cache-bench")
+    parser.add_argument("--n-blobs", type=int, default=1_000_000)
+    parser.add_argument("--fanout", type=int, default=1000, help="blobs per leaf directory")
+    parser.add_argument("--upload-concurrency", type=int, default=64)
+    args = parser.parse_args()
+
+    async with BlobServiceClient.from_connection_string(args.connection_string) as service:
+        container = service.get_container_client(args.container)
+        if not await container.exists():
+            await container.create_container()
+        async for _ in container.list_blobs(name_starts_with="bench/"):
+            break
+        else:
+            print(f"Populating {args.n_blobs:,} blobs...")
+            await _populate(container, args.n_blobs, args.fanout, args.upload_concurrency)
+
+        lister = list_cache.container_lister(container)
+        with tempfile.TemporaryDirectory() as tmp:
+            cache = list_cache.ListingCache(
+                f"adls://{service.account_name}/{args.container}/bench",
+                db_path=Path(tmp) / "listing.sqlite3",
+            )
+            await _timed("flat list_blobs", _flat_listing(container))
+            await _timed("cache: first (full) refresh", cache.arefresh(lister))
+            await _timed("cache: refresh, nothing changed", cache.arefresh(lister))
+
+            new_blob = _blob_name(args.n_blobs, args.fanout)
+            await container.upload_blob(new_blob, b"new", overwrite=True)
+            for d in _dirs_of(new_blob)[1:]:  # not the root, which the cache always lists.
+                await container.upload_blob(d, b"", metadata=_DIR_METADATA, overwrite=True)
+            await _timed("cache: refresh after adding one blob", cache.arefresh(lister))
+            await _timed("cache: forced full refresh", cache.arefresh(lister, full=True))
+            n_cached = await _timed(
+                "cache: read back", asyncio.to_thread(lambda: sum(1 for _ in cache.yield_blob_meta()))
+            )
+            print(f"{n_cached:,} blobs (including directories) in the cache")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
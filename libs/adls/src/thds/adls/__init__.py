@@ -8,6 +8,7 @@ from . import (  # noqa: F401
     etag,
     fqn,
     hashes,
+    list_cache,
     list_fast,
     named_roots,
     source,
@@ -15,13 +16,13 @@ from . import (  # noqa: F401
     uri,
 )
 from .cached import download_directory, download_to_cache, upload_through_cache  # noqa: F401
-from .copy import copy_file, copy_files, wait_for_copy  # noqa: F401
+from .copy import copy_file, copy_files, copy_many, wait_for_copy  # noqa: F401
 from .errors import BlobNotFoundError  # noqa: F401
 from .fqn import *  # noqa: F401,F403
 from .global_client import get_global_fs_client  # noqa: F401
 from .impl import *  # noqa: F401,F403
 from .ro_cache import Cache, global_cache  # noqa: F401
-from .upload import upload  # noqa: F401
+from .upload import upload, upload_stream  # noqa: F401
 from .uri import UriIsh, parse_any, parse_uri, resolve_any, resolve_uri  # noqa: F401
 
 __version__ = core.meta.get_version(__name__)
@@ -0,0 +1,157 @@
+"""A streaming pipeline for ADLSFileSystem's fetches: list -> check -> download.
+
+Each stage is a set of async workers taking items from a bounded queue, and the items flow
+through as they're ready rather than in batches, so one slow download doesn't hold up the
+rest of its batch. Since every queue is bounded, the listing can get no further ahead of the
+downloads than the window, and the memory used is proportional to the window rather than to
+the number of files.
+
+- list: whatever the source yields, e.g. a directory listing, filtered.
+- check: whether the local cache already has an up-to-date copy of the file; if so, it goes
+  straight to the output.
+- download: downloads (and verifies) the file.
+
+Each stage keeps `StageCounters`, which may be read while the pipeline runs.
+"""
+
+import asyncio
+import time
+import typing as ty
+from pathlib import Path
+
+import attr
+
+_END = object()
+
+
+class Fetch(ty.NamedTuple):
+    position: int  # in the order of the source
+    remote_path: str
+    local_path: Path
+    properties: ty.Any = None  # the remote properties, if the source had them
+
+
+@attr.s(auto_attribs=True)
+class StageCounters:
+    received: int = 0
+    passed: int = 0  # on to the next stage
+    skipped: int = 0  # done with early, e.g. filtered out of a listing, or already cached
+    failed: int = 0
+    in_flight: int = 0
+    max_in_flight: int = 0
+    max_queued: int = 0  # the most items ever waiting for this stage
+    busy_s: float = 0.0  # summed over this stage's workers
+
+
+@attr.s(auto_attribs=True)
+class FetchCounters:
+    list: StageCounters = attr.Factory(StageCounters)
+    check: StageCounters = attr.Factory(StageCounters)
+    download: StageCounters = attr.Factory(StageCounters)
+    output: StageCounters = attr.Factory(StageCounters)  # received is the number of files fetched
+
+
+class _Stage:
+    def __init__(self, counters: StageCounters, workers: int, window: int):
+        self.counters = counters
+        self.workers = workers
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=window)
+
+    async def put(self, item: ty.Any) -> None:
+        await self.queue.put(item)
+        self.counters.max_queued = max(self.counters.max_queued, self.queue.qsize())
+
+    async def close(self) -> None:
+        for _ in range(self.workers):
+            await self.queue.put(_END)
+
+    async def run(self, fn: ty.Callable[[Fetch], ty.Awaitable[None]]) -> None:
+        counters = self.counters
+
+        async def worker() -> None:
+            while (item := await self.queue.get()) is not _END:
+                counters.received += 1
+                counters.in_flight += 1
+                counters.max_in_flight = max(counters.max_in_flight, counters.in_flight)
+                start = time.monotonic()
+                try:
+                    await fn(item)
+                except BaseException:
+                    counters.failed += 1
+                    raise
+                finally:
+                    counters.in_flight -= 1
+                    counters.busy_s += time.monotonic() - start
+
+        await asyncio.gather(*(worker() for _ in range(self.workers)))
+
+
+async def fetch(
+    source: ty.AsyncIterable[Fetch],
+    is_cached: ty.Callable[[Fetch], ty.Awaitable[bool]],
+    download: ty.Callable[[Fetch], ty.Awaitable[Path]],
+    place: ty.Callable[[Fetch], Path],
+    *,
+    window: int,
+    counters: FetchCounters,
+) -> ty.AsyncIterator[ty.Tuple[int, Path]]:
+    """Yields (index, local path) for each fetched file, as each is ready.
+
+    `place` puts the (already cached or downloaded) file at its local path. If any stage
+    fails, everything is cancelled and the failure is raised.
+    """
+    checking = _Stage(counters.check, window, window)
+    downloading = _Stage(counters.download, window, window)
+    output: asyncio.Queue = asyncio.Queue(maxsize=window)
+
+    async def emit(fetched: Fetch, path: Path) -> None:
+        counters.output.received += 1
+        await output.put((fetched.position, path))
+
+    async def list_stage() -> None:
+        async for fetched in source:
+            counters.list.received += 1
+            counters.list.passed += 1
+            await checking.put(fetched)
+        await checking.close()
+
+    async def check(fetched: Fetch) -> None:
+        if await is_cached(fetched):
+            counters.check.skipped += 1
+            await emit(fetched, place(fetched))
+        else:
+            counters.check.passed += 1
+            await downloading.put(fetched)
+
+    async def check_stage() -> None:
+        await checking.run(check)
+        await downloading.close()
+
+    async def download_one(fetched: Fetch) -> None:
+        path = await download(fetched)
+        counters.download.passed += 1
+        await emit(fetched, path)
+
+    async def download_stage() -> None:
+        await downloading.run(download_one)
+        await output.put(_END)
+
+    stages = {asyncio.ensure_future(stage()) for stage in (list_stage, check_stage, download_stage)}
+    running = set(stages)
+    getter: ty.Optional[asyncio.Future] = None
+    try:
+        while True:
+            getter = asyncio.ensure_future(output.get())
+            while not getter.done():
+                done, _ = await asyncio.wait({getter, *running}, return_when=asyncio.FIRST_COMPLETED)
+                for stage in done - {getter}:
+                    running.discard(stage)
+                    stage.result()  # raises the stage's failure, if any.
+            item = getter.result()
+            if item is _END:
+                return
+            yield item
+    finally:
+        for task in (*stages, *([getter] if getter else [])):
+            task.cancel()
+        await asyncio.gather(*stages, return_exceptions=True)
@@ -0,0 +1,56 @@
+"""A local, append-only record of which fixed-size ranges of a file are done, so that an
+interrupted transfer can be resumed - ranges written into a partial download, or blocks
+staged for an upload.
+"""
+
+import json
+import threading
+import typing as ty
+from pathlib import Path
+
+
+def ranges(size: int, chunk_size: int) -> ty.List[ty.Tuple[int, int]]:
+    return [(start, min(start + chunk_size, size)) for start in range(0, size, chunk_size)]
+
+
+class RangeJournal:
+    """The first line identifies the transfer - e.g. the remote file version and the
+    chunking; each subsequent line is the start offset of a completed range. A torn final
+    line (from a crash mid-append) is ignored, and a journal with any other first line is
+    started over.
+    """
+
+    def __init__(self, path: Path, header: ty.Dict[str, ty.Any]):
+        self.path = path
+        self.done: ty.Set[int] = set()
+        self._lock = threading.Lock()
+
+        existing = self._read(header)
+        if existing is None:
+            self.path.write_text(json.dumps(header) + "\n")
+        else:
+            self.done = existing
+        self._f = open(self.path, "a")
+
+    def _read(self, header: ty.Dict[str, ty.Any]) -> ty.Optional[ty.Set[int]]:
+        try:
+            lines = self.path.read_text().split("\n")
+        except FileNotFoundError:
+            return None
+        try:
+            if json.loads(lines[0]) != header:
+                return None
+        except ValueError:
+            return None
+        # every complete line is terminated by a newline, so the last element is either
+        # empty or a torn write.
+        return {int(line) for line in lines[1:-1] if line}
+
+    def record(self, start: int) -> None:
+        with self._lock:
+            self._f.write(f"{start}\n")
+            self._f.flush()
+            self.done.add(start)
+
+    def close(self) -> None:
+        self._f.close()
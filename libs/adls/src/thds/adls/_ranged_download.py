@@ -0,0 +1,208 @@
+"""A native multi-connection download: the destination is preallocated, and fixed-size byte
+ranges are fetched concurrently, each written into place with `pwrite` as it streams in.
+
+This is what we use for files too small for azcopy to be worth starting, or on hosts
+without azcopy. Compared to the SDK's `download_file(max_concurrency=...)`, nothing is
+buffered waiting for earlier chunks to be written, and there is no single file handle to
+serialize on.
+
+Downloads are resumable. The data is written to a partial file beside the destination,
+and a sidecar 'range journal' records each range once it has been written. A retry (or a
+later process, since the caller holds the download's file lock) that finds a journal for
+the same etag and size fetches only the ranges not yet recorded. A journal for any other
+version of the file is discarded. The journal is not fsynced; the hash verification that
+follows every download is what guarantees the bytes are right.
+
+A failure that no retry could resume from - the file is gone, or has changed - removes
+the partial file and its journal, rather than leaving them beside the destination.
+"""
+
+import asyncio
+import concurrent.futures
+import contextlib
+import os
+import typing as ty
+from dataclasses import dataclass
+from pathlib import Path
+
+from azure.core import MatchConditions
+from azure.core.exceptions import HttpResponseError, ResourceModifiedError, ResourceNotFoundError
+from azure.storage.filedatalake import DataLakeFileClient, aio
+
+from thds.core import hashing, log
+
+from . import conf, errors
+from ._progress import get_global_download_tracker
+from ._range_journal import RangeJournal, ranges
+from .azcopy.download import DownloadRequest
+
+logger = log.getLogger(__name__)
+_JOURNAL_SUFFIX = ".ranges"
+
+
+@dataclass
+class RangedDownloadRequest(DownloadRequest):
+    """Download to temp_path (which is a stable partial path, not a random one) by ranges."""
+
+    size_bytes: int
+    etag: str
+    hasher: ty.Optional[hashing.OrderedHasher] = None
+    # fed every range as it is written; ranges already on disk when resuming are left for it to read.
+
+
+def should_use_ranged(size_bytes: ty.Optional[int]) -> bool:
+    min_size = conf.RANGED_DOWNLOAD_MIN_SIZE()
+    return bool(min_size) and size_bytes is not None and size_bytes >= min_size
+
+
+def partial_path(dest: Path) -> Path:
+    return dest.parent / f".{dest.name}.partial"
+
+
+def journal_path(partial: Path) -> Path:
+    return partial.with_name(partial.name + _JOURNAL_SUFFIX)
+
+
+def remove_partial(partial: Path) -> None:
+    for path in (partial, journal_path(partial)):
+        path.unlink(missing_ok=True)
+
+
+def _resumable(exc: BaseException) -> bool:
+    """Whether a retry could pick up where a download that failed with `exc` left off."""
+    if isinstance(exc, (ResourceNotFoundError, ResourceModifiedError)):
+        return False  # the file is gone, or has changed since its etag.
+    if isinstance(exc, HttpResponseError) and exc.status_code:
+        return exc.status_code >= 500 or exc.status_code in (408, 429)
+    return True
+
+
+class _RangedFile:
+    """The shared, mostly-synchronous parts of a ranged download: journal, preallocated
+    file, and progress. Sync and async callers differ only in how they fetch ranges."""
+
+    def __init__(self, url: str, request: RangedDownloadRequest):
+        self.request = request
+        self.chunk_size = conf.RANGED_DOWNLOAD_CHUNK_SIZE()
+        partial = request.temp_path
+        partial.parent.mkdir(parents=True, exist_ok=True)
+        header = dict(etag=request.etag, size=request.size_bytes, chunk_size=self.chunk_size)
+        self.journal = RangeJournal(journal_path(partial), header)
+        if not self.journal.done:
+            partial.unlink(missing_ok=True)  # whatever is there is not ours.
+
+        self.fd = os.open(partial, os.O_RDWR | os.O_CREAT, 0o644)
+        if os.fstat(self.fd).st_size != request.size_bytes:
+            if hasattr(os, "posix_fallocate") and request.size_bytes:
+                try:
+                    os.posix_fallocate(self.fd, 0, request.size_bytes)
+                except OSError:  # e.g. not supported by the filesystem
+                    pass
+            os.ftruncate(self.fd, request.size_bytes)
+
+        all_ranges = ranges(request.size_bytes, self.chunk_size)
+        self.todo = [(start, end) for start, end in all_ranges if start not in self.journal.done]
+        done_bytes = request.size_bytes - sum(end - start for start, end in self.todo)
+        if done_bytes:
+            logger.info(
+                f"Resuming download of {url} with {done_bytes:,} of {request.size_bytes:,} bytes"
+                f" already present ({len(all_ranges) - len(self.todo)} of {len(all_ranges)} ranges)"
+            )
+        self.tracker, self.key = get_global_download_tracker().add(url, request.size_bytes)
+        if done_bytes:
+            self.tracker(self.key, total_written=done_bytes)
+
+    def kwargs(self, start: int, end: int) -> ty.Dict[str, ty.Any]:
+        return dict(
+            offset=start,
+            length=end - start,
+            etag=self.request.etag,
+            match_condition=MatchConditions.IfNotModified,
+            connection_timeout=conf.CONNECTION_TIMEOUT(),
+        )
+
+    def write(self, data: bytes, offset: int) -> None:
+        if self.request.hasher:
+            self.request.hasher.update_at(offset, data)
+        view = memoryview(data)
+        while view:
+            n = os.pwrite(self.fd, view, offset)
+            view = view[n:]
+            offset += n
+        self.tracker(self.key, len(data))
+
+    def finish_range(self, start: int, end: int, written: int) -> None:
+        if written != end - start:
+            raise errors.ContentLengthMismatchError(
+                f"Range {start}-{end} of {self.request.temp_path} returned {written} bytes"
+            )
+        self.journal.record(start)
+
+    def close(self) -> None:
+        self.journal.close()
+        os.close(self.fd)
+
+    @contextlib.contextmanager
+    def closing(self) -> ty.Iterator[None]:
+        failure: ty.Optional[BaseException] = None
+        try:
+            yield
+        except BaseException as exc:
+            failure = exc
+            raise
+        finally:
+            self.close()
+            if failure is not None and not _resumable(failure):
+                logger.info(f"Removing {self.request.temp_path}, since the download can't be resumed")
+                remove_partial(self.request.temp_path)
+
+
+def download(dl_file_client: DataLakeFileClient, request: RangedDownloadRequest) -> None:
+    ranged = _RangedFile(dl_file_client.url, request)
+
+    def fetch(start: int, end: int) -> None:
+        written = 0
+        for piece in dl_file_client.download_file(**ranged.kwargs(start, end)).chunks():
+            ranged.write(piece, start + written)
+            written += len(piece)
+        ranged.finish_range(start, end, written)
+
+    with ranged.closing():
+        logger.debug(f"Downloading {dl_file_client.url} in {len(ranged.todo)} ranges")
+        with concurrent.futures.ThreadPoolExecutor(
+            max_workers=conf.RANGED_DOWNLOAD_MAX_CONCURRENCY(), thread_name_prefix="adls-ranged"
+        ) as pool:
+            futures = [pool.submit(fetch, start, end) for start, end in ranged.todo]
+            try:
+                for future in futures:
+                    future.result()
+            except BaseException:
+                # completed ranges stay journaled for the retry; don't start any more.
+                for future in futures:
+                    future.cancel()
+                raise
+
+
+async def async_download(dl_file_client: aio.DataLakeFileClient, request: RangedDownloadRequest) -> None:
+    ranged = _RangedFile(dl_file_client.url, request)
+    semaphore = asyncio.Semaphore(conf.RANGED_DOWNLOAD_MAX_CONCURRENCY())
+
+    async def fetch(start: int, end: int) -> None:
+        async with semaphore:
+            written = 0
+            downloader = await dl_file_client.download_file(**ranged.kwargs(start, end))
+            async for piece in downloader.chunks():
+                ranged.write(piece, start + written)  # a local pwrite; not worth a thread hop.
+                written += len(piece)
+            ranged.finish_range(start, end, written)
+
+    with ranged.closing():
+        logger.debug(f"Downloading {dl_file_client.url} in {len(ranged.todo)} ranges")
+        tasks = [asyncio.ensure_future(fetch(start, end)) for start, end in ranged.todo]
+        try:
+            await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)  # before we close the file.
+            raise
@@ -0,0 +1,345 @@
+"""A resumable block upload of a local file, hashed as it is read for uploading.
+
+The file is read sequentially, one block at a time. Each block is fed to the hasher and
+then staged (Put Block) on one of several concurrent connections; once every block is
+staged, they're committed (Put Block List) along with the metadata, which by then includes
+the hash. The file is therefore read exactly once, rather than once to hash it and again to
+upload it.
+
+Uploads are resumable. A local journal records each block once it has been staged, and a
+retry (or a later process - the caller holds the upload's file lock) for the same source
+file, unchanged, and the same destination skips every journaled block that the service
+still has among the blob's uncommitted blocks. Those blocks are still read, to hash them.
+Azure discards uncommitted blocks after a week, or when anything else is committed to the
+blob, in which case they simply get staged again. Journals are removed once their upload
+commits, and any left behind by uploads never retried are removed once they're a week old.
+
+This is what we use for large files when azcopy is not used.
+
+`BlockWriter` stages blocks the same way, but from a stream of writes rather than a file,
+so that something too large to hold in memory can be uploaded as it is produced. Having
+nothing to resume from, it isn't resumable.
+"""
+
+import concurrent.futures
+import hashlib
+import io
+import os
+import secrets
+import threading
+import time
+import typing as ty
+from pathlib import Path
+
+from azure.core.exceptions import (
+    HttpResponseError,
+    ResourceNotFoundError,
+    ServiceRequestError,
+    ServiceResponseError,
+)
+from azure.storage.blob import BlobBlock, BlobClient, ContentSettings
+
+from thds.core import config, fretry, hash_cache, hashing, log
+from thds.core.home import HOMEDIR
+
+from . import conf, hashes
+from ._progress import get_global_upload_tracker
+from ._range_journal import RangeJournal, ranges
+from .fqn import AdlsFqn
+
+JOURNAL_DIR = config.item("journal-dir", HOMEDIR() / ".thds/adls/staged-uploads", parse=Path)
+_MAX_BLOCKS = 50_000  # per blob, per the service.
+_JOURNAL_MAX_AGE_S = 7 * 24 * 3600  # the service discards uncommitted blocks after a week.
+_UPLOAD_BLOB_ONLY = frozenset(
+    ["blob_type", "length", "overwrite", "max_concurrency", "encoding", "progress_hook"]
+)
+# upload_blob kwargs that say how to upload rather than what to commit; commit_block_list rejects them.
+logger = log.getLogger(__name__)
+
+
+def _is_transient(exc: Exception) -> bool:
+    """Expired credentials, throttling, dropped connections - anything but a missing container."""
+    return isinstance(exc, (ServiceRequestError, ServiceResponseError)) or (
+        isinstance(exc, HttpResponseError) and not isinstance(exc, ResourceNotFoundError)
+    )
+
+
+_retry_transient = fretry.retry_sleep(_is_transient, fretry.expo(retries=9, delay=1.0))
+# one throttled block of thousands shouldn't fail an upload, and a BlockWriter can't be retried
+# as a whole - its data has been written - so each request is.
+
+
+def should_stage(src: object, n_bytes: int) -> bool:
+    min_size = conf.STAGED_UPLOAD_MIN_SIZE()
+    return isinstance(src, Path) and bool(min_size) and n_bytes >= min_size
+
+
+def _block_size(n_bytes: int) -> int:
+    return max(conf.STAGED_UPLOAD_BLOCK_SIZE(), -(-n_bytes // _MAX_BLOCKS))
+
+
+def _version(dest: AdlsFqn, src: Path, n_bytes: int, mtime_ns: int, block_size: int) -> str:
+    """Identifies this upload - of this version of this file, to this destination."""
+    key = f"{dest}\n{src.resolve()}\n{n_bytes}\n{mtime_ns}\n{block_size}"
+    return hashlib.sha256(key.encode()).hexdigest()[:16]
+
+
+def commit_kwargs(upload_blob_kwargs: ty.Mapping[str, ty.Any]) -> ty.Dict[str, ty.Any]:
+    """Those of the kwargs meant for `upload_blob` that apply to `upload`'s commit."""
+    ignored = sorted(upload_blob_kwargs.keys() & _UPLOAD_BLOB_ONLY)
+    if ignored:
+        logger.debug(f"Ignoring {ignored}, which don't apply to a staged upload")
+    return {k: v for k, v in upload_blob_kwargs.items() if k not in _UPLOAD_BLOB_ONLY}
+
+
+def _remove_stale_journals(journal_dir: Path) -> None:
+    cutoff = time.time() - _JOURNAL_MAX_AGE_S
+    for path in journal_dir.glob("*.blocks"):
+        try:
+            if path.stat().st_mtime < cutoff:
+                path.unlink()
+        except OSError:
+            pass  # another process got there first.
+
+
+def _block_id(version: str, start: int) -> str:
+    # every block id of a blob must be the same length.
+    return f"{version}-{start:015d}"
+
+
+def _still_staged(
+    blob_client: BlobClient, version: str, journaled: ty.Set[int], blocks: ty.List[ty.Tuple[int, int]]
+) -> ty.Set[int]:
+    """The journaled blocks that the service still has."""
+    if not journaled:
+        return set()
+    try:
+        _, uncommitted = blob_client.get_block_list("uncommitted")
+    except ResourceNotFoundError:
+        return set()
+    staged = {block.id: block.size for block in uncommitted}
+    return {
+        start
+        for start, end in blocks
+        if start in journaled and staged.get(_block_id(version, start)) == end - start
+    }
+
+
+def upload(
+    blob_client: BlobClient,
+    dest: AdlsFqn,
+    src: Path,
+    *,
+    metadata: ty.Dict[str, str],
+    content_settings: ContentSettings,
+    **commit_kwargs: ty.Any,
+) -> hashing.Hash:
+    """Uploads src in blocks, resuming a previous attempt if possible, and returns its hash,
+    which is also added to the committed metadata."""
+    st = src.stat()
+    block_size = _block_size(st.st_size)
+    version = _version(dest, src, st.st_size, st.st_mtime_ns, block_size)
+    JOURNAL_DIR().mkdir(parents=True, exist_ok=True)
+    _remove_stale_journals(JOURNAL_DIR())
+    journal = RangeJournal(
+        JOURNAL_DIR() / f"{version}.blocks",
+        dict(dest=str(dest), src=str(src.resolve()), size=st.st_size, mtime_ns=st.st_mtime_ns),
+    )
+    all_blocks = ranges(st.st_size, block_size)
+    try:
+        staged = _still_staged(blob_client, version, journal.done, all_blocks)
+        if staged:
+            logger.info(
+                f"Resuming upload of {src} to {dest} with {len(staged)} of {len(all_blocks)} blocks"
+                " already staged"
+            )
+        hasher = hashes.default_hasher()
+        tracker, key = get_global_upload_tracker().add(str(dest), st.st_size)
+        concurrency = conf.UPLOAD_FILE_MAX_CONCURRENCY()
+        in_flight = threading.BoundedSemaphore(concurrency)  # bounds the blocks held in memory.
+        futures: ty.List[concurrent.futures.Future] = list()
+        failures: ty.List[BaseException] = list()
+
+        def stage(start: int, data: bytes) -> None:
+            try:
+                _retry_transient(blob_client.stage_block)(
+                    _block_id(version, start),
+                    data,
+                    length=len(data),
+                    connection_timeout=conf.CONNECTION_TIMEOUT(),
+                )
+                journal.record(start)
+                tracker(key, len(data))
+            except BaseException as exc:
+                failures.append(exc)
+                raise
+            finally:
+                in_flight.release()
+
+        with open(src, "rb") as f, concurrent.futures.ThreadPoolExecutor(
+            max_workers=concurrency, thread_name_prefix="adls-staged"
+        ) as pool:
+            try:
+                for start, end in all_blocks:
+                    data = os.pread(f.fileno(), end - start, start)
+                    if len(data) != end - start:
+                        raise ValueError(f"{src} changed size while being uploaded")
+                    hasher.update(data)
+                    if start in staged:
+                        tracker(key, len(data))
+                        continue
+                    in_flight.acquire()
+                    if failures:
+                        in_flight.release()
+                        raise failures[0]
+                    futures.append(pool.submit(stage, start, data))
+                for future in futures:
+                    future.result()
+            except BaseException:
+                # staged blocks stay journaled for the retry; don't stage any more.
+                for future in futures:
+                    future.cancel()
+                raise
+
+        local_hash = hashing.Hash(hasher.name.lower(), hasher.digest())
+        metadata = dict(metadata, **hashes.metadata_hash_dict(local_hash))
+        _retry_transient(blob_client.commit_block_list)(
+            [BlobBlock(block_id=_block_id(version, start)) for start, _ in all_blocks],
+            content_settings=content_settings,
+            metadata=metadata,
+            **commit_kwargs,
+        )
+    finally:
+        journal.close()
+
+    journal.path.unlink(missing_ok=True)
+    end_st = src.stat()
+    if (end_st.st_size, end_st.st_mtime_ns) == (st.st_size, st.st_mtime_ns):
+        hash_cache.record_filehash(src, local_hash)
+    else:
+        logger.warning(f"{src} was modified while being uploaded to {dest}")
+    return local_hash
+
+
+class BlockWriter(io.RawIOBase):
+    """A write-only stream to a blob, which stages a block whenever enough has been written,
+    hashing it as it goes, and commits them all - with the hash in the metadata, as `upload`
+    would have written it - on `commit`. Until then, the blob is unchanged; `abort` stops
+    any staging still in flight, and the service discards the blocks after a week.
+
+    Written data waits in memory only until it fills a block, and at most
+    `UPLOAD_FILE_MAX_CONCURRENCY` blocks are ever in flight. Whatever fits in a single
+    block is uploaded in one request, on commit. Each request is retried on transient
+    failures, since staging the same block again, or committing the same list, is harmless.
+    """
+
+    def __init__(
+        self,
+        blob_client: BlobClient,
+        *,
+        metadata: ty.Dict[str, str],
+        content_settings: ContentSettings,
+        **commit_kwargs: ty.Any,
+    ):
+        super().__init__()
+        self._blob_client = blob_client
+        self._metadata = metadata
+        self._content_settings = content_settings
+        self._commit_kwargs = commit_kwargs
+        self._block_size = conf.STAGED_UPLOAD_BLOCK_SIZE()
+        self._version = secrets.token_hex(8)  # block ids are unique to this write.
+        self._pending = bytearray()
+        self._block_ids: ty.List[str] = list()
+        self._staged_bytes = 0
+        self._hasher = hashes.default_hasher()
+        concurrency = conf.UPLOAD_FILE_MAX_CONCURRENCY()
+        self._in_flight = threading.BoundedSemaphore(concurrency)
+        self._pool = concurrent.futures.ThreadPoolExecutor(
+            max_workers=concurrency, thread_name_prefix="adls-block-writer"
+        )
+        self._futures: ty.List[concurrent.futures.Future] = list()
+        self._failures: ty.List[BaseException] = list()
+
+    def writable(self) -> bool:
+        return True
+
+    def _stage_block(self, block_id: str, data: bytes) -> None:
+        try:
+            _retry_transient(self._blob_client.stage_block)(
+                block_id, data, length=len(data), connection_timeout=conf.CONNECTION_TIMEOUT()
+            )
+        except BaseException as exc:
+            self._failures.append(exc)
+            raise
+        finally:
+            self._in_flight.release()
+
+    def _stage(self, data: bytes) -> None:
+        if len(self._block_ids) >= _MAX_BLOCKS:
+            raise ValueError(f"Cannot stage more than {_MAX_BLOCKS} blocks of {self._block_size} bytes")
+        self._hasher.update(data)
+        block_id = _block_id(self._version, self._staged_bytes)
+        self._block_ids.append(block_id)
+        self._staged_bytes += len(data)
+        self._in_flight.acquire()
+        if self._failures:
+            self._in_flight.release()
+            raise self._failures[0]
+        self._futures.append(self._pool.submit(self._stage_block, block_id, data))
+
+    def write(self, data: ty.Any) -> int:
+        view = memoryview(data).cast("B")
+        offset = 0
+        if self._pending:
+            offset = min(len(view), self._block_size - len(self._pending))
+            self._pending += view[:offset]
+            if len(self._pending) < self._block_size:
+                return len(view)
+            self._stage(bytes(self._pending))
+            self._pending.clear()
+        # a large write is staged straight from its own memory, a block at a time.
+        while len(view) - offset >= self._block_size:
+            self._stage(bytes(view[offset : offset + self._block_size]))
+            offset += self._block_size
+        self._pending += view[offset:]
+        return len(view)
+
+    def commit(self) -> hashing.Hash:
+        """Uploads whatever remains and commits the blob, returning its hash."""
+        try:
+            if self._block_ids and self._pending:
+                self._stage(bytes(self._pending))
+                self._pending.clear()
+            if not self._block_ids:
+                self._hasher.update(self._pending)
+            local_hash = hashing.Hash(self._hasher.name.lower(), self._hasher.digest())
+            metadata = dict(self._metadata, **hashes.metadata_hash_dict(local_hash))
+
+            if not self._block_ids:
+                _retry_transient(self._blob_client.upload_blob)(
+                    bytes(self._pending),
+                    overwrite=True,
+                    content_settings=self._content_settings,
+                    metadata=metadata,
+                    **self._commit_kwargs,
+                )
+            else:
+                for future in self._futures:
+                    future.result()
+                _retry_transient(self._blob_client.commit_block_list)(
+                    [BlobBlock(block_id=block_id) for block_id in self._block_ids],
+                    content_settings=self._content_settings,
+                    metadata=metadata,
+                    **self._commit_kwargs,
+                )
+            return local_hash
+        finally:
+            self._pool.shutdown()
+            self.close()
+
+    def abort(self) -> None:
+        """Commits nothing."""
+        for future in self._futures:
+            future.cancel()
+        self._pool.shutdown()
+        self.close()
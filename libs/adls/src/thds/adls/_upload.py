@@ -65,9 +65,27 @@ def metadata_for_upload() -> ty.Dict[str, str]:
     return {"upload_wrapper_sw": "thds.adls", "upload_hostname": hostname.friendly()}
 
 
+def _remote_might_match(remote_properties: ty.Optional[PropertiesP], data: hashes.AnyStrSrc) -> bool:
+    if not remote_properties:
+        return False
+    remote_size = getattr(remote_properties, "size", None)
+    if remote_size is not None and remote_size != upload_src_len(data, default=remote_size):
+        return False
+    return any(
+        algo in hashes.PREFERRED_ALGOS for algo in hashes.extract_hashes_from_props(remote_properties)
+    )
+
+
 def _co_upload_decision_unless_file_present_with_matching_checksum(
-    data: hashes.AnyStrSrc, min_size_for_remote_check: int
+    data: hashes.AnyStrSrc, min_size_for_remote_check: int, defer_hash: bool = False
 ) -> ty.Generator[bool, ty.Optional[PropertiesP], UploadDecision]:
+    remote_properties = None
+    if defer_hash:
+        remote_properties = yield True
+        if not _remote_might_match(remote_properties, data):
+            logger.debug("Remote cannot match, so the data will be hashed while it is uploaded")
+            return UploadDecision(True, metadata_for_upload())
+
     local_hash = _try_default_hash(data)
     if not local_hash:
         return UploadDecision(True, metadata_for_upload())
@@ -78,7 +96,8 @@ def _co_upload_decision_unless_file_present_with_matching_checksum(
         logger.debug("Too small to bother with an early call - let's just upload...")
         return UploadDecision(True, metadata)
 
-    remote_properties = yield True
+    if not defer_hash:
+        remote_properties = yield True
     if not remote_properties:
         logger.debug("No remote properties could be fetched so an upload is required")
         return UploadDecision(True, metadata)
@@ -99,6 +118,10 @@ Returns False for upload_required if the file is large and the remote
 exists and has a known, matching checksum.
 
 Returns a metadata dict that should be added to any upload.
+
+With defer_hash, the data is hashed only if the remote might match it (it exists, with the
+same size, and a hash we could compare). Otherwise, the returned metadata has no hash, and
+it is up to the caller to add one, presumably computed while uploading.
 """
 
 
@@ -106,10 +129,11 @@ async def async_upload_decision_and_metadata(
     get_properties: ty.Callable[[], ty.Awaitable[PropertiesP]],
     data: hashes.AnyStrSrc,
     min_size_for_remote_check: int = _SKIP_ALREADY_UPLOADED_CHECK_IF_MORE_THAN_BYTES,
+    defer_hash: bool = False,
 ) -> UploadDecision:
     try:
         co = _co_upload_decision_unless_file_present_with_matching_checksum(
-            data, min_size_for_remote_check
+            data, min_size_for_remote_check, defer_hash
         )
         while True:
             co.send(None)
@@ -125,10 +149,11 @@ def upload_decision_and_metadata(
     get_properties: ty.Callable[[], PropertiesP],
     data: hashes.AnyStrSrc,
     min_size_for_remote_check: int = _SKIP_ALREADY_UPLOADED_CHECK_IF_MORE_THAN_BYTES,
+    defer_hash: bool = False,
 ) -> UploadDecision:
     try:
         co = _co_upload_decision_unless_file_present_with_matching_checksum(
-            data, min_size_for_remote_check
+            data, min_size_for_remote_check, defer_hash
         )
         while True:
             co.send(None)
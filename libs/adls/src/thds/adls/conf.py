@@ -25,11 +25,41 @@ MAX_SINGLE_PUT_SIZE = config.item(
     "max_single_put_size", 2**20 * 64, parse=lambda i: max(MAX_CHUNK_GET_SIZE(), int(i))
 )  # 64MB
 
+# these are for our own ranged downloads, used when azcopy is not. Each of up to
+# max_concurrency connections fetches one chunk-sized range at a time and writes it into
+# place, so a download's memory use is bounded by SDK buffering, not by chunk size.
+RANGED_DOWNLOAD_MIN_SIZE = config.item("ranged_download_min_size", 2**20 * 32, parse=int)  # 0 disables
+RANGED_DOWNLOAD_CHUNK_SIZE = config.item("ranged_download_chunk_size", 2**20 * 16, parse=int)
+RANGED_DOWNLOAD_MAX_CONCURRENCY = config.item("ranged_download_max_concurrency", 8, parse=int)
+
+# these are for file_properties.properties_many. A directory holding at least list_min_paths
+# of the requested paths is listed rather than HEADed, but the listing gives up (falling
+# back to HEADs) after list_max_items_per_path items per requested path - 250 is about one
+# listing page per 20 paths, each of which would otherwise be a request of its own.
+PROPERTIES_MANY_MAX_CONCURRENCY = config.item("properties_many_max_concurrency", 32, parse=int)
+PROPERTIES_MANY_LIST_MIN_PATHS = config.item(
+    "properties_many_list_min_paths", 8, parse=int
+)  # 0 disables
+PROPERTIES_MANY_LIST_MAX_ITEMS_PER_PATH = config.item(
+    "properties_many_list_max_items_per_path", 250, parse=int
+)
+
+# these are for copy.copy_many. Server-side copies are started concurrently, and up to
+# max_in_flight of them may be pending at once; a single thread polls all of them, in
+# batches (see properties_many), every poll_interval_s.
+COPY_MANY_MAX_IN_FLIGHT = config.item("copy_many_max_in_flight", 256, parse=int)
+COPY_MANY_START_CONCURRENCY = config.item("copy_many_start_concurrency", 16, parse=int)
+COPY_MANY_POLL_INTERVAL_S = config.item("copy_many_poll_interval_s", 2.0, parse=float)
+
 # these are for upload
 # these achieved 380 MB/sec on a 2 core machine on Kubernetes
 MAX_BLOCK_SIZE = config.item("max_block_put_size", 2**20 * 64, parse=int)  # 64 MB
 UPLOAD_FILE_MAX_CONCURRENCY = config.item("upload_file_max_concurrency", 10, parse=int)
 UPLOAD_CHUNK_SIZE = config.item("upload_chunk_size", 2**20 * 100, parse=int)  # 100 MB
+# files at least this large (that azcopy isn't used for) are staged block by block, hashed
+# as they're read, and resumable. Each of upload_file_max_concurrency connections holds a block.
+STAGED_UPLOAD_MIN_SIZE = config.item("staged_upload_min_size", 2**20 * 256, parse=int)  # 0 disables
+STAGED_UPLOAD_BLOCK_SIZE = config.item("staged_upload_block_size", 2**20 * 16, parse=int)
 
 CONNECTION_TIMEOUT = config.item("connection_timeout", 2000, parse=int)  # seconds
 
@@ -1,17 +1,28 @@
 """Functions for copying blobs across remote locations."""
 
+import collections
 import concurrent.futures
 import datetime
+import math
+import queue
 import random
+import threading
 import time
 import typing as ty
 
-from azure.storage.blob import BlobSasPermissions, BlobServiceClient, UserDelegationKey
+from azure.storage.blob import BlobProperties, BlobSasPermissions, BlobServiceClient, UserDelegationKey
 
-from thds.core import cache, log, parallel, thunks
+from thds.core import cache, hashing, log, parallel, thunks
 
+from . import conf
 from ._etag import ETAG_FAKE_HASH_NAME
-from .file_properties import exists, get_blob_properties, get_file_properties, is_directory
+from .file_properties import (
+    exists,
+    get_blob_properties,
+    get_file_properties,
+    is_directory,
+    properties_many,
+)
 from .fqn import AdlsFqn
 from .global_client import get_global_blob_container_client, get_global_blob_service_client
 from .hashes import extract_hashes_from_props
@@ -41,6 +52,11 @@ class CopyInfo(ty.NamedTuple):
         return bool(self.request)
 
 
+def _comparable_hashes(props: BlobProperties) -> ty.Dict[str, hashing.Hash]:
+    # exclude etag from comparison since it's unique per blob and will always differ
+    return {k: v for k, v in extract_hashes_from_props(props).items() if k != ETAG_FAKE_HASH_NAME}
+
+
 def _copy_file(
     src: AdlsFqn,
     dest: AdlsFqn,
@@ -61,18 +77,7 @@ def _copy_file(
     def hashes_exist_and_are_equal() -> bool:
         src_blob_props = src_blob_client.get_blob_properties()
         dest_blob_props = dest_blob_client.get_blob_properties()
-        # exclude etag from comparison since it's unique per blob and will always differ
-        src_hashes = {
-            k: v
-            for k, v in extract_hashes_from_props(src_blob_props).items()
-            if k != ETAG_FAKE_HASH_NAME
-        }
-        dest_hashes = {
-            k: v
-            for k, v in extract_hashes_from_props(dest_blob_props).items()
-            if k != ETAG_FAKE_HASH_NAME
-        }
-        return src_hashes == dest_hashes
+        return _comparable_hashes(src_blob_props) == _comparable_hashes(dest_blob_props)
 
     if dest_blob_client.exists():
         if hashes_exist_and_are_equal():
@@ -196,3 +201,247 @@ def copy_files(
             # max_workers=30 prevents hitting system thread count limits (speaking from experience)
         )
     )
+
+
+CopyStatus = ty.Literal["copied", "skipped", "failed"]
+
+
+class CopyResult(ty.NamedTuple):
+    src: AdlsFqn
+    dest: AdlsFqn
+    status: CopyStatus  # skipped if the destination already had the same content
+    error: ty.Optional[Exception] = None  # if failed
+
+
+def _same_content(src_props: BlobProperties, dest_props: BlobProperties) -> bool:
+    """Only if they have at least one (non-etag) hash in common, and all such hashes match."""
+    src_hashes, dest_hashes = _comparable_hashes(src_props), _comparable_hashes(dest_props)
+    shared = src_hashes.keys() & dest_hashes.keys()
+    return bool(shared) and all(src_hashes[algo] == dest_hashes[algo] for algo in shared)
+
+
+def _triage(
+    pairs: ty.Sequence[ty.Tuple[AdlsFqn, AdlsFqn]], overwrite_method: OverwriteMethod
+) -> ty.Tuple[ty.List[CopyResult], ty.List[ty.Tuple[AdlsFqn, AdlsFqn]]]:
+    """Results for the pairs that need no copy, and the pairs that do."""
+    props = properties_many(fqn for pair in pairs for fqn in pair).properties
+    done: ty.List[CopyResult] = list()
+    to_copy: ty.List[ty.Tuple[AdlsFqn, AdlsFqn]] = list()
+    for src, dest in pairs:
+        src_props, dest_props = props[src], props[dest]
+        if src_props is None:
+            done.append(CopyResult(src, dest, "failed", ValueError(f"{src} does not exist!")))
+        elif is_directory(src_props):  # type: ignore[arg-type]
+            done.append(CopyResult(src, dest, "failed", ValueError(f"{src} is a directory!")))
+        elif dest_props is None:
+            to_copy.append((src, dest))
+        elif _same_content(src_props, dest_props):
+            logger.debug("%s already exists with the same hash as %s, no copy will occur", dest, src)
+            done.append(CopyResult(src, dest, "skipped"))
+        elif overwrite_method == "error":
+            done.append(CopyResult(src, dest, "failed", ValueError(f"{dest} already exists!")))
+        elif overwrite_method == "skip":
+            logger.warning("%s already exists, skipping copy from %s", dest, src)
+            done.append(CopyResult(src, dest, "skipped"))
+        else:
+            if overwrite_method == "warn":
+                logger.warning("%s will be overwritten with the file from %s", dest, src)
+            to_copy.append((src, dest))
+    return done, to_copy
+
+
+class _Pending(ty.NamedTuple):
+    src: AdlsFqn
+    copy_id: str
+    deadline: float
+
+
+def _polled_result(
+    dest: AdlsFqn, pending: _Pending, props: ty.Optional[BlobProperties]
+) -> ty.Optional[CopyResult]:
+    """None if the copy is still pending."""
+    if props is None:
+        return CopyResult(
+            pending.src, dest, "failed", ValueError(f"{dest} disappeared while being copied to.")
+        )
+    copy_props = props.copy
+    if copy_props.id and copy_props.id != pending.copy_id:
+        return CopyResult(
+            pending.src,
+            dest,
+            "failed",
+            ValueError(f"Another copy to {dest} was started: {copy_props.id}"),
+        )
+    if copy_props.status == "success":
+        return CopyResult(pending.src, dest, "copied")
+    if copy_props.status == "pending":
+        return None
+    return CopyResult(
+        pending.src,
+        dest,
+        "failed",
+        ValueError(
+            f"The copy to {dest} failed with the status: {copy_props.status}. "
+            f"See blob copy properties: {copy_props}"
+        ),
+    )
+
+
+class _ConcurrentCopies:
+    """Starts copies on a pool of threads, within a budget of pending copies, which a
+    single thread polls."""
+
+    def __init__(
+        self,
+        timeout: int,
+        get_account_key: ty.Callable[[BlobServiceClient], ty.Union[str, UserDelegationKey]],
+    ):
+        self.timeout = timeout
+        self.get_account_key = get_account_key
+        self.results: "queue.Queue[CopyResult]" = queue.Queue()
+        # config is read here, in the caller's thread, where any set_local applies.
+        self.budget = threading.BoundedSemaphore(conf.COPY_MANY_MAX_IN_FLIGHT())
+        self.start_concurrency = conf.COPY_MANY_START_CONCURRENCY()
+        self.poll_interval_s = conf.COPY_MANY_POLL_INTERVAL_S()
+        self.stop = threading.Event()
+        self.lock = threading.Lock()
+        self.pending: ty.Dict[AdlsFqn, _Pending] = dict()
+
+    def _finish(self, result: CopyResult) -> None:
+        self.budget.release()
+        self.results.put(result)
+
+    def _start(self, src: AdlsFqn, dest: AdlsFqn) -> None:
+        try:
+            src_blob_client = get_global_blob_container_client(src.sa, src.container).get_blob_client(
+                src.path
+            )
+            sas_token = gen_blob_sas_token(
+                src,
+                account_key=self.get_account_key(get_global_blob_service_client(src.sa)),
+                permissions=BlobSasPermissions(read=True),
+            )
+            request = (
+                get_global_blob_container_client(dest.sa, dest.container)
+                .get_blob_client(dest.path)
+                .start_copy_from_url(f"{src_blob_client.url}?{sas_token}")
+            )
+        except Exception as exc:
+            self._finish(CopyResult(src, dest, "failed", exc))
+            return
+
+        if request.get("copy_status") == "success":  # small copies often complete immediately.
+            self._finish(CopyResult(src, dest, "copied"))
+            return
+        deadline = time.monotonic() + self.timeout if self.timeout > 0 else math.inf
+        with self.lock:
+            self.pending[dest] = _Pending(src, str(request.get("copy_id")), deadline)
+
+    def _feed(self, pairs: ty.Sequence[ty.Tuple[AdlsFqn, AdlsFqn]]) -> None:
+        with concurrent.futures.ThreadPoolExecutor(
+            max_workers=self.start_concurrency, thread_name_prefix="adls-copy-start"
+        ) as pool:
+            for src, dest in pairs:
+                while not self.budget.acquire(timeout=0.1):
+                    if self.stop.is_set():
+                        return
+                if self.stop.is_set():
+                    return
+                pool.submit(self._start, src, dest)
+
+    def _timed_out(self, dest: AdlsFqn, pending: _Pending) -> CopyResult:
+        return CopyResult(
+            pending.src,
+            dest,
+            "failed",
+            TimeoutError(
+                f"Copying to {dest} did not finish within {self.timeout} seconds. It may still be copying."
+            ),
+        )
+
+    def _poll_once(self) -> None:
+        with self.lock:
+            polling = dict(self.pending)
+        if not polling:
+            return
+
+        props: ty.Optional[ty.Mapping[AdlsFqn, ty.Optional[BlobProperties]]] = None
+        try:
+            props = properties_many(polling).properties
+        except Exception as exc:
+            # they'll be polled again next time; they may yet time out in the meantime.
+            logger.warning("Failed to poll %d pending copies: %r", len(polling), exc)
+
+        now = time.monotonic()
+        for dest, pending in polling.items():
+            try:
+                result = _polled_result(dest, pending, props[dest]) if props is not None else None
+            except Exception as exc:
+                result = CopyResult(pending.src, dest, "failed", exc)
+            if result is None and now > pending.deadline:
+                result = self._timed_out(dest, pending)
+            if result is not None:
+                with self.lock:
+                    del self.pending[dest]
+                self._finish(result)
+
+    def _poll(self) -> None:
+        while not self.stop.wait(self.poll_interval_s):
+            try:
+                self._poll_once()
+            except Exception as exc:
+                # fail what we were waiting on rather than leave `run` waiting for it forever.
+                logger.exception("Failed to poll pending copies; failing them")
+                with self.lock:
+                    failed, self.pending = self.pending, dict()
+                for dest, pending in failed.items():
+                    self._finish(CopyResult(pending.src, dest, "failed", exc))
+
+    def run(self, pairs: ty.Sequence[ty.Tuple[AdlsFqn, AdlsFqn]]) -> ty.Iterator[CopyResult]:
+        threads = [
+            threading.Thread(target=self._feed, args=(pairs,), name="adls-copy-many-feed", daemon=True),
+            threading.Thread(target=self._poll, name="adls-copy-many-poll", daemon=True),
+        ]
+        for thread in threads:
+            thread.start()
+        try:
+            for _ in range(len(pairs)):
+                yield self.results.get()
+        finally:
+            self.stop.set()
+            for thread in threads:
+                thread.join()
+
+
+def copy_many(
+    src_dest_pairs: ty.Iterable[ty.Tuple[UriIsh, UriIsh]],
+    overwrite_method: OverwriteMethod = "error",
+    timeout: int = _WAIT_TIMEOUT,
+    get_account_key: ty.Callable[
+        [BlobServiceClient], ty.Union[str, UserDelegationKey]
+    ] = get_user_delegation_key,
+) -> ty.Iterator[CopyResult]:
+    """Server-side copies of many blobs, yielding a result for each as it completes.
+
+    The sources and destinations are first checked in batches (see `properties_many`). A
+    destination that already has the same hash(es) as its source is skipped; any other
+    existing destination is handled according to `overwrite_method`. Failures - including
+    for overwrite_method="error" - are yielded, not raised.
+
+    The copies are then started concurrently, with at most `copy_many_max_in_flight`
+    pending at once, and a single thread polls all of the pending ones, in batches. Each
+    copy has `timeout` seconds (0 for no limit) from when it started to finish.
+
+    If you stop iterating early, no more copies are started, but those already started
+    will continue on the server.
+    """
+    pairs = [(parse_any(src), parse_any(dest)) for src, dest in src_dest_pairs]
+    repeated = [dest for dest, n in collections.Counter(dest for _, dest in pairs).items() if n > 1]
+    if repeated:
+        raise ValueError(f"More than one copy to each of: {repeated[:10]}")
+
+    done, to_copy = _triage(pairs, overwrite_method)
+    yield from done
+    if to_copy:
+        logger.info("Copying %d of %d files...", len(to_copy), len(pairs))
+        yield from _ConcurrentCopies(timeout, cache.locking(get_account_key)).run(to_copy)
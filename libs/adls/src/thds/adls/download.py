@@ -4,6 +4,7 @@ import os
 import shutil
 import threading
 import typing as ty
+from functools import partial
 from pathlib import Path
 
 import aiohttp.http_exceptions
@@ -14,7 +15,8 @@ from azure.storage.filedatalake import DataLakeFileClient, FileProperties, FileS
 from thds.core import fretry, hash_cache, hashing, log, scope, tmp
 from thds.core.types import StrOrPath
 
-from . import azcopy, errors, etag, hashes
+from . import _ranged_download, azcopy, conf, errors, etag, hashes, ro_cache, scheduler
+from ._etag import ETAG_FAKE_HASH_NAME
 from ._progress import report_download_progress
 from .file_lock import file_lock
 from .fqn import AdlsFqn
@@ -31,13 +33,84 @@ def _check_size(dpath: Path, expected_size: ty.Optional[int]) -> None:
         )
 
 
+def _move(dpath: Path, dest: StrOrPath) -> None:
+    try:
+        os.rename(dpath, dest)  # will succeed even if dest is read-only
+    except OSError as oserr:
+        if "Invalid cross-device link" in str(oserr):
+            # this shouldn't ever happen because of temppath_same_fs, but just in case...
+            logger.warning('Failed to move "%s" to "%s" - copying instead', dpath, dest)
+            shutil.copyfile(dpath, dest)
+            logger.info('Copied "%s" to "%s"', dpath, dest)
+        else:
+            logger.error('Failed to move "%s" to "%s" - raising', dpath, dest)
+            raise
+
+
+def _hash_writes(stream: ty.IO[bytes], hasher: hashing.OrderedHasher) -> ty.IO[bytes]:
+    # the SDK's concurrent downloader seeks before each write, so tell() is the offset.
+    old_write = stream.write
+
+    def write(data: bytes) -> int:
+        hasher.update_at(stream.tell(), data)
+        return old_write(data)
+
+    stream.write = write  # type: ignore[method-assign,assignment]
+    return stream
+
+
+def _hash_algos_for_download(
+    expected_hash: ty.Optional[hashing.Hash], remote_hash: ty.Optional[hashing.Hash]
+) -> ty.List[str]:
+    # everything we'll need to hash the downloaded file with - for verification, and for
+    # the result - so that it can all be computed while downloading.
+    algos = [h.algo for h in (expected_hash, remote_hash) if h and h.algo != ETAG_FAKE_HASH_NAME]
+    result_hash = expected_hash or remote_hash
+    if not result_hash or result_hash.algo not in hashes.PREFERRED_ALGOS:
+        algos.append(hashes.PREFERRED_ALGOS[0])
+    return list(dict.fromkeys(algos))
+
+
+def _record_hashes(path: StrOrPath, computed: ty.Sequence[hashing.Hash]) -> None:
+    for hash in computed:
+        hash_cache.record_filehash(path, hash)
+
+
 @contextlib.contextmanager
 def _atomic_download_and_move(
     fqn: AdlsFqn,
     dest: StrOrPath,
     properties: ty.Optional[FileProperties] = None,
+    hasher: ty.Optional[hashing.OrderedHasher] = None,
 ) -> ty.Iterator[azcopy.download.DownloadRequest]:
+    """If a hasher is provided, it is fed everything downloaded (except by azcopy, in which
+    case the file is read once afterward), and its hashes are recorded in the hash_cache
+    for dest.
+    """
+    hasher = hasher or hashing.OrderedHasher([])
     known_size = properties.size if properties else None
+    if (
+        properties
+        and properties.etag
+        and not azcopy.download.should_use_azcopy(known_size or -1)
+        and _ranged_download.should_use_ranged(known_size)
+    ):
+        # a stable partial path rather than a temp path, so that an interrupted download
+        # can be resumed. We hold the file lock for dest (or its cache path), so it's ours.
+        partial = _ranged_download.partial_path(Path(dest))
+        logger.debug("Downloading %s by ranges", fqn)
+        yield _ranged_download.RangedDownloadRequest(
+            partial, ty.cast(int, known_size), etag=properties.etag, hasher=hasher
+        )
+        try:
+            _check_size(partial, known_size)
+            computed = hasher.finish(partial)
+            _move(partial, dest)
+        finally:  # complete, so there's nothing left to resume - whether or not it checked out.
+            _ranged_download.remove_partial(partial)
+        _record_hashes(dest, computed)
+        return
+
     with tmp.temppath_same_fs(dest) as dpath:
         logger.debug("Downloading %s", fqn)
         if azcopy.download.should_use_azcopy(known_size or -1):
@@ -45,20 +118,14 @@ def _atomic_download_and_move(
         else:
             with open(dpath, "wb") as down_f:
                 yield azcopy.download.SdkDownloadRequest(
-                    dpath, known_size, report_download_progress(down_f, str(fqn), known_size or 0)
+                    dpath,
+                    known_size,
+                    report_download_progress(_hash_writes(down_f, hasher), str(fqn), known_size or 0),
                 )
         _check_size(dpath, known_size)
-        try:
-            os.rename(dpath, dest)  # will succeed even if dest is read-only
-        except OSError as oserr:
-            if "Invalid cross-device link" in str(oserr):
-                # this shouldn't ever happen because of temppath_same_fs, but just in case...
-                logger.warning('Failed to move "%s" to "%s" - copying instead', dpath, dest)
-                shutil.copyfile(dpath, dest)
-                logger.info('Copied "%s" to "%s"', dpath, dest)
-            else:
-                logger.error('Failed to move "%s" to "%s" - raising', dpath, dest)
-                raise
+        computed = hasher.finish(dpath)
+        _move(dpath, dest)
+    _record_hashes(dest, computed)
 
 
 # Async is weird.
@@ -125,6 +192,9 @@ def _attempt_cache_hit(
                 if local_hash != hash_path_if_exists(cache_path):
                     # only copy if the cache is out of date
                     from_local_path_to_cache(local_path, cache_path, cache.link)
+                    ro_cache.record_access(cache, cache_path, added=True)
+                else:
+                    ro_cache.record_access(cache, cache_path)
             return _FileResult(local_hash, hit=cache_path)
         return _FileResult(local_hash, hit=Path(local_path))
 
@@ -139,6 +209,7 @@ def _attempt_cache_hit(
         cache_hash = hash_path_if_exists(cache_path)
         if cache_hash == expected_hash:  # file in cache matches!
             from_cache_path_to_local(cache_path, local_path, cache.link)
+            ro_cache.record_access(cache, cache_path)
             return _FileResult(cache_hash, hit=cache_path)
 
         if cache_hash:
@@ -155,6 +226,7 @@ class _IoRequest(enum.Enum):
 
 
 IoRequest = ty.Union[_IoRequest, azcopy.download.DownloadRequest]
+# a _ranged_download.RangedDownloadRequest is also a DownloadRequest.
 IoResponse = ty.Union[FileProperties, None]
 
 
@@ -234,7 +306,13 @@ def _download_or_use_verified_cached_coroutine(  # noqa: C901
         )
 
     # attempt cache hits before taking a lock, to avoid contention for existing files.
-    if file_result := attempt_cache_hit():
+    try:
+        file_result = attempt_cache_hit()
+    except FileNotFoundError:
+        # the cache may evict a file we don't hold the lock for, even as we hit it. If it
+        # has gone, that's a miss - the attempt under the lock will tell.
+        file_result = None
+    if file_result:
         logger.debug(
             "No download - found cached version of %s using expected %s at %s",
             fqn,
@@ -266,17 +344,28 @@ def _download_or_use_verified_cached_coroutine(  # noqa: C901
     # otherwise, verify the first remote hash in the list, since that's the fastest one.
     all_remote_hashes = hashes.extract_hashes_from_props(file_properties)
     remote_hash_to_match = all_remote_hashes.get(expected_hash.algo) if expected_hash else None
+    # hash as we download, so that neither verification nor the cache needs to reread the file.
+    hasher = hashing.OrderedHasher(
+        _hash_algos_for_download(expected_hash, remote_hash_to_match),
+        # only ranged downloads write out of order, and then no further ahead than the other
+        # ranges in flight, as long as they keep pace. Past that, finish reads the file back.
+        max_buffered=(
+            max(conf.RANGED_DOWNLOAD_MAX_CONCURRENCY() - 1, 1) * conf.RANGED_DOWNLOAD_CHUNK_SIZE()
+        ),
+    )
     with hashes.verify_hashes_before_and_after_download(
         remote_hash_to_match,
         expected_hash,
         fqn,
         local_path,
     ):  # download new data directly to local path
-        with _atomic_download_and_move(fqn, local_path, file_properties) as tmpwriter:
+        with _atomic_download_and_move(fqn, local_path, file_properties, hasher) as tmpwriter:
             yield tmpwriter
 
     if cache:
         from_local_path_to_cache(local_path, cache.path(fqn), cache.link)
+        _record_hashes(cache.path(fqn), hasher.finish(local_path))  # already finished; no reread.
+        ro_cache.record_access(cache, cache.path(fqn), added=True)
 
     hash_to_set_if_missing = expected_hash or remote_hash_to_match
     if not hash_to_set_if_missing or hash_to_set_if_missing.algo not in hashes.PREFERRED_ALGOS:
@@ -341,9 +430,36 @@ def _log_nonfatal_hash_error_exc(exc: Exception, url: str) -> None:
     log(msg, url, extra_txt)
 
 
+def _connections_for(request: azcopy.download.DownloadRequest) -> int:
+    """How many connections a transfer is likely to use at once, for the scheduler."""
+    if isinstance(request, _ranged_download.RangedDownloadRequest):
+        n_ranges = -(-request.size_bytes // conf.RANGED_DOWNLOAD_CHUNK_SIZE())
+        return min(conf.RANGED_DOWNLOAD_MAX_CONCURRENCY(), n_ranges)
+    if (request.size_bytes or 0) > conf.MAX_SINGLE_GET_SIZE():
+        return conf.DOWNLOAD_FILE_MAX_CONCURRENCY()
+    return 1
+
+
+def _dedupe_key(
+    kind: str,
+    fs_client: ty.Union[FileSystemClient, aio.FileSystemClient],
+    remote_key: str,
+    local_path: StrOrPath,
+    *args: ty.Hashable,
+) -> ty.Tuple[ty.Hashable, ...]:
+    return (
+        kind,
+        fs_client.account_name,
+        fs_client.file_system_name,
+        remote_key,
+        os.path.abspath(local_path),
+        *args,
+    )
+
+
 @_dl_scope.bound
 @fretry.retry_regular(fretry.is_exc(errors.ContentLengthMismatchError), fretry.n_times(2))
-def download_or_use_verified(
+def _download_or_use_verified(
     fs_client: FileSystemClient,
     remote_key: str,
     local_path: StrOrPath,
@@ -351,15 +467,8 @@ def download_or_use_verified(
     expected_hash: ty.Optional[hashing.Hash] = None,
     cache: ty.Optional[Cache] = None,
     set_remote_hash: bool = False,
+    priority: int = 0,
 ) -> ty.Optional[Path]:
-    """Download a file or use the existing, cached copy if one exists in the cache and is verifiable.
-
-    Note that you will get a logged warning if `local_path` already exists when you call
-    this function.
-
-    If set_remote_hash is False, the function will not attempt to set hash metadata on the
-    remote file after download. This is useful when downloading from read-only locations.
-    """
     file_properties = None
     try:
         co, co_request, dl_file_client = _prep_download_coroutine(
@@ -374,10 +483,18 @@ def download_or_use_verified(
                 co_request = co.send(file_properties)
             elif isinstance(co_request, azcopy.download.DownloadRequest):
                 # coroutine is requesting download
-                fretry.retry_regular(_excs_to_retry(), fretry.n_times(2))(
-                    # retry n_times(2) means _retry_ twice.
-                    azcopy.download.sync_fastpath
-                )(dl_file_client, co_request)
+                # retry n_times(2) means _retry_ twice.
+                retry = fretry.retry_regular(_excs_to_retry(), fretry.n_times(2))
+                with scheduler.global_scheduler().transfer(
+                    co_request.size_bytes or 0,
+                    priority=priority,
+                    connections=_connections_for(co_request),
+                ):
+                    if isinstance(co_request, _ranged_download.RangedDownloadRequest):
+                        # resumes where it left off when retried.
+                        retry(_ranged_download.download)(dl_file_client, co_request)
+                    else:
+                        retry(azcopy.download.sync_fastpath)(dl_file_client, co_request)
                 co_request = co.send(None)
             else:
                 raise ValueError(f"Unexpected coroutine request: {co_request}")
@@ -396,6 +513,43 @@ def download_or_use_verified(
         errors.translate_azure_error(fs_client, remote_key, err)
 
 
+def download_or_use_verified(
+    fs_client: FileSystemClient,
+    remote_key: str,
+    local_path: StrOrPath,
+    *,
+    expected_hash: ty.Optional[hashing.Hash] = None,
+    cache: ty.Optional[Cache] = None,
+    set_remote_hash: bool = False,
+    priority: int = 0,
+) -> ty.Optional[Path]:
+    """Download a file or use the existing, cached copy if one exists in the cache and is verifiable.
+
+    Note that you will get a logged warning if `local_path` already exists when you call
+    this function.
+
+    If set_remote_hash is False, the function will not attempt to set hash metadata on the
+    remote file after download. This is useful when downloading from read-only locations.
+
+    The transfer itself waits its turn in the process-wide `scheduler`, where a higher
+    `priority` goes first. An identical call that is already in flight is waited for
+    rather than repeated.
+    """
+    return scheduler.global_scheduler().dedupe(
+        _dedupe_key("sync", fs_client, remote_key, local_path, expected_hash, cache, set_remote_hash),
+        partial(
+            _download_or_use_verified,
+            fs_client,
+            remote_key,
+            local_path,
+            expected_hash=expected_hash,
+            cache=cache,
+            set_remote_hash=set_remote_hash,
+            priority=priority,
+        ),
+    )
+
+
 _async_dl_scope = scope.AsyncScope("adls.download.async")
 
 
@@ -404,7 +558,7 @@ _async_dl_scope = scope.AsyncScope("adls.download.async")
 @fretry.retry_regular_async(
     fretry.is_exc(errors.ContentLengthMismatchError), fretry.iter_to_async(fretry.n_times(2))
 )
-async def async_download_or_use_verified(
+async def _async_download_or_use_verified(
     fs_client: aio.FileSystemClient,
     remote_key: str,
     local_path: StrOrPath,
@@ -412,6 +566,7 @@ async def async_download_or_use_verified(
     expected_hash: ty.Optional[hashing.Hash] = None,
     cache: ty.Optional[Cache] = None,
     set_remote_hash: bool = False,
+    priority: int = 0,
 ) -> ty.Optional[Path]:
     file_properties = None
     try:
@@ -429,12 +584,22 @@ async def async_download_or_use_verified(
                 co_request = co.send(file_properties)
             elif isinstance(co_request, azcopy.download.DownloadRequest):
                 # coroutine is requesting download
-                await fretry.retry_regular_async(
+                # retry n_times(2) means _retry_ twice.
+                retry = fretry.retry_regular_async(
                     _excs_to_retry(), fretry.iter_to_async(fretry.n_times(2))
-                )(
-                    # retry n_times(2) means _retry_ twice.
-                    azcopy.download.async_fastpath
-                )(dl_file_client, co_request)
+                )
+                async with scheduler.global_scheduler().atransfer(
+                    co_request.size_bytes or 0,
+                    priority=priority,
+                    connections=_connections_for(co_request),
+                ):
+                    if isinstance(co_request, _ranged_download.RangedDownloadRequest):
+                        # resumes where it left off when retried.
+                        await retry(_ranged_download.async_download)(
+                            ty.cast(aio.DataLakeFileClient, dl_file_client), co_request
+                        )
+                    else:
+                        await retry(azcopy.download.async_fastpath)(dl_file_client, co_request)
                 co_request = co.send(None)
             else:
                 raise ValueError(f"Unexpected coroutine request: {co_request}")
@@ -453,3 +618,29 @@ async def async_download_or_use_verified(
         return si.value.hit
     except AzureError as err:
         errors.translate_azure_error(fs_client, remote_key, err)
+
+
+async def async_download_or_use_verified(
+    fs_client: aio.FileSystemClient,
+    remote_key: str,
+    local_path: StrOrPath,
+    *,
+    expected_hash: ty.Optional[hashing.Hash] = None,
+    cache: ty.Optional[Cache] = None,
+    set_remote_hash: bool = False,
+    priority: int = 0,
+) -> ty.Optional[Path]:
+    """The async version of `download_or_use_verified`, sharing the same scheduler."""
+    return await scheduler.global_scheduler().adedupe(
+        _dedupe_key("async", fs_client, remote_key, local_path, expected_hash, cache, set_remote_hash),
+        partial(
+            _async_download_or_use_verified,
+            fs_client,
+            remote_key,
+            local_path,
+            expected_hash=expected_hash,
+            cache=cache,
+            set_remote_hash=set_remote_hash,
+            priority=priority,
+        ),
+    )
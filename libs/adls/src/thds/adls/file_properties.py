@@ -1,13 +1,25 @@
+import os
+import posixpath
+import time
 import typing as ty
+from collections import defaultdict
+from functools import partial
 
 from azure.core.exceptions import AzureError, ResourceNotFoundError
 from azure.storage.blob import BlobProperties
 from azure.storage.filedatalake import FileProperties
 
+from thds.core import log, parallel
+
+from . import conf
 from .errors import translate_azure_error
 from .fqn import AdlsFqn
 from .global_client import get_global_blob_container_client, get_global_fs_client
 
+logger = log.getLogger(__name__)
+R = ty.TypeVar("R")
+T = ty.TypeVar("T")
+
 
 def is_directory(info: FileProperties) -> bool:
     # from https://github.com/Azure/azure-sdk-for-python/issues/24814#issuecomment-1159280840
@@ -61,3 +73,111 @@ def exists(fqn: AdlsFqn) -> bool:
         return False
     except AzureError as err:
         translate_azure_error(get_global_fs_client(fqn.sa, fqn.container), fqn.path, err)
+
+
+# Batched versions of the above, for when you have many paths to check at once.
+# Paths that share a parent directory can often be answered by a single listing of that
+# directory (a page of which returns up to 5000 blobs, with their properties), rather
+# than one HEAD each.
+
+
+class StrategyTiming(ty.NamedTuple):
+    paths: int  # answered by this strategy
+    requests: int  # directory listings (each of which may be several pages), or HEADs
+    seconds: float  # wall clock
+
+
+class ManyProperties(ty.NamedTuple):
+    properties: ty.Dict[AdlsFqn, ty.Optional[BlobProperties]]  # None if the path does not exist
+    timings: ty.Dict[str, StrategyTiming]  # by strategy: 'list' and/or 'head'
+
+
+def _concurrently(fn: ty.Callable[[T], R], items: ty.Sequence[T]) -> ty.Iterator[ty.Tuple[T, R]]:
+    """In completion order."""
+    for i, result in parallel.failfast(
+        parallel.yield_all(
+            ((i, partial(fn, item)) for i, item in enumerate(items)),
+            max_in_flight=conf.PROPERTIES_MANY_MAX_CONCURRENCY(),
+            progress_logger=logger.debug,
+        )
+    ):
+        yield items[i], result
+
+
+def _head(fqn: AdlsFqn) -> ty.Optional[BlobProperties]:
+    try:
+        return get_blob_properties(fqn)
+    except ResourceNotFoundError:
+        return None
+    except AzureError as err:
+        translate_azure_error(get_global_fs_client(fqn.sa, fqn.container), fqn.path, err)
+
+
+def _list_siblings(siblings: ty.Sequence[AdlsFqn]) -> ty.Dict[AdlsFqn, ty.Optional[BlobProperties]]:
+    """Answers for as many of these paths - all in the same directory - as one listing of
+    (the part of) that directory (that could contain them) can give before it gets too long.
+    """
+    wanted = {fqn.path.rstrip("/"): fqn for fqn in siblings}
+    last = max(wanted)
+    parent = posixpath.dirname(last)
+    # the listing can be narrowed to the part of the directory that could contain them:
+    prefix = (parent + "/" if parent else "") + os.path.commonprefix(
+        [posixpath.basename(path) for path in wanted]
+    )
+    max_items = len(wanted) * conf.PROPERTIES_MANY_LIST_MAX_ITEMS_PER_PATH()
+    found: ty.Dict[str, BlobProperties] = dict()
+    container_client = get_global_blob_container_client(siblings[0].sa, siblings[0].container)
+    # blobs are listed in name order, so we can stop as soon as we're past the last one we want.
+    # Without "copy", the listing omits the copy status that `copy_many` polls for.
+    for i, item in enumerate(
+        container_client.walk_blobs(name_starts_with=prefix, include=["metadata", "copy"], delimiter="/")
+    ):
+        if item.name > last:
+            break
+        if i >= max_items:
+            # give up on the rest; the ones we've already listed past are known either way.
+            return {fqn: found.get(path) for path, fqn in wanted.items() if path < item.name}
+        if isinstance(item, BlobProperties) and item.name in wanted:
+            found[item.name] = item
+    return {fqn: found.get(path) for path, fqn in wanted.items()}
+
+
+def properties_many(fqns: ty.Iterable[AdlsFqn]) -> ManyProperties:
+    """Blob properties for many paths at once, or None for each that does not exist.
+
+    Paths are grouped by directory. Each directory with at least `properties_many_list_min_paths`
+    of them is listed; the rest - along with any a listing gave up before reaching - get a
+    HEAD each. Listings and HEADs each run with bounded concurrency.
+
+    Properties from a listing are not quite as complete as those from a HEAD (e.g. they lack
+    lease details), but they include the size, etag, content settings, metadata, and the
+    status of the last copy to the blob.
+    """
+    fqns = list(dict.fromkeys(fqns))
+    by_dir: ty.Dict[ty.Tuple[str, str, str], ty.List[AdlsFqn]] = defaultdict(list)
+    for fqn in fqns:
+        by_dir[(fqn.sa, fqn.container, posixpath.dirname(fqn.path.rstrip("/")))].append(fqn)
+
+    min_paths = conf.PROPERTIES_MANY_LIST_MIN_PATHS()
+    dense = [siblings for siblings in by_dir.values() if min_paths and len(siblings) >= min_paths]
+    properties: ty.Dict[AdlsFqn, ty.Optional[BlobProperties]] = dict()
+    timings: ty.Dict[str, StrategyTiming] = dict()
+    if dense:
+        start = time.monotonic()
+        for _, listed in _concurrently(_list_siblings, dense):
+            properties.update(listed)
+        timings["list"] = StrategyTiming(len(properties), len(dense), time.monotonic() - start)
+
+    to_head = [fqn for fqn in fqns if fqn not in properties]
+    if to_head:
+        start = time.monotonic()
+        properties.update(_concurrently(_head, to_head))
+        timings["head"] = StrategyTiming(len(to_head), len(to_head), time.monotonic() - start)
+
+    logger.debug("Got properties for %d paths: %s", len(fqns), timings)
+    return ManyProperties({fqn: properties[fqn] for fqn in fqns}, timings)
+
+
+def exists_many(fqns: ty.Iterable[AdlsFqn]) -> ty.Dict[AdlsFqn, bool]:
+    """Batched `exists` - see `properties_many`."""
+    return {fqn: props is not None for fqn, props in properties_many(fqns).properties.items()}
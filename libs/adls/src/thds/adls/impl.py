@@ -14,6 +14,7 @@ from typing import (
     AsyncIterator,
     Awaitable,
     Callable,
+    Dict,
     Iterable,
     List,
     Mapping,
@@ -31,6 +32,8 @@ from azure.storage.filedatalake.aio import DataLakeServiceClient, FileSystemClie
 
 from thds.core import lazy, log
 
+from ._fetch_pipeline import Fetch, FetchCounters
+from ._fetch_pipeline import fetch as pipeline_fetch
 from ._upload import async_upload_decision_and_metadata
 from .conf import CONNECTION_TIMEOUT, UPLOAD_CHUNK_SIZE
 from .download import async_download_or_use_verified
@@ -71,6 +74,19 @@ def _true(_):
     return True
 
 
+def _listed_properties(path: PathProperties) -> FileProperties:
+    """What ADLSFileSystemCache needs to know about a file, from its listing."""
+    fp = FileProperties(name=path.name)
+    # listings' times are naive, but GMT.
+    fp.last_modified = (
+        path.last_modified.replace(tzinfo=datetime.timezone.utc)
+        if path.last_modified and not path.last_modified.tzinfo
+        else path.last_modified
+    )
+    fp.size = path.content_length
+    return fp
+
+
 def batcher(it: Iterable[T], size: int = 1) -> Iterable[List[T]]:
     stream = iter(it)
 
@@ -189,6 +205,39 @@ class ADLSFileSystem:
             # use the fully qualified explicit path
             return Path(local_path).absolute()
 
+    async def _is_cached(self, file_system_client: FileSystemClient, fetched: Fetch) -> bool:
+        if self.cache is None:
+            return False
+        file_properties = fetched.properties
+        if file_properties is None:
+            async with file_system_client.get_file_client(fetched.remote_path) as file_client:
+                file_properties = await file_client.get_file_properties()
+        if self.cache.is_valid_for(file_properties):
+            # local timestamp cache is up-to-date for this file; skip download
+            LOGGER.debug(f"Skipping download of cached {fetched.remote_path}")
+            return True
+        return False
+
+    def _download_path(self, fetched: Fetch) -> Path:
+        # may download into another path than the one we return, if there is a cache
+        return fetched.local_path if self.cache is None else self.cache.cache_path(fetched.remote_path)
+
+    async def _download(self, file_system_client: FileSystemClient, fetched: Fetch) -> Path:
+        download_path = self._download_path(fetched)
+        download_path.parent.mkdir(exist_ok=True, parents=True)
+        await async_download_or_use_verified(
+            file_system_client, fetched.remote_path, download_path, cache=global_cache()
+        )
+        return self._place(fetched)
+
+    def _place(self, fetched: Fetch) -> Path:
+        download_path = self._download_path(fetched)
+        assert download_path.exists(), "File should have been downloaded by this point"
+        if download_path != fetched.local_path:
+            fetched.local_path.parent.mkdir(exist_ok=True, parents=True)
+            from_cache_path_to_local(download_path, fetched.local_path, link_opts=("ref", "hard"))
+        return fetched.local_path
+
     async def _fetch_file(
         self,
         file_system_client: FileSystemClient,
@@ -199,37 +248,35 @@ class ADLSFileSystem:
 
         :returns: a local path of the downloaded file
         """
-        # the local file path we will return to the caller;
-        # may download into another path if there is a cache
-        return_path = self._local_path_for(remote_path, local_path)
-        download_path: Path
-
-        if self.cache is None:
-            download_path = return_path
-        else:
-            download_path = self.cache.cache_path(remote_path)
-
-        dir_path = return_path.parent
-        dir_path.mkdir(exist_ok=True, parents=True)
-
-        locally_cached = False
-        if self.cache:
-            async with file_system_client.get_file_client(remote_path) as file_client:
-                file_properties = await file_client.get_file_properties()
-                if self.cache.is_valid_for(file_properties):
-                    # local timestamp cache is up-to-date for this file; skip download
-                    LOGGER.debug(f"Skipping download of cached {remote_path}")
-                    locally_cached = True
-        if not locally_cached:
-            await async_download_or_use_verified(
-                file_system_client, remote_path, download_path, cache=global_cache()
-            )
-
-        assert download_path.exists(), "File should have been downloaded by this point"
-        if download_path != return_path:
-            from_cache_path_to_local(download_path, return_path, link_opts=("ref", "hard"))
-
-        return return_path
+        # the local file path we will return to the caller
+        fetched = Fetch(0, remote_path, self._local_path_for(remote_path, local_path))
+        fetched.local_path.parent.mkdir(exist_ok=True, parents=True)
+        if await self._is_cached(file_system_client, fetched):
+            return self._place(fetched)
+        return await self._download(file_system_client, fetched)
+
+    async def _fetch_through_pipeline(
+        self,
+        file_system_client: FileSystemClient,
+        fetches: AsyncIterable[Fetch],
+        batch_size: Optional[int],
+        counters: Optional[FetchCounters],
+    ) -> List[Path]:
+        """Fetches everything, at most batch_size at a time, returning the local paths in the
+        order of `fetches`."""
+        counters = counters if counters is not None else FetchCounters()
+        local_paths: Dict[int, Path] = dict()
+        async for index, local_path in pipeline_fetch(
+            fetches,
+            lambda fetched: self._is_cached(file_system_client, fetched),
+            lambda fetched: self._download(file_system_client, fetched),
+            self._place,
+            window=batch_size or self.default_batch_size,
+            counters=counters,
+        ):
+            local_paths[index] = local_path
+        LOGGER.debug("Fetched %d files: %s", len(local_paths), counters)
+        return [local_paths[i] for i in range(len(local_paths))]
 
     async def _fetch_directory(
         self,
@@ -239,6 +286,7 @@ class ADLSFileSystem:
         batch_size: Optional[int] = None,
         recursive: bool = True,
         path_filter: Optional[Callable[[PathProperties], bool]] = None,
+        counters: Optional[FetchCounters] = None,
     ) -> List[Path]:
         """Async function that downloads all the files within a given directory,
         including the files in the subdirectories when recursive = True
@@ -250,55 +298,42 @@ class ADLSFileSystem:
         stripped_remote_path = remote_path.strip("/")
         remote_path = stripped_remote_path + "/"
         dir_path = self._local_path_for(remote_path, local_path)
-        made_dir = False
         path_filter_ = _true if path_filter is None else path_filter
+        counters = counters if counters is not None else FetchCounters()
 
         # remove the remote directory prefix to determine a relative path for creation under dir_path
         def strip_prefix(name):
             return name.lstrip("/")[len(remote_path) :]
 
-        paths = (
-            PathPair(remote_path=path.name, local_path=dir_path / strip_prefix(path.name))
-            async for path in file_system_client.get_paths(remote_path, recursive=recursive)
-            if not path.is_directory and path_filter_(path)
-        )
-
-        # shim generator to check for file vs directory, to prevent confusing errors that happen lower down
-        async def validated_paths() -> AsyncIterator[PathPair]:
-            async for path_pair in paths:
-                if path_pair.remote_path == stripped_remote_path:
+        # checks for file vs directory, to prevent confusing errors that happen lower down
+        async def fetches() -> AsyncIterator[Fetch]:
+            index = 0
+            async for path in file_system_client.get_paths(remote_path, recursive=recursive):
+                if path.is_directory or not path_filter_(path):
+                    counters.list.received += 1
+                    counters.list.skipped += 1
+                    continue
+                if path.name == stripped_remote_path:
                     raise NotADirectoryError(
                         f"Path '{stripped_remote_path}' points to a file, not a directory. "
                         f"Use fetch_file() instead."
                     )
-                nonlocal made_dir
-                if not made_dir:
+                if not index:
                     dir_path.mkdir(exist_ok=True, parents=True)
-                    made_dir = True
-                yield path_pair
-
-        local_paths = []
-        async for batch in self._async_batch(validated_paths(), batch_size):
-            local_paths.extend(
-                await asyncio.gather(
-                    *[
-                        self._fetch_file(
-                            file_system_client,
-                            path_pair.remote_path,
-                            path_pair.local_path,
-                        )
-                        for path_pair in batch
-                    ]
+                # the listing tells us enough to check the cache without asking again per file
+                yield Fetch(
+                    index, path.name, dir_path / strip_prefix(path.name), _listed_properties(path)
                 )
-            )
+                index += 1
 
-        return local_paths
+        return await self._fetch_through_pipeline(file_system_client, fetches(), batch_size, counters)
 
     async def _fetch_files(
         self,
         file_system_client: FileSystemClient,
         remote_paths: Union[Iterable[str], Mapping[str, Union[Path, str]]],
         batch_size: Optional[int] = None,
+        counters: Optional[FetchCounters] = None,
     ):
         if isinstance(remote_paths, MappingABC):
             remote_local_pairs = (
@@ -311,25 +346,11 @@ class ADLSFileSystem:
                 for remote_path in remote_paths
             )
 
-        if batch_size is None:
-            batch_size = self.default_batch_size
-
-        local_paths = []
-        for batch in iter(lambda: list(itertools.islice(remote_local_pairs, batch_size)), []):
-            local_paths.extend(
-                await asyncio.gather(
-                    *[
-                        self._fetch_file(
-                            file_system_client,
-                            path_pair.remote_path,
-                            path_pair.local_path,
-                        )
-                        for path_pair in batch
-                    ]
-                )
-            )
+        async def fetches() -> AsyncIterator[Fetch]:
+            for index, path_pair in enumerate(remote_local_pairs):
+                yield Fetch(index, path_pair.remote_path, path_pair.local_path)
 
-        return local_paths
+        return await self._fetch_through_pipeline(file_system_client, fetches(), batch_size, counters)
 
     @staticmethod
     async def _put_file(
@@ -710,8 +731,12 @@ class ADLSFileSystem:
             async for chunk in streamer:
                 yield chunk  # type: ignore[misc]
 
-    def fetch_files(self, remote_paths: Union[Iterable[str], Mapping[str, Union[Path, str]]]):
-        return self._run(self._fetch_files, remote_paths)
+    def fetch_files(
+        self,
+        remote_paths: Union[Iterable[str], Mapping[str, Union[Path, str]]],
+        counters: Optional[FetchCounters] = None,
+    ):
+        return self._run(self._fetch_files, remote_paths, counters=counters)
 
     def fetch_file(self, remote_path: str, local_path: Optional[Union[Path, str]] = None) -> Path:
         """Download the given remote file and save it into a given file path (local_path).
@@ -734,6 +759,7 @@ class ADLSFileSystem:
         batch_size: Optional[int] = None,
         recursive: bool = True,
         path_filter: Optional[Callable[[PathProperties], bool]] = None,
+        counters: Optional[FetchCounters] = None,
     ) -> List[Path]:
         """Download all the files in a given directory and save them in a given directory path.
         In case there is a cache directory, the remote directory is reflected in a subdirectory under it.
@@ -745,10 +771,12 @@ class ADLSFileSystem:
         :param local_path: path for the local directory; if not given, use the name from the
           remote path when there is no cache, otherwise use the path under the cache dir
           corresponding to remote_path
-        :param batch_size: the size of each batch
+        :param batch_size: the most files to fetch at once; the listing runs no further ahead
+          of the downloads than this
         :param recursive: recurse into subdirectories when downloading?
         :param path_filter: optional callable taking an `azure.storage.filedatalake.PathProperties`
           and returning a bool indicating whether to download the corresponding file
+        :param counters: optional `FetchCounters`, updated by each stage of the fetch as it runs
         :return: List of local paths that were downloaded to
         """
         return self._run(
@@ -758,6 +786,7 @@ class ADLSFileSystem:
             batch_size=batch_size,
             recursive=recursive,
             path_filter=path_filter,
+            counters=counters,
         )
 
     def fetch_hive_table(
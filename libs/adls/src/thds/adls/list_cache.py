@@ -0,0 +1,330 @@
+"""A persistent, incrementally refreshable listing of everything under an ADLS prefix.
+
+`list_fast` re-lists the whole tree every time, which for a large prefix (a mops memo
+prefix, say) takes minutes. Here, the listing is kept in a small SQLite database per
+(storage account, container, prefix), recording each blob's path, etag, last_modified,
+size, hash, and metadata, along with the last_modified of every directory we have
+completely listed.
+
+A refresh lists the root directory, and then descends only into the subdirectories whose
+last_modified differs from what we recorded the last time we listed them completely. All
+of the listing is driven by a single event loop, with at most
+`list_fast.MAX_INFLIGHT_LISTING_REQUESTS` directory listings in flight at once - no
+nested thread pools.
+
+This relies on a property of hierarchical-namespace (HNS) accounts: a directory's
+last_modified changes when a direct child is created, deleted, or renamed. Two caveats:
+
+- An unchanged directory is skipped along with its entire subtree, so a change deeper
+  down is only noticed if it also touched the directory above it (which creating a new
+  subdirectory does). Overwriting an existing file in place touches no directory at all.
+  If files under your prefix get rewritten or created deep inside existing directories,
+  pass `full=True`, or rely on `max_age_s` to re-list everything periodically.
+- Accounts without HNS have no directory blobs, and therefore no directory
+  last_modified; every directory is re-listed on every refresh.
+"""
+
+import asyncio
+import contextlib
+import hashlib
+import json
+import os
+import sqlite3
+import time
+import typing as ty
+from pathlib import Path
+
+from azure.core.exceptions import ServiceRequestError, ServiceResponseError
+from azure.identity.aio import DefaultAzureCredential
+from azure.storage.blob import BlobProperties
+from azure.storage.blob.aio import ContainerClient
+
+from thds.core import config, fretry, hashing, log
+from thds.core.home import HOMEDIR
+
+from . import blob_meta, list_fast
+from .fqn import AdlsFqn
+from .shared_credential import get_credential_kwargs
+from .uri import UriIsh, parse_any
+
+CACHE_DIR = config.item("dir", HOMEDIR() / ".thds/adls/list-cache", parse=Path)
+MAX_AGE_S = config.item("max_age_s", 24 * 60 * 60, parse=int)
+# directories listed longer ago than this are re-listed regardless; 0 disables.
+logger = log.getLogger(__name__)
+
+_retry_listing = fretry.retry_regular_async(
+    fretry.is_exc(ServiceResponseError, ServiceRequestError), fretry.iter_to_async(fretry.n_times(3))
+)
+
+
+class Listed(ty.NamedTuple):
+    """A direct child of a listed directory."""
+
+    path: str  # relative to the container, without a trailing slash
+    is_dir: bool
+    last_modified: ty.Optional[float]  # None for a virtual directory (a prefix with no directory blob)
+    etag: str
+    meta: ty.Optional[blob_meta.BlobMeta]  # None for a virtual directory
+
+
+Lister = ty.Callable[[str], ty.Awaitable[ty.List[Listed]]]
+# lists the direct children of a directory; "" is the root of the container.
+
+
+class RefreshStats(ty.NamedTuple):
+    dirs_listed: int
+    dirs_skipped: int
+    blobs_listed: int
+    seconds: float
+
+
+def _listed(props: BlobProperties) -> Listed:
+    meta = blob_meta.to_blob_meta(props)
+    return Listed(
+        props.name,
+        blob_meta.is_dir(meta),
+        props.last_modified.timestamp() if props.last_modified else None,
+        props.etag or "",
+        meta,
+    )
+
+
+def container_lister(container_client: ContainerClient) -> Lister:
+    @_retry_listing
+    async def list_children(dir_path: str) -> ty.List[Listed]:
+        children: ty.Dict[str, Listed] = dict()
+        async for item in container_client.walk_blobs(
+            name_starts_with=dir_path + "/" if dir_path else None, include=["metadata"], delimiter="/"
+        ):
+            if isinstance(item, BlobProperties):
+                children[item.name] = _listed(item)
+            else:
+                # a BlobPrefix. On an HNS account, there's also a directory blob with the
+                # same name, which is what we'd rather have, since it has a last_modified.
+                name = item.name.rstrip("/")
+                children.setdefault(name, Listed(name, True, None, "", None))
+        return list(children.values())
+
+    return list_children
+
+
+@contextlib.asynccontextmanager
+async def _aio_container_client(sa: str, container: str) -> ty.AsyncIterator[ContainerClient]:
+    async with DefaultAzureCredential(**get_credential_kwargs()) as credential:
+        async with ContainerClient(
+            account_url=f"https://{sa}.blob.core.windows.net",
+            container_name=container,
+            credential=credential,
+        ) as container_client:
+            yield container_client
+
+
+def _db_path(fqn: AdlsFqn) -> Path:
+    root = fqn.path.strip("/")
+    name = hashlib.sha256(root.encode()).hexdigest()[:32]
+    return CACHE_DIR() / fqn.sa / fqn.container / f"{name}.sqlite3"
+
+
+def _connect(db_path: Path) -> sqlite3.Connection:
+    db_path.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(os.fspath(db_path), timeout=30.0, isolation_level=None)  # autocommit
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS blobs (
+            path TEXT PRIMARY KEY,
+            parent TEXT NOT NULL,
+            etag TEXT NOT NULL,
+            last_modified REAL,
+            size INTEGER NOT NULL,
+            hash_algo TEXT,
+            hash BLOB,
+            metadata TEXT NOT NULL
+        ) WITHOUT ROWID
+        """
+    )
+    conn.execute("CREATE INDEX IF NOT EXISTS blobs_parent ON blobs (parent)")
+    # last_modified is NULL until the directory's entire subtree has been listed.
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS dirs (
+            path TEXT PRIMARY KEY,
+            parent TEXT NOT NULL,
+            last_modified REAL,
+            listed_at REAL
+        ) WITHOUT ROWID
+        """
+    )
+    conn.execute("CREATE INDEX IF NOT EXISTS dirs_parent ON dirs (parent)")
+    return conn
+
+
+def _subtree_bounds(dir_path: str) -> ty.Tuple[str, str]:
+    # every path under dir_path sorts between these two ('0' is the character after '/').
+    return dir_path + "/", dir_path + "0"
+
+
+class ListingCache:
+    """The cached listing of a single prefix."""
+
+    def __init__(self, fqn_or_uri: UriIsh, db_path: ty.Optional[Path] = None):
+        self.fqn = parse_any(fqn_or_uri)
+        self.root = self.fqn.path.strip("/")
+        self.db_path = db_path or _db_path(self.fqn)
+
+    def _replace_children(
+        self, conn: sqlite3.Connection, dir_path: str, children: ty.List[Listed]
+    ) -> None:
+        now = time.time()
+        new_paths = {child.path for child in children}
+        old_dirs = [
+            path
+            for (path,) in conn.execute(
+                "SELECT path FROM dirs WHERE parent = ? AND path != ?", (dir_path, dir_path)
+            )
+        ]
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for gone in (path for path in old_dirs if path not in new_paths):
+                low, high = _subtree_bounds(gone)
+                conn.execute("DELETE FROM blobs WHERE path >= ? AND path < ?", (low, high))
+                conn.execute(
+                    "DELETE FROM dirs WHERE path = ? OR (path >= ? AND path < ?)", (gone, low, high)
+                )
+            conn.execute("DELETE FROM blobs WHERE parent = ?", (dir_path,))
+            conn.executemany(
+                "INSERT INTO blobs (path, parent, etag, last_modified, size, hash_algo, hash, metadata)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (
+                        child.path,
+                        dir_path,
+                        child.etag,
+                        child.last_modified,
+                        child.meta.size,
+                        child.meta.hash.algo if child.meta.hash else None,
+                        child.meta.hash.bytes if child.meta.hash else None,
+                        json.dumps(child.meta.metadata),
+                    )
+                    for child in children
+                    if child.meta
+                ],
+            )
+            conn.executemany(
+                "INSERT OR IGNORE INTO dirs (path, parent) VALUES (?, ?)",
+                [(child.path, dir_path) for child in children if child.is_dir],
+            )
+            conn.execute("UPDATE dirs SET listed_at = ? WHERE path = ?", (now, dir_path))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    async def arefresh(
+        self, lister: Lister, *, full: bool = False, max_age_s: ty.Optional[int] = None
+    ) -> RefreshStats:
+        """Bring the cached listing up to date using the given lister.
+
+        With `full`, every directory is re-listed, as if there were no cache.
+        """
+        max_age_s = MAX_AGE_S() if max_age_s is None else max_age_s
+        start = time.monotonic()
+        conn = _connect(self.db_path)
+        known = {
+            path: (last_modified, listed_at)
+            for path, last_modified, listed_at in conn.execute(
+                "SELECT path, last_modified, listed_at FROM dirs WHERE last_modified IS NOT NULL"
+            )
+        }
+        conn.execute("INSERT OR IGNORE INTO dirs (path, parent) VALUES (?, '')", (self.root,))
+        inflight = asyncio.Semaphore(list_fast.MAX_INFLIGHT_LISTING_REQUESTS())
+        counts = dict(dirs_listed=0, dirs_skipped=0, blobs_listed=0)
+
+        def _unchanged(child: Listed) -> bool:
+            if full or child.last_modified is None or child.path not in known:
+                return False
+            last_modified, listed_at = known[child.path]
+            return last_modified == child.last_modified and not (
+                max_age_s and time.time() - (listed_at or 0) > max_age_s
+            )
+
+        async def _visit(dir_path: str, last_modified: ty.Optional[float]) -> None:
+            # forget that this directory was complete until all of it has been listed again,
+            # so that an interrupted refresh resumes here rather than skipping it next time.
+            conn.execute("UPDATE dirs SET last_modified = NULL WHERE path = ?", (dir_path,))
+            async with inflight:
+                children = await lister(dir_path)
+            self._replace_children(conn, dir_path, children)
+            counts["dirs_listed"] += 1
+            counts["blobs_listed"] += sum(1 for child in children if child.meta)
+
+            subdirs = [child for child in children if child.is_dir]
+            to_visit = [child for child in subdirs if not _unchanged(child)]
+            counts["dirs_skipped"] += len(subdirs) - len(to_visit)
+            tasks = [
+                asyncio.ensure_future(_visit(child.path, child.last_modified)) for child in to_visit
+            ]
+            try:
+                await asyncio.gather(*tasks)
+            except BaseException:
+                for task in tasks:
+                    task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)  # before we close the db.
+                raise
+            conn.execute("UPDATE dirs SET last_modified = ? WHERE path = ?", (last_modified, dir_path))
+
+        try:
+            # the root has no last_modified of its own that we can see, so it is always listed;
+            # recording 0 marks it as complete.
+            await _visit(self.root, 0.0)
+        finally:
+            conn.close()
+
+        stats = RefreshStats(**counts, seconds=time.monotonic() - start)
+        logger.info(
+            "Refreshed listing of %s: listed %d directories, skipped %d unchanged, in %.1fs",
+            self.fqn,
+            stats.dirs_listed,
+            stats.dirs_skipped,
+            stats.seconds,
+        )
+        return stats
+
+    def refresh(self, *, full: bool = False, max_age_s: ty.Optional[int] = None) -> RefreshStats:
+        async def _refresh() -> RefreshStats:
+            async with _aio_container_client(self.fqn.sa, self.fqn.container) as container_client:
+                return await self.arefresh(
+                    container_lister(container_client), full=full, max_age_s=max_age_s
+                )
+
+        return asyncio.run(_refresh())
+
+    def yield_blob_meta(self) -> ty.Iterator[blob_meta.BlobMeta]:
+        """Everything in the cached listing, including directories - in path order."""
+        if not self.db_path.exists():
+            return
+        with contextlib.closing(_connect(self.db_path)) as conn:
+            for path, size, hash_algo, hash_bytes, metadata in conn.execute(
+                "SELECT path, size, hash_algo, hash, metadata FROM blobs ORDER BY path"
+            ):
+                yield blob_meta.BlobMeta(
+                    path,
+                    size,
+                    hashing.Hash(hash_algo, hash_bytes) if hash_algo else None,
+                    json.loads(metadata),
+                )
+
+
+def yield_blob_meta(
+    fqn_or_uri: UriIsh, *, refresh: bool = True, full: bool = False
+) -> ty.Iterator[blob_meta.BlobMeta]:
+    """Like `list_fast.multilayer_yield_blob_meta`, but backed by the persistent listing
+    cache, which is first refreshed (incrementally, unless `full`) if `refresh`.
+
+    Uses its own event loop, so don't call it from a coroutine; await `ListingCache.arefresh` instead.
+    """
+    cache = ListingCache(fqn_or_uri)
+    if refresh:
+        cache.refresh(full=full)
+    yield from cache.yield_blob_meta()
@@ -2,6 +2,9 @@
 
 Part of that is the parallelism, but part of it seems to be using the blob container
 client instead of the file system client.
+
+If you list the same large prefix over and over, `list_cache` keeps a persistent listing
+that it can refresh incrementally.
 """
 
 import threading
@@ -1,18 +1,43 @@
+"""The read-only, content-verified local cache of ADLS files.
+
+Every file in the cache has an entry in a small SQLite index at the cache root, recording
+its size and (to the hour) when it was last used. When `max-bytes` is set, adding a file
+to a cache evicts the least recently used files until the cache fits the budget again.
+Eviction skips files that are locked (i.e. being downloaded or verified) and files with
+more than one hard link: deleting those would free no space, and the hard links we've
+handed out to their users keep working either way. Soft links into the cache, if you've
+asked for those, will dangle once their target is evicted.
+
+Files that were put in the cache before the index existed are only known to it after a
+full scan; `adls-ro-cache gc` does one.
+"""
+
+import contextlib
 import os
+import sqlite3
+import stat
 import sys
+import threading
+import time
 import typing as ty
 from pathlib import Path
 
+from filelock import Timeout
 from thds.core import config, log
 from thds.core import types as ct
 from thds.core.files import set_read_only
 from thds.core.home import HOMEDIR
 from thds.core.link import LinkType, link_or_copy
 
+from .file_lock import file_lock
 from .fqn import AdlsFqn
 from .md5 import hex_md5_str
 
 GLOBAL_CACHE_PATH = config.item("global-cache-path", HOMEDIR() / ".thds/adls/ro-cache", parse=Path)
+MAX_BYTES = config.item("max-bytes", 0, parse=int)
+# 0 means unbounded; otherwise, least recently used files are evicted as new ones are added.
+_INDEX_NAME = ".ro-cache-index.sqlite3"  # can't collide with a storage account name.
+_TOUCH_AFTER_S = 60 * 60
 MAX_FILENAME_LEN = config.item("max-filename-len", 255, parse=int)  # safe on most local filesystems?
 MAX_TOTAL_PATH_LEN = config.item(
     "max-total-path-len", 1023 if sys.platform == "darwin" else 4095, parse=int
@@ -99,6 +124,201 @@ def _cache_path_for_fqn(cache: Cache, fqn: AdlsFqn) -> Path:
     return Path(full_path)
 
 
+_LOCAL = threading.local()
+
+
+def _connect(root: Path) -> sqlite3.Connection:
+    root.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(os.fspath(root / _INDEX_NAME), timeout=30.0, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS entries (
+            path TEXT PRIMARY KEY,
+            size INTEGER NOT NULL,
+            accessed INTEGER NOT NULL
+        ) WITHOUT ROWID
+        """
+    )
+    conn.execute("CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed)")
+    return conn
+
+
+def _conn(root: Path) -> ty.Optional[sqlite3.Connection]:
+    """One connection per thread per cache root; None if the index can't be opened, in
+    which case the cache simply isn't tracked (or bounded)."""
+    conns: ty.Dict[Path, ty.Optional[sqlite3.Connection]] = _LOCAL.__dict__.setdefault("conns", {})
+    if root not in conns:
+        try:
+            conns[root] = _connect(root)
+        except (sqlite3.Error, OSError):
+            logger.exception("Unable to open the index of the cache at %s; it will not be bounded", root)
+            conns[root] = None
+    return conns[root]
+
+
+def _relpath(cache: Cache, path: ct.StrOrPath) -> str:
+    return os.path.relpath(path, cache.root.resolve())
+
+
+def _index_path(path: Path) -> bool:
+    return path.name.startswith(_INDEX_NAME)  # including -wal and -shm
+
+
+def record_access(cache: Cache, cache_path: ct.StrOrPath, added: bool = False) -> None:
+    """Note that a file in the cache was just used - or just `added`, which also enforces
+    the cache's byte budget."""
+    conn = _conn(cache.root.resolve())
+    if conn is None:
+        return
+    relpath = _relpath(cache, cache_path)
+    now = int(time.time())
+    try:
+        if added:
+            size = os.stat(cache_path).st_size
+            conn.execute(
+                "INSERT OR REPLACE INTO entries (path, size, accessed) VALUES (?, ?, ?)",
+                (relpath, size, now),
+            )
+        else:
+            # don't write on every hit - LRU at hourly resolution is plenty.
+            conn.execute(
+                "UPDATE entries SET accessed = ? WHERE path = ? AND accessed < ?",
+                (now, relpath, now - _TOUCH_AFTER_S),
+            )
+    except (sqlite3.Error, OSError):
+        logger.exception("Unable to record access to %s in the cache index", cache_path)
+        return
+
+    max_bytes = MAX_BYTES()
+    if added and max_bytes:
+        try:
+            (total,) = conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()
+            if total > max_bytes:
+                evict(cache, max_bytes)
+        except Exception:
+            logger.exception("Failed to evict from the cache at %s", cache.root)
+
+
+class Usage(ty.NamedTuple):
+    n_files: int
+    total_bytes: int
+    oldest_access: ty.Optional[int]  # unix seconds
+
+
+def usage(cache: Cache) -> Usage:
+    """According to the index - run `scan` first if files may have been added without it."""
+    conn = _conn(cache.root.resolve())
+    if conn is None:
+        return Usage(0, 0, None)
+    return Usage(
+        *conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0), MIN(accessed) FROM entries").fetchone()
+    )
+
+
+def scan(cache: Cache) -> Usage:
+    """Reconcile the index with the files actually in the cache: index files it didn't know
+    about (last accessed at their atime or mtime, whichever is later) and forget files that
+    are gone."""
+    root = cache.root.resolve()
+    conn = _conn(root)
+    if conn is None:
+        return Usage(0, 0, None)
+
+    on_disk: ty.Dict[str, ty.Tuple[int, int]] = dict()
+    for dirpath, _dirnames, filenames in os.walk(root):
+        for name in filenames:
+            path = Path(dirpath) / name
+            if _index_path(path):
+                continue
+            try:
+                st = path.lstat()
+            except FileNotFoundError:
+                continue
+            if stat.S_ISREG(st.st_mode):
+                on_disk[os.path.relpath(path, root)] = (st.st_size, int(max(st.st_atime, st.st_mtime)))
+
+    indexed = {row[0] for row in conn.execute("SELECT path FROM entries")}
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        conn.executemany(
+            "INSERT OR IGNORE INTO entries (path, size, accessed) VALUES (?, ?, ?)",
+            [
+                (path, *size_and_access)
+                for path, size_and_access in on_disk.items()
+                if path not in indexed
+            ],
+        )
+        conn.executemany("DELETE FROM entries WHERE path = ?", [(p,) for p in indexed - set(on_disk)])
+        conn.execute("COMMIT")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    return usage(cache)
+
+
+def _lock_str(path: Path) -> str:
+    # what the downloader locks on: the final cache path, even for a partial download.
+    name = path.name
+    if name.startswith(".") and ".partial" in name:
+        name = name[1:].split(".partial")[0]
+    return str(path.with_name(name))
+
+
+class Evicted(ty.NamedTuple):
+    n_files: int
+    n_bytes: int
+
+
+def evict(cache: Cache, max_bytes: int, dry_run: bool = False) -> Evicted:
+    """Delete the least recently used files until the indexed cache fits in max_bytes,
+    skipping files that are locked or hard linked elsewhere."""
+    root = cache.root.resolve()
+    conn = _conn(root)
+    if conn is None:
+        return Evicted(0, 0)
+
+    (total,) = conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()
+    n_files = n_bytes = 0
+    for relpath, size in conn.execute("SELECT path, size FROM entries ORDER BY accessed").fetchall():
+        if total - n_bytes <= max_bytes:
+            break
+        path = root / relpath
+        lock = file_lock(_lock_str(path))
+        try:
+            lock.acquire(timeout=0)
+        except Timeout:
+            logger.debug("Not evicting %s, which is in use", path)
+            continue
+        try:
+            try:
+                st = path.lstat()
+            except FileNotFoundError:
+                conn.execute("DELETE FROM entries WHERE path = ?", (relpath,))
+                total -= size
+                continue
+            if st.st_nlink > 1:
+                logger.debug("Not evicting %s, which has other hard links", path)
+                continue
+            if not dry_run:
+                path.unlink()
+                conn.execute("DELETE FROM entries WHERE path = ?", (relpath,))
+                with contextlib.suppress(OSError):
+                    os.removedirs(path.parent)  # stops at the root, where the index lives.
+            n_files += 1
+            n_bytes += st.st_size
+        finally:
+            lock.release()
+
+    if n_files:
+        logger.info(
+            f"{'Would evict' if dry_run else 'Evicted'} {n_files} files ({n_bytes:,} bytes)"
+            f" from the cache at {root}"
+        )
+    return Evicted(n_files, n_bytes)
+
+
 def _opts_to_types(opts: LinkOpts) -> ty.Tuple[LinkType, ...]:
     if opts is True:
         return ("ref", "hard")
@@ -0,0 +1,275 @@
+"""A process-wide budget for ADLS transfers.
+
+Plenty of things start their own pools of downloads - `download_directory`, `SourceTree`,
+mops argument loading - and a process running several of them at once could otherwise have
+hundreds of transfers competing for the same connection pool (see
+`global_client.DEFAULT_CONNECTION_POOL_SIZE`), thrashing it and each other.
+
+Instead, every transfer asks the scheduler for the number of connections it intends to use,
+and waits until they fit in the budget. Waiting transfers are admitted in order of priority
+(higher first), then size (larger first, since the large ones finish last), then arrival. An
+optional bandwidth budget paces the start of each transfer so that, on average, no more than
+that many bytes per second are begun.
+
+Callers never hand their work to another thread; they just wait their turn, so logging
+context and the like are unaffected.
+
+Identical requests already in flight are not repeated: the latecomers wait for, and share,
+the result of the first (see `dedupe`).
+"""
+
+import asyncio
+import collections
+import concurrent.futures
+import contextlib
+import heapq
+import itertools
+import threading
+import time
+import typing as ty
+
+from thds.core import cache, config, log
+
+from . import _fork_protector
+
+MAX_CONNECTIONS = config.item("max_connections", 64, parse=int)
+# shared by all transfers in the process; leaves room in the default pool of 100 for listings and the like.
+MAX_BYTES_PER_SECOND = config.item("max_bytes_per_second", 0, parse=int)  # 0 is unlimited
+_THROUGHPUT_WINDOW_S = 60.0
+
+R = ty.TypeVar("R")
+logger = log.getLogger(__name__)
+
+
+class Metrics(ty.NamedTuple):
+    queued: int  # transfers waiting for connections
+    queued_bytes: int
+    active: int
+    active_connections: int
+    completed: int
+    failed: int
+    deduplicated: int  # requests that shared the result of an identical one already in flight
+    bytes_transferred: int
+    bytes_per_second: float  # over the last minute
+
+
+class _Waiter:
+    __slots__ = ("connections", "size", "wake", "granted", "abandoned")
+
+    def __init__(self, connections: int, size: int, wake: ty.Callable[[], None]):
+        self.connections = connections
+        self.size = size
+        self.wake = wake
+        self.granted = False
+        self.abandoned = False
+
+
+class Scheduler:
+    def __init__(self, max_connections: int, max_bytes_per_second: int = 0):
+        assert max_connections > 0, max_connections
+        self.max_connections = max_connections
+        self.max_bytes_per_second = max_bytes_per_second
+        self._lock = threading.Lock()
+        self._queue: ty.List[ty.Tuple[ty.Tuple[int, int, int], _Waiter]] = list()
+        self._arrivals = itertools.count()
+        self._queued = 0
+        self._queued_bytes = 0
+        self._active = 0
+        self._connections_in_use = 0
+        self._completed = 0
+        self._failed = 0
+        self._deduplicated = 0
+        self._bytes_transferred = 0
+        self._recent: ty.Deque[ty.Tuple[float, int]] = collections.deque()
+        self._paced_until = 0.0
+        self._in_flight: ty.Dict[ty.Hashable, concurrent.futures.Future] = dict()
+
+    def _admit(self) -> None:
+        # with the lock held. Strictly in order - a big transfer at the front of the queue
+        # is not starved by smaller ones that would fit around it.
+        while self._queue:
+            _, waiter = self._queue[0]
+            if waiter.abandoned:
+                heapq.heappop(self._queue)
+                continue
+            if (
+                self._connections_in_use
+                and self._connections_in_use + waiter.connections > self.max_connections
+            ):
+                return
+            heapq.heappop(self._queue)
+            self._queued -= 1
+            self._queued_bytes -= waiter.size
+            self._active += 1
+            self._connections_in_use += waiter.connections
+            waiter.granted = True
+            waiter.wake()
+
+    def _enqueue(
+        self, size: int, priority: int, connections: int, wake: ty.Callable[[], None]
+    ) -> _Waiter:
+        waiter = _Waiter(max(1, min(connections, self.max_connections)), size, wake)
+        with self._lock:
+            self._queued += 1
+            self._queued_bytes += size
+            heapq.heappush(self._queue, ((-priority, -size, next(self._arrivals)), waiter))
+            self._admit()
+        return waiter
+
+    def _release(self, waiter: _Waiter, succeeded: bool) -> None:
+        with self._lock:
+            self._active -= 1
+            self._connections_in_use -= waiter.connections
+            if succeeded:
+                self._completed += 1
+                self._bytes_transferred += waiter.size
+                self._recent.append((time.monotonic(), waiter.size))
+            else:
+                self._failed += 1
+            self._admit()
+
+    def _abandon(self, waiter: _Waiter) -> None:
+        """The waiter gave up (was interrupted or cancelled) before starting its transfer."""
+        with self._lock:
+            if not waiter.granted:
+                waiter.abandoned = True
+                self._queued -= 1
+                self._queued_bytes -= waiter.size
+                return
+        self._release(waiter, succeeded=False)
+
+    def _pace(self, size: int) -> float:
+        """Seconds to wait before starting a transfer of this size."""
+        if not self.max_bytes_per_second:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._paced_until)
+            self._paced_until = start + size / self.max_bytes_per_second
+        return start - now
+
+    @contextlib.contextmanager
+    def transfer(self, size: int, *, priority: int = 0, connections: int = 1) -> ty.Iterator[None]:
+        """Blocks until the transfer may begin, and holds its connections until the block exits."""
+        admitted = threading.Event()
+        waiter = self._enqueue(size, priority, connections, admitted.set)
+        try:
+            admitted.wait()
+            time.sleep(self._pace(size))
+        except BaseException:
+            self._abandon(waiter)
+            raise
+        succeeded = False
+        try:
+            yield
+            succeeded = True
+        finally:
+            self._release(waiter, succeeded)
+
+    @contextlib.asynccontextmanager
+    async def atransfer(
+        self, size: int, *, priority: int = 0, connections: int = 1
+    ) -> ty.AsyncIterator[None]:
+        """`transfer`, for coroutines."""
+        loop = asyncio.get_running_loop()
+        admitted = loop.create_future()
+
+        def _admit() -> None:
+            if not admitted.done():
+                admitted.set_result(None)
+
+        def _wake() -> None:
+            # may be called from any thread holding our lock, so it must not block.
+            loop.call_soon_threadsafe(_admit)
+
+        waiter = self._enqueue(size, priority, connections, _wake)
+        try:
+            await admitted
+            await asyncio.sleep(self._pace(size))
+        except BaseException:
+            self._abandon(waiter)
+            raise
+        succeeded = False
+        try:
+            yield
+            succeeded = True
+        finally:
+            self._release(waiter, succeeded)
+
+    def _lead_or_follow(self, key: ty.Hashable) -> ty.Tuple[bool, concurrent.futures.Future]:
+        with self._lock:
+            future = self._in_flight.get(key)
+            if future is not None:
+                self._deduplicated += 1
+                return False, future
+            future = self._in_flight[key] = concurrent.futures.Future()
+            return True, future
+
+    def _finish(self, key: ty.Hashable) -> None:
+        with self._lock:
+            del self._in_flight[key]
+
+    def dedupe(self, key: ty.Hashable, fn: ty.Callable[[], R]) -> R:
+        """Calls fn, unless a call with the same key is already in flight, in which case
+        this waits for that one and returns (or raises) whatever it does.
+        """
+        leader, future = self._lead_or_follow(key)
+        if not leader:
+            logger.debug("Waiting for identical request already in flight: %s", key)
+            return future.result()
+        try:
+            result = fn()
+            future.set_result(result)
+            return result
+        except BaseException as exc:
+            future.set_exception(exc)
+            raise
+        finally:
+            self._finish(key)
+
+    async def adedupe(self, key: ty.Hashable, fn: ty.Callable[[], ty.Awaitable[R]]) -> R:
+        """`dedupe`, for coroutines. Don't share keys with synchronous callers, which could
+        otherwise end up blocking the event loop that their leader needs to run on."""
+        leader, future = self._lead_or_follow(key)
+        if not leader:
+            logger.debug("Waiting for identical request already in flight: %s", key)
+            return await asyncio.wrap_future(future)
+        try:
+            result = await fn()
+            future.set_result(result)
+            return result
+        except BaseException as exc:
+            future.set_exception(exc)
+            raise
+        finally:
+            self._finish(key)
+
+    def metrics(self) -> Metrics:
+        with self._lock:
+            now = time.monotonic()
+            while self._recent and self._recent[0][0] < now - _THROUGHPUT_WINDOW_S:
+                self._recent.popleft()
+            recent_bytes = sum(size for _, size in self._recent)
+            return Metrics(
+                queued=self._queued,
+                queued_bytes=self._queued_bytes,
+                active=self._active,
+                active_connections=self._connections_in_use,
+                completed=self._completed,
+                failed=self._failed,
+                deduplicated=self._deduplicated,
+                bytes_transferred=self._bytes_transferred,
+                bytes_per_second=recent_bytes / _THROUGHPUT_WINDOW_S,
+            )
+
+
+def _make_global_scheduler() -> Scheduler:
+    return Scheduler(MAX_CONNECTIONS(), MAX_BYTES_PER_SECOND())
+
+
+global_scheduler = _fork_protector.fork_safe_cached(cache.locking, _make_global_scheduler)
+# the budget is read from config once, the first time this is called in a process.
+
+
+def metrics() -> Metrics:
+    return global_scheduler().metrics()
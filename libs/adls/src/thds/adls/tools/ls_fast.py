@@ -1,15 +1,26 @@
 import argparse
 
-from thds.adls import list_fast, uri
+from thds.adls import list_cache, list_fast, uri
 
 
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument("uri", type=uri.parse_any, help="A fully qualified path to an ADLS location")
     parser.add_argument("--verbose", "-v", action="store_true")
+    parser.add_argument(
+        "--cached",
+        action="store_true",
+        help="Use (and incrementally refresh) the persistent listing cache for this prefix.",
+    )
+    parser.add_argument("--full", action="store_true", help="With --cached, re-list everything.")
     args = parser.parse_args()
 
-    for f in list_fast.multilayer_yield_blob_meta(args.uri):
+    blobs = (
+        list_cache.yield_blob_meta(args.uri, full=args.full)
+        if args.cached
+        else list_fast.multilayer_yield_blob_meta(args.uri)
+    )
+    for f in blobs:
         print(f.path)
         if args.verbose:
             print("      ", f.size)
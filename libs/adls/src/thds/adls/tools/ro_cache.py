@@ -0,0 +1,68 @@
+import argparse
+import datetime
+import re
+
+from thds.adls import ro_cache
+
+_UNITS = {"": 1, "K": 2**10, "M": 2**20, "G": 2**30, "T": 2**40}
+
+
+def _parse_bytes(size: str) -> int:
+    match = re.fullmatch(r"(\d+(?:\.\d+)?)\s*([KMGT]?)(?:i?B)?", size.strip(), re.IGNORECASE)
+    if not match:
+        raise argparse.ArgumentTypeError(f"Not a size: {size!r} - try e.g. 500M or 20G")
+    return int(float(match.group(1)) * _UNITS[match.group(2).upper()])
+
+
+def _gib(n_bytes: int) -> str:
+    return f"{n_bytes / 2**30:,.2f} GiB"
+
+
+def _print_usage(cache: ro_cache.Cache, usage: ro_cache.Usage) -> None:
+    oldest = (
+        datetime.datetime.fromtimestamp(usage.oldest_access).isoformat(timespec="minutes")
+        if usage.oldest_access
+        else "-"
+    )
+    budget = ro_cache.MAX_BYTES()
+    print(f"{cache.root}: {usage.n_files:,} files, {_gib(usage.total_bytes)}")
+    print(f"  least recently used: {oldest}")
+    print(f"  budget: {_gib(budget) if budget else 'unbounded'}")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Report on or garbage-collect the global ADLS read-only cache."
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("usage", help="Scan the cache and report its size.")
+    gc = subparsers.add_parser(
+        "gc",
+        help="Evict least recently used files until the cache fits in a budget."
+        " Files in use, or hard linked elsewhere, are never evicted.",
+    )
+    gc.add_argument(
+        "--max-bytes",
+        type=_parse_bytes,
+        default=None,
+        help="e.g. 50G. Defaults to the configured budget.",
+    )
+    gc.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+
+    cache = ro_cache.global_cache()
+    usage = ro_cache.scan(cache)
+    _print_usage(cache, usage)
+    if args.command == "gc":
+        max_bytes = ro_cache.MAX_BYTES() if args.max_bytes is None else args.max_bytes
+        if not max_bytes and args.max_bytes is None:
+            parser.error("No budget is configured; pass --max-bytes")
+        evicted = ro_cache.evict(cache, max_bytes, dry_run=args.dry_run)
+        verb = "Would evict" if args.dry_run else "Evicted"
+        print(f"{verb} {evicted.n_files:,} files, {_gib(evicted.n_bytes)}")
+        if not args.dry_run:
+            _print_usage(cache, ro_cache.usage(cache))
+
+
+if __name__ == "__main__":
+    main()
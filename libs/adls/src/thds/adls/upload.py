@@ -4,6 +4,7 @@ We hash anything that we possibly can, since it's a fast verification step that
 can do later during downloads.
 """
 
+import contextlib
 import subprocess
 import typing as ty
 from pathlib import Path
@@ -13,9 +14,9 @@ from azure.storage.blob import ContentSettings
 
 from thds.core import files, fretry, link, log, scope, source, tmp
 
-from . import azcopy, hashes
+from . import _staged_upload, azcopy, hashes, ro_cache
 from ._progress import report_upload_progress
-from ._upload import UploadSrc, upload_decision_and_metadata, upload_src_len
+from ._upload import UploadSrc, metadata_for_upload, upload_decision_and_metadata, upload_src_len
 from .conf import UPLOAD_FILE_MAX_CONCURRENCY
 from .file_lock import file_lock
 from .fqn import AdlsFqn
@@ -92,11 +93,13 @@ def upload(
     Can write through a local cache, which may save you a download later.
 
     content_type, cache_control, and all upload_data_kwargs will be ignored if the file
-    has already been uploaded and the hash matches.
+    has already been uploaded and the hash matches. A large file uploaded in staged blocks
+    ignores those upload_data_kwargs, such as max_concurrency, that only `upload_blob` takes.
     """
     dest_ = AdlsFqn.parse(dest) if isinstance(dest, str) else dest
     if write_through_cache:
-        _write_through_local_cache(write_through_cache.path(dest_), src)
+        if cache_path := _write_through_local_cache(write_through_cache.path(dest_), src):
+            ro_cache.record_access(write_through_cache, cache_path, added=True)
         # we always use the original source file to upload, not the cached path,
         # because uploading from a shared location risks race conditions.
 
@@ -104,8 +107,11 @@ def upload(
 
     blob_container_client = get_global_blob_container_client(dest_.sa, dest_.container)
     blob_client = blob_container_client.get_blob_client(dest_.path)
-    decision = upload_decision_and_metadata(blob_client.get_blob_properties, src)  # type: ignore [arg-type]
     n_bytes = upload_src_len(src, default=0)
+    staged = _staged_upload.should_stage(src, n_bytes) and not azcopy.upload.should_use_azcopy(n_bytes)
+    decision = upload_decision_and_metadata(
+        blob_client.get_blob_properties, src, defer_hash=staged  # type: ignore [arg-type]
+    )
 
     def source_from_meta() -> source.Source:
         best_hash = next(iter(hashes.extract_hashes_from_metadata(decision.metadata)), None)
@@ -155,6 +161,19 @@ def upload(
         if cache_control:
             upload_content_settings.cache_control = cache_control
 
+        if staged:
+            assert isinstance(src, Path)
+            local_hash = _staged_upload.upload(
+                blob_client,
+                dest_,
+                src,
+                metadata=decision.metadata,
+                content_settings=upload_content_settings,
+                **_staged_upload.commit_kwargs(upload_data_kwargs),
+            )
+            decision.metadata.update(hashes.metadata_hash_dict(local_hash))
+            return source_from_meta()
+
         # we are now using blob_client instead of file system client
         # because blob client (as of 2024-06-24) does actually do
         # some one-step, atomic uploads, wherein there is not a separate
@@ -175,3 +194,37 @@ def upload(
         )
 
     return source_from_meta()
+
+
+@contextlib.contextmanager
+def upload_stream(
+    dest: ty.Union[AdlsFqn, str],
+    *,
+    content_type: str = "",
+    metadata: ty.Optional[ty.Mapping[str, str]] = None,
+) -> ty.Iterator[ty.IO[bytes]]:
+    """Uploads whatever is written to the yielded stream, as it is written - for data too
+    large to hold in memory before uploading it, that isn't already in a file.
+
+    The blob is written (overwritten) only if the context exits without an exception, and
+    with the same hash metadata as `upload`, calculated along the way. There is no check for
+    an identical remote, since the data isn't known until it has all been uploaded.
+
+    Like `upload`, this holds the destination's upload lock throughout.
+    """
+    dest_ = AdlsFqn.parse(dest) if isinstance(dest, str) else dest
+    content_settings = ContentSettings()
+    if content_type:
+        content_settings.content_type = content_type
+    with file_lock(str(dest_), locktype="upload"):
+        writer = _staged_upload.BlockWriter(
+            get_global_blob_container_client(dest_.sa, dest_.container).get_blob_client(dest_.path),
+            metadata=dict(metadata_for_upload(), **(metadata or {})),
+            content_settings=content_settings,
+        )
+        try:
+            yield ty.cast(ty.IO[bytes], writer)
+        except BaseException:
+            writer.abort()
+            raise
+        writer.commit()
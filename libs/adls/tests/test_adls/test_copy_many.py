@@ -0,0 +1,244 @@
+import posixpath
+import threading
+import typing as ty
+import uuid
+
+import pytest
+from azure.core.exceptions import ResourceNotFoundError
+from azure.storage.blob import BlobProperties
+
+from thds.adls import AdlsFqn, conf, copy, file_properties, hashes
+from thds.core import hashing
+
+
+def _fqn(path: str) -> AdlsFqn:
+    return AdlsFqn("account", "cont", path)
+
+
+def _props(path: str, hash_bytes: ty.Optional[bytes] = None) -> BlobProperties:
+    props = BlobProperties(name=path, **{"Content-Length": 10})
+    props.metadata = (
+        hashes.metadata_hash_dict(hashing.Hash("xxh3_128", hash_bytes)) if hash_bytes else {}
+    )
+    return props
+
+
+class _FakeAccount:
+    """Copies finish after `polls_to_finish` polls, with `final_status`."""
+
+    def __init__(self, blobs: ty.Iterable[BlobProperties]):
+        self.blobs = {props.name: props for props in blobs}
+        self.polls_to_finish: ty.Dict[str, int] = dict()
+        self.final_status: ty.Dict[str, str] = dict()
+        self.poll_batches: ty.List[int] = list()
+        self.most_pending = 0
+        self.listings = 0
+        self._lock = threading.Lock()
+
+    def _pending(self) -> int:
+        return sum(1 for props in self.blobs.values() if props.copy.status == "pending")
+
+    def _read(self, path: str) -> ty.Optional[BlobProperties]:
+        props = self.blobs.get(path)
+        if props and props.copy.status == "pending":
+            self.polls_to_finish[path] -= 1
+            if not self.polls_to_finish[path]:
+                props.copy.status = self.final_status.get(path, "success")
+        return props
+
+    def properties_many(self, fqns: ty.Iterable[AdlsFqn]) -> file_properties.ManyProperties:
+        fqns = list(fqns)
+        with self._lock:
+            if all(self.blobs.get(fqn.path, _props("")).copy.status == "pending" for fqn in fqns):
+                self.poll_batches.append(len(fqns))
+            return file_properties.ManyProperties({fqn: self._read(fqn.path) for fqn in fqns}, {})
+
+    def head(self, fqn: AdlsFqn) -> BlobProperties:
+        with self._lock:
+            props = self._read(fqn.path)
+        if not props:
+            raise ResourceNotFoundError(fqn.path)
+        return props
+
+    def walk_blobs(
+        self, name_starts_with: str, include: ty.List[str], delimiter: str
+    ) -> ty.Iterator[BlobProperties]:
+        """Like the service, lists copy properties only if asked to."""
+        parent = posixpath.dirname(name_starts_with)
+        listed = list()
+        with self._lock:
+            self.listings += 1
+            for name in sorted(self.blobs):
+                if posixpath.dirname(name) != parent or not name.startswith(name_starts_with):
+                    continue
+                props = self._read(name)
+                if props:
+                    listing = _props(name)
+                    listing.metadata = dict(props.metadata) if "metadata" in include else {}
+                    if "copy" in include:
+                        listing.copy.id, listing.copy.status = props.copy.id, props.copy.status
+                    listed.append(listing)
+        return iter(listed)
+
+    def start_copy(self, url: str, dest: str, immediately: bool) -> ty.Dict[str, str]:
+        src = url.split("/")[-1].split("?")[0]
+        props = _props(dest)
+        props.metadata = dict(self.blobs[src].metadata)
+        props.copy.id = uuid.uuid4().hex
+        props.copy.status = "success" if immediately else "pending"
+        with self._lock:
+            self.blobs[dest] = props
+            self.polls_to_finish.setdefault(dest, 2)
+            self.most_pending = max(self.most_pending, self._pending())
+        return dict(copy_id=props.copy.id, copy_status=props.copy.status)
+
+
+class _FakeBlobClient(ty.NamedTuple):
+    account: _FakeAccount
+    path: str
+
+    @property
+    def url(self) -> str:
+        return f"https://account.blob.core.windows.net/cont/{self.path}"
+
+    def start_copy_from_url(self, url: str) -> ty.Dict[str, str]:
+        return self.account.start_copy(url, self.path, immediately=self.path.startswith("small"))
+
+
+class _FakeContainerClient(ty.NamedTuple):
+    account: _FakeAccount
+
+    def get_blob_client(self, path: str) -> _FakeBlobClient:
+        return _FakeBlobClient(self.account, path)
+
+    def walk_blobs(self, **kwargs: ty.Any) -> ty.Iterator[BlobProperties]:
+        return self.account.walk_blobs(**kwargs)
+
+
+@pytest.fixture
+def account(monkeypatch) -> ty.Iterator[_FakeAccount]:
+    acct = _FakeAccount([_props(f"src{i}", b"%016d" % i) for i in range(50)])
+    monkeypatch.setattr(copy, "properties_many", acct.properties_many)
+    monkeypatch.setattr(
+        copy, "get_global_blob_container_client", lambda sa, c: _FakeContainerClient(acct)
+    )
+    monkeypatch.setattr(copy, "get_global_blob_service_client", lambda sa: None)
+    monkeypatch.setattr(copy, "gen_blob_sas_token", lambda *args, **kwargs: "sas")
+    with conf.COPY_MANY_POLL_INTERVAL_S.set_local(0.01):
+        yield acct
+
+
+def _copy_many(
+    pairs: ty.Iterable[ty.Tuple[str, str]], **kwargs: ty.Any
+) -> ty.Dict[str, copy.CopyResult]:
+    results = copy.copy_many(
+        [(_fqn(src), _fqn(dest)) for src, dest in pairs], get_account_key=lambda _: "key", **kwargs
+    )
+    return {result.dest.path: result for result in results}
+
+
+def test_copies_are_skipped_copied_or_failed(account: _FakeAccount):
+    account.blobs["same"] = _props("same", b"%016d" % 0)
+    account.blobs["different"] = _props("different", b"x" * 16)
+    account.blobs["unhashed"] = _props("unhashed")
+
+    results = _copy_many(
+        [
+            ("src0", "same"),
+            ("src1", "different"),
+            ("src2", "unhashed"),
+            ("nope", "dest-of-nope"),
+            ("src3", "dest3"),
+            ("src4", "small4"),
+        ]
+    )
+
+    assert {dest: r.status for dest, r in results.items()} == {
+        "same": "skipped",
+        "different": "failed",  # overwrite_method="error"
+        "unhashed": "failed",  # no hash in common, so not known to be the same.
+        "dest-of-nope": "failed",
+        "dest3": "copied",
+        "small4": "copied",
+    }
+    assert isinstance(results["different"].error, ValueError)
+    assert account.blobs["dest3"].metadata == account.blobs["src3"].metadata
+
+
+def test_overwrite_methods(account: _FakeAccount):
+    account.blobs["skip-me"] = _props("skip-me", b"x" * 16)
+    account.blobs["overwrite-me"] = _props("overwrite-me", b"x" * 16)
+    skipped = _copy_many([("src1", "skip-me")], overwrite_method="skip")
+    overwritten = _copy_many([("src1", "overwrite-me")], overwrite_method="silent")
+    assert skipped["skip-me"].status == "skipped"
+    assert overwritten["overwrite-me"].status == "copied"
+
+
+def test_pending_copies_are_bounded_and_polled_together(account: _FakeAccount):
+    with conf.COPY_MANY_MAX_IN_FLIGHT.set_local(10):
+        results = _copy_many((f"src{i}", f"dest{i}") for i in range(50))
+
+    assert len(results) == 50
+    assert all(r.status == "copied" for r in results.values())
+    assert account.most_pending <= 10
+    assert max(account.poll_batches) > 1
+    assert len(account.poll_batches) < 50
+
+
+def test_failed_and_timed_out_copies(account: _FakeAccount):
+    account.polls_to_finish["forever"] = -1
+    account.final_status["aborted"] = "aborted"
+    results = _copy_many([("src1", "forever"), ("src2", "aborted"), ("src3", "fine")], timeout=1)
+
+    assert isinstance(results["forever"].error, TimeoutError)
+    assert isinstance(results["aborted"].error, ValueError)
+    assert results["fine"].status == "copied"
+
+
+def test_results_are_yielded_as_they_complete(account: _FakeAccount):
+    account.polls_to_finish["slow"] = 20
+    results = copy.copy_many(
+        [(_fqn("src1"), _fqn("slow")), (_fqn("src2"), _fqn("small2")), (_fqn("src3"), _fqn("fast"))],
+        get_account_key=lambda _: "key",
+    )
+    assert [r.dest.path for r in results] == ["small2", "fast", "slow"]
+
+
+def test_more_than_one_copy_to_a_destination_is_an_error(account: _FakeAccount):
+    with pytest.raises(ValueError):
+        _copy_many([("src1", "dest"), ("src2", "dest")])
+
+
+def test_errors_while_polling_fail_copies_rather_than_hang(account: _FakeAccount, monkeypatch):
+    def _odd_properties(dest, pending, props):
+        if dest.path == "odd":
+            raise KeyError("copy_status")
+        return real_polled_result(dest, pending, props)
+
+    real_polled_result = copy._polled_result
+    monkeypatch.setattr(copy, "_polled_result", _odd_properties)
+    results = _copy_many([("src1", "odd"), ("src2", "fine")])
+    assert isinstance(results["odd"].error, KeyError)
+    assert results["fine"].status == "copied"
+
+    def _broken(self):
+        if self.pending:
+            raise RuntimeError("anything else unexpected in the poller")
+
+    monkeypatch.setattr(copy._ConcurrentCopies, "_poll_once", _broken)
+    results = _copy_many([("src3", "dest3"), ("src4", "small4")])
+    assert isinstance(results["dest3"].error, RuntimeError)
+    assert results["small4"].status == "copied"  # never pending.
+
+
+def test_copies_into_a_directory_are_polled_by_listing_it(account: _FakeAccount, monkeypatch):
+    # the real properties_many, which lists directories with enough paths in them.
+    monkeypatch.setattr(copy, "properties_many", file_properties.properties_many)
+    monkeypatch.setattr(file_properties, "get_blob_properties", account.head)
+    monkeypatch.setattr(
+        file_properties, "get_global_blob_container_client", lambda sa, c: _FakeContainerClient(account)
+    )
+    results = _copy_many((f"src{i}", f"dataset/part{i}") for i in range(20))
+
+    assert {r.status for r in results.values()} == {"copied"}
+    assert account.listings > 2  # the sources, the destinations, and their polls.
@@ -0,0 +1,172 @@
+import asyncio
+import datetime
+import typing as ty
+from pathlib import Path
+
+import pytest
+from azure.storage.filedatalake import FileProperties, PathProperties
+
+from thds.adls import impl
+from thds.adls._fetch_pipeline import FetchCounters
+from thds.adls.errors import NotADirectoryError
+
+_LONG_AGO = datetime.datetime(2020, 1, 1, tzinfo=datetime.timezone.utc)
+
+
+class _FakeFileClient(ty.NamedTuple):
+    fs: "_FakeFileSystemClient"
+    path: str
+
+    async def __aenter__(self) -> "_FakeFileClient":
+        return self
+
+    async def __aexit__(self, *_exc: ty.Any) -> None:
+        pass
+
+    async def get_file_properties(self) -> FileProperties:
+        self.fs.heads += 1
+        fp = FileProperties(name=self.path)
+        fp.last_modified = _LONG_AGO
+        fp.size = len(self.fs.files[self.path])
+        return fp
+
+
+class _FakeFileSystemClient:
+    def __init__(self, files: ty.Dict[str, bytes]):
+        self.files = files
+        self.listed = 0
+        self.heads = 0
+
+    async def get_paths(self, path: str, recursive: bool = True) -> ty.AsyncIterator[PathProperties]:
+        for name, data in self.files.items():
+            if name.startswith(path) or name == path.rstrip("/"):
+                self.listed += 1
+                # naive, as the SDK parses a listing's times.
+                last_modified = _LONG_AGO.replace(tzinfo=None)
+                yield PathProperties(name=name, last_modified=last_modified, content_length=len(data))
+
+    def get_file_client(self, path: str) -> _FakeFileClient:
+        return _FakeFileClient(self, path)
+
+
+class _Downloads:
+    def __init__(self, fs_client: _FakeFileSystemClient):
+        self.fs_client = fs_client
+        self.paths: ty.List[str] = list()
+        self.in_flight = 0
+        self.most_in_flight = 0
+        self.most_listed_ahead = 0
+        self.fail: ty.Optional[str] = None
+
+    async def __call__(self, _client: ty.Any, remote_path: str, local_path: Path, **_kw: ty.Any) -> None:
+        self.in_flight += 1
+        self.most_in_flight = max(self.most_in_flight, self.in_flight)
+        self.most_listed_ahead = max(self.most_listed_ahead, self.fs_client.listed - len(self.paths))
+        try:
+            await asyncio.sleep(0.001 * (hash(remote_path) % 5))
+            if remote_path == self.fail:
+                raise ValueError(remote_path)
+            local_path.write_bytes(self.fs_client.files[remote_path])
+            self.paths.append(remote_path)
+        finally:
+            self.in_flight -= 1
+
+
+@pytest.fixture
+def fs_client() -> _FakeFileSystemClient:
+    return _FakeFileSystemClient({f"dir/sub{i % 3}/file{i}": b"%d" % i for i in range(200)})
+
+
+@pytest.fixture
+def downloads(monkeypatch, fs_client: _FakeFileSystemClient) -> _Downloads:
+    downloads = _Downloads(fs_client)
+    monkeypatch.setattr(impl, "async_download_or_use_verified", downloads)
+    monkeypatch.setattr(impl, "global_cache", lambda: None)
+    monkeypatch.setattr(impl.ADLSFileSystem, "exists", lambda self: True)
+    return downloads
+
+
+def _fetch_directory(fs: impl.ADLSFileSystem, client: ty.Any, *args: ty.Any, **kwargs: ty.Any):
+    return asyncio.run(fs._fetch_directory(client, *args, **kwargs))
+
+
+def _fetch_files(fs: impl.ADLSFileSystem, client: ty.Any, *args: ty.Any, **kwargs: ty.Any):
+    return asyncio.run(fs._fetch_files(client, *args, **kwargs))
+
+
+def test_fetch_directory_is_bounded_by_the_window_and_keeps_order(
+    tmp_path: Path, fs_client: _FakeFileSystemClient, downloads: _Downloads
+):
+    fs = impl.ADLSFileSystem("sa", "cont")
+    counters = FetchCounters()
+    paths = _fetch_directory(fs, fs_client, "dir", tmp_path / "out", batch_size=8, counters=counters)
+
+    assert paths == [tmp_path / "out" / name[len("dir/") :] for name in fs_client.files]
+    assert all(
+        p.read_bytes() == fs_client.files[f"dir/{p.relative_to(tmp_path / 'out').as_posix()}"]
+        for p in paths
+    )
+    assert downloads.most_in_flight == 8
+    # the listing can only be as far ahead as the queues and workers between it and the downloads.
+    assert downloads.most_listed_ahead <= 8 * 5
+    assert counters.list.passed == counters.download.passed == counters.output.received == 200
+    assert counters.download.max_in_flight == 8
+    assert counters.check.max_queued <= 8
+
+
+def test_the_listing_checks_the_cache_without_more_requests(
+    tmp_path: Path, fs_client: _FakeFileSystemClient, downloads: _Downloads
+):
+    fs = impl.ADLSFileSystem("sa", "cont", cache_dir=tmp_path / "cache")
+    _fetch_directory(fs, fs_client, "dir", tmp_path / "first")
+    assert len(downloads.paths) == 200
+
+    counters = FetchCounters()
+    paths = _fetch_directory(fs, fs_client, "dir", tmp_path / "second", counters=counters)
+    assert len(downloads.paths) == 200  # none again
+    assert fs_client.heads == 0
+    assert counters.check.skipped == 200
+    assert paths[0].read_bytes() == fs_client.files["dir/sub0/file0"]
+
+
+def test_fetch_files_checks_the_cache_per_file(
+    tmp_path: Path, fs_client: _FakeFileSystemClient, downloads: _Downloads
+):
+    fs = impl.ADLSFileSystem("sa", "cont", cache_dir=tmp_path / "cache")
+    names = ["dir/sub1/file4", "dir/sub0/file3"]
+    first = _fetch_files(fs, fs_client, names)
+    second = _fetch_files(fs, fs_client, {name: tmp_path / name for name in names})
+
+    assert first == [fs.cache.cache_path(name) for name in names]  # type: ignore[union-attr]
+    assert second == [tmp_path / name for name in names]
+    assert sorted(downloads.paths) == sorted(names)
+    assert fs_client.heads == 4
+
+
+def test_path_filter_and_failures(
+    tmp_path: Path, fs_client: _FakeFileSystemClient, downloads: _Downloads
+):
+    fs = impl.ADLSFileSystem("sa", "cont")
+    counters = FetchCounters()
+    paths = _fetch_directory(
+        fs,
+        fs_client,
+        "dir/sub1",
+        tmp_path / "sub1",
+        path_filter=lambda p: p.name.endswith("0"),
+        counters=counters,
+    )
+    assert len(paths) == counters.list.passed == 7  # 10, 40, ... 190
+    assert counters.list.skipped == counters.list.received - 7
+
+    downloads.fail = "dir/sub2/file50"
+    with pytest.raises(ValueError):
+        _fetch_directory(fs, fs_client, "dir", tmp_path / "failing", batch_size=4)
+
+
+def test_a_file_is_not_a_directory(
+    tmp_path: Path, fs_client: _FakeFileSystemClient, downloads: _Downloads
+):
+    fs = impl.ADLSFileSystem("sa", "cont")
+    with pytest.raises(NotADirectoryError):
+        _fetch_directory(fs, fs_client, "dir/sub0/file0", tmp_path / "nope")
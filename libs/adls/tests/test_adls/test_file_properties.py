@@ -0,0 +1,122 @@
+import threading
+import typing as ty
+
+import pytest
+from azure.core.exceptions import ResourceNotFoundError
+from azure.storage.blob import BlobProperties
+
+from thds.adls import AdlsFqn, conf, file_properties
+
+
+class _Prefix(ty.NamedTuple):
+    name: str
+
+
+class _FakeContainerClient:
+    def __init__(self, names: ty.Iterable[str]):
+        self.blobs = {name: BlobProperties(name=name, **{"Content-Length": len(name)}) for name in names}
+        self.walked: ty.List[str] = list()
+        self.items_walked = 0
+        self.heads: ty.List[str] = list()
+        self._lock = threading.Lock()
+
+    def walk_blobs(self, name_starts_with: str, **_kw: ty.Any) -> ty.Iterator[ty.Any]:
+        self.walked.append(name_starts_with)
+        items: ty.Dict[str, ty.Any] = dict()
+        for name, props in self.blobs.items():
+            if name.startswith(name_starts_with):
+                rest = name[len(name_starts_with) :]
+                if "/" in rest:
+                    prefix = name_starts_with + rest.split("/")[0] + "/"
+                    items[prefix] = _Prefix(prefix)
+                else:
+                    items[name] = props
+        for name in sorted(items):
+            with self._lock:
+                self.items_walked += 1
+            yield items[name]
+
+    def get_blob_client(self, name: str) -> "_FakeContainerClient._Blob":
+        return _FakeContainerClient._Blob(self, name)
+
+    class _Blob(ty.NamedTuple):
+        container: "_FakeContainerClient"
+        name: str
+
+        def get_blob_properties(self) -> BlobProperties:
+            with self.container._lock:
+                self.container.heads.append(self.name)
+            if self.name not in self.container.blobs:
+                raise ResourceNotFoundError("nope")
+            return self.container.blobs[self.name]
+
+
+@pytest.fixture
+def container(monkeypatch) -> _FakeContainerClient:
+    files = [f"memo/{i:04}/result" for i in range(30)]
+    files += [f"dense/f{i:03}" for i in range(500)] + ["dense/sub/x"]
+    files += ["sparse/a", "sparse/b", "other/deep/z"]
+    client = _FakeContainerClient(files)
+    monkeypatch.setattr(file_properties, "get_global_blob_container_client", lambda sa, c: client)
+    return client
+
+
+def _fqn(path: str) -> AdlsFqn:
+    return AdlsFqn("account", "cont", path)
+
+
+def test_dense_directories_are_listed_and_sparse_ones_headed(container: _FakeContainerClient):
+    dense = [_fqn(f"dense/f{i:03}") for i in range(100, 120)] + [_fqn("dense/f999")]
+    sparse = [_fqn("sparse/a"), _fqn("sparse/nope")]
+    with conf.PROPERTIES_MANY_LIST_MIN_PATHS.set_local(8):
+        result = file_properties.properties_many([*sparse, *dense])
+
+    assert list(result.properties) == [*sparse, *dense]  # in the order requested
+    assert all(result.properties[fqn] for fqn in dense[:-1])
+    assert result.properties[dense[-1]] is None
+    assert result.properties[_fqn("sparse/a")].size == len("sparse/a")  # type: ignore[union-attr]
+    assert result.properties[_fqn("sparse/nope")] is None
+
+    assert container.walked == ["dense/f"]  # narrowed to the common prefix
+    assert sorted(container.heads) == ["sparse/a", "sparse/nope"]
+    assert result.timings["list"].paths == len(dense)
+    assert result.timings["list"].requests == 1
+    assert result.timings["head"].requests == 2
+
+
+def test_listing_stops_after_the_last_wanted_name(container: _FakeContainerClient):
+    wanted = [_fqn(f"dense/f{i:03}") for i in (*range(10), 20)]
+    with conf.PROPERTIES_MANY_LIST_MIN_PATHS.set_local(8):
+        assert all(file_properties.exists_many(wanted).values())
+    assert container.walked == ["dense/f0"]
+    assert container.items_walked == 22  # f000 through f021
+    assert not container.heads
+
+
+def test_overlong_listings_fall_back_to_heads(container: _FakeContainerClient):
+    wanted = [_fqn(f"dense/f{i:03}") for i in (1, 2, 3, 4, 5, 6, 7, 480)]
+    with conf.PROPERTIES_MANY_LIST_MIN_PATHS.set_local(8):
+        with conf.PROPERTIES_MANY_LIST_MAX_ITEMS_PER_PATH.set_local(10):
+            result = file_properties.properties_many(wanted)
+
+    assert all(result.properties.values())
+    assert container.heads == ["dense/f480"]
+    assert result.timings["list"].paths == 7
+
+
+def test_paths_in_the_container_root(container: _FakeContainerClient):
+    wanted = [_fqn("memo"), _fqn("other"), _fqn("sparse/")]
+    with conf.PROPERTIES_MANY_LIST_MIN_PATHS.set_local(2):
+        exists = file_properties.exists_many(wanted)
+
+    assert container.walked == [""]
+    # on an account without HNS, directories aren't blobs, whether listed or HEADed.
+    assert not any(exists.values())
+
+
+def test_listing_can_be_disabled(container: _FakeContainerClient):
+    wanted = [_fqn(f"dense/f{i:03}") for i in range(20)]
+    with conf.PROPERTIES_MANY_LIST_MIN_PATHS.set_local(0):
+        result = file_properties.properties_many(wanted)
+    assert not container.walked
+    assert set(result.timings) == {"head"}
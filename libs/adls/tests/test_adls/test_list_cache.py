@@ -0,0 +1,220 @@
+import asyncio
+import posixpath
+import typing as ty
+from pathlib import Path
+
+import pytest
+from azure.storage.blob import BlobProperties
+
+from thds.adls import list_cache
+from thds.adls.blob_meta import BlobMeta
+from thds.adls.list_cache import Listed, ListingCache
+
+
+class _FakeTree:
+    """An HNS-like namespace: directories carry a last_modified that changes when a
+    direct child is added or removed."""
+
+    def __init__(self, files: ty.Iterable[str], virtual_dirs: bool = False):
+        self.files: ty.Dict[str, int] = dict()
+        self.dirs: ty.Dict[str, float] = dict()
+        self.virtual_dirs = virtual_dirs
+        self.clock = 1000.0
+        self.listed: ty.List[str] = list()
+        self.fail_on: ty.Set[str] = set()
+        for path in files:
+            self.add(path)
+
+    def _touch_parents(self, path: str) -> None:
+        self.clock += 1
+        parent = posixpath.dirname(path)
+        while parent:
+            if parent not in self.dirs:
+                self.dirs[parent] = self.clock
+                self._touch_parents(parent)
+            parent = posixpath.dirname(parent)
+        if posixpath.dirname(path):
+            self.dirs[posixpath.dirname(path)] = self.clock
+
+    def add(self, path: str, size: int = 10) -> None:
+        self.files[path] = size
+        self._touch_parents(path)
+
+    def remove_dir(self, dir_path: str) -> None:
+        for path in [p for p in self.files if p.startswith(dir_path + "/")]:
+            del self.files[path]
+        for path in [p for p in self.dirs if p == dir_path or p.startswith(dir_path + "/")]:
+            del self.dirs[path]
+        self._touch_parents(dir_path)
+
+    async def list_children(self, dir_path: str) -> ty.List[Listed]:
+        await asyncio.sleep(0)
+        self.listed.append(dir_path)
+        if dir_path in self.fail_on:
+            raise ConnectionError(dir_path)
+        children = [
+            Listed(path, False, 1.0, "0x8DC1234567890AB", BlobMeta(path, size, None, {}))
+            for path, size in self.files.items()
+            if posixpath.dirname(path) == dir_path
+        ]
+        for path, last_modified in self.dirs.items():
+            if posixpath.dirname(path) == dir_path:
+                if self.virtual_dirs:
+                    children.append(Listed(path, True, None, "", None))
+                else:
+                    meta = BlobMeta(path, 0, None, {"hdi_isfolder": "true"})
+                    children.append(Listed(path, True, last_modified, "0x8DC1234567890AB", meta))
+        return children
+
+
+_FILES = [
+    "root/a/1.txt",
+    "root/a/2.txt",
+    "root/b/1.txt",
+    "root/c/x/1.txt",
+    "root/c/y/p/1.txt",
+    "root/0.txt",
+]
+
+
+@pytest.fixture
+def cache(tmp_path: Path) -> ListingCache:
+    return ListingCache("adls://account/cont/root/", db_path=tmp_path / "listing.sqlite3")
+
+
+def _refresh(cache: ListingCache, tree: _FakeTree, **kwargs) -> list_cache.RefreshStats:
+    tree.listed.clear()
+    return asyncio.run(cache.arefresh(tree.list_children, max_age_s=0, **kwargs))
+
+
+def _files(cache: ListingCache) -> ty.Set[str]:
+    return {meta.path for meta in cache.yield_blob_meta() if meta.metadata.get("hdi_isfolder") != "true"}
+
+
+def test_first_refresh_lists_everything(cache: ListingCache):
+    tree = _FakeTree(_FILES)
+    stats = _refresh(cache, tree)
+
+    assert _files(cache) == set(_FILES)
+    assert set(tree.listed) == {"root", *tree.dirs}
+    assert stats.dirs_listed == len(tree.dirs)  # including the root
+    dirs = {meta.path for meta in cache.yield_blob_meta()} - set(_FILES)
+    assert dirs == set(tree.dirs) - {"root"}
+
+
+def test_unchanged_tree_lists_only_the_root(cache: ListingCache):
+    tree = _FakeTree(_FILES)
+    _refresh(cache, tree)
+    stats = _refresh(cache, tree)
+
+    assert tree.listed == ["root"]
+    assert stats.dirs_skipped == 3  # a, b, and c
+    assert _files(cache) == set(_FILES)
+
+
+def test_refresh_descends_only_into_changed_directories(cache: ListingCache):
+    tree = _FakeTree(_FILES)
+    _refresh(cache, tree)
+    tree.add("root/c/z/1.txt")
+    _refresh(cache, tree)
+
+    assert sorted(tree.listed) == ["root", "root/c", "root/c/z"]
+    assert _files(cache) == {*_FILES, "root/c/z/1.txt"}
+
+
+def test_removed_directories_are_forgotten(cache: ListingCache):
+    tree = _FakeTree(_FILES)
+    _refresh(cache, tree)
+    tree.remove_dir("root/c")
+    _refresh(cache, tree)
+
+    assert _files(cache) == {f for f in _FILES if not f.startswith("root/c/")}
+    assert not [meta for meta in cache.yield_blob_meta() if meta.path.startswith("root/c")]
+
+
+def test_interrupted_refresh_is_resumed(cache: ListingCache):
+    tree = _FakeTree(_FILES)
+    _refresh(cache, tree)
+    tree.add("root/c/y/p/2.txt")
+    tree.add("root/c/new/1.txt")  # touches root/c, so we descend there
+    tree.fail_on = {"root/c/new"}
+    with pytest.raises(ConnectionError):
+        _refresh(cache, tree)
+
+    tree.fail_on = set()
+    _refresh(cache, tree)
+    # root and root/c weren't completed last time, so they are listed again,
+    # even though their last_modified is what we saw then.
+    assert {"root", "root/c", "root/c/new"} <= set(tree.listed)
+    assert "root/c/new/1.txt" in _files(cache)
+
+
+def test_full_refresh_relists_everything(cache: ListingCache):
+    tree = _FakeTree(_FILES)
+    _refresh(cache, tree)
+    tree.files["root/c/x/1.txt"] = 99  # an overwrite touches no directory
+    _refresh(cache, tree)
+    assert {m.path: m.size for m in cache.yield_blob_meta()}["root/c/x/1.txt"] == 10
+
+    _refresh(cache, tree, full=True)
+    assert set(tree.listed) == {"root", *tree.dirs}
+    assert {m.path: m.size for m in cache.yield_blob_meta()}["root/c/x/1.txt"] == 99
+
+
+def test_old_listings_are_refreshed(cache: ListingCache):
+    tree = _FakeTree(_FILES)
+    _refresh(cache, tree)
+    tree.listed.clear()
+    asyncio.run(cache.arefresh(tree.list_children, max_age_s=1))
+    assert tree.listed == ["root"]
+
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setattr(list_cache.time, "time", lambda: 10**12)
+        tree.listed.clear()
+        asyncio.run(cache.arefresh(tree.list_children, max_age_s=1))
+    assert set(tree.listed) == {"root", *tree.dirs}
+
+
+def test_virtual_directories_are_always_listed(cache: ListingCache):
+    tree = _FakeTree(_FILES, virtual_dirs=True)
+    _refresh(cache, tree)
+    _refresh(cache, tree)
+
+    assert set(tree.listed) == {"root", *tree.dirs}
+    assert {meta.path for meta in cache.yield_blob_meta()} == set(_FILES)
+
+
+class _Prefix(ty.NamedTuple):
+    name: str
+
+
+class _FakeContainerClient:
+    def __init__(self, items: ty.List[ty.Any]):
+        self.items = items
+        self.calls: ty.List[ty.Dict[str, ty.Any]] = list()
+
+    async def _walk(self) -> ty.AsyncIterator[ty.Any]:
+        for item in self.items:
+            yield item
+
+    def walk_blobs(self, **kwargs: ty.Any) -> ty.AsyncIterator[ty.Any]:
+        self.calls.append(kwargs)
+        return self._walk()
+
+
+def test_container_lister_prefers_directory_blobs_to_prefixes():
+    dir_blob = BlobProperties(name="root/a", metadata={"hdi_isfolder": "true"})
+    file_blob = BlobProperties(name="root/f.txt", **{"Content-Length": 3, "ETag": "0x8DC1234567890AB"})
+    client = _FakeContainerClient([dir_blob, _Prefix("root/a/"), file_blob, _Prefix("root/v/")])
+
+    listed: ty.List[Listed] = asyncio.run(
+        list_cache.container_lister(client)("root")  # type: ignore[arg-type]
+    )
+
+    assert client.calls[0]["name_starts_with"] == "root/"
+    by_path = {child.path: child for child in listed}
+    assert set(by_path) == {"root/a", "root/f.txt", "root/v"}
+    assert by_path["root/a"].is_dir and by_path["root/a"].meta
+    assert not by_path["root/f.txt"].is_dir
+    assert by_path["root/f.txt"].meta and by_path["root/f.txt"].meta.size == 3
+    assert by_path["root/v"].is_dir and by_path["root/v"].meta is None
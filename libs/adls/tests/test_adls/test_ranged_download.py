@@ -0,0 +1,190 @@
+import asyncio
+import threading
+import typing as ty
+from pathlib import Path
+
+import pytest
+import xxhash
+from azure.core.exceptions import ResourceModifiedError, ResourceNotFoundError
+from azure.storage.filedatalake import FileProperties
+
+from thds.adls import AdlsFqn, _ranged_download, conf, errors
+from thds.adls.download import _download_or_use_verified_cached_coroutine, _IoRequest
+from thds.core import hash_cache
+
+_DATA = bytes(range(256)) * 40  # 10240 bytes
+_CHUNK = 1000  # so the last range is short
+
+
+class _Downloader:
+    def __init__(self, data: bytes):
+        self.data = data
+
+    def chunks(self) -> ty.Iterator[bytes]:
+        for i in range(0, len(self.data), 300):
+            yield self.data[i : i + 300]
+
+
+class _AsyncDownloader(_Downloader):
+    async def _achunks(self) -> ty.AsyncIterator[bytes]:
+        for piece in super().chunks():
+            await asyncio.sleep(0)
+            yield piece
+
+    def chunks(self) -> ty.AsyncIterator[bytes]:  # type: ignore[override]
+        return self._achunks()
+
+
+class _FakeFileClient:
+    """Serves byte ranges of some data, optionally failing on some of them."""
+
+    url = "https://fake.dfs.core.windows.net/container/file"
+
+    def __init__(
+        self,
+        data: bytes,
+        fail_at: ty.Collection[int] = (),
+        etag: str = "0x8DC1234567890AB",
+        error: ty.Callable[[str], Exception] = ConnectionError,
+    ):
+        self.data = data
+        self.etag = etag
+        self.fail_at = set(fail_at)
+        self.error = error
+        self.requested: ty.List[int] = list()
+        self._lock = threading.Lock()
+
+    def _range(self, offset: int, length: int, etag: str, **_kw: ty.Any) -> bytes:
+        assert etag == self.etag
+        with self._lock:
+            self.requested.append(offset)
+        if offset in self.fail_at:
+            raise self.error(f"boom at {offset}")
+        return self.data[offset : offset + length]
+
+    def download_file(self, **kwargs: ty.Any) -> _Downloader:
+        return _Downloader(self._range(**kwargs))
+
+
+class _FakeAsyncFileClient(_FakeFileClient):
+    async def download_file(self, **kwargs: ty.Any) -> _AsyncDownloader:  # type: ignore[override]
+        return _AsyncDownloader(self._range(**kwargs))
+
+
+@pytest.fixture
+def small_chunks():
+    with conf.RANGED_DOWNLOAD_CHUNK_SIZE.set_local(_CHUNK):
+        with conf.RANGED_DOWNLOAD_MAX_CONCURRENCY.set_local(4):
+            yield
+
+
+def _request(tmp_path: Path, etag: str = "0x8DC1234567890AB") -> _ranged_download.RangedDownloadRequest:
+    partial = _ranged_download.partial_path(tmp_path / "file.bin")
+    return _ranged_download.RangedDownloadRequest(partial, len(_DATA), etag=etag)
+
+
+def test_ranged_download_writes_all_ranges_into_place(tmp_path: Path, small_chunks):
+    client = _FakeFileClient(_DATA)
+    request = _request(tmp_path)
+    _ranged_download.download(client, request)  # type: ignore[arg-type]
+
+    assert request.temp_path.read_bytes() == _DATA
+    assert sorted(client.requested) == list(range(0, len(_DATA), _CHUNK))
+
+
+def test_ranged_download_resumes_only_missing_ranges(tmp_path: Path, small_chunks):
+    request = _request(tmp_path)
+    failing = _FakeFileClient(_DATA, fail_at={3000, 7000})
+    with pytest.raises(ConnectionError):
+        _ranged_download.download(failing, request)  # type: ignore[arg-type]
+
+    done_before = set(failing.requested) - {3000, 7000}
+    resumed = _FakeFileClient(_DATA)
+    _ranged_download.download(resumed, request)  # type: ignore[arg-type]
+
+    assert request.temp_path.read_bytes() == _DATA
+    assert {3000, 7000} <= set(resumed.requested)
+    assert not done_before & set(resumed.requested)
+
+
+def test_ranged_download_discards_journal_for_another_version(tmp_path: Path, small_chunks):
+    stale = _request(tmp_path, etag="0x8DC0000000000AB")
+    old_version = _FakeFileClient(b"x" * len(_DATA), fail_at={5000}, etag="0x8DC0000000000AB")
+    with pytest.raises(ConnectionError):
+        _ranged_download.download(old_version, stale)  # type: ignore[arg-type]
+
+    client = _FakeFileClient(_DATA)
+    request = _request(tmp_path)
+    _ranged_download.download(client, request)  # type: ignore[arg-type]
+
+    assert request.temp_path.read_bytes() == _DATA
+    assert len(client.requested) == len(range(0, len(_DATA), _CHUNK))
+
+
+def test_ranged_download_short_range_raises(tmp_path: Path, small_chunks):
+    client = _FakeFileClient(_DATA[:-10])
+    with pytest.raises(errors.ContentLengthMismatchError):
+        _ranged_download.download(client, _request(tmp_path))  # type: ignore[arg-type]
+
+
+@pytest.mark.parametrize("error", [ResourceNotFoundError, ResourceModifiedError])
+def test_ranged_download_that_cant_be_resumed_leaves_nothing_behind(
+    tmp_path: Path, small_chunks, error: ty.Callable[[str], Exception]
+):
+    request = _request(tmp_path)
+    with pytest.raises(error):  # type: ignore[call-overload]
+        _ranged_download.download(
+            _FakeFileClient(_DATA, fail_at={5000}, error=error), request  # type: ignore[arg-type]
+        )
+    assert not list(tmp_path.iterdir())
+
+    with pytest.raises(error):  # type: ignore[call-overload]
+        asyncio.run(
+            _ranged_download.async_download(
+                _FakeAsyncFileClient(_DATA, fail_at={0}, error=error), request  # type: ignore[arg-type]
+            )
+        )
+    assert not list(tmp_path.iterdir())
+
+
+def test_async_ranged_download_resumes(tmp_path: Path, small_chunks):
+    request = _request(tmp_path)
+    failing = _FakeAsyncFileClient(_DATA, fail_at={0})
+    with pytest.raises(ConnectionError):
+        asyncio.run(_ranged_download.async_download(failing, request))  # type: ignore[arg-type]
+
+    resumed = _FakeAsyncFileClient(_DATA)
+    asyncio.run(_ranged_download.async_download(resumed, request))  # type: ignore[arg-type]
+    assert request.temp_path.read_bytes() == _DATA
+    assert 0 in resumed.requested
+
+
+def test_download_coroutine_requests_ranged_download_for_large_files(
+    tmp_path: Path, small_chunks, monkeypatch
+):
+    def _no_rereads(*args):
+        raise AssertionError("The downloaded file should not be read to hash it")
+
+    monkeypatch.setattr(hash_cache, "_compute", _no_rereads)
+    dest = tmp_path / "dest" / "file.bin"
+    props = FileProperties(
+        name="file.bin", **{"Content-Length": len(_DATA), "ETag": "0x8DC1234567890AB"}
+    )
+    with conf.RANGED_DOWNLOAD_MIN_SIZE.set_local(len(_DATA)):
+        co = _download_or_use_verified_cached_coroutine(
+            AdlsFqn.parse("adls://account/cont/file.bin"), dest
+        )
+        request = co.send(None)
+        while request == _IoRequest.FILE_PROPERTIES:
+            request = co.send(props)
+
+    assert isinstance(request, _ranged_download.RangedDownloadRequest)
+    assert request.temp_path.parent == dest.parent
+    _ranged_download.download(_FakeFileClient(_DATA), request)  # type: ignore[arg-type]
+    with pytest.raises(StopIteration):
+        co.send(None)
+
+    assert dest.read_bytes() == _DATA
+    assert sorted(p.name for p in dest.parent.iterdir()) == ["file.bin"]  # no partial or journal left
+    # hashed while downloading:
+    assert hash_cache.filehash("xxh3_128", dest).bytes == xxhash.xxh3_128(_DATA).digest()
@@ -1,6 +1,13 @@
+import os
 import random
 
+import pytest
+import xxhash
+
+from thds.adls import download, ro_cache
+from thds.adls.file_lock import FILELOCKS_DIR, file_lock
 from thds.adls.ro_cache import AdlsFqn, Cache, Path, _cache_path_for_fqn
+from thds.core import hashing
 
 
 def test_long_path_parts_are_compressed(tmp_path: Path):
@@ -79,3 +86,77 @@ def test_very_long_path(tmp_path: Path):
     path.write_text("wrote file successfully")
     # if the above succeeds, then we've successfully made the path short enough for use...
     assert path.read_text() == "wrote file successfully"
+
+
+def _put(cache: Cache, name: str, size: int, accessed: int) -> Path:
+    path = cache.path(AdlsFqn("sa", "cont", name))
+    path.write_bytes(b"x" * size)
+    ro_cache.record_access(cache, path, added=True)
+    ro_cache._conn(cache.root.resolve()).execute(  # type: ignore[union-attr]
+        "UPDATE entries SET accessed = ? WHERE path = ?", (accessed, ro_cache._relpath(cache, path))
+    )
+    return path
+
+
+@pytest.fixture
+def small_cache(tmp_path: Path):
+    with FILELOCKS_DIR.set_local(tmp_path / "locks"):
+        cache = Cache(tmp_path / "cache", ("ref", "hard"))
+        yield cache, [_put(cache, f"dir/{i}.bin", 100, accessed=1000 + i) for i in range(5)]
+
+
+def test_eviction_is_least_recently_used_first(small_cache):
+    cache, paths = small_cache
+    assert ro_cache.usage(cache) == ro_cache.Usage(5, 500, 1000)
+    assert ro_cache.evict(cache, 300, dry_run=True) == ro_cache.Evicted(2, 200)
+    assert all(p.exists() for p in paths)
+
+    assert ro_cache.evict(cache, 300) == ro_cache.Evicted(2, 200)
+    assert [p.exists() for p in paths] == [False, False, True, True, True]
+    assert ro_cache.usage(cache).total_bytes == 300
+
+
+def test_eviction_skips_locked_and_hard_linked_files(small_cache, tmp_path: Path):
+    cache, paths = small_cache
+    os.link(paths[1], tmp_path / "handed-out.bin")
+    with file_lock(str(paths[0])):
+        assert ro_cache.evict(cache, 300) == ro_cache.Evicted(2, 200)
+
+    assert [p.exists() for p in paths] == [True, True, False, False, True]
+    assert (tmp_path / "handed-out.bin").read_bytes() == b"x" * 100
+
+
+def test_adding_to_a_bounded_cache_evicts(small_cache):
+    cache, paths = small_cache
+    with ro_cache.MAX_BYTES.set_local(450):
+        newest = _put(cache, "new.bin", 100, accessed=2000)
+    assert [p.exists() for p in paths] == [False, False, True, True, True] and newest.exists()
+
+
+def test_scan_indexes_unknown_files_and_forgets_missing_ones(small_cache):
+    cache, paths = small_cache
+    paths[0].unlink()
+    unknown = cache.path(AdlsFqn("sa", "cont", "unknown.bin"))
+    unknown.write_bytes(b"y" * 50)
+
+    usage = ro_cache.scan(cache)
+    assert (usage.n_files, usage.total_bytes) == (5, 450)
+
+
+def test_a_cached_file_evicted_while_it_is_hit_is_a_miss(small_cache, tmp_path: Path, monkeypatch):
+    cache, paths = small_cache
+
+    def evicted_meanwhile(*args):
+        ro_cache.evict(cache, 0)  # nothing is locked before the first cache hit attempt.
+        return from_cache_path_to_local(*args)
+
+    from_cache_path_to_local = download.from_cache_path_to_local
+    monkeypatch.setattr(download, "from_cache_path_to_local", evicted_meanwhile)
+    co = download._download_or_use_verified_cached_coroutine(
+        AdlsFqn("sa", "cont", "dir/0.bin"),
+        tmp_path / "local.bin",
+        expected_hash=hashing.Hash("xxh3_128", xxhash.xxh3_128(b"x" * 100).digest()),
+        cache=cache,
+    )
+    assert co.send(None) == download._IoRequest.FILE_PROPERTIES  # so, downloaded instead.
+    assert not paths[0].exists()
@@ -0,0 +1,173 @@
+import asyncio
+import threading
+import time
+import typing as ty
+
+import pytest
+
+from thds.adls.scheduler import Scheduler
+
+
+def _wait_until(predicate: ty.Callable[[], bool], timeout: float = 5.0) -> None:
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.001)
+
+
+def test_transfers_share_a_connection_budget():
+    scheduler = Scheduler(max_connections=4)
+    lock = threading.Lock()
+    active: ty.List[int] = [0]
+    most: ty.List[int] = [0]
+
+    def _transfer() -> None:
+        with scheduler.transfer(10, connections=2):
+            with lock:
+                active[0] += 1
+                most[0] = max(most[0], active[0])
+            time.sleep(0.01)
+            with lock:
+                active[0] -= 1
+
+    threads = [threading.Thread(target=_transfer) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert most[0] == 2
+    metrics = scheduler.metrics()
+    assert metrics.completed == 8 and metrics.bytes_transferred == 80
+    assert metrics.queued == metrics.active == metrics.active_connections == 0
+
+
+def test_a_transfer_larger_than_the_budget_still_runs_alone():
+    scheduler = Scheduler(max_connections=2)
+    with scheduler.transfer(1, connections=100):
+        assert scheduler.metrics().active_connections == 2
+
+
+def test_waiting_transfers_go_by_priority_then_size():
+    scheduler = Scheduler(max_connections=1)
+    admitted: ty.List[str] = list()
+
+    def _transfer(name: str, size: int, priority: int) -> None:
+        with scheduler.transfer(size, priority=priority):
+            admitted.append(name)
+
+    blocker = scheduler.transfer(1)
+    blocker.__enter__()
+    waiting = [("small", 1, 0), ("big", 100, 0), ("urgent", 1, 5), ("medium", 50, 0)]
+    threads = [threading.Thread(target=_transfer, args=args) for args in waiting]
+    for t in threads:
+        t.start()
+    _wait_until(lambda: scheduler.metrics().queued == 4)
+    assert scheduler.metrics().queued_bytes == 152
+    blocker.__exit__(None, None, None)
+    for t in threads:
+        t.join()
+
+    assert admitted == ["urgent", "big", "medium", "small"]
+
+
+def test_failed_transfers_are_counted_but_not_their_bytes():
+    scheduler = Scheduler(max_connections=1)
+    with pytest.raises(ValueError):
+        with scheduler.transfer(10):
+            raise ValueError("nope")
+    metrics = scheduler.metrics()
+    assert metrics.failed == 1 and metrics.completed == 0 and metrics.bytes_transferred == 0
+    with scheduler.transfer(10):  # the connection was released
+        pass
+
+
+def test_bandwidth_budget_paces_transfer_starts():
+    scheduler = Scheduler(max_connections=10, max_bytes_per_second=1000)
+    start = time.monotonic()
+    for _ in range(3):
+        with scheduler.transfer(100):
+            pass
+    # the third may start only once the first two have had their 0.1s each.
+    assert time.monotonic() - start >= 0.19
+
+
+def test_identical_requests_in_flight_are_deduplicated():
+    scheduler = Scheduler(max_connections=1)
+    release = threading.Event()
+    calls: ty.List[int] = list()
+    results: ty.List[str] = list()
+
+    def _work() -> str:
+        calls.append(1)
+        release.wait()
+        return "done"
+
+    threads = [
+        threading.Thread(target=lambda: results.append(scheduler.dedupe("key", _work))) for _ in range(3)
+    ]
+    for t in threads:
+        t.start()
+    _wait_until(lambda: scheduler.metrics().deduplicated == 2)
+    release.set()
+    for t in threads:
+        t.join()
+
+    assert calls == [1]
+    assert results == ["done"] * 3
+    assert scheduler.dedupe("key", lambda: "again") == "again"  # not in flight anymore
+
+
+def test_deduplicated_requests_share_failures():
+    scheduler = Scheduler(max_connections=1)
+    started = threading.Event()
+    release = threading.Event()
+    errors: ty.List[Exception] = list()
+
+    def _fail() -> None:
+        started.set()
+        release.wait()
+        raise ConnectionError("boom")
+
+    def _call() -> None:
+        try:
+            scheduler.dedupe("key", _fail)
+        except ConnectionError as exc:
+            errors.append(exc)
+
+    leader = threading.Thread(target=_call)
+    leader.start()
+    started.wait()
+    follower = threading.Thread(target=_call)
+    follower.start()
+    _wait_until(lambda: scheduler.metrics().deduplicated == 1)
+    release.set()
+    leader.join()
+    follower.join()
+    assert len(errors) == 2
+
+
+def test_async_transfers_and_cancellation():
+    scheduler = Scheduler(max_connections=1)
+
+    async def _main() -> None:
+        async with scheduler.atransfer(10):
+            waiting = asyncio.ensure_future(scheduler.atransfer(20).__aenter__())
+            await asyncio.sleep(0.01)
+            assert scheduler.metrics().queued == 1
+            waiting.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await waiting
+            assert scheduler.metrics().queued == 0
+
+        async def _dl(n: int) -> int:
+            async with scheduler.atransfer(n):
+                await asyncio.sleep(0)
+                return n
+
+        assert await asyncio.gather(*(_dl(n) for n in range(5))) == list(range(5))
+        assert await scheduler.adedupe("k", lambda: _dl(7)) == 7
+
+    asyncio.run(_main())
+    metrics = scheduler.metrics()
+    assert metrics.completed == 7 and metrics.active == 0 and metrics.failed == 0
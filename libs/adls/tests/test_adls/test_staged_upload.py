@@ -0,0 +1,270 @@
+import contextlib
+import os
+import sys
+import threading
+import time
+import typing as ty
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+import xxhash
+from azure.core.exceptions import ServiceResponseError
+from azure.storage.blob import BlobBlock, BlobProperties, ContentSettings
+
+from thds.adls import AdlsFqn, _staged_upload, _upload, conf, hashes
+from thds.core import hash_cache, hashing
+
+_DATA = bytes(range(256)) * 400  # 102400 bytes
+_BLOCK = 10_000  # so the last block is short
+_DEST = AdlsFqn.parse("adls://account/cont/big.bin")
+
+
+class _FakeBlobClient:
+    def __init__(self, fail_at: ty.Collection[int] = (), fail_once_at: ty.Collection[int] = ()):
+        self.uncommitted: ty.Dict[str, bytes] = dict()
+        self.staged: ty.List[str] = list()
+        self.fail_at = set(fail_at)
+        self.fail_once_at = set(fail_once_at)  # -1 for the commit.
+        self.committed: ty.Optional[bytes] = None
+        self.metadata: ty.Dict[str, str] = dict()
+        self._lock = threading.Lock()
+
+    def stage_block(self, block_id: str, data: bytes, length: int, **_kw: ty.Any) -> None:
+        assert len(data) == length
+        if int(block_id.split("-")[1]) in self.fail_at:
+            raise ConnectionError(block_id)
+        self._fail_once(int(block_id.split("-")[1]))
+        with self._lock:
+            self.staged.append(block_id)
+            self.uncommitted[block_id] = data
+
+    def get_block_list(self, block_list_type: str) -> ty.Tuple[list, list]:
+        assert block_list_type == "uncommitted"
+        blocks = list()
+        for block_id, data in self.uncommitted.items():
+            block = BlobBlock(block_id)
+            block.size = len(data)
+            blocks.append(block)
+        return [], blocks
+
+    def _fail_once(self, offset: int) -> None:
+        with self._lock:
+            if offset in self.fail_once_at:
+                self.fail_once_at.remove(offset)
+                raise ServiceResponseError(f"transient failure at {offset}")
+
+    def commit_block_list(
+        self, blocks: ty.List[BlobBlock], content_settings: ContentSettings, metadata: ty.Dict[str, str]
+    ) -> None:
+        self._fail_once(-1)
+        self.committed = b"".join(self.uncommitted[block.id] for block in blocks)
+        self.metadata = metadata
+        self.uncommitted.clear()
+
+    def upload_blob(
+        self,
+        data: bytes,
+        overwrite: bool,
+        content_settings: ContentSettings,
+        metadata: ty.Dict[str, str],
+    ) -> None:
+        assert overwrite
+        self.committed = data
+        self.metadata = metadata
+
+
+@pytest.fixture
+def src(tmp_path: Path) -> ty.Iterator[Path]:
+    path = tmp_path / "big.bin"
+    path.write_bytes(_DATA)
+    with _staged_upload.JOURNAL_DIR.set_local(tmp_path / "journals"):
+        with conf.STAGED_UPLOAD_BLOCK_SIZE.set_local(_BLOCK):
+            with conf.UPLOAD_FILE_MAX_CONCURRENCY.set_local(3):
+                yield path
+
+
+def _upload_to(client: _FakeBlobClient, src: Path):
+    return _staged_upload.upload(
+        client, _DEST, src, metadata=_upload.metadata_for_upload(), content_settings=ContentSettings()  # type: ignore[arg-type]
+    )
+
+
+def test_staged_upload_commits_the_file_with_the_usual_hash_metadata(src: Path, monkeypatch):
+    def _no_rereads(*args):
+        raise AssertionError("The file should not be read again to hash it")
+
+    client = _FakeBlobClient()
+    local_hash = _upload_to(client, src)
+
+    assert client.committed == _DATA
+    assert local_hash == hashing.Hash("xxh3_128", xxhash.xxh3_128(_DATA).digest())
+    # the same metadata that hashing before uploading would have written:
+    assert client.metadata == _upload.upload_decision_and_metadata(lambda: None, src).metadata  # type: ignore
+    assert not list((src.parent / "journals").iterdir())
+
+    monkeypatch.setattr(hash_cache, "_compute", _no_rereads)
+    assert hash_cache.filehash("xxh3_128", src) == local_hash  # recorded while uploading
+
+
+def test_interrupted_staged_upload_resumes(src: Path):
+    failing = _FakeBlobClient(fail_at={50_000})
+    with pytest.raises(ConnectionError):
+        _upload_to(failing, src)
+    assert list((src.parent / "journals").iterdir())
+    already = set(failing.staged)
+    assert already
+
+    failing.fail_at = set()
+    failing.staged.clear()
+    _upload_to(failing, src)
+
+    assert failing.committed == _DATA
+    assert not already & set(failing.staged)
+    assert any(block_id.endswith("000000000050000") for block_id in failing.staged)
+
+
+def test_staged_upload_retries_each_request_on_transient_failures(src: Path):
+    client = _FakeBlobClient(fail_once_at={0, 20_000, -1})
+    _upload_to(client, src)
+    assert client.committed == _DATA and not client.fail_once_at
+    assert not list(_staged_upload.JOURNAL_DIR().iterdir())
+
+
+def test_blocks_the_service_no_longer_has_are_staged_again(src: Path):
+    client = _FakeBlobClient(fail_at={90_000})
+    with pytest.raises(ConnectionError):
+        _upload_to(client, src)
+    client.uncommitted.clear()  # e.g. expired, or something else was committed.
+
+    client.fail_at = set()
+    client.staged.clear()
+    _upload_to(client, src)
+    assert client.committed == _DATA
+    assert len(client.staged) == len(range(0, len(_DATA), _BLOCK))
+
+
+def test_changing_the_file_starts_over(src: Path):
+    client = _FakeBlobClient(fail_at={90_000})
+    with pytest.raises(ConnectionError):
+        _upload_to(client, src)
+
+    new_data = _DATA[::-1]
+    src.write_bytes(new_data)
+    client.fail_at = set()
+    _upload_to(client, src)
+    assert client.committed == new_data
+
+
+def test_deferred_decision_does_not_hash_when_the_remote_cannot_match(src: Path, monkeypatch):
+    def _no_hashing(*args):
+        raise AssertionError("should not hash")
+
+    monkeypatch.setattr(_upload, "_try_default_hash", _no_hashing)
+    decision = _upload.upload_decision_and_metadata(lambda: None, src, defer_hash=True)  # type: ignore
+    assert decision.upload_required
+    assert not list(hashes.extract_hashes_from_metadata(decision.metadata))
+
+    other_size = BlobProperties(name="big.bin", **{"Content-Length": 5})
+    other_size.metadata = hashes.metadata_hash_dict(hashing.Hash("xxh3_128", b"x" * 16))
+    assert _upload.upload_decision_and_metadata(lambda: other_size, src, defer_hash=True).upload_required
+
+
+def test_deferred_decision_still_skips_matching_remotes(src: Path):
+    remote = BlobProperties(name="big.bin", **{"Content-Length": len(_DATA)})
+    remote.metadata = hashes.metadata_hash_dict(
+        hashing.Hash("xxh3_128", xxhash.xxh3_128(_DATA).digest())
+    )
+    decision = _upload.upload_decision_and_metadata(
+        lambda: remote, src, min_size_for_remote_check=0, defer_hash=True
+    )
+    assert not decision.upload_required
+
+
+def _writer(client: _FakeBlobClient) -> _staged_upload.BlockWriter:
+    return _staged_upload.BlockWriter(
+        client, metadata=_upload.metadata_for_upload(), content_settings=ContentSettings()  # type: ignore[arg-type]
+    )
+
+
+def test_block_writer_stages_writes_of_any_size(src: Path):
+    client = _FakeBlobClient()
+    writer = _writer(client)
+    writer.write(_DATA[:3])
+    writer.write(memoryview(_DATA)[3:25_000])  # several blocks at once
+    for start in range(25_000, len(_DATA), 777):
+        writer.write(_DATA[start : start + 777])
+    local_hash = writer.commit()
+
+    assert client.committed == _DATA
+    assert len(client.staged) == len(range(0, len(_DATA), _BLOCK))
+    assert local_hash == hashing.Hash("xxh3_128", xxhash.xxh3_128(_DATA).digest())
+    assert client.metadata == _upload.upload_decision_and_metadata(lambda: None, src).metadata  # type: ignore
+
+
+def test_block_writer_uploads_a_single_block_in_one_request(src: Path):
+    client = _FakeBlobClient()
+    writer = _writer(client)
+    writer.write(_DATA[: _BLOCK - 1])
+    writer.commit()
+    assert client.committed == _DATA[: _BLOCK - 1] and not client.staged
+
+
+def test_block_writer_commits_nothing_after_a_failure(src: Path):
+    client = _FakeBlobClient(fail_at={20_000})
+    writer = _writer(client)
+    with pytest.raises(ConnectionError):
+        for start in range(0, len(_DATA), _BLOCK):
+            writer.write(_DATA[start : start + _BLOCK])
+        writer.commit()
+    assert client.committed is None
+
+
+def test_block_writer_retries_each_request_on_transient_failures(src: Path):
+    client = _FakeBlobClient(fail_once_at={0, 20_000, -1})
+    writer = _writer(client)
+    writer.write(_DATA)
+    writer.commit()
+    assert client.committed == _DATA and not client.fail_once_at
+
+
+def test_upload_stream_holds_the_upload_lock(src: Path, monkeypatch):
+    client = _FakeBlobClient()
+    locked: ty.List[str] = list()
+
+    @contextlib.contextmanager
+    def file_lock(lock_str: str, locktype: str) -> ty.Iterator[None]:
+        locked.append(locktype)
+        yield
+        locked.append("released")
+
+    upload = sys.modules["thds.adls.upload"]  # the module, which the function shadows.
+    monkeypatch.setattr(upload, "file_lock", file_lock)
+    monkeypatch.setattr(
+        upload,
+        "get_global_blob_container_client",
+        lambda sa, cont: SimpleNamespace(get_blob_client=lambda path: client),
+    )
+    with upload.upload_stream(_DEST) as stream:
+        stream.write(_DATA)
+        assert locked == ["upload"]
+    assert locked == ["upload", "released"] and client.committed == _DATA
+
+
+def test_journals_of_abandoned_uploads_are_removed_after_a_week(src: Path):
+    journals = _staged_upload.JOURNAL_DIR()
+    journals.mkdir(parents=True)
+    abandoned, recent = journals / "abandoned.blocks", journals / "recent.blocks"
+    abandoned.write_text("{}\n")
+    recent.write_text("{}\n")
+    week_ago = time.time() - 7 * 24 * 3600 - 60
+    os.utime(abandoned, (week_ago, week_ago))
+
+    _upload_to(_FakeBlobClient(), src)
+    assert sorted(p.name for p in journals.iterdir()) == ["recent.blocks"]
+
+
+def test_upload_blob_only_kwargs_are_not_committed():
+    assert _staged_upload.commit_kwargs(
+        dict(max_concurrency=4, overwrite=True, tags={"a": "b"})
+    ) == dict(tags={"a": "b"})
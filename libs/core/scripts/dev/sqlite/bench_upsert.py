@@ -0,0 +1,58 @@
+#!/usr/bin/env python
+"""Compares the row-by-row upsert writer with the staging-table bulk writer on many
+partial rows, with a few different keysets interleaved, against a pre-populated table.
+
+    python scripts/dev/sqlite/bench_upsert.py [n_rows]
+"""
+
+import random
+import sqlite3
+import sys
+import tempfile
+import typing as ty
+from pathlib import Path
+from timeit import default_timer
+
+from thds.core.sqlite import upsert, write
+
+_COLUMNS = ("name", "foo", "age", "height", "countdown")
+
+
+def _make_db(path: Path, n_rows: int) -> sqlite3.Connection:
+    conn = sqlite3.connect(path)
+    conn.execute(
+        "CREATE TABLE test (id INTEGER PRIMARY KEY, name TEXT NOT NULL, foo TEXT, age INTEGER,"
+        " height REAL, countdown INTEGER)"
+    )
+    write.write_mappings(conn, "test", (dict(id=i, name=str(i)) for i in range(0, n_rows, 2)))
+    conn.commit()
+    return conn
+
+
+def _partial_rows(n_rows: int):
+    rng = random.Random(42)
+    keysets = [rng.sample(_COLUMNS[1:], k) for k in (1, 2, 3)]
+    for _ in range(n_rows):
+        keyset = rng.choice(keysets)
+        row: ty.Dict[str, ty.Any] = {col: rng.randint(0, 1000) for col in keyset}
+        row["id"] = rng.randrange(n_rows)
+        row["name"] = "named"
+        yield row
+
+
+def bench(n_rows: int) -> None:
+    with tempfile.TemporaryDirectory() as tmpdir:
+        results = dict()
+        for name, upserter in (("row-by-row", upsert.mappings), ("bulk", upsert.bulk_mappings)):
+            conn = _make_db(Path(tmpdir) / f"{name}.db", n_rows)
+            start = default_timer()
+            upserter(conn, "test", _partial_rows(n_rows))
+            elapsed = default_timer() - start
+            results[name] = list(conn.execute("SELECT * FROM test ORDER BY id"))
+            print(f"{name:>12}: {n_rows:_} rows in {elapsed:.2f}s ({n_rows / elapsed:_.0f} rows/s)")
+            conn.close()
+        assert results["row-by-row"] == results["bulk"], "bulk upsert produced different results!"
+
+
+if __name__ == "__main__":
+    bench(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000)
@@ -2,7 +2,9 @@ import functools
 import inspect
 import sys
 import threading
+import time
 import typing as ty
+from collections import OrderedDict
 
 from . import protocols as proto
 
@@ -62,8 +64,15 @@ def make_bound_hashkey(func: ty.Callable) -> ty.Callable[..., HashedTuple]:
     the cache-wrapped `func`. Note that `*args`, by definition, are order dependent.
     """
     signature = inspect.signature(func)
+    params = signature.parameters.values()
+    positional_kinds = (inspect.Parameter.POSITIONAL_ONLY, inspect.Parameter.POSITIONAL_OR_KEYWORD)
+    n_positional = len(params) if all(p.kind in positional_kinds for p in params) else -1
 
     def bound_hashkey(args: tuple, kwargs: ty.Mapping) -> HashedTuple:
+        if not kwargs and len(args) == n_positional:
+            # Fast path: every parameter was passed positionally, so binding and applying
+            # defaults would produce exactly these args and no kwargs.
+            return HashedTuple(args)
         bound_arguments = signature.bind(*args, **kwargs)
         bound_arguments.apply_defaults()
         return hashkey(bound_arguments.args, bound_arguments.kwargs)
@@ -71,6 +80,192 @@ def make_bound_hashkey(func: ty.Callable) -> ty.Callable[..., HashedTuple]:
     return bound_hashkey
 
 
+_K = ty.TypeVar("_K", bound=ty.Hashable)
+_V = ty.TypeVar("_V")
+_MISSING = object()
+
+
+class BoundedCache(ty.MutableMapping[_K, _V]):
+    """A threadsafe mapping bounded by total weight, with optional per-entry expiry.
+
+    - `maxsize` bounds the sum of `getsizeof(value)` over all entries (by default every entry
+      weighs 1, so it bounds the number of entries). `None` means unbounded.
+    - `policy` chooses what to evict when over `maxsize`: the least recently used (`"lru"`)
+      or the least frequently used (`"lfu"`, ties broken by recency) entry.
+    - `ttl` is the number of seconds (according to `timer`) after being set that an entry
+      expires. Expired entries are never returned.
+    - `on_evict(key, value)` is called for every entry removed by eviction, expiry, or
+      `clear`, so callers can release resources held by cached values. It is called
+      outside of the internal lock.
+
+    Intended for use as `locking(make_cache=...)`, but usable on its own.
+    """
+
+    def __init__(
+        self,
+        maxsize: ty.Optional[int] = None,
+        *,
+        policy: ty.Literal["lru", "lfu"] = "lru",
+        ttl: ty.Optional[float] = None,
+        getsizeof: ty.Optional[ty.Callable[[_V], int]] = None,
+        on_evict: ty.Optional[ty.Callable[[_K, _V], ty.Any]] = None,
+        timer: ty.Callable[[], float] = time.monotonic,
+    ):
+        if policy not in ("lru", "lfu"):
+            raise ValueError(f"Unknown eviction policy {policy!r}; expected 'lru' or 'lfu'")
+        self.maxsize = maxsize
+        self.currsize = 0  # total weight
+        self._policy = policy
+        self._ttl = ttl
+        self._getsizeof = getsizeof
+        self._on_evict = on_evict
+        self._timer = timer
+        self._lock = threading.Lock()
+        self._data: ty.Dict[_K, ty.Tuple[_V, int]] = dict()  # value, weight
+        # recency for LRU, and for breaking LFU ties; oldest first.
+        self._recency: "OrderedDict[_K, None]" = OrderedDict()
+        # for LFU; buckets of keys by frequency, each in recency order.
+        self._freqs: ty.Dict[_K, int] = dict()
+        self._buckets: ty.Dict[int, "OrderedDict[_K, None]"] = dict()
+        # ttl is fixed, so the order in which keys were set is the order in which they expire.
+        self._expiries: "OrderedDict[_K, float]" = OrderedDict()
+
+    # all underscore methods below assume the lock is held.
+    def _touch(self, key: _K) -> None:
+        if self._policy == "lru":
+            self._recency.move_to_end(key)
+            return
+        freq = self._freqs[key]
+        self._freqs[key] = freq + 1
+        bucket = self._buckets[freq]
+        del bucket[key]
+        if not bucket:
+            del self._buckets[freq]
+        self._buckets.setdefault(freq + 1, OrderedDict())[key] = None
+
+    def _remove(self, key: _K) -> _V:
+        value, weight = self._data.pop(key)
+        self.currsize -= weight
+        self._expiries.pop(key, None)
+        if self._policy == "lru":
+            del self._recency[key]
+        else:
+            freq = self._freqs.pop(key)
+            bucket = self._buckets[freq]
+            del bucket[key]
+            if not bucket:
+                del self._buckets[freq]
+        return value
+
+    def _expire(self, removed: ty.List[ty.Tuple[_K, _V]]) -> None:
+        if self._ttl is None:
+            return
+        now = self._timer()
+        while self._expiries:
+            key, expires_at = next(iter(self._expiries.items()))
+            if expires_at > now:
+                break
+            removed.append((key, self._remove(key)))
+
+    def _evict(self, removed: ty.List[ty.Tuple[_K, _V]], room_for: int) -> None:
+        # evicts before inserting, so that under LFU a new entry can't be its own victim.
+        if self.maxsize is None:
+            return
+        while self.currsize + room_for > self.maxsize and self._data:
+            if self._policy == "lru":
+                key = next(iter(self._recency))
+            else:
+                key = next(iter(self._buckets[min(self._buckets)]))
+            removed.append((key, self._remove(key)))
+
+    def _notify(self, removed: ty.List[ty.Tuple[_K, _V]]) -> None:
+        if self._on_evict:
+            for key, value in removed:
+                self._on_evict(key, value)
+
+    def get(self, key: _K, default: ty.Any = None) -> ty.Any:
+        removed: ty.List[ty.Tuple[_K, _V]] = list()
+        with self._lock:
+            self._expire(removed)
+            entry = self._data.get(key, _MISSING)
+            if entry is not _MISSING:
+                self._touch(key)
+        self._notify(removed)
+        return default if entry is _MISSING else entry[0]  # type: ignore[index]
+
+    def __getitem__(self, key: _K) -> _V:
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def getsizeof(self, value: _V) -> int:
+        """The weight of a value, as counted against `maxsize`."""
+        return self._getsizeof(value) if self._getsizeof else 1
+
+    def __setitem__(self, key: _K, value: _V) -> None:
+        weight = self.getsizeof(value)
+        if self.maxsize is not None and weight > self.maxsize:
+            raise ValueError(f"Value of size {weight} is larger than the cache's maxsize {self.maxsize}")
+        removed: ty.List[ty.Tuple[_K, _V]] = list()
+        with self._lock:
+            if key in self._data:
+                self._remove(key)  # replaced, not evicted - no callback.
+            self._expire(removed)
+            self._evict(removed, weight)
+            self._data[key] = (value, weight)
+            self.currsize += weight
+            if self._policy == "lru":
+                self._recency[key] = None
+            else:
+                self._freqs[key] = 1
+                self._buckets.setdefault(1, OrderedDict())[key] = None
+            if self._ttl is not None:
+                self._expiries[key] = self._timer() + self._ttl
+        self._notify(removed)
+
+    def __delitem__(self, key: _K) -> None:
+        with self._lock:
+            if key not in self._data:
+                raise KeyError(key)
+            self._remove(key)
+
+    def __contains__(self, key: object) -> bool:
+        # unlike get, does not count as a use of the entry.
+        with self._lock:
+            if key not in self._data:
+                return False
+            expires_at = self._expiries.get(key)  # type: ignore[arg-type]
+            return expires_at is None or expires_at > self._timer()
+
+    def __iter__(self) -> ty.Iterator[_K]:
+        removed: ty.List[ty.Tuple[_K, _V]] = list()
+        with self._lock:
+            self._expire(removed)
+            keys = list(self._data)
+        self._notify(removed)
+        return iter(keys)
+
+    def __len__(self) -> int:
+        removed: ty.List[ty.Tuple[_K, _V]] = list()
+        with self._lock:
+            self._expire(removed)
+            length = len(self._data)
+        self._notify(removed)
+        return length
+
+    def clear(self) -> None:
+        with self._lock:
+            removed = [(key, value) for key, (value, _weight) in self._data.items()]
+            self._data.clear()
+            self._recency.clear()
+            self._freqs.clear()
+            self._buckets.clear()
+            self._expiries.clear()
+            self.currsize = 0
+        self._notify(removed)
+
+
 class _CacheInfo(ty.NamedTuple):
     # typed version of what is in `functools`
     hits: int
@@ -83,6 +278,14 @@ _P = ParamSpec("_P")
 _R = ty.TypeVar("_R")
 
 
+def _fits(cache: ty.MutableMapping[HashedTuple, ty.Any], value: ty.Any) -> bool:
+    """False if a bounded cache - ours, or one from `cachetools` - would refuse the value as
+    heavier than its maxsize."""
+    maxsize = getattr(cache, "maxsize", None)
+    getsizeof = getattr(cache, "getsizeof", None)
+    return maxsize is None or getsizeof is None or getsizeof(value) <= maxsize
+
+
 def _locking_factory(
     cache_lock: proto.ContextManager,
     make_func_lock: ty.Callable[[HashedTuple], proto.ContextManager],
@@ -92,6 +295,7 @@ def _locking_factory(
         cache: ty.MutableMapping[HashedTuple, _R] = make_cache()
         keys_to_func_locks: ty.Dict[HashedTuple, proto.ContextManager] = {}
         hits = misses = 0
+        stats_lock = threading.Lock()  # separate from cache_lock, which may be held for a while.
         bound_hashkey = make_bound_hashkey(func)
         sentinel = ty.cast(_R, object())  # unique object used to signal cache misses
 
@@ -102,7 +306,8 @@ def _locking_factory(
             key = bound_hashkey(args, kwargs)
             maybe_value = cache.get(key, sentinel)
             if maybe_value is not sentinel:
-                hits += 1
+                with stats_lock:
+                    hits += 1
                 return maybe_value
 
             if key not in keys_to_func_locks:
@@ -114,27 +319,29 @@ def _locking_factory(
             with keys_to_func_locks[key]:
                 maybe_value = cache.get(key, sentinel)
                 if maybe_value is not sentinel:
-                    hits += 1
+                    with stats_lock:
+                        hits += 1
                     return maybe_value
 
-                misses += 1
+                with stats_lock:
+                    misses += 1
                 result = func(*args, **kwargs)
-                cache[key] = result
+                if _fits(cache, result):
+                    cache[key] = result
+                # otherwise too large to cache - as with `cachetools`, it is simply returned.
 
             keys_to_func_locks.pop(key, None)  # this allows for the use of reentrant locks
             return result
 
         def cache_info() -> _CacheInfo:
-            # concurrent usage of cached function may result in incorrect hit and miss counts
-            # incrementing them is not threadsafe
-            with cache_lock:
+            with cache_lock, stats_lock:
                 # A caller-supplied bounded mapping (e.g. `cachetools.LRUCache`) reports its own
                 # `maxsize`; a plain dict has none.
                 return _CacheInfo(hits, misses, getattr(cache, "maxsize", None), len(cache))
 
         def clear_cache() -> None:
             nonlocal hits, misses
-            with cache_lock:
+            with cache_lock, stats_lock:
                 cache.clear()
                 keys_to_func_locks.clear()
                 hits = misses = 0
@@ -158,6 +365,11 @@ def locking(
     cache_lock: ty.Optional[proto.ContextManager] = ...,
     make_func_lock: ty.Optional[ty.Callable[[HashedTuple], proto.ContextManager]] = ...,
     make_cache: ty.Optional[ty.Callable[[], ty.MutableMapping[HashedTuple, ty.Any]]] = ...,
+    maxsize: ty.Optional[int] = ...,
+    policy: ty.Literal["lru", "lfu"] = ...,
+    ttl: ty.Optional[float] = ...,
+    getsizeof: ty.Optional[ty.Callable[[ty.Any], int]] = ...,
+    on_evict: ty.Optional[ty.Callable[[HashedTuple, ty.Any], ty.Any]] = ...,
 ) -> ty.Callable[[ty.Callable[_P, _R]], ty.Callable[_P, _R]]: ...  # pragma: no cover
 
 
@@ -171,6 +383,11 @@ def locking(
     cache_lock: ty.Optional[proto.ContextManager] = None,
     make_func_lock: ty.Optional[ty.Callable[[HashedTuple], proto.ContextManager]] = None,
     make_cache: ty.Optional[ty.Callable[[], ty.MutableMapping[HashedTuple, ty.Any]]] = None,
+    maxsize: ty.Optional[int] = None,
+    policy: ty.Literal["lru", "lfu"] = "lru",
+    ttl: ty.Optional[float] = None,
+    getsizeof: ty.Optional[ty.Callable[[ty.Any], int]] = None,
+    on_evict: ty.Optional[ty.Callable[[HashedTuple, ty.Any], ty.Any]] = None,
 ):
     """A threadsafe, simple, unbounded-by-default cache.
 
@@ -195,10 +412,26 @@ def locking(
     threadsafe - single-flight still comes from the locks above, which is why this is a parameter
     here rather than a reason to reach for `cachetools.cached`.
 
-    Please also note that `hits` and `misses` in `cache_info` may not be accurate as they are not incremented in
-    a threadsafe matter. Doing that incrementation in a threadsafe manner would incur a performance penalty on threaded
-    usage that is not worth the cost.
+    Alternatively, any of `maxsize`, `ttl`, `getsizeof`, or `on_evict` builds a `BoundedCache`
+    with those settings and the given eviction `policy` (which is an error on its own) - no
+    third-party dependency required.
+    Cache keys are passed to `on_evict` as `HashedTuple`s of the bound arguments. These may
+    not be combined with `make_cache`. A result weighing more than `maxsize` is returned, but
+    not cached.
+
+    `hits` and `misses` in `cache_info` are counted under a dedicated lock, so they are accurate
+    under concurrent use.
     """
+    bounded = any(opt is not None for opt in (maxsize, ttl, getsizeof, on_evict))
+    if policy != "lru" and not bounded:
+        raise ValueError(f"policy={policy!r} only applies along with maxsize/ttl/getsizeof/on_evict")
+    if bounded:
+        if make_cache:
+            raise ValueError("Pass either make_cache or maxsize/ttl/getsizeof/on_evict, not both")
+
+        make_cache = functools.partial(
+            BoundedCache, maxsize, policy=policy, ttl=ttl, getsizeof=getsizeof, on_evict=on_evict
+        )
 
     def default_make_func_lock(_key: HashedTuple) -> threading.Lock:
         return threading.Lock()
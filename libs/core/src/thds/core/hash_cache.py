@@ -1,93 +1,305 @@
 """Sometimes, you just want to cache hashes. Specifically, hashes of files.
 
-We cache these hashes as files themselves, and the default location is under the user's
-home directory.
-
-The name of the file is an implementation detail that includes the hash of the file path,
-the directory it lives in is the hashlib name of the hash algorithm, and the contents of
-the file are the raw bytes of the hash. However, none of these details is guaranteed to
-remain stable over time, and the only stable interface is the `hash_file` and `filehash`
-functions themselves.
+We cache these hashes in a single SQLite index (WAL mode, so many processes may read and
+write it concurrently), and the default location is under the user's home directory.
+
+Each entry is keyed by the resolved file path and the hash algorithm name, and is only
+considered valid if the inode, size, and mtime (in nanoseconds) of the file still match
+what they were when the hash was computed. The index is bounded in size; the least
+recently used entries are evicted once it grows past `MAX_ENTRIES`.
+
+Older versions of this module wrote one small file per (path, algo) under
+`<directory>/<algo>/`. Those entries are still honored: a miss in the index falls back
+to the legacy file, and a valid legacy hash is migrated into the index.
+
+None of these details is guaranteed to remain stable over time, and the only stable
+interface is the `hash_file`, `hash_files`, `filehash`, `filehashes`, and `record_filehash`
+functions.
 """
 
 import hashlib
+import os
+import sqlite3
 import sys
+import threading
+import time
+import typing as ty
 from pathlib import Path
 
-from . import config, files
-from .hashing import Hash, Hasher, get_hasher, hash_using
+from . import config
+from .hashing import Hash, Hasher, get_hasher, hash_file_parallel, hash_using
 from .home import HOMEDIR
 from .log import getLogger
 from .types import StrOrPath
 
 CACHE_HASH_DIR = config.item("directory", HOMEDIR() / ".thds/core/hash-cache", parse=Path)
+MAX_ENTRIES = config.item("max_entries", 1_000_000, parse=int)
+PARALLEL_THRESHOLD = config.item("parallel_threshold", 2**28, parse=int)
+# files at least this large are hashed with concurrent segment reads; 0 disables.
 _1GB = 1 * 2**30  # log if hashing a file larger than this, since it will be slow.
+_INDEX_NAME = "index.sqlite3"
+_SQLITE_MAX_VARS = 500  # well under the compiled-in default of 999 for older SQLite builds.
+_TOUCH_AFTER_S = 60 * 60  # don't write on every hit - LRU at hourly resolution is plenty.
+_EVICT_CHECK_EVERY = 1000  # inserts between checks of the index size.
 
 
 logger = getLogger(__name__)
+_LOCAL = threading.local()
+_INSERTS_LOCK = threading.Lock()
+_INSERTS_SINCE_CHECK = 0
+
+
+def _index_path() -> Path:
+    return CACHE_HASH_DIR() / _INDEX_NAME
+
+
+def _connect(db_path: Path) -> sqlite3.Connection:
+    db_path.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(os.fspath(db_path), timeout=30.0, isolation_level=None)  # autocommit
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS file_hashes (
+            path TEXT NOT NULL,
+            algo TEXT NOT NULL,
+            inode INTEGER NOT NULL,
+            size INTEGER NOT NULL,
+            mtime_ns INTEGER NOT NULL,
+            hash BLOB NOT NULL,
+            accessed INTEGER NOT NULL,
+            PRIMARY KEY (path, algo)
+        ) WITHOUT ROWID
+        """)
+    conn.execute("CREATE INDEX IF NOT EXISTS file_hashes_accessed ON file_hashes (accessed)")
+    return conn
+
+
+def _conn() -> ty.Optional[sqlite3.Connection]:
+    """One connection per thread per index path (the path is configurable, so it may
+    change during the life of a process, most notably in tests).
+
+    Returns None if the index cannot be opened, in which case we simply don't cache.
+    """
+    db_path = _index_path()
+    conns: ty.Dict[Path, ty.Optional[sqlite3.Connection]] = _LOCAL.__dict__.setdefault("conns", {})
+    if db_path not in conns:
+        try:
+            conns[db_path] = _connect(db_path)
+        except (sqlite3.Error, OSError):
+            logger.exception("Unable to open hash cache index at %s; hashes will not be cached", db_path)
+            conns[db_path] = None
+    return conns[db_path]
+
+
+class _Stat(ty.NamedTuple):
+    inode: int
+    size: int
+    mtime_ns: int
+
 
+def _stat(path: Path) -> _Stat:
+    st = path.stat()
+    return _Stat(st.st_ino, st.st_size, st.st_mtime_ns)
 
-def _filecachekey(path: Path, hashtype: str) -> Path:
-    # the construction of our cache key here is somewhat arbitrary,
-    # and the name substring is really just for debugging purposes.
-    # however, the filesize is a useful bit of additional 'entropy'
-    # that will help us avoid edge cases that might arise from race
-    # conditions, and the approach must remain stable over time for
-    # the cache to provide a meaningful advantage.
+
+def _lookup(
+    conn: sqlite3.Connection, algo: str, paths_and_stats: ty.Mapping[str, _Stat]
+) -> ty.Dict[str, bytes]:
+    """Returns the cached hash for every path whose stat still matches the index."""
+    found: ty.Dict[str, bytes] = dict()
+    to_touch: ty.List[ty.Tuple[str, str]] = list()
+    now = int(time.time())
+    keys = list(paths_and_stats)
+    for i in range(0, len(keys), _SQLITE_MAX_VARS):
+        chunk = keys[i : i + _SQLITE_MAX_VARS]
+        rows = conn.execute(
+            "SELECT path, inode, size, mtime_ns, hash, accessed FROM file_hashes"
+            f" WHERE algo = ? AND path IN ({', '.join('?' * len(chunk))})",
+            (algo, *chunk),
+        )
+        for path, inode, size, mtime_ns, hash_bytes, accessed in rows:
+            if _Stat(inode, size, mtime_ns) == paths_and_stats[path]:
+                found[path] = hash_bytes
+                if now - accessed > _TOUCH_AFTER_S:
+                    to_touch.append((path, algo))
+    if to_touch:
+        conn.executemany(
+            f"UPDATE file_hashes SET accessed = {now} WHERE path = ? AND algo = ?", to_touch
+        )
+    return found
+
+
+def _maybe_evict(conn: sqlite3.Connection, n_inserted: int) -> None:
+    global _INSERTS_SINCE_CHECK
+    with _INSERTS_LOCK:
+        _INSERTS_SINCE_CHECK += n_inserted
+        if _INSERTS_SINCE_CHECK < _EVICT_CHECK_EVERY:
+            return
+        _INSERTS_SINCE_CHECK = 0
+
+    max_entries = MAX_ENTRIES()
+    (count,) = conn.execute("SELECT COUNT(*) FROM file_hashes").fetchone()
+    if count <= max_entries:
+        return
+    # evict down to 90% so that we're not evicting on every subsequent check.
+    n_evict = count - int(max_entries * 0.9)
+    logger.info("Evicting %d least recently used entries from the hash cache", n_evict)
+    conn.execute(
+        "DELETE FROM file_hashes WHERE (path, algo) IN"
+        " (SELECT path, algo FROM file_hashes ORDER BY accessed LIMIT ?)",
+        (n_evict,),
+    )
+
+
+def _store(
+    conn: sqlite3.Connection, algo: str, entries: ty.Sequence[ty.Tuple[str, _Stat, bytes]]
+) -> None:
+    if not entries:
+        return
+    now = int(time.time())
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        conn.executemany(
+            "INSERT OR REPLACE INTO file_hashes (path, algo, inode, size, mtime_ns, hash, accessed)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [(path, algo, *st, hash_bytes, now) for path, st, hash_bytes in entries],
+        )
+        conn.execute("COMMIT")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    _maybe_evict(conn, len(entries))
+
+
+def _legacy_filecachekey(path: Path, hashtype: str, size: int) -> Path:
+    # this was the one-file-per-hash cache key. It is retained only so that we can
+    # migrate hashes computed by older versions of this module into the index.
     path_str = str(path)
     path_hash = hash_using(path_str.encode(), hashlib.sha256()).hexdigest()
-    # we use a compressed (hashed) version of the path because
-    # filenames can get kind of long and we don't want to deal with
-    # long filenames blowing up our system by being unwritable.
     return (
         CACHE_HASH_DIR()
         / hashtype
-        / (path_str[-50:].replace("/", "|") + "-" + path_hash + "+" + str(path.stat().st_size))
+        / (path_str[-50:].replace("/", "|") + "-" + path_hash + "+" + str(size))
     )
 
 
-def _is_no_older_than(file: Path, other: Path) -> bool:
-    """Returns True if `file` is no older than `other`. Both files must exist."""
-    return file.stat().st_mtime >= other.stat().st_mtime
+def _read_legacy(path: Path, hashtype: str, st: _Stat) -> ty.Optional[bytes]:
+    legacy_path = _legacy_filecachekey(path, hashtype, st.size)
+    try:
+        legacy_stat = legacy_path.stat()
+    except OSError:
+        return None
+    # the legacy cache was valid as long as it was no older than the file it describes.
+    if legacy_stat.st_mtime_ns < st.mtime_ns:
+        return None
+    logger.debug("Migrating legacy cached hash for %s from %s", path, legacy_path)
+    return legacy_path.read_bytes()
 
 
-def hash_file(filepath: StrOrPath, hasher: Hasher) -> bytes:
-    """Hashes a file with the given hashlib hasher. If we've already previously computed
-    the given hash for the file and the file hasn't changed (according to filesystem
-    mtime) since we stored that hash, we'll just return the cached hash.
-
-    File must exist and respond positively to stat().
-    """
-    resolved_path = Path(filepath).resolve()
-    cached_hash_path = _filecachekey(resolved_path, hasher.name)
-    # now we can check to see if we have hash bytes for that file somewhere already.
-    hash_cached = "hash-cached" if cached_hash_path.exists() else ""
-    if hash_cached and _is_no_older_than(cached_hash_path, resolved_path):
-        logger.debug("Reusing known hash for %s - cache key %s", resolved_path, cached_hash_path)
-        return cached_hash_path.read_bytes()
-
-    psize = resolved_path.stat().st_size
-    if psize > _1GB:
-        log_at_lvl = logger.warning if hash_cached else logger.info
-        # I want to know how often we're finding 'outdated' hashes; those should be rare.
-        log_at_lvl(f"Hashing {psize / _1GB:.2f} GB file at {resolved_path}{hash_cached}")
+def _compute(resolved_path: Path, hasher: Hasher, size: int) -> bytes:
+    if size > _1GB:
+        logger.info(f"Hashing {size / _1GB:.2f} GB file at {resolved_path}")
 
     if hasattr(hasher, "update_mmap"):
         # a special case for the blake3 module, which has deadlocked in the past
         logger.warning("DEBUG starting update_mmap for blake3")
-        hasher.update_mmap(filepath)
+        hasher.update_mmap(resolved_path)
         hash_bytes = hasher.digest()
         logger.info("DEBUG finished update_mmap")
-    else:
-        hash_bytes = hash_using(resolved_path, hasher).digest()
+        return hash_bytes
+
+    parallel_threshold = PARALLEL_THRESHOLD()
+    if parallel_threshold and size >= parallel_threshold:
+        return hash_file_parallel(resolved_path, hasher).digest()
+    return hash_using(resolved_path, hasher).digest()
+
+
+def _algo_key(hasher_name: str) -> str:
+    # one key per algorithm, whether we were handed a hasher ('XXH3_128') or the name it was
+    # registered under ('xxh3_128').
+    return hasher_name.lower()
+
+
+def _hash_files(
+    filepaths: ty.Sequence[StrOrPath], hasher_name: str, make_hasher: ty.Callable[[], Hasher]
+) -> ty.List[bytes]:
+    """`hasher_name` is the hasher's own name, which is what the legacy cache was keyed by."""
+    algo = _algo_key(hasher_name)
+    resolved = [Path(fp).resolve() for fp in filepaths]
+    stats = {str(rp): _stat(rp) for rp in resolved}
+
+    conn = _conn()
+    known: ty.Dict[str, bytes] = dict()
+    if conn is not None:
+        try:
+            known = _lookup(conn, algo, stats)
+        except sqlite3.Error:
+            logger.exception("Unable to read from hash cache index")
+
+    to_store: ty.List[ty.Tuple[str, _Stat, bytes]] = list()
+    for rp in resolved:
+        path_str = str(rp)
+        if path_str in known:
+            logger.debug("Reusing known hash for %s", path_str)
+            continue
+        st = stats[path_str]
+        hash_bytes = _read_legacy(rp, hasher_name, st)
+        if hash_bytes is None:
+            hash_bytes = _compute(rp, make_hasher(), st.size)
+        known[path_str] = hash_bytes
+        to_store.append((path_str, st, hash_bytes))
+
+    if conn is not None:
+        try:
+            _store(conn, algo, to_store)
+        except sqlite3.Error:
+            logger.exception("Unable to write to hash cache index")
+
+    return [known[str(rp)] for rp in resolved]
+
+
+def hash_file(filepath: StrOrPath, hasher: Hasher) -> bytes:
+    """Hashes a file with the given hashlib hasher. If we've already previously computed
+    the given hash for the file and the file hasn't changed (according to its inode, size,
+    and mtime) since we stored that hash, we'll just return the cached hash.
+
+    File must exist and respond positively to stat().
+    """
+    return _hash_files([filepath], hasher.name, lambda: hasher)[0]
 
-    cached_hash_path.parent.mkdir(parents=True, exist_ok=True)
-    with files.atomic_binary_writer(cached_hash_path) as f:
-        f.write(hash_bytes)
-    return hash_bytes
+
+def hash_files(filepaths: ty.Iterable[StrOrPath], algo: str) -> ty.List[bytes]:
+    """Bulk version of `hash_file`, returning hashes in the same order as the input paths.
+
+    All cache lookups are performed together, so this is much cheaper than calling
+    `hash_file` in a loop when most of the files have already been hashed.
+    """
+    return _hash_files(list(filepaths), get_hasher(algo).name, lambda: get_hasher(algo))
 
 
 def filehash(algo: str, pathlike: StrOrPath) -> Hash:
     """Wraps a cached hash of a file in a core.hashing.Hash object, which carries the name
     of the hash algorithm used."""
     return Hash(sys.intern(algo), hash_file(pathlike, get_hasher(algo)))
+
+
+def filehashes(algo: str, pathlikes: ty.Iterable[StrOrPath]) -> ty.List[Hash]:
+    """Bulk version of `filehash`."""
+    algo = sys.intern(algo)
+    return [Hash(algo, hash_bytes) for hash_bytes in hash_files(pathlikes, algo)]
+
+
+def record_filehash(pathlike: StrOrPath, hash: Hash) -> None:
+    """Record a hash of a file that was computed some other way - typically while the file
+    was being written - so that the file need not be read to hash it again.
+
+    The caller vouches for the hash; the file must not have changed since it was computed.
+    """
+    rp = Path(pathlike).resolve()
+    entry = (str(rp), _stat(rp), hash.bytes)
+    conn = _conn()
+    if conn is not None:
+        try:
+            _store(conn, _algo_key(hash.algo), [entry])
+        except sqlite3.Error:
+            logger.exception("Unable to write to hash cache index")
@@ -10,16 +10,27 @@ not stop the first.  Both report independently - each with its own label, its
 own aggregate statistics, and its own log line - while a single process-global
 sampler thread does the underlying reads once per tick and folds each sample
 into every active Journalist.
+
+Setting `THDS_CORE_JOURNALIST_TRACE_PATH` additionally keeps a bounded ring buffer of
+the raw samples - including per-thread CPU time read from `/proc/<pid>/task` - and
+records every `logger_context` as a span. At exit (or on demand, via
+`dump_chrome_trace`) these are written as Chrome trace-event JSON, which Perfetto
+(ui.perfetto.dev) or chrome://tracing will render as counter tracks and a flame chart.
 """
 
+import atexit
+import collections
+import contextlib
+import json
 import os
 import threading
 import time
 import typing as ty
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from pathlib import Path
 
-from thds.core import log
+from thds.core import config, files, log
+from thds.core.log import kw_logger
 
 _logger = log.getLogger(__name__)
 
@@ -31,6 +42,14 @@ except ImportError:
 
 _SAMPLER_THREAD_NAME = "thds-core-journalist-sampler"
 
+TRACE_PATH = config.item("trace_path", "")
+# if set, record samples and spans, and dump them as a Chrome trace here at exit.
+# A literal `{pid}` is replaced with the process id, so that child processes that
+# inherit the environment don't overwrite their parent's trace.
+TRACE_MAX_SAMPLES = config.item("trace_max_samples", 36_000, parse=int)
+# the ring buffer size - at the default 1 second sample interval, 10 hours.
+TRACE_MAX_SPANS = config.item("trace_max_spans", 100_000, parse=int)
+
 
 # cgroup v2: /sys/fs/cgroup/memory.current
 # cgroup v1: /sys/fs/cgroup/memory/memory.usage_in_bytes
@@ -103,6 +122,43 @@ def _tree_cpu_times(proc: "psutil.Process") -> tuple[float, float]:
     return user, sys_
 
 
+try:
+    _CLOCK_TICKS = os.sysconf("SC_CLK_TCK")
+except (AttributeError, ValueError, OSError):
+    _CLOCK_TICKS = 100
+
+
+def _read_thread_cpu_seconds(pid: int) -> dict[int, tuple[str, float]] | None:
+    """Return {native thread id: (name, user+system CPU seconds)} for every thread of
+    `pid`, or None where /proc is unavailable (i.e. not Linux).
+
+    Names come from Python's `threading` where the thread is known to it, otherwise
+    from the kernel's (truncated) `comm`.
+    """
+    task_dir = Path(f"/proc/{pid}/task")
+    try:
+        tids = os.listdir(task_dir)
+    except OSError:
+        return None
+
+    py_names = {t.native_id: t.name for t in threading.enumerate()} if pid == os.getpid() else {}
+    threads: dict[int, tuple[str, float]] = {}
+    for tid_str in tids:
+        try:
+            stat = (task_dir / tid_str / "stat").read_text()
+        except OSError:
+            continue  # the thread exited between listdir and read
+        # comm is parenthesized and may itself contain spaces or parens, so the
+        # numeric fields are everything after the last ')'. utime and stime are
+        # fields 14 and 15 of the stat line, i.e. 11 and 12 after the comm.
+        rparen = stat.rindex(")")
+        fields = stat[rparen + 2 :].split()
+        tid = int(tid_str)
+        name = py_names.get(tid) or stat[stat.index("(") + 1 : rparen]
+        threads[tid] = (name, (int(fields[11]) + int(fields[12])) / _CLOCK_TICKS)
+    return threads
+
+
 def _read_net_bytes() -> tuple[int, int] | None:
     """Return (bytes_sent, bytes_recv) across all interfaces, or None."""
     if psutil is None:
@@ -171,6 +227,8 @@ class _Sample:
     cgroup_mb: float | None
     net: tuple[int, int] | None  # (bytes_sent, bytes_recv)
     disk: tuple[int, int] | None  # (bytes_read, bytes_written)
+    # {native thread id: (name, cpu seconds)} for this process; only read while tracing.
+    threads: dict[int, tuple[str, float]] | None = None
 
 
 class _Gauge:
@@ -250,6 +308,126 @@ _MB = 1024 * 1024
 _GB = 1024**3
 
 
+@dataclass(frozen=True)
+class _Span:
+    name: str
+    tid: int
+    start: float  # time.monotonic(), like _Sample.wall
+    end: float
+    args: dict[str, str] = field(default_factory=dict)
+
+
+def _us(monotonic_seconds: float) -> float:
+    return round(monotonic_seconds * 1_000_000, 1)
+
+
+class _Recorder:
+    """Bounded ring buffers of raw samples and `logger_context` spans.
+
+    Appends are the only work done on the hot path; everything else (rates, thread
+    names, JSON) is derived when the trace is dumped, which keeps recording cheap
+    enough to leave on for the life of a long-running process.
+    """
+
+    def __init__(self, max_samples: int, max_spans: int) -> None:
+        self.samples: collections.deque[_Sample] = collections.deque(maxlen=max_samples)
+        self.spans: collections.deque[_Span] = collections.deque(maxlen=max_spans)
+
+    @contextlib.contextmanager
+    def span(self, kwargs: ty.Mapping[str, ty.Any]) -> ty.Iterator[None]:
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.spans.append(
+                _Span(
+                    name=",".join(f"{k}={v}" for k, v in kwargs.items()),
+                    tid=threading.get_native_id(),
+                    start=start,
+                    end=time.monotonic(),
+                    args={k: str(v) for k, v in kwargs.items()},
+                )
+            )
+
+    def chrome_trace_events(self) -> list[dict[str, ty.Any]]:
+        """Counter ("C") events for each sample, complete ("X") events for each span, and
+        metadata ("M") events naming the process and its threads."""
+        pid = os.getpid()
+        events: list[dict[str, ty.Any]] = []
+        thread_names: dict[int, str] = {}
+
+        def counter(name: str, ts: float, **args: float) -> None:
+            events.append({"name": name, "ph": "C", "ts": _us(ts), "pid": pid, "args": args})
+
+        samples = list(self.samples)
+        for prev, cur in zip([None, *samples], samples):
+            mem = dict(rss=round(cur.rss_mb, 1))
+            if cur.cgroup_mb is not None:
+                mem["cgroup"] = round(cur.cgroup_mb, 1)
+            counter("memory_mb", cur.wall, **mem)
+            for tid, (name, _) in (cur.threads or {}).items():
+                thread_names[tid] = name
+            if prev is None:
+                continue  # rates need a previous sample.
+
+            dt = max(cur.wall - prev.wall, 0.01)
+            counter(
+                "cpu_cores",
+                cur.wall,
+                process=round(max(0.0, cur.cpu_seconds - prev.cpu_seconds) / dt, 3),
+            )
+            if cur.net is not None and prev.net is not None:
+                sent, recv = ((c - p) / dt / _MB for c, p in zip(cur.net, prev.net))
+                counter(
+                    "net_mbps", cur.wall, recv=round(max(0.0, recv), 2), sent=round(max(0.0, sent), 2)
+                )
+            if cur.disk is not None and prev.disk is not None:
+                read, write = ((c - p) / dt / _MB for c, p in zip(cur.disk, prev.disk))
+                counter(
+                    "disk_mbps", cur.wall, read=round(max(0.0, read), 2), write=round(max(0.0, write), 2)
+                )
+            if cur.threads is not None and prev.threads is not None:
+                per_thread = {
+                    f"{name} ({tid})": round(max(0.0, cpu - prev.threads[tid][1]) / dt, 3)
+                    for tid, (name, cpu) in cur.threads.items()
+                    if tid in prev.threads
+                }
+                if per_thread:
+                    counter("thread_cpu_cores", cur.wall, **per_thread)
+
+        for span in list(self.spans):
+            events.append(
+                {
+                    "name": span.name,
+                    "ph": "X",
+                    "ts": _us(span.start),
+                    "dur": _us(span.end - span.start),
+                    "pid": pid,
+                    "tid": span.tid,
+                    "args": span.args,
+                }
+            )
+            thread_names.setdefault(span.tid, "")
+
+        py_names = {t.native_id: t.name for t in threading.enumerate()}
+        for tid in thread_names:
+            name = thread_names[tid] or py_names.get(tid) or str(tid)
+            events.append(
+                {"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": name}}
+            )
+        events.append({"name": "process_name", "ph": "M", "pid": pid, "args": {"name": f"python {pid}"}})
+        return events
+
+    def dump(self, path: Path) -> None:
+        with files.atomic_text_writer(path) as f:
+            json.dump({"traceEvents": self.chrome_trace_events(), "displayTimeUnit": "ms"}, f)
+
+
+def _trace_path() -> Path | None:
+    path = TRACE_PATH()
+    return Path(str(path).replace("{pid}", str(os.getpid()))) if path else None
+
+
 class _Sampler:
     """Process-global owner of the single sampler thread.
 
@@ -271,6 +449,7 @@ class _Sampler:
         self._cgroup_cpu_available = _read_cgroup_cpu_seconds() is not None
         self._net_available = _read_net_bytes() is not None
         self._disk_available = _read_disk_bytes() is not None
+        self._recorder: _Recorder | None = None
 
     def active_labels(self) -> set[str]:
         with self._lock:
@@ -279,7 +458,17 @@ class _Sampler:
     def current_interval(self) -> float:
         return self._sample_interval
 
+    def start_recording(self) -> _Recorder:
+        """Idempotently start keeping samples and `logger_context` spans for a trace."""
+        with self._lock:
+            if self._recorder is None:
+                self._recorder = _Recorder(TRACE_MAX_SAMPLES(), TRACE_MAX_SPANS())
+                kw_logger.add_span_hook(self._recorder.span)
+            return self._recorder
+
     def register(self, acc: "Journalist") -> None:
+        if self._recorder is None and TRACE_PATH():
+            self.start_recording()
         with self._lock:
             acc._label = self._resolve_label(acc._label)
             first = not self._accumulators
@@ -344,7 +533,10 @@ class _Sampler:
                 cgroup_mb=cgroup_mb,
                 net=_read_net_bytes() if self._net_available else None,
                 disk=_read_disk_bytes() if self._disk_available else None,
+                threads=_read_thread_cpu_seconds(proc.pid) if self._recorder is not None else None,
             )
+            if self._recorder is not None:
+                self._recorder.samples.append(sample)
 
             # Snapshot under the lock, fold outside it. A journalist that exits
             # mid-batch is still in this snapshot, but its fold self-vetoes via
@@ -360,6 +552,41 @@ class _Sampler:
 _SAMPLER = _Sampler()
 
 
+def dump_chrome_trace(path: os.PathLike | str) -> bool:
+    """Write everything recorded so far as Chrome trace-event JSON.
+
+    Returns False (and writes nothing) if recording was never started, either via
+    `THDS_CORE_JOURNALIST_TRACE_PATH` or `start_recording`.
+    """
+    recorder = _SAMPLER._recorder
+    if recorder is None:
+        return False
+    recorder.dump(Path(path))
+    return True
+
+
+def start_recording() -> None:
+    """Record samples and spans from now on, regardless of `TRACE_PATH`.
+
+    Samples are only taken while at least one Journalist is active.
+    """
+    _SAMPLER.start_recording()
+
+
+def _dump_at_exit() -> None:
+    path = _trace_path()
+    if path is None:
+        return
+    try:
+        if dump_chrome_trace(path):
+            _logger.info("Wrote journalist trace to %s", path)
+    except Exception:
+        _logger.exception("Failed to write journalist trace to %s", path)
+
+
+atexit.register(_dump_at_exit)
+
+
 class Journalist:
     """Context manager that samples RSS, CPU, and network IO across the process tree.
 
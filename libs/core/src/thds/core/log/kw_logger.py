@@ -6,7 +6,7 @@ import contextlib
 import logging
 import logging.config
 from copy import copy
-from typing import Any, Dict, MutableMapping, Optional
+from typing import Any, Callable, ContextManager, Dict, Mapping, MutableMapping, Optional, Tuple
 
 from .. import config
 from ..stack_context import StackContext
@@ -31,11 +31,38 @@ class _THContext(Dict[str, Any]):
 _LOG_CONTEXT: StackContext[_THContext] = StackContext("TH_LOG_CONTEXT", _THContext())
 
 
+SpanHook = Callable[[Mapping[str, Any]], ContextManager]
+_SPAN_HOOKS: Tuple[SpanHook, ...] = ()
+# each is entered around the body of every logger_context, with the newly-added key-value pairs.
+
+
+def add_span_hook(hook: SpanHook) -> None:
+    """Lets something like thds.core.journalist treat each `logger_context` as a span.
+
+    The hook is called with the key-value pairs being added, and the context manager it
+    returns is entered once the new context is in effect, and exited before it is removed.
+    """
+    global _SPAN_HOOKS
+    _SPAN_HOOKS = (*_SPAN_HOOKS, hook)
+
+
+def remove_span_hook(hook: SpanHook) -> None:
+    global _SPAN_HOOKS
+    _SPAN_HOOKS = tuple(h for h in _SPAN_HOOKS if h != hook)
+
+
 @contextlib.contextmanager
 def logger_context(**kwargs):
     """Put some key-value pairs into the keyword-based logger context."""
     with _LOG_CONTEXT.set(_THContext(_LOG_CONTEXT(), **kwargs)):
-        yield
+        hooks = _SPAN_HOOKS
+        if not hooks:
+            yield
+        else:
+            with contextlib.ExitStack() as stack:
+                for hook in hooks:
+                    stack.enter_context(hook(kwargs))
+                yield
 
 
 def _embed_th_context_in_extra_kw(kwargs: MutableMapping[str, Any]) -> MutableMapping[str, Any]:
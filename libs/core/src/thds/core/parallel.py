@@ -4,7 +4,7 @@ import concurrent.futures
 import itertools
 import traceback
 import typing as ty
-from collections import defaultdict
+from collections import defaultdict, deque
 from dataclasses import dataclass
 from uuid import uuid4
 
@@ -73,6 +73,44 @@ def _get_caller_logger(named: str) -> ty.Callable[[str], ty.Any]:
     return log.getLogger(__name__).debug  # if not named, we default to debug level
 
 
+def _submit_all(
+    executor: concurrent.futures.Executor, thunks: ty.Iterable[ty.Tuple[H, ty.Callable[[], R]]]
+) -> ty.Iterator[ty.Tuple[H, "concurrent.futures.Future[R]"]]:
+    keys_onto_futures = {key: executor.submit(thunk) for key, thunk in thunks}
+    future_ids_onto_keys = {id(future): key for key, future in keys_onto_futures.items()}
+    # While concurrent.futures.as_completed accepts an iterable as input, it
+    # does not yield any completed futures until the input iterable is
+    # exhausted.
+    for future in concurrent.futures.as_completed(keys_onto_futures.values()):
+        yield future_ids_onto_keys[id(future)], future
+
+
+def _submit_windowed(
+    executor: concurrent.futures.Executor,
+    thunks: ty.Iterable[ty.Tuple[H, ty.Callable[[], R]]],
+    max_in_flight: int,
+) -> ty.Iterator[ty.Tuple[H, "concurrent.futures.Future[R]"]]:
+    """Never pulls more than max_in_flight thunks off the input iterable before their
+    results have been yielded, so memory use is independent of the number of thunks.
+    """
+    thunks_iter = iter(thunks)
+    in_flight: ty.Dict["concurrent.futures.Future[R]", H] = dict()
+    completed: ty.Deque[ty.Tuple[H, "concurrent.futures.Future[R]"]] = deque()
+
+    def top_up() -> None:
+        room = max_in_flight - len(in_flight) - len(completed)
+        for key, thunk in itertools.islice(thunks_iter, max(room, 0)):
+            in_flight[executor.submit(thunk)] = key
+
+    top_up()
+    while in_flight:
+        done, _ = concurrent.futures.wait(in_flight, return_when=concurrent.futures.FIRST_COMPLETED)
+        completed.extend((in_flight.pop(future), future) for future in done)
+        while completed:
+            yield completed.popleft()
+            top_up()
+
+
 def yield_all(
     thunks: ty.Iterable[ty.Tuple[H, ty.Callable[[], R]]],
     *,
@@ -81,6 +119,7 @@ def yield_all(
     error_fmt: ty.Callable[[str], str] = lambda x: x,
     named: str = "",
     progress_logger: ty.Optional[ty.Callable[[str], ty.Any]] = None,
+    max_in_flight: int = 0,
 ) -> ty.Iterator[ty.Tuple[H, ty.Union[R, Error]]]:
     """Stream your results so that you don't have to load them all into memory at the same
     time (necessarily). Also, yield (rather than raise) Exceptions, wrapped as Errors.
@@ -91,9 +130,15 @@ def yield_all(
     parallel tasks, you should provide your own Executor - and for
     most mops purposes it should be a ThreadPoolExecutor.
 
-    Currently this function does not yield any results until the input iterable is exhausted,
+    By default, this function does not yield any results until the input iterable is exhausted,
     even though some of the thunks may have been submitted and the workers have returned a result
     to the local process.
+
+    If you pass a positive `max_in_flight`, at most that many thunks will have been
+    submitted without their results having been yielded, and results are yielded as soon
+    as they complete. The input iterable is consumed lazily, so memory use is O(max_in_flight)
+    regardless of the number of thunks. Without an executor, the ThreadPoolExecutor we
+    create will have max_in_flight workers.
     """
     files.bump_limits()
     len_or_none = try_len(thunks)
@@ -111,18 +156,18 @@ def yield_all(
 
     progress_logger = progress_logger or _get_caller_logger(named)
 
+    max_workers = min(max_in_flight, len_or_none or max_in_flight) if max_in_flight > 0 else len_or_none
     executor_cm = executor_cm or concurrent.futures.ThreadPoolExecutor(
-        max_workers=len_or_none or None, **concurrency.initcontext()
+        max_workers=max_workers or None, **concurrency.initcontext()
     )  # if len_or_none turns out to be zero, swap in a None which won't kill the executor
     with executor_cm as executor:
-        keys_onto_futures = {key: executor.submit(thunk) for key, thunk in thunks}
-        future_ids_onto_keys = {id(future): key for key, future in keys_onto_futures.items()}
-        # While concurrent.futures.as_completed accepts an iterable as input, it
-        # does not yield any completed futures until the input iterable is
-        # exhausted.
+        keys_and_futures = (
+            _submit_windowed(executor, thunks, max_in_flight)
+            if max_in_flight > 0
+            else _submit_all(executor, thunks)
+        )
         num_exceptions = 0
-        for i, future in enumerate(concurrent.futures.as_completed(keys_onto_futures.values()), start=1):
-            thunk_key = future_ids_onto_keys[id(future)]
+        for i, (thunk_key, future) in enumerate(keys_and_futures, start=1):
             error_suffix = (
                 error_fmt(f"; {num_exceptions} tasks have raised exceptions") if num_exceptions else ""
             )
@@ -148,9 +193,14 @@ def failfast(results: ty.Iterable[ty.Tuple[H, ty.Union[R, Error]]]) -> ty.Iterat
         yield key, res
 
 
-def failfast_results(thunks: ty.Iterable[ty.Callable[[], R]], *, named: str = "") -> ty.Iterator[R]:
-    """Run thunks concurrently, yield results in completion order, abort on first error."""
-    for _, result in failfast(yield_all(create_keys(thunks), named=named)):
+def failfast_results(
+    thunks: ty.Iterable[ty.Callable[[], R]], *, named: str = "", max_in_flight: int = 0
+) -> ty.Iterator[R]:
+    """Run thunks concurrently, yield results in completion order, abort on first error.
+
+    See `yield_all` for the meaning of `max_in_flight`.
+    """
+    for _, result in failfast(yield_all(create_keys(thunks), named=named, max_in_flight=max_in_flight)):
         yield result
 
 
@@ -188,6 +238,7 @@ def yield_results(
     success_fmt: ty.Callable[[str], str] = lambda x: x,
     named: str = "",
     progress_logger: ty.Optional[ty.Callable[[str], ty.Any]] = None,
+    max_in_flight: int = 0,
 ) -> ty.Iterator[R]:
     """Yield only the successful results of your Callables/Thunks. Continue despite errors.
 
@@ -200,6 +251,8 @@ def yield_results(
     will be raised at the end of execution to indicate that not all
     tasks were successful. If you wish to capture Exceptions alongside
     results, use `yield_all` instead.
+
+    Pass a positive `max_in_flight` to bound the number of outstanding tasks - see `yield_all`.
     """
 
     exceptions: ty.List[Exception] = list()
@@ -212,6 +265,7 @@ def yield_results(
             progress_logger=progress_logger,
             fmt=success_fmt,
             error_fmt=error_fmt,
+            max_in_flight=max_in_flight,
         ),
         start=1,
     ):
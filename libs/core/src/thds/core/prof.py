@@ -25,6 +25,14 @@ monkey-patching will be done automatically.
 To wrap a logger, simply use the output of `wrap_logger(YOUR_LOGGER)`
 as your logger. It will automatically output profiling information on
 every usage.
+
+For where the time actually goes between log statements, set the
+TH_PROF_STACKS environment variable (to 1, or true) to run a background
+stack sampler (`core.stack_prof`) for the life of the process; any other
+number, e.g. 0.05, is the sampling interval in seconds. Collapsed stacks,
+tagged with each `profile` name and any other `logger_context`, are
+written to th-profiles/ at exit, ready for a flamegraph tool. This
+does not require psutil.
 """
 
 import contextlib
@@ -275,3 +283,15 @@ if "TH_PROF_ALL_LOGGERS" in os.environ:
             format="{name:<45} - {levelname:^8} - {message}",
         )
         monkey_patch_core_getLogger()
+
+
+if "TH_PROF_STACKS" in os.environ:
+    from thds.core import stack_prof
+
+    _stacks_interval = stack_prof.interval_from_env(os.environ["TH_PROF_STACKS"])
+    if _stacks_interval is not None:
+        print(f"Sampling all thread stacks every {_stacks_interval}s because of TH_PROF_STACKS")
+        stack_prof.sample_process(
+            _stacks_interval,
+            _PROFS_DIR / f"th-stacks-{datetime.utcnow().isoformat()}-{os.getpid()}.folded",
+        )
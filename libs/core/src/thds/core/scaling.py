@@ -11,6 +11,21 @@ import typing as ty
 from thds.core.stack_context import StackContext
 
 _SCALE_GROUP_PRIORITY: StackContext[ty.Tuple[str, ...]] = StackContext("_SCALE_GROUP_PRIORITY", ("",))
+PushHook = ty.Callable[[ty.Tuple[str, ...]], ty.ContextManager]
+_PUSH_HOOKS: ty.Tuple[PushHook, ...] = ()
+
+
+def add_push_hook(hook: PushHook) -> None:
+    """The hook is called with the active scale groups each time a group is pushed, and the
+    context manager it returns is entered while they remain active.
+    """
+    global _PUSH_HOOKS
+    _PUSH_HOOKS = (*_PUSH_HOOKS, hook)
+
+
+def remove_push_hook(hook: PushHook) -> None:
+    global _PUSH_HOOKS
+    _PUSH_HOOKS = tuple(h for h in _PUSH_HOOKS if h != hook)
 
 
 @contextlib.contextmanager
@@ -31,7 +46,10 @@ def push_scale_group(*scale_group_names: str) -> ty.Iterator[ty.Tuple[str, ...]]
     with _SCALE_GROUP_PRIORITY.set(
         (*scale_group_names, *(sz for sz in _SCALE_GROUP_PRIORITY() if sz not in scale_group_names))
     ):
-        yield _SCALE_GROUP_PRIORITY()
+        with contextlib.ExitStack() as stack:
+            for hook in _PUSH_HOOKS:
+                stack.enter_context(hook(_SCALE_GROUP_PRIORITY()))
+            yield _SCALE_GROUP_PRIORITY()
 
 
 def active_scale_groups() -> ty.Tuple[str, ...]:
@@ -2,15 +2,19 @@ import concurrent.futures
 import json
 import os
 import shutil
+import threading
 import typing as ty
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from pathlib import Path
 
-from .. import cm, link, logical_root, parallel, thunks, types
+from .. import cm, config, hash_cache, hashing, link, log, logical_root, parallel, thunks, types
 from . import serde
 from .src import Source
 
 _MAX_PARALLELISM = 90
+_MAX_IN_FLIGHT = 2 * _MAX_PARALLELISM  # keeps the workers busy without a future per file.
+PREFETCH_MAX_BYTES_IN_FLIGHT = config.item("prefetch_max_bytes_in_flight", 2**32, parse=int)
+logger = log.getLogger(__name__)
 
 
 def _logical_tree_replication_operations(
@@ -25,38 +29,149 @@ def _logical_tree_replication_operations(
     return logical_dest, operations
 
 
+def _is_replicated(src: Path, dest: Path, hash: ty.Optional[hashing.Hash]) -> bool:
+    """True if dest already has the same contents as src (or is src)."""
+    try:
+        if os.path.samefile(src, dest):
+            return True
+        if src.stat().st_size != dest.stat().st_size:
+            return False
+    except FileNotFoundError:
+        return False
+
+    algo = hash.algo if hash else "sha256"
+    # both hashes are cached by inode/size/mtime, so an unchanged tree is cheap to recheck.
+    expected = hash.bytes if hash else hash_cache.filehash(algo, src).bytes
+    return hash_cache.filehash(algo, dest).bytes == expected
+
+
+def _remove_unlisted(logical_dest: Path, keep: ty.Collection[Path]) -> None:
+    """Remove every file under logical_dest that is not in keep, along with any directories
+    left empty."""
+    for dirpath, _dirnames, filenames in os.walk(logical_dest, topdown=False):
+        dir_ = Path(dirpath)
+        for filename in filenames:
+            if (dir_ / filename) not in keep:
+                (dir_ / filename).unlink()
+        if dir_ != logical_dest and not any(dir_.iterdir()):
+            dir_.rmdir()
+
+
 def replicate_logical_tree(
     local_paths: ty.Iterable[Path],
     logical_local_root: Path,
     dest_dir: Path,
     copy: ty.Callable[[Path, Path], ty.Any] = link.cheap_copy,
     executor_cm: ty.Optional[ty.ContextManager[concurrent.futures.Executor]] = None,
+    max_in_flight: int = _MAX_IN_FLIGHT,
+    incremental: bool = False,
+    hashes: ty.Optional[ty.Mapping[Path, hashing.Hash]] = None,
 ) -> Path:
     """
     Replicate only the specified files from logical_root into dest_dir.
     Returns the path to the logical root in the new location.
+
+    By default the logical root in dest_dir is emptied first. If incremental, files
+    already present with matching contents are left alone, and only those that are not
+    listed are removed. Matching is by hash - from `hashes` (keyed by local path) where
+    provided, else sha256 - so repeated replication into the same directory is cheap.
     """
     logical_dest, operations = _logical_tree_replication_operations(
         local_paths, logical_local_root, dest_dir
     )
 
     top_level_of_logical_dest_dir = dest_dir / logical_local_root.name
-    shutil.rmtree(top_level_of_logical_dest_dir, ignore_errors=True)
-
-    def copy_to(src: Path, dest: Path) -> None:
+    if incremental:
+        if top_level_of_logical_dest_dir.is_dir():
+            _remove_unlisted(top_level_of_logical_dest_dir, {dest for _, dest in operations})
+    else:
+        shutil.rmtree(top_level_of_logical_dest_dir, ignore_errors=True)
+
+    hashes = hashes or dict()
+
+    def copy_to(src: Path, dest: Path) -> bool:
+        if incremental:
+            if _is_replicated(src, dest, hashes.get(src)):
+                return False
+            dest.unlink(missing_ok=True)
         dest.parent.mkdir(parents=True, exist_ok=True)
         copy(src, dest)
+        return True
 
-    for _ in parallel.failfast(
+    n_copied = 0
+    for _, copied in parallel.failfast(
         parallel.yield_all(
             ((src, thunks.thunking(copy_to)(src, dest)) for src, dest in operations),
             executor_cm=executor_cm,
+            max_in_flight=max_in_flight,
         )
     ):
-        pass
+        n_copied += copied
+    if incremental:
+        logger.debug(
+            f"Replicated {n_copied} of {len(operations)} files into {top_level_of_logical_dest_dir}"
+        )
     return top_level_of_logical_dest_dir
 
 
+class _Prefetch:
+    """Downloads sources in the background, largest first, while the total size of the
+    downloads in flight stays under a budget (one download is always allowed, however large).
+
+    `claim` lets a foreground caller either wait on the prefetch of a source, or take over
+    a source that has not been started yet, so that nothing is downloaded twice.
+    """
+
+    def __init__(self, sources: ty.Sequence[Source], max_bytes_in_flight: int, max_workers: int):
+        self._cond = threading.Condition()
+        self._futures: ty.Dict[Source, concurrent.futures.Future[Path]] = dict()
+        self._claimed: ty.Set[Source] = set()
+        self._bytes_in_flight = 0
+        self._max_bytes_in_flight = max_bytes_in_flight
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="source-tree-prefetch"
+        )
+        self._thread = threading.Thread(
+            target=self._run,
+            args=(sorted(set(sources), key=lambda src: src.size, reverse=True),),
+            name="source-tree-prefetch-scheduler",
+            daemon=True,
+        )
+        self._thread.start()
+
+    def _download(self, src: Source) -> Path:
+        try:
+            return src.path()
+        finally:
+            with self._cond:
+                self._bytes_in_flight -= src.size
+                self._cond.notify_all()
+
+    def _run(self, sources: ty.List[Source]) -> None:
+        try:
+            for src in sources:
+                with self._cond:
+                    while (
+                        self._bytes_in_flight
+                        and self._bytes_in_flight + src.size > self._max_bytes_in_flight
+                    ):
+                        self._cond.wait()
+                    if src in self._claimed:
+                        continue
+                    self._bytes_in_flight += src.size
+                    self._futures[src] = self._executor.submit(self._download, src)
+        finally:
+            self._executor.shutdown(wait=False)
+
+    def claim(self, src: Source) -> ty.Optional["concurrent.futures.Future[Path]"]:
+        """The prefetch's future for this source, or None if the caller must fetch it."""
+        with self._cond:
+            future = self._futures.get(src)
+            if future is None:
+                self._claimed.add(src)
+            return future
+
+
 @dataclass
 class SourceTree(os.PathLike):
     """Represent a fixed set of sources (with hashes where available) as a list of
@@ -71,30 +186,64 @@ class SourceTree(os.PathLike):
     # consuming system.  in those cases, this can be specified and we'll find the lowest
     # common prefix _above_ that.
 
-    def path(self, dest_dir: ty.Optional[types.StrOrPath] = None) -> Path:
+    # set by prefetch(); background downloads that path() will wait on rather than repeat.
+    _prefetch: ty.Optional[_Prefetch] = field(default=None, init=False, repr=False, compare=False)
+
+    def __getstate__(self) -> ty.Dict[str, ty.Any]:
+        # a prefetch in progress is local to this process. Leaving it out entirely (the class
+        # default covers unpickled trees) keeps the pickle - and so mops memo keys - unchanged.
+        state = dict(self.__dict__)
+        state.pop("_prefetch", None)
+        return state
+
+    def prefetch(
+        self, max_bytes_in_flight: int = 0, max_workers: int = _MAX_PARALLELISM
+    ) -> "SourceTree":
+        """Start downloading the sources in the background, largest first, without exceeding
+        `max_bytes_in_flight` (default from config) at any one time. Returns self.
+
+        A later `path()` waits for sources the prefetch has already started, and downloads the
+        rest itself. Download errors are raised from `path()`. Calling this again is a no-op.
+        """
+        if self._prefetch is None:
+            self._prefetch = _Prefetch(
+                self.sources, max_bytes_in_flight or PREFETCH_MAX_BYTES_IN_FLIGHT(), max_workers
+            )
+        return self
+
+    def _fetch(self, src: Source) -> ty.Callable[[], Path]:
+        future = self._prefetch.claim(src) if self._prefetch else None
+        # src.path() is a thunk that downloads the data if not already present locally.
+        # Source allows registration of download handlers by URI scheme.
+        return (lambda: future.result()) if future else src.path
+
+    def path(self, dest_dir: ty.Optional[types.StrOrPath] = None, incremental: bool = False) -> Path:
         """Return a local path to a directory that corresponds to the logical root.
 
-        This incurs a download of _all_ sources explicitly represented by the list.
+        This incurs a download of _all_ sources explicitly represented by the list, largest
+        first.
 
         If you want to _ensure_ that _only_ the listed sources are present in the
         directory, despite any other files which may be present in an
         implementation-specific cache, you must pass a Path to a directory that you are
-        willing to have emptied, and this method will copy the files into it.
+        willing to have emptied, and this method will copy the files into it. If
+        incremental, files already in that directory with the expected contents are kept
+        rather than copied again (unlisted files are still removed).
         """
         with cm.keep_context(
             concurrent.futures.ThreadPoolExecutor(max_workers=_MAX_PARALLELISM)
         ) as thread_pool:
-            local_paths = [
-                local_path
-                for _, local_path in parallel.failfast(
+            by_size = sorted(self.sources, key=lambda src: src.size, reverse=True)
+            downloaded = list(
+                parallel.failfast(
                     parallel.yield_all(
-                        # src.path() is a thunk that downloads the data if not already present locally.
-                        # Source allows registration of download handlers by URI scheme.
-                        ((src, src.path) for src in self.sources),
+                        ((src, self._fetch(src)) for src in by_size),
                         executor_cm=thread_pool,
+                        max_in_flight=_MAX_IN_FLIGHT,
                     )
                 )
-            ]
+            )
+            local_paths = [local_path for _, local_path in downloaded]
 
             if len(local_paths) == 1:
                 local_logical_root = local_paths[0].parent.resolve()
@@ -108,7 +257,12 @@ class SourceTree(os.PathLike):
                 return local_logical_root
 
             return replicate_logical_tree(
-                local_paths, local_logical_root, Path(dest_dir).resolve(), executor_cm=thread_pool
+                local_paths,
+                local_logical_root,
+                Path(dest_dir).resolve(),
+                executor_cm=thread_pool,
+                incremental=incremental,
+                hashes={local_path: src.hash for src, local_path in downloaded if src.hash},
             )
 
     @property
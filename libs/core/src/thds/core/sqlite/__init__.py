@@ -1,5 +1,5 @@
 from . import connect, copy, ddl, functions, index, read, sqlmap, types, upsert  # noqa: F401
-from .merge import merge_databases  # noqa: F401
+from .merge import merge_databases, tree_merge_databases  # noqa: F401
 from .meta import (  # noqa: F401
     debug_errors,
     list_tables,
@@ -1,8 +1,10 @@
+import concurrent.futures
 import os
+import re
 import typing as ty
 from contextlib import closing
 from pathlib import Path
-from sqlite3 import connect
+from sqlite3 import Connection, connect
 from timeit import default_timer
 
 from thds.core import log, types
@@ -82,3 +84,157 @@ def merge_databases(
     logger.info(f"Merge complete after {default_timer() - merge_start:.2f}s")
     conn.close()
     return Path(first_filename)
+
+
+def _index_defs(conn: Connection, table_names: ty.Collection[str]) -> ty.Dict[str, str]:
+    return {
+        idx_name: index_sql
+        for table_name in table_names or get_tables(conn).keys()
+        for idx_name, index_sql in get_indexes(table_name, conn).items()
+    }
+
+
+def _is_unique(index_sql: str) -> bool:
+    return re.match(r"\s*CREATE\s+UNIQUE\s", index_sql, re.IGNORECASE) is not None
+
+
+def _create_missing_unique_indexes(
+    db: types.StrOrPath, table_names: ty.Collection[str], source_db: types.StrOrPath
+) -> None:
+    """Those the source has on tables the destination has, and the destination doesn't."""
+    with closing(connect(os.fspath(source_db))) as conn:
+        unique_indexes = {
+            idx_name: (table_name, index_sql)
+            for table_name in table_names or get_tables(conn).keys()
+            for idx_name, index_sql in get_indexes(table_name, conn).items()
+            if _is_unique(index_sql)
+        }
+    if not unique_indexes:
+        return
+    with closing(connect(os.fspath(db))) as conn:
+        tables = get_tables(conn)
+        existing = {
+            row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")
+        }
+        for idx_name, (table_name, index_sql) in unique_indexes.items():
+            if idx_name not in existing and table_name in tables:
+                conn.execute(index_sql)
+        conn.commit()
+
+
+def _merge_pair(
+    dest: types.StrOrPath,
+    src: types.StrOrPath,
+    table_names: ty.Collection[str],
+    replace: bool,
+    drop_dest_indexes: bool,
+) -> ty.Tuple[Path, ty.Dict[str, str]]:
+    """One step of a tree merge, run in a worker process.
+
+    Returns the index definitions found in both databases, having dropped the destination's
+    non-unique ones (the first time it is a destination), so that inserts don't pay for
+    their maintenance. The caller recreates them once, at the very end.
+
+    Unique indexes stay where they are, and the source's are created on the destination
+    before inserting (or after, for the tables the merge creates), since they decide which
+    rows `INSERT OR REPLACE` replaces.
+    """
+    indexes: ty.Dict[str, str] = dict()
+    with closing(connect(os.fspath(dest))) as conn:
+        if drop_dest_indexes:
+            indexes.update(_index_defs(conn, table_names))
+            for idx_name, index_sql in indexes.items():
+                if not _is_unique(index_sql):
+                    conn.execute(f"DROP INDEX [{idx_name}]")
+            conn.commit()
+    with closing(connect(os.fspath(src))) as conn:
+        for idx_name, index_sql in _index_defs(conn, table_names).items():
+            indexes.setdefault(idx_name, index_sql)
+    _create_missing_unique_indexes(dest, table_names, src)
+    merge_databases([dest, src], table_names, replace=replace, copy_indexes=False)
+    _create_missing_unique_indexes(dest, table_names, src)
+    return Path(dest), indexes
+
+
+def tree_merge_databases(
+    filenames: ty.Iterable[types.StrOrPath],
+    table_names: ty.Collection[str] = tuple(),
+    *,
+    replace: bool = False,
+    copy_indexes: bool = True,
+    executor: ty.Optional[concurrent.futures.Executor] = None,
+    max_workers: int = 0,
+) -> Path:
+    """Produces the same result as `merge_databases`, but merges adjacent pairs of
+    databases concurrently, in ceil(log2(N)) rounds, rather than merging every database
+    into the first one at a time.
+
+    Order is preserved - with `replace=True`, rows from later databases still win.
+
+    Index creation is deferred: non-unique indexes are dropped from each database before it
+    is first merged into, and every index found in any of the databases is created once on
+    the final result (unless `copy_indexes` is False, in which case they are simply dropped).
+    Unique indexes are kept throughout, so that `replace=True` replaces the same rows it
+    would in a sequential merge.
+
+    This mutates roughly half of the input databases, not just the first! The result
+    is the first database in the list. Per-round timings are logged.
+
+    Merging is CPU-intensive, so you'll want a ProcessPoolExecutor - one is created with
+    `max_workers` (default: one per pair in the first round) if you don't provide one.
+    """
+    paths = [Path(fn) for fn in filenames]
+    n_databases = len(paths)
+    if n_databases < 2:
+        return paths[0]
+
+    owned_executor = None
+    if executor is None:
+        executor = owned_executor = concurrent.futures.ProcessPoolExecutor(
+            max_workers=max_workers or n_databases // 2
+        )
+
+    indexes: ty.Dict[str, str] = dict()
+    stripped: ty.Set[Path] = set()
+    merge_start = default_timer()
+    n_rounds = (n_databases - 1).bit_length()
+    try:
+        for round_num in range(1, n_rounds + 1):
+            start = default_timer()
+            pairs = list(zip(paths[0::2], paths[1::2]))
+            futures = [
+                executor.submit(_merge_pair, dest, src, table_names, replace, dest not in stripped)
+                for dest, src in pairs
+            ]
+            stripped.update(dest for dest, _ in pairs)
+            merged = list()
+            for future in futures:  # in order, so that earlier databases' index definitions win.
+                dest, pair_indexes = future.result()
+                merged.append(dest)
+                for idx_name, index_sql in pair_indexes.items():
+                    indexes.setdefault(idx_name, index_sql)
+            paths = merged + paths[len(pairs) * 2 :]  # an odd database out waits for the next round
+            logger.info(
+                f"Tree merge round {round_num}/{n_rounds} merged {len(pairs)} pairs"
+                f" in {default_timer() - start:.2f}s"
+            )
+    finally:
+        if owned_executor:
+            owned_executor.shutdown()
+
+    (result,) = paths
+    if copy_indexes and indexes:
+        start = default_timer()
+        with closing(connect(os.fspath(result))) as conn:
+            existing = {
+                row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")
+            }
+            for idx_name, index_sql in indexes.items():
+                if idx_name not in existing:
+                    conn.execute(index_sql)
+            conn.commit()
+        logger.info(f"Created {len(indexes)} deferred indexes in {default_timer() - start:.2f}s")
+    logger.info(
+        f"Tree merge of {n_databases} databases complete after {default_timer() - merge_start:.2f}s"
+    )
+    return result
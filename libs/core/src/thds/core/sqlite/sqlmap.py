@@ -3,14 +3,14 @@ import os
 import shutil
 import typing as ty
 from collections import defaultdict
-from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from functools import partial
 from pathlib import Path
 from uuid import uuid4
 
-from thds.core import log, parallel, scope, thunks, tmp, types
+from thds.core import cpus, log, parallel, scope, thunks, tmp, types
 
-from .merge import merge_databases
+from .merge import merge_databases, tree_merge_databases
 
 logger = log.getLogger(__name__)
 _tmpdir_scope = scope.Scope()
@@ -67,6 +67,11 @@ def merge_sqlite_dirs(
     max_cores is the maximum number of _databases_ to merge in parallel;
     since SQLite is doing almost all of the work, we don't imagine that we'd be able to get
     much speedup by merging multiple databases using the same core. This has not been benchmarked.
+
+    With the default merger, the databases for each filename are merged pairwise in
+    log2(N) concurrent rounds (see `tree_merge_databases`), all sharing a single process
+    pool of max_cores workers (or one per available CPU, if max_cores is not positive).
+    A custom merger is called once per filename with all of that filename's databases.
     """
     _ensure_output_dir(output_dir)
     sqlite_dbs_by_filename: ty.Dict[str, ty.List[Path]] = defaultdict(list)
@@ -85,7 +90,11 @@ def merge_sqlite_dirs(
             if sqlite_db_path.is_file():
                 sqlite_dbs_by_filename[sqlite_db_path.name].append(sqlite_db_path)
 
-    thunking_merger = thunks.thunking(merger or _default_merge_databases)
+    if merger is None or merger is _default_merge_databases:
+        _tree_merge_sqlite_dbs(sqlite_dbs_by_filename, output_dir, max_cores)
+        return {filename: output_dir / filename for filename in sqlite_dbs_by_filename}
+
+    thunking_merger = thunks.thunking(merger)
     for merged_db in parallel.yield_results(
         [
             thunking_merger(sqlite_db_paths)
@@ -100,6 +109,25 @@ def merge_sqlite_dirs(
     return {filename: output_dir / filename for filename in sqlite_dbs_by_filename}
 
 
+def _tree_merge_sqlite_dbs(
+    sqlite_dbs_by_filename: ty.Mapping[str, ty.List[Path]], output_dir: Path, max_cores: int
+) -> None:
+    n_pairs = sum(len(paths) // 2 for paths in sqlite_dbs_by_filename.values())
+    max_workers = max(min(max_cores if max_cores > 0 else cpus.available_cpu_count(), n_pairs), 1)
+    # SQLite merge is CPU-intensive, so the pairwise merges happen in a Process Pool,
+    # while the rounds for each filename are coordinated from (cheap) threads.
+    with ProcessPoolExecutor(max_workers=max_workers) as process_pool:
+        for merged_db in parallel.yield_results(
+            [
+                thunks.thunking(tree_merge_databases)(sqlite_db_paths, executor=process_pool)
+                for sqlite_db_paths in sqlite_dbs_by_filename.values()
+            ],
+            executor_cm=ThreadPoolExecutor(max_workers=max(len(sqlite_dbs_by_filename), 1)),
+        ):
+            logger.info(f"Moving merged database {merged_db} into {output_dir}")
+            shutil.move(str(merged_db), os.path.join(output_dir, merged_db.name))
+
+
 def _ensure_output_dir(output_directory: Path):
     if output_directory.exists():
         if not output_directory.is_dir():
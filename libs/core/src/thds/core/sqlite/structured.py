@@ -1,23 +1,64 @@
+import contextlib
 import functools
+import queue
+import sqlite3
+import threading
 import typing as ty
 from dataclasses import dataclass
+from pathlib import Path
 from sqlite3 import Connection, OperationalError
 
 from thds.core import config
-from thds.core.lazy import ThreadLocalLazy
+from thds.core.lazy import Lazy, ThreadLocalLazy
 from thds.core.log import getLogger
 from thds.core.types import StrOrPath
 
 from .connect import row_connect
+from .functions import register_functions_on_connection
 from .meta import column_names, get_tables, primary_key_cols
 from .read import matching
 from .types import T, TableSource
 
 SQLITE_CACHE_SIZE = config.item("cache_size", 100_000)
 MMAP_BYTES = config.item("mmap_bytes", 8_589_934_592)
+SQLITE_MAX_VARIABLES = config.item("max_variables", 999)
+# the compiled-in default for SQLite < 3.32; newer builds allow 32766, but this is plenty.
 _logger = getLogger(__name__)
 
 
+class ReadPool:
+    """A bounded pool of read-only connections to a single SQLite database, shared across
+    threads. Each connection is used by only one thread at a time, but is not tied to the
+    thread that opened it, so N threads need not mean N connections (and N mmaps).
+    """
+
+    def __init__(self, db_path: StrOrPath, size: int, mmap_size: ty.Optional[int] = None):
+        self._uri = Path(db_path).resolve().as_uri() + "?mode=ro"
+        self._mmap_size = mmap_size
+        self._slots = threading.BoundedSemaphore(size)
+        self._idle: "queue.LifoQueue[Connection]" = queue.LifoQueue()
+        # LIFO so that the most recently used (and therefore warmest) connection is reused.
+
+    def _open(self) -> Connection:
+        conn = sqlite3.connect(self._uri, uri=True, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        if self._mmap_size:
+            conn.execute(f"PRAGMA mmap_size={self._mmap_size};")
+        return register_functions_on_connection(conn)
+
+    @contextlib.contextmanager
+    def connection(self) -> ty.Iterator[Connection]:
+        with self._slots:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                conn = self._open()
+            try:
+                yield conn
+            finally:
+                self._idle.put(conn)
+
+
 @dataclass
 class TableMeta:
     """Things which can be derived and cached once we have established the first Connection."""
@@ -26,6 +67,9 @@ class TableMeta:
     name: str
     pk_cols: ty.Set[str]
     colnames: ty.Set[str]
+    pool: ty.Optional[ReadPool] = None
+    # if present, queries borrow a connection from the pool rather than using conn, which
+    # is then the connection the metadata was read with, usable only by the thread that opened it.
 
 
 DbPathAndTableName = ty.Tuple[StrOrPath, str]
@@ -43,11 +87,16 @@ class _Table(ty.Protocol):
     def __call__(self, ignore_mmap_size: bool = False) -> TableMeta: ...
 
 
+def _chunks(seq: ty.Sequence[int], size: int) -> ty.Iterator[ty.Sequence[int]]:
+    for i in range(0, len(seq), size):
+        yield seq[i : i + size]
+
+
 class StructTable(ty.Generic[T]):
     def __init__(
         self,
         from_item: ty.Callable[[ty.Mapping[str, ty.Any]], T],
-        table_meta: ty.Callable[[ty.Optional[int]], ThreadLocalLazy[TableMeta]],
+        table_meta: ty.Callable[[ty.Optional[int]], ty.Callable[[], TableMeta]],
         cache_size: ty.Optional[int] = None,
         mmap_size: int = -1,
     ):
@@ -63,11 +112,26 @@ class StructTable(ty.Generic[T]):
             self.get = functools.lru_cache(cache_size)(self.get)  # type: ignore
             self.list = functools.lru_cache(cache_size)(self.list)  # type: ignore
 
+    @contextlib.contextmanager
+    def _conn(self, tbl: TableMeta) -> ty.Iterator[Connection]:
+        if tbl.pool is None:
+            yield tbl.conn
+        else:
+            with tbl.pool.connection() as conn:
+                yield conn
+
     def matching(self, **where: ty.Any) -> ty.Iterator[T]:
         tbl = self._tbl()
         try:
-            for item in matching(tbl.name, tbl.conn, where):
-                yield self.from_item(item)
+            if tbl.pool is None:
+                for item in matching(tbl.name, tbl.conn, where):
+                    yield self.from_item(item)
+            else:
+                # don't hold a pooled connection while our caller consumes the iterator.
+                with self._conn(tbl) as conn:
+                    items = list(matching(tbl.name, conn, where))
+                for item in items:
+                    yield self.from_item(item)
         except OperationalError as e:
             if unknown_cols := (set(where) - tbl.colnames):
                 raise UnknownColumns(f"Can't match on columns that don't exist: {unknown_cols}")
@@ -98,13 +162,81 @@ class StructTable(ty.Generic[T]):
         """List all items in the table where key/column = value."""
         return list(self.matching(**where))
 
+    def matching_many(self, wheres: ty.Iterable[ty.Mapping[str, ty.Any]]) -> ty.List[ty.List[T]]:
+        """The batched equivalent of `[self.list(**where) for where in wheres]`.
+
+        Results are in the same order as the input. Rather than one query per mapping, the
+        mappings are grouped by the set of columns they match on, and each group is
+        looked up in chunks, by joining against an inline table of the values (so SQLite
+        applies the same type affinity it would for `column = value`).
+        """
+        tbl = self._tbl()
+        wheres = list(wheres)
+        results: ty.List[ty.List[T]] = [list() for _ in wheres]
+        by_cols: ty.Dict[ty.Tuple[str, ...], ty.List[int]] = dict()
+        for i, where in enumerate(wheres):
+            by_cols.setdefault(tuple(sorted(where)), list()).append(i)
+
+        for cols, indices in by_cols.items():
+            if unknown_cols := (set(cols) - tbl.colnames):
+                raise UnknownColumns(f"Can't match on columns that don't exist: {unknown_cols}")
+            if not cols:
+                everything = self.list()
+                for i in indices:
+                    results[i] = list(everything)
+                continue
+
+            chunk_size = max(SQLITE_MAX_VARIABLES() // (len(cols) + 1), 1)
+            placeholders = "(" + ", ".join("?" * (len(cols) + 1)) + ")"
+            on = " AND ".join(f"_t.[{col}] = _keys.[{col}]" for col in cols)
+            with self._conn(tbl) as conn:
+                for chunk in _chunks(indices, chunk_size):
+                    cursor = conn.cursor()
+                    cursor.row_factory = None  # we need the ordinal, but not in the item.
+                    cursor.execute(
+                        f"WITH _keys(_ord, {', '.join(f'[{col}]' for col in cols)})"
+                        f" AS (VALUES {', '.join([placeholders] * len(chunk))})"
+                        f" SELECT _keys._ord, _t.* FROM _keys JOIN [{tbl.name}] AS _t ON {on}",
+                        [value for i in chunk for value in (i, *(wheres[i][col] for col in cols))],
+                    )
+                    names = [d[0] for d in cursor.description[1:]]
+                    for row in cursor:
+                        results[row[0]].append(self.from_item(dict(zip(names, row[1:]))))
+        return results
+
+    def get_many(self, primary_keys: ty.Iterable[ty.Mapping[str, ty.Any]]) -> ty.List[ty.Optional[T]]:
+        """The batched equivalent of `[self.get(**pk) for pk in primary_keys]` - results are
+        in the same order as the input, with None where there is no match.
+
+        Raises if any primary key is incomplete or matches more than one item.
+        """
+        tbl = self._tbl()
+        primary_keys = list(primary_keys)
+        for primary_key in primary_keys:
+            if not set(primary_key) == tbl.pk_cols:
+                raise BadPrimaryKey(
+                    f"Primary key must be complete; expected {tbl.pk_cols} but got {primary_key}"
+                )
+
+        def only(primary_key: ty.Mapping[str, ty.Any], items: ty.List[T]) -> ty.Optional[T]:
+            if len(items) > 1:
+                raise BadPrimaryKey(f"More than one item found for supposed primary key {primary_key}")
+            return items[0] if items else None
+
+        return [only(pk, items) for pk, items in zip(primary_keys, self.matching_many(primary_keys))]
+
 
 def autometa_factory(
     src: ty.Callable[[], DbPathAndTableName],
-) -> ty.Callable[[ty.Optional[int]], ThreadLocalLazy[TableMeta]]:
-    """Use this factory to defer the connection and other settings (e.g., mmap_size) within each thread"""
+    pool_size: int = 0,
+) -> ty.Callable[[ty.Optional[int]], ty.Callable[[], TableMeta]]:
+    """Use this factory to defer the connection and other settings (e.g., mmap_size) within each thread.
 
-    def _autometa(mmap_size: ty.Optional[int] = None) -> ThreadLocalLazy[TableMeta]:
+    By default, each thread gets its own connection. With a positive `pool_size`, all
+    threads instead share a pool of at most that many read-only connections.
+    """
+
+    def _autometa(mmap_size: ty.Optional[int] = None) -> ty.Callable[[], TableMeta]:
         def _get_table_meta():
             db_path, table_name = src()
             conn = row_connect(db_path)
@@ -119,12 +251,22 @@ def autometa_factory(
             if not colnames:
                 raise UnknownColumns(f"Found no columns for table {table_name}")
 
+            if pool_size > 0:
+                _logger.info(f"Sharing up to {pool_size} read-only connections to {db_path}")
+                pool = ReadPool(db_path, pool_size, mmap_size)
+                with pool.connection():
+                    pass  # fail fast if the database can't be opened read-only.
+                # conn stays this thread's own - only the pool's connections are shared.
+                return TableMeta(conn, table_name, pk_cols, colnames, pool=pool)
+
             if mmap_size:
                 _logger.info(f"Setting sqlite mmap size to {mmap_size}")
                 conn.execute(f"PRAGMA mmap_size={mmap_size};")
 
             return TableMeta(conn, table_name, pk_cols, colnames)
 
+        if pool_size > 0:
+            return Lazy(_get_table_meta)
         return ThreadLocalLazy(_get_table_meta)
 
     return _autometa
@@ -133,9 +275,10 @@ def autometa_factory(
 def struct_table_from_source(
     from_item: ty.Callable[[ty.Mapping[str, ty.Any]], T],
     table_source: ty.Callable[[], TableSource],
+    pool_size: int = 0,
     **kwargs,
 ) -> StructTable[T]:
     def extract_path_and_name() -> DbPathAndTableName:
         return str(table_source().db_src.path()), table_source().table_name
 
-    return StructTable(from_item, autometa_factory(extract_path_and_name), **kwargs)
+    return StructTable(from_item, autometa_factory(extract_path_and_name, pool_size=pool_size), **kwargs)
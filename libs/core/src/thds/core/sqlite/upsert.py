@@ -1,7 +1,8 @@
+import operator
 import textwrap
 import typing as ty
 from functools import lru_cache
-from sqlite3 import Connection
+from sqlite3 import Connection, Cursor
 
 from thds.core import generators, log
 
@@ -137,3 +138,132 @@ def mappings(
     unique combination of keys it sees (and so needs to examine the keys for every row).
     """
     generators.iterator_sender(_make_upsert_writer(conn, table_name, batch_size=batch_size), rows)
+
+
+def _bulk_merge_query(
+    table_name: str,
+    staging: str,
+    all_column_names: ty.Sequence[str],
+    keyset: ty.Sequence[str],
+    primary_keys: ty.Sequence[str],
+) -> str:
+    """Every staged row replaces the target row with the same primary key, taking the
+    staged values for the columns in the keyset and the existing values (if any) for the rest.
+    """
+    return textwrap.dedent(
+        f"""
+        INSERT OR REPLACE INTO [{table_name}] ({", ".join(f"[{col}]" for col in all_column_names)})
+            SELECT {", ".join(f"_s.[{col}]" if col in keyset else f"_t.[{col}]" for col in all_column_names)}
+            FROM {staging} AS _s
+            LEFT JOIN [{table_name}] AS _t USING ({", ".join(f"[{pk}]" for pk in primary_keys)})
+        """
+    )
+
+
+def _make_bulk_upsert_writer(
+    conn: Connection,
+    table_name: str,
+    staging_rows: int = 200_000,
+) -> ty.Generator[None, ty.Mapping[str, ty.Any], str]:
+    """A set-based alternative to `_make_upsert_writer`.
+
+    Up to `staging_rows` rows are first coalesced in memory by primary key, with later rows
+    overriding the columns they provide - which is exactly what upserting them one at a time
+    would do. Each key then appears once, so order no longer matters, and the coalesced rows
+    are grouped by keyset, streamed into a TEMP staging table per keyset, and merged into the
+    target with a single INSERT OR REPLACE ... SELECT ... LEFT JOIN per keyset.
+
+    The one behavioral difference is that constraints (e.g. NOT NULL) are only checked
+    against the coalesced row, so a row that omits a NOT NULL column may be rescued by a
+    later row for the same key within the same chunk.
+    """
+    primary_keys = primary_key_cols(table_name, conn)
+    if not primary_keys:
+        raise ValueError(f"Cannot upsert into table '{table_name}', which has no primary key")
+    all_column_names = tuple(get_table_schema(conn, table_name).keys())
+    staging = f"temp.[_upsert_staging_{table_name}]"
+
+    @lru_cache(maxsize=None)
+    def keyset_queries(keyset: ty.Tuple[str, ...]) -> ty.Tuple[str, str, str]:
+        cols = ", ".join(f"[{col}]" for col in keyset)
+        return (
+            f"CREATE TABLE {staging} ({cols})",  # keys are already unique; no index to maintain.
+            f"INSERT INTO {staging} ({cols}) VALUES ({', '.join('?' * len(keyset))})",
+            _bulk_merge_query(table_name, staging, all_column_names, keyset, primary_keys),
+        )
+
+    coalesced: ty.Dict[ty.Tuple[ty.Any, ...], ty.Dict[str, ty.Any]] = dict()
+
+    def merge(cursor: Cursor) -> None:
+        try:
+            # staging in primary key order makes the merge walk the target's B-tree in order.
+            pks = sorted(coalesced)
+        except TypeError:  # e.g. mixed types or NULLs in the keys; no matter.
+            pks = list(coalesced)
+        by_keyset: ty.Dict[ty.Tuple[str, ...], ty.List[ty.Dict[str, ty.Any]]] = dict()
+        for row in map(coalesced.__getitem__, pks):
+            by_keyset.setdefault(tuple(row), list()).append(row)  # key order doesn't matter here.
+        coalesced.clear()
+
+        for keyset, rows in by_keyset.items():
+            create_staging, insert_staged, merge_query = keyset_queries(keyset)
+            logger.debug(f"Merging {len(rows)} rows with keys {keyset} into table '{table_name}'")
+            cursor.execute(f"DROP TABLE IF EXISTS {staging}")
+            cursor.execute(create_staging)
+            getter = operator.itemgetter(*keyset)
+            cursor.executemany(
+                insert_staged, map(getter, rows) if len(keyset) > 1 else ((getter(row),) for row in rows)
+            )
+            cursor.execute(merge_query)
+
+    cursor = None
+    try:
+        row = yield
+        cursor = conn.cursor()
+        # don't create the cursor til we receive our first actual row.
+
+        while True:
+            try:
+                pk = tuple([row[pk_col] for pk_col in primary_keys])
+            except KeyError:
+                raise ValueError(f"Row is missing primary key columns {primary_keys}: {row}")
+            existing = coalesced.get(pk)
+            if existing is None:
+                coalesced[pk] = dict(row)
+                if len(coalesced) >= staging_rows:
+                    merge(cursor)
+            else:
+                existing.update(row)
+            row = yield
+
+    except GeneratorExit:
+        if cursor is None:
+            logger.warning(f"No rows to upsert into table '{table_name}'")
+            return ""
+
+        merge(cursor)
+        conn.commit()
+        return table_name
+    finally:
+        if cursor:
+            cursor.execute(f"DROP TABLE IF EXISTS {staging}")
+            cursor.close()
+
+
+def bulk_mappings(
+    conn: Connection,
+    table_name: str,
+    rows: ty.Iterable[ty.Mapping[str, ty.Any]],
+    *,
+    staging_rows: int = 200_000,
+) -> None:
+    """Like `mappings`, but merges rows into the target with one set-based query per keyset
+    (per `staging_rows` distinct primary keys), rather than a correlated lookup per row. Much
+    faster when upserting many partial rows, especially with heterogeneous keys.
+
+    NOT NULL and other constraints are checked against each key's coalesced row rather than
+    against every individual input row - see `_make_bulk_upsert_writer`.
+    """
+    generators.iterator_sender(
+        _make_bulk_upsert_writer(conn, table_name, staging_rows=staging_rows), rows
+    )
@@ -0,0 +1,245 @@
+"""A background stack-sampling profiler, for finding hot paths in processes you can't
+attach py-spy to.
+
+A daemon thread wakes every `interval` seconds, reads every other thread's current
+frame via `sys._current_frames()`, and counts each distinct stack. Since it samples on
+wall-clock time, threads blocked on IO or locks show up too - often that's exactly
+what you're looking for in an orchestrator.
+
+Each stack is rooted at its thread name and tagged with whatever `logger_context`
+key-value pairs and `scaling` groups were active in that thread, so e.g. every
+function called under `logger_context(profname="load")` is grouped beneath
+`[profname=load]`. (Tags are tracked per thread; coroutines interleaving on an event
+loop will share their thread's latest tags.)
+
+The output is the 'collapsed stack' format understood by flamegraph.pl, speedscope,
+and inferno: one `frame;frame;frame count` line per distinct stack.
+
+```
+with StackSampler() as sampler:
+    do_the_slow_thing()
+sampler.write_collapsed("slow.folded")
+print(*sampler.time_tracker().to_json())
+```
+
+Alternatively, set the TH_PROF_STACKS environment variable (see `core.prof`) to sample
+the whole process and write the stacks under `th-profiles/` at exit.
+"""
+
+import atexit
+import collections
+import contextlib
+import os
+import sys
+import threading
+import time
+import types
+import typing as ty
+from pathlib import Path
+
+from . import scaling
+from .log import getLogger, kw_logger
+from .timer import Timer, TimeTracker
+
+_SAMPLER_THREAD_NAME = "thds-core-stack-sampler"
+logger = getLogger(__name__)
+
+_THREAD_TAGS: ty.Dict[int, ty.Tuple[str, ...]] = dict()
+# thread ident -> the tags currently active in that thread; only maintained while a sampler runs.
+_TAGGING_LOCK = threading.Lock()
+_TAGGING_USERS = 0
+
+
+def _current_tags() -> ty.Tuple[str, ...]:
+    log_tags = (f"[{k}={v}]" for k, v in kw_logger._LOG_CONTEXT().items())
+    scale_tags = (f"[scale={group}]" for group in reversed(scaling.active_scale_groups()) if group)
+    return (*scale_tags, *log_tags)
+
+
+@contextlib.contextmanager
+def _retag(_: ty.Any) -> ty.Iterator[None]:
+    # entered after the new context takes effect, exited before it is removed.
+    ident = threading.get_ident()
+    prev = _THREAD_TAGS.get(ident)
+    _THREAD_TAGS[ident] = _current_tags()
+    try:
+        yield
+    finally:
+        if not _TAGGING_USERS:
+            pass  # tagging stopped meanwhile, and cleared the tags; don't leave these behind.
+        elif prev is None:
+            _THREAD_TAGS.pop(ident, None)
+        else:
+            _THREAD_TAGS[ident] = prev
+
+
+def _start_tagging() -> None:
+    global _TAGGING_USERS
+    with _TAGGING_LOCK:
+        _TAGGING_USERS += 1
+        if _TAGGING_USERS == 1:
+            kw_logger.add_span_hook(_retag)
+            scaling.add_push_hook(_retag)
+
+
+def _stop_tagging() -> None:
+    global _TAGGING_USERS
+    with _TAGGING_LOCK:
+        _TAGGING_USERS -= 1
+        if _TAGGING_USERS == 0:
+            kw_logger.remove_span_hook(_retag)
+            scaling.remove_push_hook(_retag)
+            _THREAD_TAGS.clear()
+
+
+class StackSampler:
+    """Samples the stacks of all other threads every `interval` seconds while running.
+
+    Counts accumulate across start/stop cycles until `reset`. `max_depth` bounds the
+    number of frames kept per stack (the outermost ones are dropped).
+    """
+
+    def __init__(self, interval: float = 0.01, max_depth: int = 128):
+        self.interval = interval
+        self.max_depth = max_depth
+        self.counts: ty.Counter[ty.Tuple[str, ...]] = collections.Counter()
+        self.n_samples = 0
+        self._labels: ty.Dict[types.CodeType, str] = dict()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: ty.Optional[threading.Thread] = None
+
+    def _label(self, frame: types.FrameType) -> str:
+        code = frame.f_code
+        label = self._labels.get(code)
+        if label is None:
+            module = frame.f_globals.get("__name__") or os.path.basename(code.co_filename)
+            label = self._labels[code] = f"{module}:{code.co_name}:{code.co_firstlineno}"
+        return label
+
+    def _stack(self, frame: ty.Optional[types.FrameType]) -> ty.List[str]:
+        stack: ty.List[str] = list()
+        while frame is not None and len(stack) < self.max_depth:
+            stack.append(self._label(frame))
+            frame = frame.f_back
+        stack.reverse()
+        return stack
+
+    def sample(self) -> None:
+        """Take one sample of every thread but the calling one. Called by the sampler
+        thread, but you may call it yourself at points of interest."""
+        own = threading.get_ident()
+        names = {t.ident: t.name for t in threading.enumerate()}
+        frames = sys._current_frames()
+        stacks = [
+            (*_THREAD_TAGS.get(ident, ()), names.get(ident, str(ident)), *self._stack(frame))
+            for ident, frame in frames.items()
+            if ident != own
+        ]
+        del frames  # don't keep other threads' frames (and their locals) alive.
+        with self._lock:
+            self.counts.update(stacks)
+            self.n_samples += 1
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self.sample()
+
+    def start(self) -> "StackSampler":
+        if self._thread is None:
+            _start_tagging()
+            self._stop = threading.Event()
+            self._thread = threading.Thread(target=self._run, name=_SAMPLER_THREAD_NAME, daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        thread, self._thread = self._thread, None
+        if thread is not None:
+            self._stop.set()
+            thread.join()
+            _stop_tagging()
+
+    def __enter__(self) -> "StackSampler":
+        return self.start()
+
+    def __exit__(self, *args: ty.Any) -> None:
+        self.stop()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.counts.clear()
+            self.n_samples = 0
+
+    def collapsed(self) -> ty.List[str]:
+        """The samples in collapsed-stack format, most frequent stack first."""
+        with self._lock:
+            counts = self.counts.most_common()
+        return [f"{';'.join(stack)} {count}" for stack, count in counts]
+
+    def write_collapsed(self, path: ty.Union[str, os.PathLike]) -> Path:
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text("".join(line + "\n" for line in self.collapsed()))
+        return path
+
+    def time_tracker(self) -> TimeTracker:
+        """Estimated inclusive wall time per function (and per tag), for comparison with or
+        merging into manually-instrumented TimeTrackers. `calls` is the number of
+        samples in which the function appeared, and `total` is all sampled thread time.
+        """
+        tracker = TimeTracker()
+        with self._lock:
+            counts = list(self.counts.items())
+        for stack, count in counts:
+            # tags and thread names are components too. Recursion shouldn't double
+            # count; a function is either on the stack or it isn't.
+            for label in set(stack):
+                timer = tracker.tracked_times[label]
+                timer.secs += count * self.interval
+                timer.calls += count
+            tracker.tracked_times[TimeTracker.total] += Timer(count * self.interval, count)
+        return tracker
+
+
+_PROCESS_SAMPLER: ty.Optional[StackSampler] = None
+
+
+_OFF = frozenset(["", "0", "false", "no", "off"])
+_ON = frozenset(["1", "true", "yes", "on"])
+
+
+def interval_from_env(value: str, default: float = 0.01) -> ty.Optional[float]:
+    """The sampling interval an environment variable like TH_PROF_STACKS asks for, or None
+    to not sample. Boolean-ish values turn sampling off or on at the `default` interval, so
+    `1` means on, not once a second; any other number is the interval in seconds.
+    """
+    value = value.strip().lower()
+    if value in _OFF:
+        return None
+    if value in _ON:
+        return default
+    try:
+        interval = float(value)
+    except ValueError:
+        logger.warning(f"Sampling stacks every {default}s; could not parse an interval from {value!r}")
+        return default
+    return interval if interval > 0 else None
+
+
+def sample_process(interval: float, out: Path) -> StackSampler:
+    """Start sampling the whole process (once), writing collapsed stacks to `out` at exit."""
+    global _PROCESS_SAMPLER
+    if _PROCESS_SAMPLER is None:
+        sampler = _PROCESS_SAMPLER = StackSampler(interval).start()
+        started = time.monotonic()
+
+        def _write() -> None:
+            sampler.stop()
+            sampler.write_collapsed(out)
+            logger.info(
+                f"Wrote {sampler.n_samples} stack samples over {time.monotonic() - started:.1f}s to {out}"
+            )
+
+        atexit.register(_write)
+    return _PROCESS_SAMPLER
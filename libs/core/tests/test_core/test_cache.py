@@ -1,8 +1,11 @@
 import random
 import time
+import typing as ty
 from concurrent.futures import ThreadPoolExecutor
 from threading import RLock
 
+import pytest
+
 from thds.core import cache
 
 
@@ -164,3 +167,128 @@ def test_locking_bounded_cache_is_still_single_flight() -> None:
         list(exc.map(slow, [7] * 8))
 
     assert invocations == 1
+
+
+def test_bound_hashkey_positional_fast_path_matches_binding() -> None:
+    def f(a: int, b: int = 2) -> None:
+        pass
+
+    bound_hashkey = cache.make_bound_hashkey(f)
+    assert bound_hashkey((1, 2), {}) == bound_hashkey((1,), {}) == bound_hashkey((), dict(b=2, a=1))
+
+
+def test_bounded_cache_lru_evicts_least_recently_used() -> None:
+    evicted: ty.List[ty.Tuple[str, int]] = []
+    lru: cache.BoundedCache[str, int] = cache.BoundedCache(
+        2, on_evict=lambda k, v: evicted.append((k, v))
+    )
+    lru["a"] = 1
+    lru["b"] = 2
+    assert lru["a"] == 1  # b is now the least recently used
+    lru["c"] = 3
+    assert sorted(lru) == ["a", "c"]
+    assert evicted == [("b", 2)]
+
+
+def test_bounded_cache_lfu_evicts_least_frequently_used() -> None:
+    lfu: cache.BoundedCache[str, int] = cache.BoundedCache(2, policy="lfu")
+    lfu["a"] = 1
+    lfu["b"] = 2
+    lfu["a"], lfu["a"], lfu["b"]  # noqa: B018
+    lfu["c"] = 3
+    assert "b" not in lfu
+    lfu["d"] = 4  # c has been used least
+    assert sorted(lfu) == ["a", "d"]
+
+
+def test_bounded_cache_weights_entries() -> None:
+    weighted: cache.BoundedCache[str, str] = cache.BoundedCache(10, getsizeof=len)
+    weighted["a"] = "xxxx"
+    weighted["b"] = "xxxx"
+    weighted["c"] = "xxxx"
+    assert sorted(weighted) == ["b", "c"]
+    assert weighted.currsize == 8
+
+
+def test_bounded_cache_membership_does_not_count_as_use() -> None:
+    lru: cache.BoundedCache[str, int] = cache.BoundedCache(2)
+    lru["a"] = 1
+    lru["b"] = 2
+    assert "a" in lru  # a is still the least recently used
+    lru["c"] = 3
+    assert sorted(lru) == ["b", "c"]
+
+
+def test_bounded_cache_expires_entries() -> None:
+    now = 0.0
+    evicted: ty.List[str] = []
+    ttl_cache: cache.BoundedCache[str, int] = cache.BoundedCache(
+        ttl=10, timer=lambda: now, on_evict=lambda k, v: evicted.append(k)
+    )
+    ttl_cache["a"] = 1
+    now = 5
+    ttl_cache["b"] = 2
+    assert ttl_cache.get("a") == 1
+    now = 11
+    assert ttl_cache.get("a") is None
+    assert ttl_cache.get("b") == 2
+    assert evicted == ["a"]
+
+
+def test_locking_with_maxsize_and_ttl() -> None:
+    calls = []
+    released = []
+
+    @cache.locking(maxsize=2, ttl=0.5, on_evict=lambda key, value: released.append(value))
+    def square(n: int) -> int:
+        calls.append(n)
+        return n * n
+
+    assert [square(n) for n in (1, 2, 1, 3)] == [1, 4, 1, 9]
+    assert released == [4]  # 2 was the least recently used
+    assert square.cache_info().maxsize == 2  # type: ignore[attr-defined]
+    assert square.cache_info().currsize == 2  # type: ignore[attr-defined]
+    assert calls == [1, 2, 3]
+
+    time.sleep(0.6)
+    assert square(3) == 9  # expired, so computed again
+    assert calls == [1, 2, 3, 3]
+    assert sorted(released) == [1, 4, 9]
+    assert square.cache_info().currsize == 1  # type: ignore[attr-defined]
+
+
+def test_locking_counters_are_accurate_under_concurrency() -> None:
+    cached_add_one = cache.locking(add_one)
+    with ThreadPoolExecutor(16) as exc:
+        list(exc.map(cached_add_one, [n % 10 for n in range(5000)]))
+
+    info = cached_add_one.cache_info()  # type: ignore[attr-defined]
+    assert (info.hits, info.misses) == (4990, 10)
+
+
+def test_locking_returns_values_too_large_to_cache() -> None:
+    calls = []
+
+    @cache.locking(maxsize=10, getsizeof=len)
+    def xs(n: int) -> bytes:
+        calls.append(n)
+        return b"x" * n
+
+    assert xs(20) == xs(20) == b"x" * 20
+    assert xs(5) == xs(5) == b"x" * 5
+    assert calls == [20, 20, 5]
+
+
+def test_locking_propagates_errors_from_on_evict() -> None:
+    def on_evict(key: ty.Any, value: int) -> None:
+        raise ValueError("can't release")
+
+    cached_add_one = cache.locking(maxsize=1, on_evict=on_evict)(add_one)
+    cached_add_one(1)
+    with pytest.raises(ValueError, match="can't release"):
+        cached_add_one(2)
+
+
+def test_locking_rejects_a_policy_without_bounds() -> None:
+    with pytest.raises(ValueError, match="policy"):
+        cache.locking(policy="lfu")
@@ -20,3 +20,115 @@ def test_file_hashes_correctly_and_consistently():
 def test_directory_fails_to_hash():
     with pytest.raises(IsADirectoryError):
         hash_cache.hash_file(TEST_DIR, hashlib.sha256())
+
+
+@pytest.fixture
+def cache_dir(tmp_path: Path):
+    with hash_cache.CACHE_HASH_DIR.set_local(tmp_path / "hash-cache"):
+        yield tmp_path / "hash-cache"
+
+
+def test_cached_hash_is_invalidated_when_file_changes(cache_dir: Path, tmp_path: Path):
+    f = tmp_path / "a.txt"
+    f.write_text("one")
+    assert hash_cache.hash_file(f, hashlib.sha256()) == hashlib.sha256(b"one").digest()
+    assert (cache_dir / "index.sqlite3").exists()
+
+    f.write_text("two!")
+    assert hash_cache.hash_file(f, hashlib.sha256()) == hashlib.sha256(b"two!").digest()
+
+
+def test_hash_files_returns_hashes_in_input_order(cache_dir: Path, tmp_path: Path):
+    paths = list()
+    for i in range(5):
+        paths.append(tmp_path / f"{i}.txt")
+        paths[-1].write_text(str(i))
+    hash_cache.hash_file(paths[2], hashlib.md5())  # one of them is already cached
+
+    hashes = hash_cache.filehashes("md5", reversed(paths))
+    assert [h.bytes for h in hashes] == [
+        hashlib.md5(str(i).encode()).digest() for i in reversed(range(5))
+    ]
+    assert {h.algo for h in hashes} == {"md5"}
+
+
+def test_legacy_cache_entries_are_migrated(cache_dir: Path, tmp_path: Path):
+    f = tmp_path / "legacy.txt"
+    f.write_text("legacy")
+    resolved = f.resolve()
+    legacy = hash_cache._legacy_filecachekey(resolved, "sha256", resolved.stat().st_size)
+    legacy.parent.mkdir(parents=True)
+    legacy.write_bytes(b"not-a-real-hash")  # proves that we read it rather than hashing
+
+    assert hash_cache.hash_file(f, hashlib.sha256()) == b"not-a-real-hash"
+    legacy.unlink()
+    assert hash_cache.hash_file(f, hashlib.sha256()) == b"not-a-real-hash"  # now from the index
+
+
+def test_index_evicts_least_recently_used(cache_dir: Path, tmp_path: Path, monkeypatch):
+    monkeypatch.setattr(hash_cache, "_EVICT_CHECK_EVERY", 1)
+    with hash_cache.MAX_ENTRIES.set_local(10):
+        paths = [tmp_path / f"{i}.txt" for i in range(20)]
+        for p in paths:
+            p.write_text(p.name)
+        hash_cache.hash_files(paths, "sha256")
+
+    conn = hash_cache._conn()
+    assert conn is not None
+    (count,) = conn.execute("SELECT COUNT(*) FROM file_hashes").fetchone()
+    assert count == 9
+
+
+def test_large_files_are_hashed_in_parallel(cache_dir: Path, tmp_path: Path, monkeypatch):
+    calls = list()
+
+    def spy(path, hasher):
+        calls.append(path)
+        return hashing.hash_file_parallel(path, hasher)
+
+    monkeypatch.setattr(hash_cache, "hash_file_parallel", spy)
+    small, large = tmp_path / "small.bin", tmp_path / "large.bin"
+    small.write_bytes(b"x" * 4095)
+    large.write_bytes(b"x" * 4096)
+    with hash_cache.PARALLEL_THRESHOLD.set_local(4096):
+        assert hash_cache.hash_files([small, large], "sha256") == [
+            hashlib.sha256(b"x" * 4095).digest(),
+            hashlib.sha256(b"x" * 4096).digest(),
+        ]
+    assert calls == [large.resolve()]
+
+
+def test_recorded_hash_is_used_until_file_changes(cache_dir: Path, tmp_path: Path):
+    f = tmp_path / "a.txt"
+    f.write_text("one")
+    hash_cache.record_filehash(f, hashing.Hash("sha256", b"not really"))
+    assert hash_cache.filehash("sha256", f) == hashing.Hash("sha256", b"not really")
+
+    f.write_text("two!")
+    assert hash_cache.filehash("sha256", f).bytes == hashlib.sha256(b"two!").digest()
+
+
+def test_hash_file_and_hash_files_share_entries(cache_dir: Path, tmp_path: Path, monkeypatch):
+    xxhash = pytest.importorskip("xxhash")
+    monkeypatch.setitem(hashing._NAMED_HASH_CONSTRUCTORS, "xxh3_128", lambda _: xxhash.xxh3_128())
+    f = tmp_path / "a.txt"
+    f.write_text("one")
+    first = hash_cache.hash_file(f, hashing.get_hasher("xxh3_128"))  # its name is 'XXH3_128'
+
+    monkeypatch.setattr(hash_cache, "_compute", lambda *args: pytest.fail("not a cache hit"))
+    assert hash_cache.hash_files([f], "xxh3_128") == [first]
+    assert hash_cache.filehash("xxh3_128", f).bytes == first
+
+
+def test_recorded_hash_is_found_by_hasher_or_by_name(cache_dir: Path, tmp_path: Path, monkeypatch):
+    xxhash = pytest.importorskip("xxhash")
+    monkeypatch.setitem(hashing._NAMED_HASH_CONSTRUCTORS, "xxh3_128", lambda _: xxhash.xxh3_128())
+    f = tmp_path / "a.txt"
+    f.write_text("one")
+    hash_cache.record_filehash(f, hashing.Hash("xxh3_128", b"not really"))
+
+    assert hash_cache.hash_file(f, hashing.get_hasher("xxh3_128")) == b"not really"
+    assert hash_cache.hash_files([f], "xxh3_128") == [b"not really"]
+    conn = hash_cache._conn()
+    assert conn is not None
+    assert conn.execute("SELECT algo FROM file_hashes").fetchall() == [("xxh3_128",)]
@@ -5,7 +5,7 @@ thing to hash when passes the very broad types that it accepts.
 import hashlib
 from pathlib import Path
 
-from thds.core.hashing import hash_anything, hash_using
+from thds.core.hashing import Hash, OrderedHasher, hash_anything, hash_file_parallel, hash_using
 
 HW = Path(__file__).parent.parent / "data/hello_world.txt"
 HW_SHA256 = (
@@ -33,3 +33,58 @@ def test_hash_anything_doesnt_die_on_typerror():
 
 def test_hash_anything_doesnt_die_on_fnf_error():
     assert None is hash_anything("file/not/exists", hashlib.md5())
+
+
+def test_parallel_file_hash_matches_serial(tmp_path: Path):
+    big = tmp_path / "big.bin"
+    big.write_bytes(bytes(range(256)) * 4099)  # deliberately not a multiple of the segment size
+
+    serial = hash_using(big, hashlib.sha256()).hexdigest()
+    assert serial == hash_file_parallel(big, hashlib.sha256(), segment_size=1000, readers=3).hexdigest()
+    assert serial == hash_file_parallel(big, hashlib.sha256()).hexdigest()
+
+
+def test_parallel_hash_of_empty_file(tmp_path: Path):
+    empty = tmp_path / "empty"
+    empty.write_bytes(b"")
+    assert hashlib.md5().hexdigest() == hash_file_parallel(empty, hashlib.md5()).hexdigest()
+
+
+def _pieces(data: bytes, size: int):
+    return [(i, data[i : i + size]) for i in range(0, len(data), size)]
+
+
+def test_ordered_hasher_hashes_out_of_order_writes_without_rereading(tmp_path: Path):
+    data = bytes(range(256)) * 100
+    path = tmp_path / "f"
+    path.write_bytes(data)
+
+    hasher = OrderedHasher(["sha256", "md5"])
+    for offset, piece in reversed(_pieces(data, 1000)):
+        hasher.update_at(offset, piece)
+    assert hasher.hashed_bytes == len(data)
+    path.write_bytes(b"")  # so we'd notice if finish read it
+    assert hasher.finish(path) == [
+        Hash("sha256", hashlib.sha256(data).digest()),
+        Hash("md5", hashlib.md5(data).digest()),
+    ]
+
+
+def test_ordered_hasher_reads_back_what_it_could_not_hash(tmp_path: Path):
+    data = bytes(range(256)) * 100
+    path = tmp_path / "f"
+    path.write_bytes(data)
+    expected = [Hash("sha256", hashlib.sha256(data).digest())]
+
+    over_budget = OrderedHasher(["sha256"], max_buffered=2500)
+    pieces = _pieces(data, 1000)
+    for offset, piece in pieces[:3] + pieces[4:]:  # the first three, then no room to wait for the fourth
+        over_budget.update_at(offset, piece)
+    assert over_budget.hashed_bytes == 3000
+    assert over_budget.finish(path) == expected
+
+    rewritten = OrderedHasher(["sha256"])
+    for offset, piece in pieces[:5] + pieces:  # e.g. a retried download
+        rewritten.update_at(offset, piece)
+    assert rewritten.hashed_bytes == 0
+    assert rewritten.finish(path) == expected
@@ -1,11 +1,14 @@
+import json
 import logging
+import os
 import threading
 import time
 
-from thds.core import journalist
+from thds.core import journalist, log
+from thds.core.log import kw_logger
 
 
-def _sample(wall, cpu, rss_mb=100.0, cgroup_mb=None, net=None, disk=None):
+def _sample(wall, cpu, rss_mb=100.0, cgroup_mb=None, net=None, disk=None, threads=None):
     return journalist._Sample(
         wall=wall,
         cpu_seconds=cpu,
@@ -13,6 +16,7 @@ def _sample(wall, cpu, rss_mb=100.0, cgroup_mb=None, net=None, disk=None):
         cgroup_mb=cgroup_mb,
         net=net,
         disk=disk,
+        threads=threads,
     )
 
 
@@ -197,3 +201,71 @@ def test_metrics_construct_with_no_args():
     assert metrics.peak_disk_read_mbps == 0.0
     assert metrics.total_disk_write_gb == 0.0
     assert metrics.elapsed_seconds is None
+
+
+def test_read_thread_cpu_seconds_names_python_threads():
+    threads = journalist._read_thread_cpu_seconds(os.getpid())
+    if threads is None:  # no /proc - not Linux
+        return
+
+    name, cpu_seconds = threads[threading.get_native_id()]
+    assert name == threading.current_thread().name
+    assert cpu_seconds > 0.0
+
+
+def test_chrome_trace_has_counters_per_thread_cpu_and_spans():
+    recorder = journalist._Recorder(max_samples=2, max_spans=10)
+    threads_0 = {1: ("MainThread", 1.0), 2: ("worker", 0.0)}
+    threads_1 = {1: ("MainThread", 1.5), 2: ("worker", 1.0)}
+    recorder.samples.append(_sample(wall=9.0, cpu=0.0, threads=threads_0))  # dropped by the ring
+    recorder.samples.append(_sample(wall=10.0, cpu=1.0, net=(0, 0), threads=threads_0))
+    recorder.samples.append(_sample(wall=11.0, cpu=3.0, net=(0, 10 * 1024**2), threads=threads_1))
+
+    kw_logger.add_span_hook(recorder.span)
+    try:
+        with log.logger_context(phase="load"):
+            with log.logger_context(table="x"):
+                pass
+    finally:
+        kw_logger.remove_span_hook(recorder.span)
+
+    events = recorder.chrome_trace_events()
+    counters = [(e["name"], e["args"]) for e in events if e["ph"] == "C"]
+    assert counters == [
+        ("memory_mb", {"rss": 100.0}),
+        ("memory_mb", {"rss": 100.0}),
+        ("cpu_cores", {"process": 2.0}),
+        ("net_mbps", {"recv": 10.0, "sent": 0.0}),
+        ("thread_cpu_cores", {"MainThread (1)": 0.5, "worker (2)": 1.0}),
+    ]
+
+    spans = [e for e in events if e["ph"] == "X"]
+    assert [s["name"] for s in spans] == ["table=x", "phase=load"]  # inner exits first
+    assert spans[1]["ts"] <= spans[0]["ts"]
+    assert spans[0]["tid"] == threading.get_native_id()
+    thread_names = {e["tid"]: e["args"]["name"] for e in events if e["name"] == "thread_name"}
+    assert thread_names == {1: "MainThread", 2: "worker", threading.get_native_id(): "MainThread"}
+
+
+def test_trace_path_dumps_chrome_trace(tmp_path):
+    j = _fresh_journalist("traced", sample_interval=0.02)
+    if not j._enabled:
+        return
+
+    trace_path = tmp_path / "trace-{pid}.json"
+    try:
+        with journalist.TRACE_PATH.set_local(str(trace_path)):
+            with j:
+                with log.logger_context(step="sleep"):
+                    time.sleep(0.2)
+            journalist._dump_at_exit()
+    finally:
+        recorder = journalist._SAMPLER._recorder
+        journalist._SAMPLER._recorder = None
+        if recorder is not None:
+            kw_logger.remove_span_hook(recorder.span)
+
+    trace = json.loads((tmp_path / f"trace-{os.getpid()}.json").read_text())
+    phases = {e["ph"] for e in trace["traceEvents"]}
+    assert {"C", "X", "M"} <= phases
+    assert any(e["name"] == "step=sleep" for e in trace["traceEvents"])
@@ -1,9 +1,9 @@
 from functools import partial
-from typing import List
+from typing import Dict, List
 
 import pytest
 
-from thds.core.parallel import IteratorWithLen, yield_results
+from thds.core.parallel import Error, IteratorWithLen, yield_all, yield_results
 
 
 def test_iterator_with_len():
@@ -46,3 +46,40 @@ def test_parallel_yield_results(caplog):
             results.append(res)
 
     assert sorted(results) == list(range(11))
+
+
+def test_max_in_flight_bounds_outstanding_tasks_and_streams_results():
+    consumed = 0
+    outstanding = list()
+
+    def thunks():
+        nonlocal consumed
+        for i in range(100):
+            consumed += 1
+            yield i, partial(lambda x: x * 2, i)
+
+    results: Dict[int, object] = dict()
+    for key, res in yield_all(thunks(), max_in_flight=4):
+        outstanding.append(consumed - len(results))
+        results[key] = res
+
+    assert results == {i: i * 2 for i in range(100)}
+    assert max(outstanding) <= 4
+
+
+def test_max_in_flight_yields_before_input_is_exhausted():
+    def thunks():
+        yield "first", lambda: 1
+        raise AssertionError("only the first thunk should have been pulled")
+
+    assert next(yield_all(thunks(), max_in_flight=1)) == ("first", 1)
+
+
+def test_max_in_flight_yields_errors():
+    def boom():
+        raise TeensError(13)
+
+    results = dict(yield_all(iter([("ok", lambda: 1), ("boom", boom)]), max_in_flight=2))
+    assert results["ok"] == 1
+    assert isinstance(results["boom"], Error)
+    assert isinstance(results["boom"].error, TeensError)
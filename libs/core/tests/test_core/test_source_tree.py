@@ -1,11 +1,16 @@
 import json
+import pickle
+import threading
+import time
+import typing as ty
 from pathlib import Path
 from tempfile import TemporaryDirectory
+from unittest import mock
 
 import pytest
 
-from thds.core import scope
-from thds.core.source import Source, tree, tree_from_directory
+from thds.core import link, scope
+from thds.core.source import Source, _download, tree, tree_from_directory
 
 
 def test_logical_tree_replication_operations():
@@ -205,3 +210,142 @@ def test_higher_logical_root_uri_multiple_sources_mismatch():
     )
     with pytest.raises(AssertionError, match="Expected the uri ends with"):
         st.higher_logical_root_uri
+
+
+# --- incremental replication ---
+
+
+def _write_tree(root: Path, files: dict) -> ty.List[Path]:
+    paths = []
+    for rel, content in files.items():
+        path = root / rel
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(content)
+        paths.append(path)
+    return paths
+
+
+def test_incremental_replication_copies_only_changed_files(tmp_path: Path):
+    src_root = tmp_path / "cache" / "data"
+    paths = _write_tree(src_root, {"a.txt": "a", "sub/b.txt": "b", "sub/c.txt": "c"})
+    dest_dir = tmp_path / "dest"
+    tree.replicate_logical_tree(paths, src_root, dest_dir)
+
+    copied: ty.List[Path] = []
+
+    def counting_copy(src: Path, dest: Path) -> None:
+        copied.append(dest)
+        link.cheap_copy(src, dest)
+
+    (src_root / "sub/b.txt").write_text("changed")
+    (dest_dir / "data/stale/old.txt").parent.mkdir(parents=True)
+    (dest_dir / "data/stale/old.txt").write_text("not listed")
+    (dest_dir / "data/a.txt.bak").write_text("not listed either")
+
+    logical_dest = tree.replicate_logical_tree(
+        paths, src_root, dest_dir, copy=counting_copy, incremental=True
+    )
+    assert copied == [dest_dir / "data/sub/b.txt"]
+    assert (logical_dest / "sub/b.txt").read_text() == "changed"
+    assert sorted(str(p.relative_to(logical_dest)) for p in logical_dest.rglob("*")) == [
+        "a.txt",
+        "sub",
+        "sub/b.txt",
+        "sub/c.txt",
+    ]
+
+    copied.clear()
+    tree.replicate_logical_tree(paths, src_root, dest_dir, copy=counting_copy, incremental=True)
+    assert copied == []
+
+
+# --- prefetch ---
+
+
+class _FakeRemote:
+    """Downloads `fake://` URIs by writing files of the requested size, recording the
+    order of downloads and the peak bytes in flight."""
+
+    def __init__(self, root: Path):
+        self.root = root
+        self.lock = threading.Lock()
+        self.started: ty.List[str] = []
+        self.in_flight = 0
+        self.peak_in_flight = 0
+
+    def handler(self, uri: str):
+        if not uri.startswith("fake://"):
+            return None
+
+        def download(hash) -> Path:
+            size = int(uri.rsplit("-", 1)[1])
+            with self.lock:
+                self.started.append(uri)
+                self.in_flight += size
+                self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+            time.sleep(0.02)
+            path = self.root / uri[len("fake://") :]
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_bytes(b"x" * size)
+            with self.lock:
+                self.in_flight -= size
+            return path
+
+        return download
+
+
+@pytest.fixture
+def fake_remote(tmp_path: Path):
+    remote = _FakeRemote(tmp_path / "remote")
+    _download.register_download_handler("test-fake", remote.handler)
+    yield remote
+    _download._DOWNLOAD_HANDLERS.pop("test-fake")
+
+
+def test_prefetch_is_bounded_largest_first_and_not_repeated(fake_remote: _FakeRemote):
+    sizes = [10, 300, 20, 200, 100]
+    st = tree.SourceTree([Source(uri=f"fake://root/f-{size}", size=size) for size in sizes])
+
+    st.prefetch(max_bytes_in_flight=300)
+    st.prefetch(max_bytes_in_flight=1)  # no-op
+    assert st._prefetch
+    st._prefetch._thread.join()  # everything has been scheduled, within the budget.
+    local_root = st.path()
+
+    assert sorted(p.name for p in local_root.iterdir()) == sorted(f"f-{size}" for size in sizes)
+    assert sorted(fake_remote.started) == sorted(src.uri for src in st.sources)  # once each
+    assert fake_remote.started[0] == "fake://root/f-300"
+    assert fake_remote.peak_in_flight <= 300
+
+
+def test_path_takes_over_sources_the_prefetch_has_not_started(fake_remote: _FakeRemote):
+    st = tree.SourceTree([Source(uri=f"fake://claim/k-{size}", size=size) for size in (5, 4, 3)])
+    st.prefetch(max_bytes_in_flight=1)  # only one download at a time in the background
+    st.path()
+    assert sorted(fake_remote.started) == sorted(src.uri for src in st.sources)
+
+
+def test_path_downloads_largest_first(fake_remote: _FakeRemote):
+    st = tree.SourceTree([Source(uri=f"fake://big/g-{size}", size=size) for size in (1, 3, 2)])
+    with mock.patch.object(tree, "_MAX_PARALLELISM", 1):
+        st.path()
+    assert fake_remote.started == ["fake://big/g-3", "fake://big/g-2", "fake://big/g-1"]
+
+
+def test_prefetched_tree_pickles_without_prefetch(fake_remote: _FakeRemote):
+    st = tree.SourceTree([Source(uri="fake://p/h-1", size=1)]).prefetch()
+    st.path()
+    restored = pickle.loads(pickle.dumps(st))
+    assert restored._prefetch is None
+    assert restored == st
+
+
+def test_pickled_state_is_unchanged_by_prefetch_support(fake_remote: _FakeRemote):
+    # mops memoizes on the pickle bytes of arguments, so these must stay as they were.
+    plain = tree.SourceTree([Source(uri="fake://s/i-1", size=1)])
+    assert sorted(plain.__getstate__()) == ["higher_logical_root", "sources"]
+
+    prefetched = tree.SourceTree([Source(uri="fake://s/i-1", size=1)]).prefetch()
+    plain.path()  # downloading records the local path on each Source, for both.
+    prefetched.path()
+    assert pickle.dumps(prefetched) == pickle.dumps(plain)
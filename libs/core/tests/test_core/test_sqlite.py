@@ -99,6 +99,78 @@ def test_autometa(test_db: StructTable[TstItem]):
         assert table.get(id=1) == TstItem(1, "one")
 
 
+def test_get_many_preserves_input_order(test_db: StructTable[TstItem]):
+    assert test_db.get_many([dict(id=3), dict(id=100), dict(id=1), dict(id=3)]) == [
+        TstItem(3, "three"),
+        None,
+        TstItem(1, "one"),
+        TstItem(3, "three"),
+    ]
+    assert test_db.get_many([]) == []
+
+    with pytest.raises(BadPrimaryKey):
+        test_db.get_many([dict(id=1), dict(name="two")])
+
+
+def test_get_many_chunks_under_variable_limit(test_db: StructTable[TstItem]):
+    from thds.core.sqlite.structured import SQLITE_MAX_VARIABLES
+
+    with SQLITE_MAX_VARIABLES.set_local(4):  # two keys per query
+        keys = [dict(id=i) for i in reversed(range(1, 17))]
+        assert [item and item.id for item in test_db.get_many(keys)] == [None, *range(15, 0, -1)]
+
+
+def test_get_many_duplicate_primary_key(_base_test_db: sqlite3.Connection):
+    bad_db = StructTable(
+        lambda d: TstItem(**d),
+        lambda _: lambda: TableMeta(_base_test_db, "test", {"name"}, {"id", "name"}),  # type: ignore
+    )
+    assert bad_db.get_many([dict(name="seven")]) == [TstItem(7, "seven")]
+    with pytest.raises(BadPrimaryKey):
+        bad_db.get_many([dict(name="seven"), dict(name="more than ten")])
+
+
+def test_matching_many(test_db: StructTable[TstItem]):
+    results = test_db.matching_many([dict(name="more than ten"), dict(id=2), dict(name="nope")])
+    assert [item.id for item in results[0]] == [11, 12, 13, 14, 15]
+    assert results[1:] == [[TstItem(2, "two")], []]
+
+    with pytest.raises(UnknownColumns):
+        test_db.matching_many([dict(foo="bad")])
+
+
+def test_pooled_table_is_shared_across_threads(tmp_path: Path, _base_test_db_rows):
+    import concurrent.futures
+
+    db_path = tmp_path / "pooled.sqlite"
+    conn = sqlite3.connect(db_path)
+    conn.execute("CREATE TABLE test (id INTEGER PRIMARY KEY, name TEXT)")
+    write_mappings(conn, "test", _base_test_db_rows)
+    conn.commit()
+    conn.close()
+
+    table = StructTable(
+        lambda d: TstItem(**d), autometa_factory(lambda: (db_path, "test"), pool_size=2), cache_size=0
+    )
+
+    def lookup(i: int):
+        return table.get(id=i), table.get_many([dict(id=i), dict(id=i + 100)])
+
+    with concurrent.futures.ThreadPoolExecutor(8) as pool:
+        results = list(pool.map(lookup, range(1, 16)))
+    assert [(got.id, many[0].id, many[1]) for got, many in results] == [  # type: ignore
+        (i, i, None) for i in range(1, 16)
+    ]
+
+    tbl = table._tbl()
+    pool_ = tbl.pool
+    assert pool_ is not None and pool_._idle.qsize() <= 2
+    assert all(pooled is not tbl.conn for pooled in pool_._idle.queue)
+    with pool_.connection() as ro_conn:
+        with pytest.raises(sqlite3.OperationalError):
+            ro_conn.execute("DELETE FROM test")
+
+
 def test_function_registration(_base_test_db: sqlite3.Connection):
     def _is_func_registered(conn: sqlite3.Connection, func_name: str) -> bool:
         try:
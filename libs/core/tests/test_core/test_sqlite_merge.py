@@ -0,0 +1,89 @@
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
+from pathlib import Path
+
+import pytest
+
+from thds.core.sqlite import merge_databases, sqlmap, tree_merge_databases
+
+
+def _make_db(path: Path, rows) -> Path:
+    with closing(sqlite3.connect(path)) as conn:
+        conn.execute("CREATE TABLE t (id INTEGER PRIMARY KEY, name TEXT)")
+        conn.execute("CREATE INDEX idx_t_name ON t (name)")
+        conn.executemany("INSERT INTO t VALUES (?, ?)", rows)
+        conn.commit()
+    return path
+
+
+def _rows(path: Path):
+    with closing(sqlite3.connect(path)) as conn:
+        return sorted(conn.execute("SELECT id, name FROM t"))
+
+
+def _indexes(path: Path):
+    with closing(sqlite3.connect(path)) as conn:
+        return [row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")]
+
+
+@pytest.mark.parametrize("n", [1, 2, 5, 8])
+def test_tree_merge_matches_sequential_merge(tmp_path: Path, n: int):
+    def make_all(prefix: str):
+        return [
+            _make_db(tmp_path / f"{prefix}{i}.db", [(i * 10 + j, f"{i}-{j}") for j in range(3)])
+            for i in range(n)
+        ]
+
+    sequential = merge_databases(make_all("seq"))
+    # threads stand in for processes here; the merge itself is the same.
+    with ThreadPoolExecutor(4) as executor:
+        tree = tree_merge_databases(make_all("tree"), executor=executor)
+
+    assert tree == tmp_path / "tree0.db"
+    assert _rows(tree) == _rows(sequential)
+    assert _indexes(tree) == ["idx_t_name"]
+
+
+def test_tree_merge_preserves_order_for_replace(tmp_path: Path):
+    dbs = [_make_db(tmp_path / f"{i}.db", [(1, f"from {i}")]) for i in range(5)]
+    with ThreadPoolExecutor(2) as executor:
+        merged = tree_merge_databases(dbs, replace=True, executor=executor)
+    assert _rows(merged) == [(1, "from 4")]
+
+
+def test_tree_merge_keeps_unique_indexes_for_replace(tmp_path: Path):
+    def make_all(prefix: str):
+        paths = list()
+        for i in range(4):
+            paths.append(tmp_path / f"{prefix}{i}.db")
+            with closing(sqlite3.connect(paths[-1])) as conn:
+                conn.execute("CREATE TABLE t (k TEXT, v INTEGER)")
+                conn.execute("CREATE UNIQUE INDEX t_k ON t (k)")
+                conn.execute("CREATE INDEX t_v ON t (v)")
+                conn.executemany("INSERT INTO t VALUES (?, ?)", [("a", i), (f"only-{i}", i)])
+                conn.commit()
+        return paths
+
+    def rows(path: Path):
+        with closing(sqlite3.connect(path)) as conn:
+            return sorted(conn.execute("SELECT k, v FROM t"))
+
+    sequential = merge_databases(make_all("seq"), replace=True)
+    with ThreadPoolExecutor(2) as executor:
+        tree = tree_merge_databases(make_all("tree"), replace=True, executor=executor)
+
+    assert rows(tree) == rows(sequential)
+    assert ("a", 3) in rows(tree)
+    assert sorted(_indexes(tree)) == ["t_k", "t_v"]
+
+
+def _write_partition(partition: sqlmap.Partition, part_dir: Path) -> None:
+    _make_db(part_dir / "out.db", [(partition.partition, f"p{partition.partition}")])
+
+
+def test_parallel_to_sqlite_tree_merges_partitions(tmp_path: Path):
+    outputs = sqlmap.parallel_to_sqlite(_write_partition, tmp_path / "out", N=4)
+    assert outputs == {"out.db": tmp_path / "out" / "out.db"}
+    assert _rows(outputs["out.db"]) == [(i, f"p{i}") for i in range(4)]
+    assert _indexes(outputs["out.db"]) == ["idx_t_name"]
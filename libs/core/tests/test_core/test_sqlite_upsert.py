@@ -1,4 +1,5 @@
 import sqlite3
+import typing as ty
 
 import pytest
 
@@ -110,3 +111,53 @@ def test_name_cannot_be_null_but_can_be_omitted_from_update(test_conn: sqlite3.C
         height=None,
         untouched=None,
     )
+
+
+_UPSERTS: ty.List[ty.Dict[str, ty.Any]] = [
+    dict(id=42, name="42", foo="42"),
+    dict(id=1, name="one", foo="SPAZ"),
+    dict(id=30, age=10, name="insert-me"),
+    dict(id=1, foo="SPEZ", age=10, name="one"),
+    dict(id=8, age=8, countdown=13),
+    dict(id=9, age=9, countdown=13),
+    dict(id=10, age=10, name="GEORGE", countdown=13),
+    dict(id=1, age=1, countdown=13),
+    dict(id=15, untouched=None),
+]
+
+
+def _all_rows(conn: sqlite3.Connection):
+    return [dict(row) for row in conn.execute("SELECT * FROM test ORDER BY id")]
+
+
+@pytest.mark.parametrize("staging_rows", [1, 3, 200_000])
+def test_bulk_upsert_matches_row_by_row_upsert(_base_test_db_rows, staging_rows: int):
+    def make_conn() -> sqlite3.Connection:
+        db = connect.row_connect(":memory:")
+        db.execute(
+            "CREATE TABLE test (id INTEGER PRIMARY KEY, name TEXT NOT NULL, foo TEXT, age INTEGER, height REAL, countdown INTEGER, allowed_bags INTEGER, untouched TEXT)"
+        )
+        for item in _base_test_db_rows:
+            write.write_mappings(db, TEST_TB, [item])
+        return db
+
+    row_by_row, bulk = make_conn(), make_conn()
+    upsert.mappings(row_by_row, TEST_TB, _UPSERTS)
+    upsert.bulk_mappings(bulk, TEST_TB, _UPSERTS, staging_rows=staging_rows)
+
+    assert _all_rows(bulk) == _all_rows(row_by_row)
+    assert dict(bulk.execute("SELECT * FROM test WHERE id = 15").fetchone())["untouched"] is None
+
+
+def test_bulk_upsert_checks_constraints_on_merged_rows(test_conn: sqlite3.Connection):
+    with pytest.raises(sqlite3.IntegrityError):
+        upsert.bulk_mappings(test_conn, TEST_TB, [dict(id=99, age=88)])
+
+    # the second row provides the NOT NULL name for the same key before the merge.
+    upsert.bulk_mappings(test_conn, TEST_TB, [dict(id=99, age=88), dict(id=99, name="George")])
+    assert dict(list(read.matching_select(TEST_TB, test_conn, dict(id=99)))[0])["age"] == 88
+
+
+def test_bulk_upsert_requires_primary_keys(test_conn: sqlite3.Connection):
+    with pytest.raises(ValueError):
+        upsert.bulk_mappings(test_conn, TEST_TB, [dict(name="no id")])
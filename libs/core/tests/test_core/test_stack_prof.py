@@ -0,0 +1,85 @@
+import contextlib
+import threading
+import time
+
+from thds.core import log, scaling, stack_prof
+
+
+def _busy_wait(stop: threading.Event) -> None:
+    while not stop.is_set():
+        time.sleep(0.001)
+
+
+def _run_tagged_worker(stop: threading.Event) -> None:
+    with scaling.push_scale_group("big"):
+        with log.logger_context(profname="load"):
+            _busy_wait(stop)
+
+
+def test_samples_are_tagged_with_logger_context_and_scale_groups():
+    stop = threading.Event()
+    sampler = stack_prof.StackSampler(interval=0.005)
+    with sampler:
+        worker = threading.Thread(target=_run_tagged_worker, args=(stop,), name="tagged-worker")
+        worker.start()
+        time.sleep(0.2)
+        stop.set()
+        worker.join()
+
+    assert sampler.n_samples > 0
+    worker_stacks = [stack for stack in sampler.counts if "tagged-worker" in stack]
+    assert worker_stacks
+    tagged = [stack for stack in worker_stacks if any("_busy_wait" in frame for frame in stack)]
+    assert tagged
+    for stack in tagged:
+        assert stack[:3] == ("[scale=big]", "[profname=load]", "tagged-worker")
+
+    # tags are dropped once the sampler stops.
+    assert stack_prof._THREAD_TAGS == {}
+    with log.logger_context(profname="ignored"):
+        assert stack_prof._THREAD_TAGS == {}
+
+
+def test_collapsed_output_and_time_tracker(tmp_path):
+    stop = threading.Event()
+    sampler = stack_prof.StackSampler(interval=0.005)
+    worker = threading.Thread(target=_busy_wait, args=(stop,), name="worker")
+    worker.start()
+    try:
+        for _ in range(5):
+            sampler.sample()  # sampling by hand is deterministic in count.
+    finally:
+        stop.set()
+        worker.join()
+
+    assert sampler.n_samples == 5
+    lines = sampler.write_collapsed(tmp_path / "out.folded").read_text().splitlines()
+    assert lines == sampler.collapsed()
+    frames, count = lines[0].rsplit(" ", 1)
+    assert int(count) >= 1 and ";" in frames
+    assert sum(int(line.rsplit(" ", 1)[1]) for line in lines if line.startswith("worker;")) == 5
+
+    tracker = sampler.time_tracker()
+    busy = [name for name in tracker.tracked_times if "_busy_wait" in name]
+    assert len(busy) == 1
+    assert tracker.tracked_times[busy[0]].calls == 5
+    assert abs(tracker.tracked_times[busy[0]].secs - 5 * 0.005) < 1e-9
+    assert 0.0 < tracker.pct_of_totals[busy[0]] <= 100.0
+
+
+def test_contexts_exited_after_the_sampler_stops_leave_no_tags():
+    with contextlib.ExitStack() as outer:
+        with stack_prof.StackSampler(interval=0.005):
+            outer.enter_context(log.logger_context(outer="yes"))
+            inner = log.logger_context(inner="yes")
+            inner.__enter__()
+        inner.__exit__(None, None, None)
+        # restoring outer's tags would leave them behind, for the next sampler to find.
+        assert stack_prof._THREAD_TAGS == {}
+
+
+def test_interval_from_env():
+    assert stack_prof.interval_from_env("1") == stack_prof.interval_from_env("true") == 0.01
+    assert stack_prof.interval_from_env("0.05") == 0.05
+    assert stack_prof.interval_from_env("0") is stack_prof.interval_from_env("off") is None
+    assert stack_prof.interval_from_env("fast") == 0.01
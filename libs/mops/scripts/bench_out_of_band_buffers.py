@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+"""Benchmarks peak memory and time to pickle, and to unpickle, a large numpy array
+argument, in band and out of band (see `thds.mops.pure.pickling._out_of_band`).
+
+    pip install numpy
+    python scripts/bench_out_of_band_buffers.py [--gb 1]
+
+Each step runs in a fresh process, so that its peak RSS is its own, and is reported as a
+multiple of the array's size. The blob store is a local directory, so unpickling out of
+band memory-maps the blob in place.
+"""
+
+import argparse
+import io
+import multiprocessing
+import resource
+import tempfile
+import time
+import typing as ty
+from pathlib import Path
+
+import numpy as np
+
+from thds.core.files import to_uri
+from thds.mops.pure.core.uris import ACTIVE_STORAGE_ROOT
+from thds.mops.pure.pickling import _out_of_band, _pickle
+
+
+def _peak_rss_bytes() -> int:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024  # KiB, on Linux
+
+
+def _pickle_step(root: Path, n_bytes: int, threshold: int, out: ty.Any) -> None:
+    array = np.ones(n_bytes // 8, dtype=np.float64)
+    baseline = _peak_rss_bytes()
+    with ACTIVE_STORAGE_ROOT.set(to_uri(root)), _out_of_band.THRESHOLD.set_local(threshold):
+        start = time.perf_counter()
+        pickled = _pickle.gimme_bytes(_pickle.Dumper(), ((array,), {}))
+        (root / "args").write_bytes(pickled)
+        elapsed_s = time.perf_counter() - start
+    out.put((elapsed_s, _peak_rss_bytes() - baseline + n_bytes))
+
+
+def _unpickle_step(root: Path, n_bytes: int, out: ty.Any) -> None:
+    baseline = _peak_rss_bytes()
+    start = time.perf_counter()
+    (array,), _ = _pickle.CallableUnpickler(io.BytesIO((root / "args").read_bytes())).load()
+    total = array.sum()  # touch every page
+    elapsed_s = time.perf_counter() - start
+    assert total == n_bytes // 8
+    out.put((elapsed_s, _peak_rss_bytes() - baseline))
+
+
+def _run(target: ty.Callable, *args: ty.Any) -> ty.Tuple[float, int]:
+    context = multiprocessing.get_context("spawn")
+    out = context.Queue()
+    process = context.Process(target=target, args=(*args, out))
+    process.start()
+    result = out.get()
+    process.join()
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument("--gb", type=float, default=1.0)
+    args = parser.parse_args()
+    n_bytes = int(args.gb * 2**30)
+
+    print(f"{'':>12} {'pickle s':>9} {'peak RSS':>9} {'unpickle s':>11} {'peak RSS':>9}")
+    for label, threshold in [("in band", 0), ("out of band", 2**20)]:
+        with tempfile.TemporaryDirectory() as tmp:
+            pickle_s, pickle_rss = _run(_pickle_step, Path(tmp), n_bytes, threshold)
+            unpickle_s, unpickle_rss = _run(_unpickle_step, Path(tmp), n_bytes)
+        print(
+            f"{label:>12} {pickle_s:9.2f} {pickle_rss / n_bytes:8.2f}x"
+            f" {unpickle_s:11.2f} {unpickle_rss / n_bytes:8.2f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+"""Benchmarks argument pickling in worker processes against pickling in this process, for
+a fan-out of invocations serialized from many threads at once, as the local runner does.
+
+    python scripts/bench_process_pickling.py [--invocations 64] [--threads 16] [--workers 1 2 4 8]
+
+Each invocation's arguments are a large graph - mostly builtins, with some dates, Decimals
+and Paths mixed in - of which every invocation has its own. The handlers are the stateless
+ones from the real Dumper, plus one that claims Paths without uploading them, so nothing
+here touches a blob store. The speedup is bounded by the number of cores, and by the
+plain pickle that still happens here, so run it on the machine you orchestrate from.
+"""
+
+import argparse
+import datetime as dt
+import time
+import typing as ty
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from functools import partial
+from pathlib import Path
+
+from thds.mops.config import process_pickling_workers
+from thds.mops.pure.pickling import _pickle, _process_pool
+
+
+def _paths(obj: ty.Any) -> ty.Optional[ty.Callable]:
+    return partial(Path, str(obj)) if isinstance(obj, Path) else None
+
+
+def _dumper() -> _pickle.Dumper:
+    return _pickle.Dumper(
+        _paths, _pickle.SourceArgumentPickler(), _pickle.NestedFunctionWithLogicKeyPickler()
+    )
+
+
+def _args(i: int, size: int) -> ty.Tuple[ty.Tuple, ty.Dict[str, ty.Any]]:
+    rows = [{"id": j, "key": f"row-{i}-{j}", "values": [j * 0.5] * 8} for j in range(size)]
+    # not defined here: the workers can't import what's defined in __main__.
+    records = [(dt.date(2026, 1, 1 + j % 28), Decimal(j) / 7) for j in range(size // 10)]
+    paths = [Path(f"/data/{i}/part-{j}.parquet") for j in range(size // 100)]
+    return (rows, records), {"paths": paths, "config": {"i": i, "flags": list(range(50))}}
+
+
+def _freeze_all(
+    all_args: ty.List[ty.Tuple[ty.Tuple, ty.Dict[str, ty.Any]]], threads: int
+) -> ty.List[bytes]:
+    dumper = _dumper()
+
+    def freeze(args_kwargs: ty.Tuple[ty.Tuple, ty.Dict[str, ty.Any]]) -> bytes:
+        return _process_pool.gimme_bytes(dumper, args_kwargs)
+
+    with ThreadPoolExecutor(threads) as pool:
+        return list(pool.map(freeze, all_args))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument("--invocations", type=int, default=64)
+    parser.add_argument("--size", type=int, default=20_000, help="rows per invocation")
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    args = parser.parse_args()
+
+    all_args = [_args(i, args.size) for i in range(args.invocations)]
+    print(
+        f"{args.invocations} invocations of {len(_pickle.gimme_bytes(_dumper(), all_args[0])):,} bytes each"
+    )
+
+    start = time.monotonic()
+    expected = _freeze_all(all_args, args.threads)
+    serial_s = time.monotonic() - start
+    print(f"  in this process: {serial_s:6.2f}s")
+
+    for workers in args.workers:
+        process_pickling_workers.set_global(workers)  # not set_local - the threads must see it.
+        _freeze_all(all_args[:workers], workers)  # start them, outside the timing.
+        start = time.monotonic()
+        pooled = _freeze_all(all_args, args.threads)
+        elapsed_s = time.monotonic() - start
+        assert pooled == expected, "the workers must produce the same bytes"
+        print(f"  {workers:2} workers:      {elapsed_s:6.2f}s ({serial_s / elapsed_s:.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,6 +3,7 @@ import typing as ty
 from pathlib import Path
 
 from thds.core import config, log
+
 from thds.mops._compat import tomllib
 
 logger = log.getLogger(__name__)
@@ -49,6 +50,11 @@ max_concurrent_serialization = config.item("mops.max_concurrent_serialization",
 # 20 clients. Running a similar stress test from your orchestrator may
 # be a good idea if you are dealing with hundreds of micro (<20
 # second) remote tasks.
+process_pickling_workers = config.item("mops.process_pickling_workers", 0, parse=int)
+# Opt-in: argument pickling is GIL-bound, so a fan-out with large arguments serializes one
+# invocation at a time no matter the concurrency above. With N > 0 workers, most of that
+# work happens in N spawned processes instead - see pure.pickling._process_pool. Set it
+# globally (or in the environment), since the fan-out serializes from many threads.
 
 open_files_limit = config.item("mops.resources.max_open_files", 10000)
 
@@ -8,7 +8,8 @@ from azure.core.exceptions import HttpResponseError
 from azure.storage.filedatalake import DataLakeFileClient
 
 from thds import adls
-from thds.adls.errors import blob_not_found_translation, is_blob_not_found
+from thds.adls.errors import ContentLengthMismatchError, blob_not_found_translation, is_blob_not_found
+from thds.adls.file_properties import get_blob_properties
 from thds.adls.global_client import get_global_fs_client
 from thds.core import config, fretry, home, link, log, scope
 
@@ -76,13 +77,37 @@ class AdlsBlobStore(BlobStore):
         scope.enter(log.logger_context(download="mops-getfile"))
         return adls.download_to_cache(remote_uri)
 
+    @fretry.retry_regular(fretry.is_exc(ContentLengthMismatchError), fretry.n_times(2))
     @_azure_creds_retry
     @scope.bound
     def putbytes(
         self, remote_uri: str, data: AnyStrSrc, type_hint: str = "application/octet-stream"
     ) -> None:
-        """Upload data to a remote path."""
+        """Upload data to a remote path.
+
+        A stream is uploaded from its start on every attempt, and must be seekable to be
+        retried. If it has a length, the uploaded blob is checked against it, since a blob
+        that is only part of a stream would otherwise go unnoticed until it was read.
+        """
+        if hasattr(data, "seek"):
+            data.seek(0)  # type: ignore
         adls.upload(remote_uri, data, content_type=type_hint)
+        if hasattr(data, "read") and hasattr(data, "__len__"):
+            uploaded = get_blob_properties(adls.fqn.parse(remote_uri)).size
+            if uploaded != len(data):  # type: ignore
+                raise ContentLengthMismatchError(
+                    f"Uploaded {uploaded} of {len(data)} bytes to {remote_uri}"  # type: ignore
+                )
+
+    def putstream(
+        self, remote_uri: str, type_hint: str = "application/octet-stream"
+    ) -> ty.ContextManager[ty.IO[bytes]]:
+        """The optional StreamingBlobStore capability - see `core.types`.
+
+        Not retried as a whole, as the other methods are - what was written can't be written
+        again - but each request of the upload is retried on the same transient failures.
+        """
+        return adls.upload_stream(remote_uri, content_type=type_hint)
 
     @_azure_creds_retry
     @scope.bound
@@ -134,6 +159,18 @@ class AdlsBlobStore(BlobStore):
             fqn, listing.paths_from(client, fqn, adls.fqn.parse(start_at).path.rsplit("/", 1)[-1])
         )
 
+    def list_recursive(self, uri: str) -> ty.Iterator[str]:
+        """One paged `get_paths` listing, however deep the tree."""
+        fqn = adls.fqn.parse(uri)
+        client = get_global_fs_client(fqn.sa, fqn.container)
+        try:
+            for path in client.get_paths(fqn.path, recursive=True):
+                if not path.is_directory:
+                    yield str(adls.fqn.AdlsFqn(fqn.sa, fqn.container, path.name))
+        except HttpResponseError as hre:
+            if not is_blob_not_found(hre):
+                raise
+
 
 class DangerouslyCachingStore(AdlsBlobStore):
     """This BlobStore will cache _everything_ locally
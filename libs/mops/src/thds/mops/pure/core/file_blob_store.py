@@ -59,6 +59,9 @@ def _put_bytes_to_file_uri(remote_uri: str, data: AnyStrSrc) -> None:
     elif isinstance(data, str):
         with atomic_writable(remote_uri, "w") as f:
             f.write(data)  # type: ignore
+    elif hasattr(data, "read"):
+        with atomic_writable(remote_uri, "wb") as f:
+            shutil.copyfileobj(data, f)  # type: ignore
     else:
         # if this fallback case fails, we may need to admit defeat for now,
         # and follow up by analyzing the failure and adding support for the input data type.
@@ -96,6 +99,11 @@ class FileBlobStore(BlobStore):
     def putfile(self, path: Path, remote_uri: str) -> None:
         _link(path, remote_uri)
 
+    def putstream(self, remote_uri: str, type_hint: str = "bytes") -> ty.ContextManager[ty.IO[bytes]]:
+        """The optional StreamingBlobStore capability - see `core.types`."""
+        logger.debug(f"Streaming {type_hint} to {remote_uri}")
+        return atomic_writable(remote_uri, "wb")
+
     def exists(self, remote_uri: str) -> bool:
         return path_from_uri(remote_uri).exists()
 
@@ -114,6 +122,12 @@ class FileBlobStore(BlobStore):
         # modified_at on a tie, which cannot be compared when one side is None.
         return [entry for entry in listed if entry.uri >= start_at] if start_at else listed
 
+    def list_recursive(self, prefix_uri: str) -> ty.Iterator[str]:
+        """The optional RecursivelyListableBlobStore capability - see `core.types`."""
+        root = path_from_uri(prefix_uri)
+        if root.is_dir():
+            yield from (to_uri(path) for path in root.rglob("*") if path.is_file())
+
     def join(self, *parts: str) -> str:
         return os.path.join(*parts)
 
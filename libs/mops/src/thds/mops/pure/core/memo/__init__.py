@@ -1,4 +1,4 @@
-from . import calls, results, unique_name_for_function  # noqa: F401
+from . import calls, result_index, results, unique_name_for_function  # noqa: F401
 from .function_memospace import (  # noqa
     args_kwargs_content_address,
     make_function_memospace,
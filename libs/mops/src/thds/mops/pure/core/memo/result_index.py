@@ -0,0 +1,123 @@
+"""An index of the memoized results under a function memospace.
+
+Before every invocation we check whether its result (and perhaps its exception) already
+exists, which costs an `exists` round trip apiece. Across a wide fan-out, that adds up to
+minutes of probing, one call at a time. Instead, the index lists the whole function
+memospace once - at the first check under it - and answers the checks after that from
+memory.
+
+mops never deletes control files, so whatever the listing found still exists. Whatever it
+didn't find may have been written since, so those checks still fall back to `exists`.
+
+This is opt-in, via `thds.mops.pure.memo.result_index` - for a function with a long history
+and few calls, the listing costs more than it saves. Set it globally (or in the
+environment), since fan-outs check from many threads. Only a blob store that is a
+`RecursivelyListableBlobStore` can be indexed.
+"""
+
+import threading
+import time
+import typing as ty
+
+from thds.core import config, log
+
+from ..types import BlobStore, RecursivelyListableBlobStore
+from ..uris import lookup_blob_store
+
+ENABLED = config.item("thds.mops.pure.memo.result_index", default=False, parse=config.tobool)
+logger = log.getLogger(__name__)
+
+
+class Counters(ty.NamedTuple):
+    listings: int = 0
+    listed: int = 0  # blobs seen by the listings
+    indexed: int = 0  # of which were results
+    hits: int = 0  # checks answered by the index
+    misses: int = 0  # checks left to `exists`
+
+
+class ResultIndex:
+    """The URIs of blobs named one of `names`, anywhere under the function memospace."""
+
+    def __init__(
+        self,
+        blob_store: BlobStore,
+        function_memospace: str,
+        names: ty.Collection[str],
+    ):
+        self._blob_store = blob_store
+        self.function_memospace = function_memospace
+        self._names = frozenset(names)
+        self._known: ty.Optional[ty.Set[ty.Tuple[str, ...]]] = None
+        self._lock = threading.Lock()
+        self.counters = Counters()
+
+    def _key(self, uri: str) -> ty.Tuple[str, ...]:
+        # split normalizes, so a URI matches however its parts were joined.
+        return tuple(self._blob_store.split(uri))
+
+    def _list(self) -> ty.Set[ty.Tuple[str, ...]]:
+        start = time.monotonic()
+        known = set()
+        listed = 0
+        blob_store = ty.cast(RecursivelyListableBlobStore, self._blob_store)
+        for uri in blob_store.list_recursive(self.function_memospace):
+            listed += 1
+            key = self._key(uri)
+            if key[-1] in self._names:
+                known.add(key)
+        logger.info(
+            "Indexed %d results from %d blobs under %s in %.1fs",
+            len(known),
+            listed,
+            self.function_memospace,
+            time.monotonic() - start,
+        )
+        self.counters = self.counters._replace(
+            listings=self.counters.listings + 1,
+            listed=self.counters.listed + listed,
+            indexed=self.counters.indexed + len(known),
+        )
+        return known
+
+    def __contains__(self, uri: str) -> bool:
+        with self._lock:  # the first check lists; the others wait for it rather than probe.
+            if self._known is None:
+                self._known = self._list()
+            found = self._key(uri) in self._known
+            if found:
+                self.counters = self.counters._replace(hits=self.counters.hits + 1)
+            else:
+                self.counters = self.counters._replace(misses=self.counters.misses + 1)
+            return found
+
+
+_INDEXES: ty.Dict[str, ResultIndex] = dict()
+_INDEXES_LOCK = threading.Lock()
+
+
+def for_memospace(function_memospace: str, names: ty.Collection[str]) -> ty.Optional[ResultIndex]:
+    """The index for the function memospace, if enabled and its blob store can list it."""
+    if not ENABLED():
+        return None
+    with _INDEXES_LOCK:
+        index = _INDEXES.get(function_memospace)
+        if index is None:
+            blob_store = lookup_blob_store(function_memospace)
+            if not isinstance(blob_store, RecursivelyListableBlobStore):
+                return None
+            index = _INDEXES[function_memospace] = ResultIndex(blob_store, function_memospace, names)
+        return index
+
+
+def counters() -> Counters:
+    """Summed over every index in this process."""
+    with _INDEXES_LOCK:
+        each = [index.counters for index in _INDEXES.values()]
+    return Counters(*(sum(column) for column in zip(*each))) if each else Counters()
+
+
+def clear() -> None:
+    """Forget every index, so the next checks list again."""
+    with _INDEXES_LOCK:
+        _INDEXES.clear()
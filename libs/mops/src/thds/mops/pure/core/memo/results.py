@@ -11,6 +11,7 @@ from thds.core import config, log, stack_context
 from thds.termtool import colorize
 
 from ..uris import lookup_blob_store
+from . import result_index
 
 _REQUIRE_ALL_RESULTS = config.item("require_all_results", default="")
 _UNLESS_ENV = stack_context.StackContext("results_unless_env", "")
@@ -78,10 +79,23 @@ def check_if_result_exists(
     memo_uri: str,
     check_for_exception: bool = False,
     before_raise: ty.Optional[ty.Callable[[], ty.Any]] = None,
+    function_memospace: str = "",
 ) -> ty.Union[None, Success, Error]:
+    """Pass the function_memospace that memo_uri is under to make use of its result index,
+    if enabled - see `result_index`.
+    """
     fs = lookup_blob_store(memo_uri)
+    index = (
+        result_index.for_memospace(function_memospace, (RESULT, EXCEPTION))
+        if function_memospace
+        else None
+    )
+
+    def exists(uri: str) -> bool:
+        return (index is not None and uri in index) or fs.exists(uri)
+
     value_uri = fs.join(memo_uri, RESULT)
-    if fs.exists(value_uri):
+    if exists(value_uri):
         return Success(value_uri)
 
     required_msg = _should_require_result(memo_uri)
@@ -98,7 +112,7 @@ def check_if_result_exists(
         return None
 
     error_uri = fs.join(memo_uri, EXCEPTION)
-    if fs.exists(error_uri):
+    if exists(error_uri):
         return Error(error_uri)
 
     return None
@@ -177,5 +177,34 @@ class ListableBlobStore(ty.Protocol):
         """
 
 
+@ty.runtime_checkable
+class RecursivelyListableBlobStore(ty.Protocol):
+    """Another optional capability, for reading back many memoized results at once (see
+    `memo.result_index`). Without it, each result is found with its own `exists`.
+    """
+
+    def list_recursive(self, __prefix_uri: str) -> ty.Iterator[str]:
+        """URIs of every blob anywhere under a prefix, in no particular order, from as few
+        requests as the store allows. A prefix with nothing under it lists nothing.
+        """
+
+
+@ty.runtime_checkable
+class StreamingBlobStore(ty.Protocol):
+    """An optional capability, for writing a blob too large to hold in memory as bytes - a
+    large result, pickled straight into it. Without it, such a blob is built as bytes and
+    written with `putbytes`.
+    """
+
+    def putstream(
+        self, __remote_uri: str, *, type_hint: str = "bytes"
+    ) -> ty.ContextManager[ty.IO[bytes]]:
+        """A stream to write the blob to, uploaded (or written) as it is written to, rather
+        than all at the end. The blob appears at the URI - all at once, and replacing
+        anything there - only if the context exits without an exception; otherwise, nothing
+        at the URI changes.
+        """
+
+
 Args = ty.Sequence
 Kwargs = ty.Mapping[str, ty.Any]
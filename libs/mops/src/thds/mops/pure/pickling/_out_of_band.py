@@ -0,0 +1,100 @@
+"""Large contiguous buffers - the data of a numpy array, or an Arrow buffer - pickled out of
+band, as content-addressed blobs of their own.
+
+Pickled in band, a 4 GB array is copied into the pickle's BytesIO, then into the bytes
+we upload, and on the way back, read into bytes and copied again into the array. Instead,
+with `THRESHOLD` set:
+
+- objects that reduce differently at protocol 5 - numpy arrays do - are reduced as at
+  protocol 5. If that gives a `pickle.PickleBuffer` of at least `THRESHOLD` bytes (and
+  nothing smaller), the buffer is hashed and uploaded straight from memory, and pickled
+  as a persistent id for its content-addressed URI. Anything else pickles exactly as it
+  did before - still at protocol 4, so its bytes, and the memo keys they make, don't change.
+- unpickling memory-maps the blob, copy-on-write: from a `FileBlobStore` in place, and
+  otherwise from the local cache the blob store downloads it to. Either way, the array is
+  paged in as it is read, rather than held twice.
+
+This is opt-in, because an argument containing such a buffer pickles to a different memo
+key than it used to, and because a mops older than this can't unpickle these ids.
+"""
+
+import hashlib
+import io
+import pickle
+import typing as ty
+
+from thds.core import config, hashing
+
+from ..core.content_addressed import wordybin_content_addressed
+from ..core.uris import lookup_blob_store
+from .pickles import UnpickleBufferFromUri
+
+THRESHOLD = config.item("thds.mops.pure.pickling.out_of_band_buffer_bytes", default=0, parse=int)
+# the smallest buffer to pickle out of band; 0 means none are.
+
+
+def _out_of_band(buffer: pickle.PickleBuffer, threshold: int) -> bool:
+    try:
+        with buffer.raw() as raw:
+            return raw.nbytes >= threshold
+    except BufferError:  # not contiguous
+        return False
+
+
+def reduction(obj: ty.Any) -> ty.Any:
+    """A `reducer_override` - NotImplemented unless `obj` has buffers to pickle out of band."""
+    if type(obj).__reduce_ex__ is object.__reduce_ex__:
+        return NotImplemented  # the same at any protocol
+    threshold = THRESHOLD()
+    rv = obj.__reduce_ex__(5)
+    if not isinstance(rv, tuple) or len(rv) < 2:
+        return NotImplemented
+    buffers = [arg for arg in rv[1] if isinstance(arg, pickle.PickleBuffer)]
+    if not buffers or not all(_out_of_band(buffer, threshold) for buffer in buffers):
+        return NotImplemented  # a protocol 4 pickler can't pickle a PickleBuffer in band.
+    return rv
+
+
+class _BufferReader(io.RawIOBase):
+    """Reads a buffer in place, as often as asked - a retried upload seeks back to the start
+    and reads the whole of it again, and the uploader can hash it, too."""
+
+    def __init__(self, raw: memoryview):
+        super().__init__()
+        self._raw = raw
+        self._pos = 0
+
+    def __len__(self) -> int:
+        return self._raw.nbytes
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._pos
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        start = {io.SEEK_SET: 0, io.SEEK_CUR: self._pos, io.SEEK_END: self._raw.nbytes}[whence]
+        self._pos = max(0, start + offset)
+        return self._pos
+
+    def readinto(self, b: ty.Any) -> int:
+        out = memoryview(b).cast("B")
+        chunk = self._raw[self._pos : self._pos + out.nbytes]  # never more than was asked for.
+        out[: chunk.nbytes] = chunk
+        self._pos += chunk.nbytes
+        return chunk.nbytes
+
+
+def upload(buffer: pickle.PickleBuffer) -> UnpickleBufferFromUri:
+    """Only for the buffers `reduction` approved."""
+    with buffer.raw() as raw:
+        bytes_uri, _ = wordybin_content_addressed(hashing.Hash("sha256", hashlib.sha256(raw).digest()))
+        blob_store = lookup_blob_store(bytes_uri)
+        if not blob_store.exists(bytes_uri):
+            with _BufferReader(raw) as reader:
+                blob_store.putbytes(bytes_uri, reader, type_hint="application/octet-stream")
+    return UnpickleBufferFromUri(bytes_uri)
@@ -15,8 +15,10 @@ from ..core import memo, metadata
 from ..core.source import prepare_source_argument, prepare_source_result
 from ..core.types import Args, Deserializer, Kwargs, SerializerHandler
 from ..core.uris import get_bytes
+from . import _out_of_band, compression
 from .pickles import (
     PicklableFunction,
+    UnpickleBufferFromUri,
     UnpickleFunctionWithLogicKey,
     UnpickleSourceHashrefArgument,
     UnpickleSourceResult,
@@ -41,20 +43,32 @@ _PICKLE_PROTOCOL = 4
 # different hashes and orphaning caches generated on earlier Pythons.
 
 
+def handle_persistent_id(
+    handlers: ty.Sequence[SerializerHandler], obj: ty.Any
+) -> ty.Union[None, ty.Callable]:
+    if isinstance(obj, Exception):
+        pickling_support.install(obj)
+    for handler in handlers:
+        pid = handler(obj)
+        if pid is not None:
+            return pid
+    return None
+
+
 class _CallbackPickler(pickle.Pickler):
     def __init__(self, handlers: ty.Sequence[SerializerHandler], *args: ty.Any, **kwargs: ty.Any):
         kwargs.setdefault("protocol", _PICKLE_PROTOCOL)
+        if _out_of_band.THRESHOLD() > 0:
+            # only if enabled, since the C pickler calls back into Python for every object
+            # with a reducer_override, and it must be set before __init__, which looks it up.
+            self.reducer_override = _out_of_band.reduction  # type: ignore[method-assign]
         super().__init__(*args, **kwargs)
         self.handlers = handlers
 
-    def persistent_id(self, obj: ty.Any) -> ty.Union[None, ty.Callable]:
-        if isinstance(obj, Exception):
-            pickling_support.install(obj)
-        for handler in self.handlers:
-            pid = handler(obj)
-            if pid is not None:
-                return pid
-        return None
+    def persistent_id(self, obj: ty.Any) -> ty.Union[None, ty.Callable, UnpickleBufferFromUri]:
+        if type(obj) is pickle.PickleBuffer:  # only ever from _out_of_band.reduction
+            return _out_of_band.upload(obj)
+        return handle_persistent_id(self.handlers, obj)
 
 
 class CallableUnpickler(pickle.Unpickler):
@@ -97,7 +111,8 @@ def read_partial_pickle(full_bytes: bytes) -> ty.Tuple[bytes, bytes]:
     first_pickle_pos = full_bytes.find(b"\x80")
     if first_pickle_pos == -1:
         raise ValueError(f"Unable to find a pickle in bytes of length {len(full_bytes)}")
-    return full_bytes[:first_pickle_pos], full_bytes[first_pickle_pos:]
+    # the 'pickle' may be a compressed frame, which also begins with \x80.
+    return full_bytes[:first_pickle_pos], compression.unframe(full_bytes[first_pickle_pos:])
 
 
 def _unpickle_with_callable(pickle_bytes: bytes) -> ty.Any:
@@ -131,7 +146,13 @@ def read_metadata_and_object(
     return make_read_header_and_object(type_hint, xf_header=_read_metadata_header)(uri)
 
 
-def freeze_args_kwargs(dumper: Dumper, f: ty.Callable, args: Args, kwargs: Kwargs) -> bytes:
+def freeze_args_kwargs(
+    dumper: Dumper,
+    f: ty.Callable,
+    args: Args,
+    kwargs: Kwargs,
+    to_bytes: ty.Callable[[Dumper, object], bytes] = gimme_bytes,
+) -> bytes:
     """Returns a pickled (args, kwargs) tuple, with pre-bound
     arguments to normalize different call structures into a
     canonical/determinstic binding.
@@ -139,7 +160,7 @@ def freeze_args_kwargs(dumper: Dumper, f: ty.Callable, args: Args, kwargs: Kwarg
     Also binds default arguments, for maximum determinism/explicitness.
     """
     bound_arguments = inspect.bind_arguments(f, *args, **kwargs)
-    return gimme_bytes(dumper, (bound_arguments.args, bound_arguments.kwargs))
+    return to_bytes(dumper, (bound_arguments.args, bound_arguments.kwargs))
 
 
 def unfreeze_args_kwargs(
@@ -0,0 +1,265 @@
+"""Pickling arguments in worker processes, to get it out from under the GIL.
+
+`_CallbackPickler` calls back into Python - its `persistent_id` - for every single object
+it pickles, which makes it many times slower than a plain pickle, and it holds the GIL the
+whole while. With `mops.process_pickling_workers` set, this instead:
+
+1. pickles the object plainly, in this process, at C speed. `reducer_override` is only
+   called for objects that aren't plain builtins, and those are the only objects the
+   handlers ever claim. Whatever a handler claims - a Path, a Source, a by-id object, a
+   function with a logic key - is replaced with a placeholder, after its handler has run
+   here, where its state (uploads, hashrefs, the by-id registry) lives.
+2. has a worker process unpickle that and pickle it again with a `_CallbackPickler`, whose
+   only handler replaces each placeholder with the persistent id resolved for it here. The
+   worker asks for any placeholder seen more than once, because the handlers are called
+   for every occurrence, so their side effects (if not their order) and the identity of
+   the ids they return, which the pickle memoizes, stay the same.
+
+The resulting bytes are the memoization key, so they must match what `_pickle.Dumper`
+would have produced here, and they do, with one exception: the order of a set (or
+frozenset) of strings depends on the process's hash seed, so it differs in the worker -
+as it already does between any two orchestrator processes, unless PYTHONHASHSEED is set,
+which the workers inherit.
+
+Anything that can't be done this way - an object the worker can't import, a class or
+function from `__main__`, buffers to pickle out of band, a worker that died - falls back to
+pickling in this process.
+"""
+
+import io
+import multiprocessing
+import os
+import pickle
+import threading
+import types
+import typing as ty
+from multiprocessing.connection import Connection
+
+from thds.core import log
+
+from ...config import process_pickling_workers
+from ..core.types import SerializerHandler
+from . import _out_of_band, _pickle
+
+logger = log.getLogger(__name__)
+
+
+class _Placeholder(ty.NamedTuple):
+    position: int
+
+
+class _Handled:
+    """The handlers, and every persistent id they've returned for each object they've
+    claimed, so that pickling here instead - if a worker can't - replays those rather than
+    running the handlers (and their uploads, or by-id registrations) all over again."""
+
+    def __init__(self, handlers: ty.Sequence[SerializerHandler]):
+        self.handlers = handlers
+        self.claimed: ty.List[ty.Any] = list()  # by placeholder position
+        self.pids: ty.List[ty.List[ty.Any]] = list()  # also keeps them alive, for the worker.
+        self._positions: ty.Dict[int, int] = dict()
+        self._replayed: ty.Dict[int, int] = dict()
+
+    def first(self, obj: ty.Any) -> ty.Optional[int]:
+        """The position of the placeholder for obj, if a handler claims it."""
+        pid = _pickle.handle_persistent_id(self.handlers, obj)
+        if pid is None:
+            return None
+        self._positions[id(obj)] = len(self.claimed)
+        self.claimed.append(obj)
+        self.pids.append([pid])
+        return len(self.claimed) - 1
+
+    def again(self, position: int) -> ty.Any:
+        pid = _pickle.handle_persistent_id(self.handlers, self.claimed[position])
+        self.pids[position].append(pid)
+        return pid
+
+    def replay(self, obj: ty.Any) -> ty.Any:
+        """A handler for pickling here, in the same order as the worker would have."""
+        position = self._positions.get(id(obj))
+        if position is None:
+            return _pickle.handle_persistent_id(self.handlers, obj)
+        n = self._replayed.get(position, 0)
+        self._replayed[position] = n + 1
+        if n < len(self.pids[position]):
+            return self.pids[position][n]
+        return self.again(position)
+
+
+class _ForWorkerPickler(pickle.Pickler):
+    def __init__(self, file: ty.IO[bytes]):
+        super().__init__(file, protocol=_pickle._PICKLE_PROTOCOL)
+
+    def reducer_override(self, obj: ty.Any) -> ty.Any:
+        if isinstance(obj, (type, types.FunctionType)) and obj.__module__ == "__main__":
+            # the worker would pickle it again as from `__mp_main__`.
+            raise pickle.PicklingError(f"{obj.__qualname__} is defined in __main__")
+        return NotImplemented
+
+
+def _for_worker(obj: object) -> bytes:
+    with io.BytesIO() as bio:
+        _ForWorkerPickler(bio).dump(obj)
+        return bio.getvalue()
+
+
+class _PlaceholdingPickler(_ForWorkerPickler):
+    def __init__(self, handled: _Handled, file: ty.IO[bytes]):
+        super().__init__(file)
+        self.handled = handled
+
+    def reducer_override(self, obj: ty.Any) -> ty.Any:
+        position = self.handled.first(obj)
+        if position is None:
+            if _out_of_band.THRESHOLD() > 0 and _out_of_band.reduction(obj) is not NotImplemented:
+                # no use copying it to a worker - and its pickling is no work for the GIL.
+                raise pickle.PicklingError(f"{type(obj).__name__} has buffers to pickle out of band")
+            return super().reducer_override(obj)
+        return _Placeholder, (position,)
+
+
+class _PlaceholderResolver:
+    """The worker's only handler."""
+
+    def __init__(self, conn: Connection, first_pid_ids: ty.List[int], pids: ty.Dict[int, ty.Any]):
+        self.conn = conn
+        self.first_pid_ids = first_pid_ids
+        self.pids = pids  # by their id in the parent, so that identical ids stay identical
+        self.seen: ty.Set[int] = set()
+
+    def __call__(self, obj: ty.Any) -> ty.Any:
+        if type(obj) is not _Placeholder:
+            return None
+        if obj.position not in self.seen:
+            self.seen.add(obj.position)
+            return self.pids[self.first_pid_ids[obj.position]]
+        self.conn.send(("again", obj.position))
+        pid_id, pid_bytes = self.conn.recv()
+        if pid_id not in self.pids:
+            self.pids[pid_id] = pickle.loads(pid_bytes)
+        return self.pids[pid_id]
+
+
+def _serve(conn: Connection) -> None:
+    while True:
+        try:
+            first_pid_ids, pids_bytes = conn.recv()
+            payload = conn.recv_bytes()
+        except EOFError:
+            return
+        try:
+            resolver = _PlaceholderResolver(conn, first_pid_ids, pickle.loads(pids_bytes))
+            with io.BytesIO() as bio:
+                _pickle._CallbackPickler([resolver], bio).dump(pickle.loads(payload))
+                result = bio.getvalue()
+        except Exception as exc:
+            conn.send(("error", f"{type(exc).__name__}: {exc}"))
+        else:
+            conn.send(("done", None))
+            conn.send_bytes(result)
+
+
+class _WorkerError(Exception):
+    pass
+
+
+class _Worker:
+    def __init__(self, context: ty.Any):
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=_serve, args=(child_conn,), daemon=True)
+        self.process.start()
+        child_conn.close()
+
+    def repickle(self, handled: _Handled, payload: bytes) -> bytes:
+        firsts = [pids[0] for pids in handled.pids]
+        self.conn.send(([id(pid) for pid in firsts], _for_worker({id(pid): pid for pid in firsts})))
+        self.conn.send_bytes(payload)
+        while True:
+            kind, arg = self.conn.recv()
+            if kind == "done":
+                return self.conn.recv_bytes()
+            if kind == "error":
+                raise _WorkerError(arg)
+            # a placeholder seen again: the handlers must see it again too.
+            pid = handled.again(arg)
+            self.conn.send((id(pid), _for_worker(pid)))
+
+
+class _Pool:
+    def __init__(self, size: int):
+        self.size = size
+        self.pid = os.getpid()
+        self._context = multiprocessing.get_context("spawn")
+        self._idle: ty.List[_Worker] = list()
+        self._started = 0
+        self._available = threading.Condition()  # a worker is idle, or one may be started.
+
+    def _checkout(self) -> _Worker:
+        with self._available:
+            while not self._idle and self._started >= self.size:
+                self._available.wait()
+            if self._idle:
+                return self._idle.pop()
+            self._started += 1
+        try:
+            return _Worker(self._context)
+        except BaseException:
+            self._discard(None)
+            raise
+
+    def _checkin(self, worker: _Worker) -> None:
+        with self._available:
+            self._idle.append(worker)
+            self._available.notify()
+
+    def _discard(self, worker: ty.Optional[_Worker]) -> None:
+        with self._available:
+            self._started -= 1
+            self._available.notify()  # whoever is waiting may start another.
+        if worker is not None:
+            worker.process.kill()
+
+    def dump(self, handled: _Handled, obj: object) -> bytes:
+        with io.BytesIO() as bio:
+            _PlaceholdingPickler(handled, bio).dump(obj)
+            payload = bio.getvalue()
+
+        worker = self._checkout()
+        try:
+            result = worker.repickle(handled, payload)
+        except _WorkerError:
+            self._checkin(worker)  # it's ready for the next one.
+            raise
+        except BaseException:
+            self._discard(worker)  # mid-conversation, so it can't be reused.
+            raise
+        self._checkin(worker)
+        return result
+
+
+_POOL: ty.Optional[_Pool] = None
+_POOL_LOCK = threading.Lock()
+
+
+def _pool(size: int) -> _Pool:
+    global _POOL
+    with _POOL_LOCK:
+        if _POOL is None or _POOL.size != size or _POOL.pid != os.getpid():
+            _POOL = _Pool(size)  # the workers of a replaced pool exit once it's collected.
+        return _POOL
+
+
+def gimme_bytes(dumper: _pickle.Dumper, obj: object) -> bytes:
+    """Like `_pickle.gimme_bytes`, but in a worker process if `mops.process_pickling_workers`
+    is set."""
+    workers = process_pickling_workers()
+    if workers <= 0:
+        return _pickle.gimme_bytes(dumper, obj)
+    handled = _Handled(dumper.handlers)
+    try:
+        return _pool(workers).dump(handled, obj)
+    except Exception as err:
+        # including the errors the handlers raise, which pickling here will raise again.
+        logger.debug("Pickling in this process instead of a worker: %s", err)
+        return _pickle.gimme_bytes(_pickle.Dumper(handled.replay), obj)
@@ -0,0 +1,120 @@
+"""Optional compression of the invocation, result, and exception pickles.
+
+A large result - a DataFrame, an array - pickles to about its size in memory, and all of it
+gets uploaded and then downloaded again by every reader. With `CODEC` set to `zstd` or `lz4`
+(which need `zstandard` or `lz4` installed, wherever these are read or written), any of
+these pickles at least `THRESHOLD` bytes long is written compressed, in a frame:
+
+    \\x80\\xffmops-compressed:<codec>\\n<the compressed pickle>
+
+after the same text header as before. Readers look for the first \\x80 to find the pickle,
+so they find the frame there instead, and unframe it. Anything else is an uncompressed
+pickle, which is every blob written before this, or with `CODEC` unset, or too small to
+bother with - so either can be read, whatever `CODEC` is.
+
+A mops older than this would fail on a framed blob, with 'unsupported pickle protocol:
+255', so `CODEC` is unset by default. Set it once the orchestrator and every remote
+environment that reads these blobs has been upgraded. Each side compresses what it writes
+according to its own config, and reads whatever it finds.
+
+A pickle written with `framing`, as it is made, rather than from bytes, can't be measured
+first: with `CODEC` set, it is always framed, whatever its size.
+"""
+
+import contextlib
+import typing as ty
+
+from thds.core import config, log
+
+CODEC = config.item("thds.mops.pure.pickling.compression", default="", parse=str)
+THRESHOLD = config.item("thds.mops.pure.pickling.compression_threshold", default=2**16, parse=int)
+_FRAME = b"\x80\xffmops-compressed:"
+# \x80 is the pickle PROTO opcode, but there is no protocol 255.
+logger = log.getLogger(__name__)
+
+
+class _Codec(ty.NamedTuple):
+    compress: ty.Callable[[bytes], bytes]
+    decompress: ty.Callable[[bytes], bytes]
+    compressing: ty.Callable[[ty.IO[bytes]], ty.ContextManager[ty.IO[bytes]]]
+    # writes compressed to the stream it wraps, and finishes on exit, without closing it.
+
+
+def _zstd() -> _Codec:
+    import zstandard
+
+    # (de)compressors aren't thread-safe, and they're cheap to make.
+    return _Codec(
+        lambda data: zstandard.ZstdCompressor(level=3).compress(data),
+        # a frame written by a stream_writer doesn't record its size, so decompress can't size it.
+        lambda data: zstandard.ZstdDecompressor().decompressobj().decompress(data),
+        lambda stream: zstandard.ZstdCompressor(level=3).stream_writer(stream, closefd=False),
+    )
+
+
+def _lz4() -> _Codec:
+    import lz4.frame
+
+    return _Codec(
+        lz4.frame.compress,
+        lz4.frame.decompress,
+        lambda stream: lz4.frame.LZ4FrameFile(stream, mode="wb"),  # doesn't close what it wraps.
+    )
+
+
+_CODECS: ty.Dict[str, ty.Tuple[str, ty.Callable[[], _Codec]]] = dict(
+    zstd=("zstandard", _zstd), lz4=("lz4", _lz4)
+)
+
+
+def _codec(name: str) -> _Codec:
+    if name not in _CODECS:
+        raise ValueError(f"Unknown compression codec {name!r}; expected one of {sorted(_CODECS)}")
+    package, make_codec = _CODECS[name]
+    try:
+        return make_codec()
+    except ModuleNotFoundError as mnf:
+        raise ModuleNotFoundError(
+            f"Please install `{package}` to read or write {name} mops blobs."
+        ) from mnf
+
+
+def frame(pickle_bytes: bytes) -> bytes:
+    """Compressed and framed, if configured and worth it; otherwise, unchanged."""
+    codec_name = CODEC()
+    if not codec_name:
+        return pickle_bytes
+    codec = _codec(codec_name)  # even if unused, so that a misconfiguration is found early.
+    if len(pickle_bytes) < THRESHOLD():
+        return pickle_bytes
+    compressed = codec.compress(pickle_bytes)
+    if len(compressed) >= len(pickle_bytes):
+        return pickle_bytes  # already compressed, or random - a frame would only cost the reader.
+    logger.debug(
+        "Compressed a pickle with %s from %d to %d bytes", codec_name, len(pickle_bytes), len(compressed)
+    )
+    return _FRAME + codec_name.encode() + b"\n" + compressed
+
+
+@contextlib.contextmanager
+def framing(stream: ty.IO[bytes]) -> ty.Iterator[ty.IO[bytes]]:
+    """A stream to write a pickle to, which writes it to `stream` compressed and framed, if
+    configured; otherwise, `stream` itself.
+    """
+    codec_name = CODEC()
+    if not codec_name:
+        yield stream
+        return
+    codec = _codec(codec_name)
+    stream.write(_FRAME + codec_name.encode() + b"\n")
+    with codec.compressing(stream) as compressing:
+        yield compressing
+
+
+def unframe(data: bytes) -> bytes:
+    """The pickle, decompressed if it was framed."""
+    if not data.startswith(_FRAME):
+        return data
+    codec_end = data.index(b"\n", len(_FRAME))
+    codec_name = data[len(_FRAME) : codec_end].decode()
+    return _codec(codec_name).decompress(data[codec_end + 1 :])
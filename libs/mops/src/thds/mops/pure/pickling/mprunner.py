@@ -25,7 +25,7 @@ from ..core.types import Args, F, Kwargs, Serializer, T
 from ..runner import local, shim_builder
 from ..runner.types import FutureShim, Shim, ShimBuilder
 from ..tools.summarize import run_summary
-from . import _pickle, pickles, sha256_b64
+from . import _pickle, _process_pool, compression, pickles, sha256_b64
 
 RUNNER_NAME = "mops2-mpf"
 Redirect = ty.Callable[[F, Args, Kwargs], F]
@@ -149,7 +149,9 @@ class MemoizingPicklingRunner:
         # Why do we need func in order to serialize args and kwargs? Because
         # we use it to bind the arguments to the function first, which makes that part
         # deterministic and also 'reifies' any default arguments, so we don't have any implicit state.
-        return _pickle.freeze_args_kwargs(self._get_stateful_dumper(storage_root), func, args, kwargs)
+        return _pickle.freeze_args_kwargs(
+            self._get_stateful_dumper(storage_root), func, args, kwargs, _process_pool.gimme_bytes
+        )
 
     def _serialize_invocation(
         self, storage_root: str, func: ty.Callable[..., T], args_kwargs: bytes
@@ -169,12 +171,14 @@ class MemoizingPicklingRunner:
         return (
             header.encode("utf-8")
             + b"\n"
-            + _pickle.gimme_bytes(
-                self._get_stateful_dumper(storage_root),
-                pickles.Invocation(
-                    _pickle.wrap_f(self._redirect(func, _ARGS_CONTEXT(), _KWARGS_CONTEXT())),
-                    args_kwargs,
-                ),
+            + compression.frame(
+                _pickle.gimme_bytes(
+                    self._get_stateful_dumper(storage_root),
+                    pickles.Invocation(
+                        _pickle.wrap_f(self._redirect(func, _ARGS_CONTEXT(), _KWARGS_CONTEXT())),
+                        args_kwargs,
+                    ),
+                )
             )
         )
 
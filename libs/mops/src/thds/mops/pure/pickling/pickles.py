@@ -6,6 +6,7 @@ to maintain backward-compatibility more easily.
 
 import importlib
 import io
+import mmap
 import pickle
 import sys
 import typing as ty
@@ -103,6 +104,17 @@ class UnpickleSimplePickleFromUri:
         return self._cached
 
 
+class UnpickleBufferFromUri(ty.NamedTuple):
+    """A buffer pickled out of band - see `_out_of_band`. Memory-mapped copy-on-write, so
+    that it's paged in only as it's read, and writable without ever writing the blob."""
+
+    uri: str
+
+    def __call__(self) -> mmap.mmap:
+        with lookup_blob_store(self.uri).getfile(self.uri).open("rb") as f:
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+
+
 class UnpicklePathFromUri(ty.NamedTuple):
     uri: str
 
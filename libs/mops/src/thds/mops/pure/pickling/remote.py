@@ -19,11 +19,11 @@ from ..core.memo import results
 from ..core.serialize_big_objs import ByIdRegistry, ByIdSerializer
 from ..core.serialize_paths import CoordinatingPathSerializer
 from ..core.source import hashref_context
-from ..core.types import Args, BlobStore, Kwargs, T
+from ..core.types import Args, BlobStore, Kwargs, StreamingBlobStore, T
 from ..core.use_runner import unwrap_use_runner
 from ..runner import strings
 from ..tools import console
-from . import _pickle, mprunner, pickles, sha256_b64
+from . import _pickle, compression, mprunner, pickles, sha256_b64
 
 logger = log.getLogger(__name__)
 
@@ -51,6 +51,10 @@ def generate_run_id(started_at: datetime) -> str:
     return f"{timestamp}-{random_words}"
 
 
+class _LostRace(Exception):
+    """Another invocation wrote the result while we were writing ours."""
+
+
 @dataclass  # needed for cached_property
 class ResultExcWithMetadataChannel:
     fs: BlobStore
@@ -118,33 +122,41 @@ class ResultExcWithMetadataChannel:
 
         # when we pickle the return value, we also end up potentially uploading
         # various Sources and Paths and other special-cased things inside the result.
-        return_value_bytes = _pickle.gimme_bytes(self.dumper, r)
-        if self.fs.exists(result_uri):
-            logger.warning("Not overwriting existing result at %s after serialization", result_uri)
-            self._write_metadata_only("lost-race-after-serialization")
-            return
-
-        # It's important that all deferred work is performed before the return
-        # value is written to the blob store so that result consumers don't read
-        # inconsistent data. For example, one type of deferred work is uploading
-        # result sources. If the invocation result is written with the source
-        # uri before the source is uploaded, then result consumers might try to
-        # download a non-existent file in the meantime.
-        deferred_work.perform_all()
-
-        # BUG: there remains a race condition between fs.exists and putbytes.
-        # multiple callers could get a False from fs.exists and then proceed to write.
-        # the biggest issue here is for functions that are not truly pure, because
-        # they will be writing different results, and theoretically different callers
-        # could end up seeing the different results.
-        #
-        # In the future, if a Blob Store provided a put_unless_exists method, we could use
-        # that to avoid the race condition.
-        self.fs.putbytes(
-            result_uri,
-            self._metadata_header + self._extra_metadata_content + return_value_bytes,
-            type_hint="application/mops-return-value",
-        )
+        if isinstance(self.fs, StreamingBlobStore):
+            try:
+                self._stream_return_value(self.fs, result_uri, r)
+            except _LostRace:
+                logger.warning("Not overwriting existing result at %s after serialization", result_uri)
+                self._write_metadata_only("lost-race-after-serialization")
+                return
+        else:
+            return_value_bytes = compression.frame(_pickle.gimme_bytes(self.dumper, r))
+            if self.fs.exists(result_uri):
+                logger.warning("Not overwriting existing result at %s after serialization", result_uri)
+                self._write_metadata_only("lost-race-after-serialization")
+                return
+
+            # It's important that all deferred work is performed before the return
+            # value is written to the blob store so that result consumers don't read
+            # inconsistent data. For example, one type of deferred work is uploading
+            # result sources. If the invocation result is written with the source
+            # uri before the source is uploaded, then result consumers might try to
+            # download a non-existent file in the meantime.
+            deferred_work.perform_all()
+
+            # BUG: there remains a race condition between fs.exists and putbytes.
+            # multiple callers could get a False from fs.exists and then proceed to write.
+            # the biggest issue here is for functions that are not truly pure, because
+            # they will be writing different results, and theoretically different callers
+            # could end up seeing the different results.
+            #
+            # In the future, if a Blob Store provided a put_unless_exists method, we could use
+            # that to avoid the race condition.
+            self.fs.putbytes(
+                result_uri,
+                self._metadata_header + self._extra_metadata_content + return_value_bytes,
+                type_hint="application/mops-return-value",
+            )
 
         diagnostics = b""
         threshold = _RESULT_DIAGNOSTICS_THRESHOLD_SECONDS()
@@ -155,8 +167,21 @@ class ResultExcWithMetadataChannel:
 
         self._write_metadata_only("result", diagnostics)
 
+    def _stream_return_value(self, fs: StreamingBlobStore, result_uri: str, r: T) -> None:
+        """Pickles the result straight into the blob, which is uploaded as it is written, so
+        that a result never has to fit in memory twice. The same checks, deferred work, and
+        race as the `putbytes` path - only the blob isn't committed until they're done.
+        """
+        with fs.putstream(result_uri, type_hint="application/mops-return-value") as stream:
+            stream.write(self._metadata_header + self._extra_metadata_content)
+            with compression.framing(stream) as pickle_stream:
+                self.dumper(r, pickle_stream)
+            if self.fs.exists(result_uri):
+                raise _LostRace()  # leaving the context by an exception commits nothing.
+            deferred_work.perform_all()
+
     def exception(self, exc: Exception) -> None:
-        exc_bytes = _pickle.gimme_bytes(self.dumper, exc)
+        exc_bytes = compression.frame(_pickle.gimme_bytes(self.dumper, exc))
         self.fs.putbytes(
             self.fs.join(self.call_id, results.EXCEPTION),
             self._metadata_header + exc_bytes,
@@ -11,7 +11,7 @@ from thds.core import concurrency, futures, log, scope
 from thds.termtool.colorize import colorized, make_colorized_out
 
 from ..._utils.on_slow import LogSlow, on_slow
-from ...config import max_concurrent_network_ops, max_concurrent_serialization
+from ...config import max_concurrent_network_ops, max_concurrent_serialization, process_pickling_workers
 from .._futures import MopsFuture
 from ..core import deferred_work, lease, memo, metadata, pipeline_id_mask, uris
 from ..core.lease.maintain import MAINTAIN_LEASES  # noqa: F401
@@ -32,7 +32,10 @@ from .get_results import (
 # improving throughput. A semaphore limits concurrency so each pickle finishes fast.
 # Reentrant because serialization (__getstate__) can trigger lazy mops calls
 # that themselves need to serialize — blocking the same thread would deadlock.
-_SERIALIZATION_SEMAPHORE = concurrency.ReentrantBoundedSemaphore(int(max_concurrent_serialization()))
+# Pickling in worker processes escapes the GIL, so then there's a use for one thread per worker.
+_SERIALIZATION_SEMAPHORE = concurrency.ReentrantBoundedSemaphore(
+    max(int(max_concurrent_serialization()), int(process_pickling_workers()))
+)
 
 # this semaphore (and a similar one in get_results) allow us to prioritize getting a single unit
 # of progress _complete_, rather than issuing many instructions to the
@@ -116,6 +119,7 @@ def invoke_via_shim_or_return_memoized(  # noqa: C901
                 memo_uri,
                 check_for_exception=not rerun_exceptions,
                 before_raise=debug_required_result_failure,
+                function_memospace=function_memospace,
             )
             if not result:
                 return None
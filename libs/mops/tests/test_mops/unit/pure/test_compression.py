@@ -0,0 +1,74 @@
+import os
+import pickle
+import typing as ty
+from pathlib import Path
+
+import pytest
+
+from thds.core.files import to_uri
+from thds.mops.pure import memoize_in
+from thds.mops.pure.pickling import _pickle, compression
+
+
+@pytest.fixture(params=["zstd", "lz4"])
+def codec(request) -> ty.Iterator[str]:
+    pytest.importorskip(dict(zstd="zstandard", lz4="lz4")[request.param])
+    with compression.CODEC.set_local(request.param), compression.THRESHOLD.set_local(1000):
+        yield request.param
+
+
+_ROWS = [{"name": f"row-{i % 100}", "value": 0.5} for i in range(5000)]
+_BIG = pickle.dumps(_ROWS, protocol=4)
+
+
+def test_frames_round_trip(codec: str):
+    framed = compression.frame(_BIG)
+    assert framed.startswith(b"\x80\xffmops-compressed:" + codec.encode() + b"\n")
+    assert len(framed) < len(_BIG)
+    assert compression.unframe(framed) == _BIG
+
+    header, pickle_bytes = _pickle.read_partial_pickle(b"some: header\n" + framed)
+    assert header == b"some: header\n"
+    assert pickle.loads(pickle_bytes) == _ROWS
+
+
+def test_small_or_incompressible_or_unconfigured_stay_plain(codec: str):
+    small = pickle.dumps(list(range(10)), protocol=4)
+    assert compression.frame(small) == small
+    incompressible = pickle.dumps(os.urandom(4000), protocol=4)
+    assert compression.frame(incompressible) == incompressible
+    with compression.CODEC.set_local(""):
+        assert compression.frame(_BIG) == _BIG
+
+
+def test_plain_pickles_are_read_as_ever():
+    assert compression.unframe(_BIG) == _BIG
+    assert _pickle.read_partial_pickle(b"header\n" + _BIG) == (b"header\n", _BIG)
+
+
+def test_unknown_codecs_are_refused():
+    with compression.CODEC.set_local("snappy"), pytest.raises(ValueError, match="snappy"):
+        compression.frame(_BIG)
+    with pytest.raises(ValueError, match="snappy"):
+        compression.unframe(b"\x80\xffmops-compressed:snappy\n...")
+
+
+_CALLS: ty.List[int] = list()
+
+
+def _rows(n: int) -> ty.List[ty.Dict[str, ty.Any]]:
+    _CALLS.append(n)
+    return _ROWS[:n]
+
+
+def test_compressed_results_are_memoized(codec: str, tmp_path: Path):
+    rows = memoize_in(to_uri(tmp_path))(_rows)
+    _CALLS.clear()
+    assert rows(5000) == _ROWS
+
+    (result,) = tmp_path.rglob("result")
+    assert b"\x80\xffmops-compressed:" + codec.encode() in result.read_bytes()
+
+    with compression.CODEC.set_local(""):  # read back as memoized, whatever we'd write now.
+        assert rows(5000) == _ROWS
+    assert _CALLS == [5000]
@@ -0,0 +1,110 @@
+import io
+import mmap
+import operator
+import pickle
+import typing as ty
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+from thds.core.files import to_uri
+from thds.mops.pure.core.file_blob_store import FileBlobStore
+from thds.mops.pure.core.uris import ACTIVE_STORAGE_ROOT
+from thds.mops.pure.pickling import _out_of_band, _pickle
+
+
+class Blob:
+    """Like a numpy array: its data goes out of band, when pickled at protocol 5."""
+
+    def __init__(self, data: ty.Any):
+        self.data = data
+
+    def __reduce_ex__(self, protocol: ty.SupportsIndex) -> ty.Any:
+        if operator.index(protocol) >= 5:
+            return Blob, (pickle.PickleBuffer(self.data),)
+        return Blob, (bytes(self.data),)
+
+
+@pytest.fixture
+def storage_root(tmp_path: Path) -> ty.Iterator[Path]:
+    with ACTIVE_STORAGE_ROOT.set(to_uri(tmp_path)), _out_of_band.THRESHOLD.set_local(1000):
+        yield tmp_path
+
+
+def _round_trip(obj: object) -> ty.Tuple[bytes, ty.Any]:
+    pickled = _pickle.gimme_bytes(_pickle.Dumper(), obj)
+    return pickled, _pickle.CallableUnpickler(io.BytesIO(pickled)).load()
+
+
+def test_large_buffers_become_mapped_content_addressed_blobs(storage_root: Path):
+    data = bytearray(b"abc" * 2000)
+    pickled, (blob, same_blob, again) = _round_trip([Blob(data), Blob(data), Blob(bytearray(data))])
+
+    assert pickled.startswith(b"\x80\x04")  # still protocol 4
+    assert len(pickled) < 1000
+    (stored,) = storage_root.rglob("_bytes")  # once, since the content is the same.
+    assert stored.read_bytes() == data
+
+    assert isinstance(blob.data, mmap.mmap)
+    assert blob.data[:] == same_blob.data[:] == again.data[:] == data
+    blob.data[:3] = b"xyz"  # copy-on-write
+    assert stored.read_bytes() == data
+
+
+def test_small_buffers_or_disabled_pickle_as_before(storage_root: Path):
+    small = Blob(bytearray(b"abc" * 10))
+    assert _round_trip(small)[0] == pickle.dumps(small, protocol=4)
+
+    with _out_of_band.THRESHOLD.set_local(0):
+        large = Blob(bytearray(b"abc" * 2000))
+        assert _round_trip(large)[0] == pickle.dumps(large, protocol=4)
+    assert not list(storage_root.rglob("_bytes"))
+
+
+def test_numpy_arrays(storage_root: Path):
+    np = pytest.importorskip("numpy")
+    array = np.arange(100_000, dtype=np.float64).reshape(1000, 100)
+    strided = np.arange(2000.0)[::2]  # not contiguous, so in band.
+
+    pickled, (unpickled, small, unstrided) = _round_trip([array, np.arange(10), strided])
+    assert len(pickled) < 20_000
+    assert np.array_equal(unpickled, array) and isinstance(unpickled.base.base.obj, mmap.mmap)
+    assert np.array_equal(small, np.arange(10)) and np.array_equal(unstrided, strided)
+    unpickled[0, 0] = -1.0  # writable
+
+
+def test_buffers_are_uploaded_from_a_rereadable_stream(storage_root: Path, monkeypatch):
+    class RetryingStore(FileBlobStore):
+        def putbytes(self, remote_uri: str, data: ty.Any, type_hint: str = "bytes") -> None:
+            attempts.append(data.read(100))  # an attempt that failed partway through.
+            data.seek(0)
+            super().putbytes(remote_uri, data, type_hint=type_hint)
+
+    attempts: ty.List[bytes] = list()
+    monkeypatch.setattr(_out_of_band, "lookup_blob_store", lambda uri: RetryingStore())
+    data = bytearray(range(256)) * 20
+    _round_trip(Blob(data))
+
+    (stored,) = storage_root.rglob("_bytes")
+    assert attempts == [bytes(data[:100])]
+    assert stored.read_bytes() == data
+
+
+def test_adls_uploads_of_streams_are_retried_whole_until_the_sizes_match(monkeypatch):
+    adls_blob_store = pytest.importorskip("thds.mops.pure.adls.blob_store")
+    uploaded: ty.List[bytes] = list()
+
+    def upload(uri: str, data: ty.IO[bytes], content_type: str = "") -> None:
+        uploaded.append(data.read(10 if not uploaded else -1))
+
+    monkeypatch.setattr(adls_blob_store.adls, "upload", upload)
+    monkeypatch.setattr(
+        adls_blob_store, "get_blob_properties", lambda fqn: SimpleNamespace(size=len(uploaded[-1]))
+    )
+    with memoryview(b"x" * 100) as raw:
+        reader = _out_of_band._BufferReader(raw)
+        reader.read(50)
+        adls_blob_store.AdlsBlobStore().putbytes("adls://account/cont/some/_bytes", reader)
+
+    assert uploaded == [b"x" * 10, b"x" * 100]
@@ -0,0 +1,135 @@
+import sys
+import threading
+import types
+import typing as ty
+from collections import Counter
+from functools import partial
+from pathlib import Path
+
+import pytest
+
+from thds.mops.config import process_pickling_workers
+from thds.mops.pure.pickling import _pickle, _process_pool
+
+
+def _path_from(s: str) -> Path:
+    return Path(s)
+
+
+class _CountingHandlers:
+    def __init__(self) -> None:
+        self.seen: ty.List[object] = list()
+        self.by_id: ty.Dict[int, ty.Callable] = dict()
+
+    def paths(self, obj: ty.Any) -> ty.Optional[ty.Callable]:
+        if isinstance(obj, Path):
+            self.seen.append(obj)
+            return partial(_path_from, str(obj))
+        return None
+
+    def big(self, obj: ty.Any) -> ty.Optional[ty.Callable]:
+        if type(obj).__name__ == "Big":
+            self.seen.append(obj)
+            # the same id every time, like ByIdSerializer - the pickle memoizes it.
+            return self.by_id.setdefault(id(obj), partial(str, f"big-{len(self.by_id)}"))
+        return None
+
+    def dumper(self) -> _pickle.Dumper:
+        return _pickle.Dumper(self.big, self.paths)
+
+
+def _args() -> object:
+    class Big:  # a local class - the workers never see it, only its placeholder.
+        pass
+
+    big = Big()
+    shared = [Path("/a/b"), {"x": 1.5, "y": b"bytes"}]
+    return (
+        (shared, shared, big, Path("/c"), big),
+        {"nested": {"paths": [Path("/a/b"), Path("/c")], "big": big, "n": list(range(100))}},
+    )
+
+
+@pytest.fixture
+def workers() -> ty.Iterator[None]:
+    with process_pickling_workers.set_local(2):
+        yield
+
+
+def test_workers_produce_the_same_bytes_and_side_effects(workers: None):
+    args = _args()
+    serial, pooled = _CountingHandlers(), _CountingHandlers()
+
+    expected = _pickle.gimme_bytes(serial.dumper(), args)
+    assert _process_pool.gimme_bytes(pooled.dumper(), args) == expected
+    # the same calls, though repeats come later - after the worker has found them.
+    assert Counter(map(id, pooled.seen)) == Counter(map(id, serial.seen))
+    assert _process_pool.gimme_bytes(_CountingHandlers().dumper(), args) == expected  # a reused worker
+
+
+def test_without_workers_pickles_here(monkeypatch):
+    monkeypatch.setattr(_process_pool, "_pool", None)  # would fail if called
+    handlers = _CountingHandlers()
+    assert _process_pool.gimme_bytes(handlers.dumper(), _args()) == _pickle.gimme_bytes(
+        _CountingHandlers().dumper(), _args()
+    )
+
+
+def test_what_the_workers_cannot_import_is_pickled_here(workers: None, monkeypatch):
+    module = types.ModuleType("only_in_this_process")
+    monkeypatch.setitem(sys.modules, module.__name__, module)
+    Unknown = type("Unknown", (), {"__module__": module.__name__})
+    module.Unknown = Unknown  # type: ignore
+
+    args = (Unknown(), _args())
+    serial, pooled = _CountingHandlers(), _CountingHandlers()
+    expected = _pickle.gimme_bytes(serial.dumper(), args)
+    assert _process_pool.gimme_bytes(pooled.dumper(), args) == expected
+    assert Counter(map(id, pooled.seen)) == Counter(map(id, serial.seen))  # not run all over again.
+    assert _process_pool._pool(2)._started <= 2  # the worker that failed was kept.
+
+
+def test_handler_errors_are_raised(workers: None):
+    def fails(obj: ty.Any) -> None:
+        if isinstance(obj, Path):
+            raise ValueError(f"No such file {obj}")
+
+    with pytest.raises(ValueError, match="No such file"):
+        _process_pool.gimme_bytes(_pickle.Dumper(fails), [Path("/nope")])
+
+
+def test_a_worker_that_dies_is_replaced_for_whoever_is_waiting(monkeypatch):
+    pool = _process_pool._Pool(1)
+    waiting = threading.Event()
+    results: ty.List[bytes] = list()
+
+    class _Signalling(threading.Condition):
+        def wait(self, timeout: ty.Optional[float] = None) -> bool:
+            waiting.set()
+            return super().wait(timeout)
+
+    class _Worker:
+        started = 0
+
+        def __init__(self, context: object):
+            _Worker.started += 1
+            self.dies = _Worker.started == 1
+            self.process = types.SimpleNamespace(kill=lambda: None)
+
+        def repickle(self, handled: object, payload: bytes) -> bytes:
+            if self.dies:
+                second.start()
+                assert waiting.wait(10)
+                raise EOFError("the worker died")
+            return payload
+
+    second = threading.Thread(target=lambda: results.append(pool.dump(_process_pool._Handled(()), 2)))
+    monkeypatch.setattr(pool, "_available", _Signalling())
+    monkeypatch.setattr(_process_pool, "_Worker", _Worker)
+
+    with pytest.raises(EOFError):
+        pool.dump(_process_pool._Handled(()), 1)
+    second.join(10)
+
+    assert not second.is_alive()
+    assert len(results) == 1 and _Worker.started == 2 and pool._started == 1
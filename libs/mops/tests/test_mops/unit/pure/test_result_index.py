@@ -0,0 +1,78 @@
+import typing as ty
+from pathlib import Path
+
+import pytest
+
+from thds.core.files import to_uri
+from thds.mops.pure.core.file_blob_store import FileBlobStore
+from thds.mops.pure.core.memo import result_index, results
+
+
+@pytest.fixture
+def memospace(tmp_path: Path) -> str:
+    for memo_dir, name in [
+        ("calls-a/done", results.RESULT),
+        ("calls-a/failed", results.EXCEPTION),
+        ("calls-b/done", results.RESULT),
+        ("calls-b/started", "invocation"),
+    ]:
+        (tmp_path / memo_dir).mkdir(parents=True, exist_ok=True)
+        (tmp_path / memo_dir / name).write_bytes(b"")
+    return to_uri(tmp_path)
+
+
+@pytest.fixture
+def existses(monkeypatch) -> ty.Iterator[ty.List[str]]:
+    checked: ty.List[str] = list()
+    real_exists = FileBlobStore.exists
+
+    def exists(self: FileBlobStore, uri: str) -> bool:
+        checked.append(uri)
+        return real_exists(self, uri)
+
+    monkeypatch.setattr(FileBlobStore, "exists", exists)
+    result_index.clear()
+    with result_index.ENABLED.set_local(True):
+        yield checked
+    result_index.clear()
+
+
+def _check(memospace: str, memo_dir: str) -> ty.Union[None, results.Success, results.Error]:
+    return results.check_if_result_exists(
+        f"{memospace}/{memo_dir}", check_for_exception=True, function_memospace=memospace
+    )
+
+
+def test_indexed_results_need_no_exists(memospace: str, existses: ty.List[str]):
+    assert isinstance(_check(memospace, "calls-a/done"), results.Success)
+    assert isinstance(_check(memospace, "calls-b/done"), results.Success)
+    assert isinstance(_check(memospace, "calls-a/failed"), results.Error)
+    assert existses == [f"{memospace}/calls-a/failed/result"]  # the exception was found by index.
+
+    counters = result_index.counters()
+    assert (counters.listings, counters.listed, counters.indexed) == (1, 4, 3)
+    assert (counters.hits, counters.misses) == (3, 1)
+
+
+def test_misses_fall_back_to_exists(memospace: str, existses: ty.List[str], tmp_path: Path):
+    assert _check(memospace, "calls-b/started") is None
+    assert len(existses) == 2
+
+    (tmp_path / "calls-b/started/result").write_bytes(b"")  # after the listing
+    assert isinstance(_check(memospace, "calls-b/started"), results.Success)
+    assert result_index.counters().listings == 1
+
+
+def test_disabled_or_without_a_memospace(memospace: str, existses: ty.List[str]):
+    assert isinstance(results.check_if_result_exists(f"{memospace}/calls-a/done"), results.Success)
+    with result_index.ENABLED.set_local(False):
+        assert isinstance(_check(memospace, "calls-b/done"), results.Success)
+    assert len(existses) == 2
+    assert result_index.counters() == result_index.Counters()
+
+
+def test_list_recursive_lists_only_files(memospace: str, tmp_path: Path):
+    listed = set(FileBlobStore().list_recursive(memospace))
+    assert len(listed) == 4
+    assert to_uri(tmp_path / "calls-a/done/result") in listed
+    assert not list(FileBlobStore().list_recursive(to_uri(tmp_path / "nope")))
@@ -0,0 +1,71 @@
+import io
+import pickle
+import typing as ty
+from pathlib import Path
+
+import pytest
+
+from thds.core.files import to_uri
+from thds.mops.pure import memoize_in
+from thds.mops.pure.core.file_blob_store import FileBlobStore
+from thds.mops.pure.core.types import StreamingBlobStore
+from thds.mops.pure.pickling import _pickle, compression
+
+
+def test_file_blob_store_writes_the_stream_only_on_a_clean_exit(tmp_path: Path):
+    store = FileBlobStore()
+    assert isinstance(store, StreamingBlobStore)
+    uri = to_uri(tmp_path / "some" / "blob")
+
+    with pytest.raises(RuntimeError):
+        with store.putstream(uri) as stream:
+            stream.write(b"half a blob")
+            raise RuntimeError("oops")
+    assert not store.exists(uri)
+
+    with store.putstream(uri) as stream:
+        stream.write(b"a whole ")
+        stream.write(b"blob")
+    assert (tmp_path / "some" / "blob").read_bytes() == b"a whole blob"
+
+
+_ROWS = [{"name": f"row-{i % 100}", "value": 0.5} for i in range(5000)]
+
+
+@pytest.mark.parametrize("codec", ["", "zstd", "lz4"])
+def test_framed_streams_read_back_as_pickles(codec: str):
+    if codec:
+        pytest.importorskip(dict(zstd="zstandard", lz4="lz4")[codec])
+    out = io.BytesIO()
+    out.write(b"some: header\n")
+    with compression.CODEC.set_local(codec):
+        with compression.framing(out) as stream:
+            pickle.dump(_ROWS, stream, protocol=4)
+    assert not out.closed
+
+    header, pickle_bytes = _pickle.read_partial_pickle(out.getvalue())
+    assert header == b"some: header\n"
+    assert pickle.loads(pickle_bytes) == _ROWS
+    if codec:
+        assert len(out.getvalue()) < len(pickle.dumps(_ROWS, protocol=4))
+
+
+_CALLS: ty.List[int] = list()
+
+
+def _rows(n: int) -> ty.List[ty.Dict[str, ty.Any]]:
+    _CALLS.append(n)
+    return _ROWS[:n]
+
+
+def test_streamed_results_are_memoized(tmp_path: Path):
+    rows = memoize_in(to_uri(tmp_path))(_rows)
+    _CALLS.clear()
+    assert rows(5000) == _ROWS
+
+    (result,) = tmp_path.rglob("result")
+    header, pickle_bytes = _pickle.read_partial_pickle(result.read_bytes())
+    assert b"remote-code-version=" in header and pickle.loads(pickle_bytes) == _ROWS
+    assert not list(tmp_path.rglob("*.tmp*"))
+    assert rows(5000) == _ROWS
+    assert _CALLS == [5000]